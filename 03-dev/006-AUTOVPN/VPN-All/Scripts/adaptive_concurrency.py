@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+AIMD 自适应并发控制
+供 final_auto_resolver / complete_domain_resolver 的域名解析流水线使用，
+替代"每批新建线程池 + 批次间固定 sleep + 失败后指数退避 sleep"
+
+- 加性增：每完成约一轮（当前并发上限个）成功请求，并发上限 +1
+- 乘性减：最近窗口内超时/SERVFAIL 比例超过阈值时，并发上限减半（每轮最多一次）
+- 长驻流水线：单个线程池贯穿整个任务，没有批次屏障；
+  临时性失败重新排到队尾重试，不再 sleep
+"""
+
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Hashable, Iterable, Optional, Tuple
+
+# 请求结果分类
+OK = 'ok'
+TIMEOUT = 'timeout'
+SERVFAIL = 'servfail'
+NEGATIVE = 'negative'  # NXDOMAIN / NoAnswer：权威否定应答，不重试
+FAILED = 'failed'  # 其他错误
+
+# 视为上游过载的结果
+CONGESTION_OUTCOMES = (TIMEOUT, SERVFAIL)
+# 可重试的结果
+RETRYABLE_OUTCOMES = (TIMEOUT, SERVFAIL, FAILED)
+
+
+def classify_dns_error(error: Optional[str]) -> str:
+    """将 DNS 错误字符串归类为流水线结果"""
+    if not error:
+        return OK
+    if error in ('NXDOMAIN', 'NoAnswer'):
+        return NEGATIVE
+    if error == 'SERVFAIL':
+        return SERVFAIL
+    if 'timeout' in error.lower() or 'timed out' in error.lower():
+        return TIMEOUT
+    return FAILED
+
+
+class AIMDController:
+    """按观测到的超时/SERVFAIL比例调整并发上限"""
+
+    def __init__(self, initial: int = 8, min_limit: int = 1, max_limit: int = 64,
+                 increase: float = 1.0, decrease_factor: float = 0.5,
+                 window: int = 50, error_threshold: float = 0.05):
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.increase = increase
+        self.decrease_factor = decrease_factor
+        self.error_threshold = error_threshold
+        self._limit = float(min(self.max_limit, max(self.min_limit, initial)))
+        self._window = deque(maxlen=window)
+        self._in_flight = 0
+        self._since_decrease = 0
+        self._cond = threading.Condition()
+        self.stats = {'completed': 0, 'timeouts': 0, 'servfails': 0, 'decreases': 0,
+                      'peak_limit': int(self._limit)}
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def error_rate(self) -> float:
+        """最近窗口内的超时/SERVFAIL比例"""
+        with self._cond:
+            if not self._window:
+                return 0.0
+            return sum(self._window) / len(self._window)
+
+    def acquire(self, stop_event: Optional[threading.Event] = None) -> bool:
+        """等待并发名额；stop_event 置位时返回 False"""
+        with self._cond:
+            while self._in_flight >= int(self._limit):
+                if stop_event is not None and stop_event.is_set():
+                    return False
+                self._cond.wait(timeout=0.5)
+            self._in_flight += 1
+            return True
+
+    def release(self, outcome: str):
+        """归还名额并记录结果"""
+        with self._cond:
+            self._in_flight = max(0, self._in_flight - 1)
+            self._record(outcome)
+            self._cond.notify_all()
+
+    def _record(self, outcome: str):
+        congested = outcome in CONGESTION_OUTCOMES
+        self._window.append(1 if congested else 0)
+        self._since_decrease += 1
+        self.stats['completed'] += 1
+        if outcome == TIMEOUT:
+            self.stats['timeouts'] += 1
+        elif outcome == SERVFAIL:
+            self.stats['servfails'] += 1
+
+        if congested:
+            rate = sum(self._window) / len(self._window)
+            # 每轮最多减一次，避免同一波超时把并发压到最低
+            if rate > self.error_threshold and self._since_decrease >= int(self._limit):
+                self._limit = max(self.min_limit, self._limit * self.decrease_factor)
+                self._since_decrease = 0
+                self.stats['decreases'] += 1
+        elif outcome != FAILED:
+            # 每个成功请求增加 increase/limit，约每轮 +increase
+            self._limit = min(self.max_limit, self._limit + self.increase / self._limit)
+            self.stats['peak_limit'] = max(self.stats['peak_limit'], int(self._limit))
+
+
+class AdaptivePipeline:
+    """长驻解析流水线：单个线程池 + AIMD 并发控制 + 队尾重试
+
+    worker(item) 返回 (结果, 结果分类)；on_done(item, 结果, 结果分类) 在流水线锁内调用，
+    回调中可直接修改共享计数而无需另行加锁。
+    """
+
+    def __init__(self, worker: Callable[[Hashable], Tuple[object, str]],
+                 controller: Optional[AIMDController] = None, max_attempts: int = 3,
+                 stop_event: Optional[threading.Event] = None):
+        self.worker = worker
+        self.controller = controller or AIMDController()
+        self.max_attempts = max(1, max_attempts)
+        self.stop_event = stop_event or threading.Event()
+        self._executor = ThreadPoolExecutor(max_workers=self.controller.max_limit,
+                                            thread_name_prefix='aimd-worker')
+        self._lock = threading.Lock()
+        self.stats = {'submitted': 0, 'retries': 0}
+
+    def run(self, items: Iterable[Hashable],
+            on_done: Optional[Callable[[Hashable, object, str], None]] = None) -> Dict[Hashable, object]:
+        """处理全部条目，返回 {条目: 结果}；stop_event 置位后不再派发新任务"""
+        items = list(dict.fromkeys(items))
+        results: Dict[Hashable, object] = {}
+        if not items:
+            return results
+        work: queue.Queue = queue.Queue()
+        for item in items:
+            work.put((item, 1))
+        outstanding = [len(items)]
+
+        def finalize(item, result, outcome):
+            with self._lock:
+                results[item] = result
+                try:
+                    if on_done is not None:
+                        on_done(item, result, outcome)
+                finally:
+                    outstanding[0] -= 1
+                    if outstanding[0] == 0:
+                        work.put(None)
+
+        def task(item, attempt):
+            try:
+                result, outcome = self.worker(item)
+            except Exception:
+                result, outcome = None, FAILED
+            self.controller.release(outcome)
+            if (outcome in RETRYABLE_OUTCOMES and attempt < self.max_attempts
+                    and not self.stop_event.is_set()):
+                with self._lock:
+                    self.stats['retries'] += 1
+                work.put((item, attempt + 1))
+                return
+            finalize(item, result, outcome)
+
+        while not self.stop_event.is_set():
+            try:
+                entry = work.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            if entry is None:
+                break
+            if not self.controller.acquire(self.stop_event):
+                break
+            self.stats['submitted'] += 1
+            self._executor.submit(task, *entry)
+        return results
+
+    def close(self):
+        """等待在途任务结束并释放线程池"""
+        self._executor.shutdown(wait=True)
@@ -4,11 +4,8 @@ import configparser
 import logging
 import paramiko
 import ipaddress
-import tempfile
-from typing import List, Tuple, Optional
-from datetime import datetime
+from typing import Dict, List, Optional
 import subprocess
-import shutil
 import socket
 import sys
 import os
@@ -45,9 +42,17 @@ logger = logging.getLogger(__name__)
 # 项目根目录定义
 PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+if SCRIPT_DIR not in sys.path:
+    sys.path.insert(0, SCRIPT_DIR)
 
-# 添加hosts文件路径定义
-HOSTS_FILE = r'C:\Windows\System32\drivers\etc\hosts'
+from dns_cache import get_dns_cache, system_resolve
+from remote_resolver_agent import RemoteResolverAgent, ParamikoTransport
+from result_store import get_result_store
+from hosts_file import HostsFile, HOSTS_FILE
+from hosts_journal import get_hosts_journal
+
+# 境外服务器解析结果在DNS缓存中的服务器键（与 autovpn_menu 共用）
+REMOTE_DNS_SERVER = 'remote'
 
 # 读取配置文件
 CONFIG_FILE = os.path.join(PROJECT_ROOT, 'config.json')
@@ -74,63 +79,65 @@ def load_config():
 # 新增hosts更新函数（直接参照update_hosts.py逻辑）
 
 
-def resolve_domain_ip(ssh: paramiko.SSHClient, domain: str) -> Optional[str]:
-    """通过境外服务器解析域名获取IP地址"""
-    try:
-        # 创建并上传执行脚本
-        script_content = f"dig +short {domain} | awk 'NR == 1 {{print; exit}}'"
-        tmpfile_path, remote_script_path = _create_and_upload_script(
-            ssh, script_content, domain)
-
-        # 执行脚本
-        stdin, stdout, stderr = ssh.exec_command(f"bash {remote_script_path}")
-        result = stdout.read().decode('utf-8', errors='ignore').strip()
-        error = stderr.read().decode('utf-8', errors='ignore').strip()
-
-        # 清理远程脚本
-        ssh.exec_command(f"rm -f {remote_script_path}")
-
-        # 处理结果
-        if result:
-            ip = result.split('\n')[0]
-            print(f"[INFO] Remote resolved: {domain} -> {ip}")
-            return ip
-        else:
-            print(f"[WARNING] 境外解析失败，尝试本地解析")
-            return get_ip_by_domain(domain)
-
-    except Exception as e:
-        print(f"[ERROR] 远程DNS错误: {e}")
-        return None
-
-
-def _create_and_upload_script(
-        ssh: paramiko.SSHClient, script_content: str, domain: str) -> Tuple[str, str]:
-    """创建临时脚本文件并上传到服务器"""
-    # 创建临时文件
-    with tempfile.NamedTemporaryFile(mode='w', suffix='.sh', delete=False) as tmpfile:
-        tmpfile.write(script_content)
-        tmpfile_path = tmpfile.name
-
-    # 生成远程脚本路径
-    remote_script_path = f"/tmp/dig_{domain.replace('.', '_')}.sh"
+def resolve_domains_ip(agent: RemoteResolverAgent, domains: List[str]) -> Dict[str, Optional[str]]:
+    """通过境外服务器常驻解析代理批量解析域名（经持久化DNS缓存）
+
+    未过期的缓存直接使用；其余域名经同一SSH会话流水线发送，整批只需一次往返。
+    结果按域名写入解析结果库，不重写任何文本文件。
+    """
+    cache = get_dns_cache()
+    unique = list(dict.fromkeys(domains))
+    to_fetch = []
+    for domain in unique:
+        entry = cache.get(domain, 'A', REMOTE_DNS_SERVER)
+        if entry is None or not entry.is_fresh():
+            to_fetch.append(domain)
+
+    fetched = {}
+    if to_fetch:
+        try:
+            fetched = agent.resolve_many(to_fetch)
+        except Exception as e:
+            print(f"[ERROR] 远程DNS错误: {e}")
+
+    results = {}
+    store = get_result_store()
+    with store.batch():
+        for domain in unique:
+            # 过期条目以本次远程结果刷新，远程失败时使用旧值
+            entry = cache.lookup(
+                domain, 'A', REMOTE_DNS_SERVER,
+                lambda d=domain: fetched.get(d, ([], None, 'RemoteFailed')),
+                revalidate_in_background=False)
+            if entry.addresses:
+                ip = entry.addresses[0]
+                source = {'network': 'Remote resolved', 'stale': 'Remote resolved (stale cache)'}.get(
+                    entry.source, 'Remote resolved (cached)')
+                print(f"[INFO] {source}: {domain} -> {ip}")
+                store.upsert(domain, ipv4=entry.addresses, best_ip=ip)
+            else:
+                print(f"[WARNING] 境外解析失败，尝试本地解析: {domain}")
+                ip = get_ip_by_domain(domain)
+                if ip:
+                    store.upsert(domain, ipv4=[ip], best_ip=ip)
+                else:
+                    store.record_failure(domain, entry.error)
+            results[domain] = ip
+    return results
 
-    # 上传脚本
-    sftp = ssh.open_sftp()
-    sftp.put(tmpfile_path, remote_script_path)
-    sftp.chmod(remote_script_path, 0o755)
-    sftp.close()
 
-    return tmpfile_path, remote_script_path
+def resolve_domain_ip(agent: RemoteResolverAgent, domain: str) -> Optional[str]:
+    """通过境外服务器解析单个域名获取IP地址"""
+    return resolve_domains_ip(agent, [domain]).get(domain)
 
 
 def get_ip_by_domain(domain: str) -> Optional[str]:
-    """通过域名获取IP地址"""
-    try:
-        return socket.gethostbyname(domain)
-    except socket.gaierror:
-        print(f"无法解析域名: {domain}")
-        return None
+    """通过域名获取IP地址（系统解析器，经持久化DNS缓存）"""
+    addresses = system_resolve(domain, ipv6=False)
+    if addresses:
+        return addresses[0]
+    print(f"无法解析域名: {domain}")
+    return None
 
 
 def is_foreign_ip(ip: str) -> bool:
@@ -156,12 +163,16 @@ def is_foreign_ip(ip: str) -> bool:
         return True  # 缺少依赖时默认视为境外IP
 
 
-def update_hosts_with_domains(domains: List[str]) -> int:
-    """更新hosts文件，返回实际写入的条目数"""
+def update_hosts_with_domains(domains: List[str], resolved: Optional[Dict[str, str]] = None) -> int:
+    """更新hosts文件，返回实际生效的条目数（不含被AUTOVPN区块之前的同名记录覆盖的域名）
+
+    resolved: 已解析的 {域名: IP}，未提供或缺失的域名使用本地解析
+    """
+    resolved = resolved or {}
     # 收集有效域名-IP对
     domain_ip_pairs = []
     for domain in domains:
-        ip = resolve_domain_ip(domain)
+        ip = resolved.get(domain) or get_ip_by_domain(domain)
         if ip and is_valid_ip(ip):
             domain_ip_pairs.append((domain, ip))
 
@@ -169,14 +180,7 @@ def update_hosts_with_domains(domains: List[str]) -> int:
         print("[ERROR] 没有有效的域名-IP对")
         return 0
 
-    temp_hosts = os.path.join(PROJECT_ROOT, 'temp_hosts.txt')
     try:
-        # 读取现有hosts内容
-        original_hosts = []
-        if os.path.exists(HOSTS_FILE):
-            with open(HOSTS_FILE, 'r', encoding='utf-8') as f:
-                original_hosts = f.readlines()
-
         # 创建域名IP映射
         domain_ip_map = {}
         for domain, ip in domain_ip_pairs:
@@ -191,51 +195,33 @@ def update_hosts_with_domains(domains: List[str]) -> int:
         # 去重排序
         unique_items = deduplicate_and_sort(processed_lines)
 
-        # 写入临时文件
-        with open(temp_hosts, 'w', encoding='utf-8') as f:
-            # 写入非AUTOVPN管理的内容
-            for line in original_hosts:
-                if not line.startswith('# AUTOVPN') and not is_relevant_line(
-                        line, domain_ip_map):
-                    if line.strip():
-                        f.write(line)
-
-            # 写入新记录
-            f.write('\n# AUTOVPN自动写入\n')
-            for entry in unique_items:
-                f.write(entry + '\n')
-                logger.info(f"写入记录: {entry}")
-
-        # 创建备份
-        bak = HOSTS_FILE + '.' + datetime.now().strftime('%Y%m%d_%H%M%S') + '.bak'
-        shutil.copy(HOSTS_FILE, bak)
-        logger.info(f"已备份原hosts到 {bak}")
-
-        # 强制更新hosts文件
-        if force_update_hosts(temp_hosts):
-            # 验证写入结果
-            if verify_hosts_update(unique_items):
-                logger.info(f"[SUCCESS] 实际写入 {len(unique_items)} 条记录")
-                return len(unique_items)
-            else:
-                logger.error("[ERROR] 文件内容验证失败")
-                return 0
+        # AUTOVPN区块内的同名旧记录替换为新记录；区块外用户维护的条目不变
+        hosts = HostsFile.load(HOSTS_FILE)
+        entries = [tuple(entry.split('\t', 1)) for entry in unique_items]
+        hosts.upsert(entries)
+        for entry in unique_items:
+            logger.info(f"写入记录: {entry}")
+        # 区块之前已有指向其他IP的同名条目时，新记录不会生效
+        shadowed = hosts.shadowed(entries)
+        if shadowed:
+            logger.warning(f"[WARNING] 以下域名在AUTOVPN区块之前已有其他IP的记录，新记录不会生效: {', '.join(shadowed)}")
+
+        # 原子写入，按校验和验证写入结果；变更差量记入日志（python hosts_journal.py list/restore）
+        with get_hosts_journal().track(HOSTS_FILE, f"add_single_domain: {', '.join(domain_ip_map)}"):
+            updated = force_update_hosts(hosts)
+        if updated:
+            effective = len(unique_items) - len(shadowed)
+            logger.info(f"[SUCCESS] 实际写入 {len(unique_items)} 条记录，生效 {effective} 条")
+            return effective
         else:
             return 0
 
     except Exception as e:
         logger.error(f"[CRITICAL] 主机文件更新异常: {e}", exc_info=True)
         return 0
-    finally:
-        cleanup_temp_file(temp_hosts)
-
 
-def is_relevant_line(line: str, domain_map: dict) -> bool:
-    """检查行是否包含相关域名"""
-    return any(domain in line for domain in domain_map.keys())
 
-
-def force_update_hosts(temp_path: str) -> bool:
+def force_update_hosts(hosts: HostsFile) -> bool:
     """强制更新hosts文件"""
     try:
         # 获取管理员权限
@@ -244,8 +230,9 @@ def force_update_hosts(temp_path: str) -> bool:
             os.system(
                 f'icacls "{HOSTS_FILE}" /grant administrators:F /t /c >nul 2>&1')
 
-        os.chmod(HOSTS_FILE, 0o666)
-        shutil.copy(temp_path, HOSTS_FILE)
+        if os.path.exists(HOSTS_FILE):
+            os.chmod(HOSTS_FILE, 0o666)
+        hosts.save(HOSTS_FILE)
         os.system('ipconfig /flushdns')
         return True
     except Exception as e:
@@ -255,23 +242,6 @@ def force_update_hosts(temp_path: str) -> bool:
         return False
 
 
-def verify_hosts_update(expected_items: list) -> bool:
-    """验证hosts文件更新结果"""
-    try:
-        with open(HOSTS_FILE, 'r', encoding='utf-8') as f:
-            content = f.read()
-
-        # 检查所有预期记录是否存在
-        for item in expected_items:
-            if item.split()[0] not in content:
-                logger.error(f"[ERROR] 验证失败 - 缺失: {item}")
-                return False
-        return True
-    except Exception as e:
-        logger.error(f"[ERROR] 文件验证失败: {e}", exc_info=True)
-        return False
-
-
 def is_valid_ip(ip: str) -> bool:
     """验证IP地址有效性"""
     try:
@@ -311,17 +281,6 @@ def deduplicate_and_sort(items: list) -> list:
         return list(unique_items)
 
 
-def cleanup_temp_file(temp_path: str):
-    """清理临时文件"""
-    try:
-        if os.path.exists(temp_path):
-            os.chmod(temp_path, 0o666)
-            os.unlink(temp_path)
-            logger.debug("[DEBUG] 临时文件已强制删除")
-    except Exception as e:
-        logger.error(f"[ERROR] 清理临时文件失败: {e}", exc_info=True)
-
-
 def www_domain(domain: str) -> str:
     """生成www版本域名"""
     return f"www.{domain}" if not domain.startswith('www.') else domain
@@ -391,7 +350,11 @@ if __name__ == "__main__":
         print("请检查网络连接和远程服务器配置")
         sys.exit(1)
 
+    # 常驻解析代理：整个运行期间复用同一SSH会话
+    agent = RemoteResolverAgent(ParamikoTransport.factory(ssh))
+
     print(f"\n=> 开始处理 {total_domains} 个域名...")
+    resolved = resolve_domains_ip(agent, domains_input)
 
     for i, domain in enumerate(domains_input, start=1):
         print(f"{'-' * 40}")
@@ -399,7 +362,7 @@ if __name__ == "__main__":
         print(f"{'-' * 40}")
 
         # 解析域名IP
-        ip = resolve_domain_ip(ssh, domain)
+        ip = resolved.get(domain)
         if not ip:
             print(f"[❌] 域名解析失败: {domain}")
             failed_domains.append(domain)
@@ -426,7 +389,7 @@ if __name__ == "__main__":
                 domains.append(d)
 
         # 更新hosts文件
-        result = update_hosts_with_domains(domains)
+        result = update_hosts_with_domains(domains, {d: ip for d in domains})
         if result > 0:
             print(f"[✅] 成功更新hosts文件，新增{result}条记录")
             success_count += 1
@@ -443,6 +406,7 @@ if __name__ == "__main__":
             print(f"     - {d}")
 
     # 关闭SSH连接
+    agent.close()
     if ssh:
         ssh.close()
         print("[INFO] SSH连接已关闭")
@@ -0,0 +1,463 @@
+#!/usr/bin/env python3
+"""
+异步批量DNS解析引擎
+基于 asyncio + 原始UDP套接字，将所有域名的 A/AAAA 查询同时复用到全部DNS服务器上
+
+- 每个DNS服务器一个UDP端点，按查询ID分发响应
+- 每服务器令牌桶限速 + 全局并发上限
+- 响应带 TC（截断）标志时自动改用TCP重查
+- 结果保留每个服务器的应答集合及TTL，供命中统计/缓存使用
+- 可选接入 dns_cache.DNSCache：未过期条目不发查询，查询失败时使用旧值
+- 不依赖 dnspython，可直接对本地UDP DNS桩服务器测试
+"""
+
+import asyncio
+import random
+import socket
+import struct
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+# 记录类型
+QTYPE_A = 1
+QTYPE_CNAME = 5
+QTYPE_AAAA = 28
+QTYPE_OPT = 41
+QTYPE_NAMES = {QTYPE_A: 'A', QTYPE_AAAA: 'AAAA'}
+QTYPE_CODES = {'A': QTYPE_A, 'AAAA': QTYPE_AAAA}
+
+# 响应码
+RCODE_NOERROR = 0
+RCODE_SERVFAIL = 2
+RCODE_NXDOMAIN = 3
+RCODE_REFUSED = 5
+
+EDNS_UDP_PAYLOAD = 1232  # 避免分片的推荐EDNS缓冲区大小
+
+ServerSpec = Union[str, Tuple[str, int]]
+
+
+class DNSFormatError(Exception):
+    """DNS报文格式错误"""
+
+
+@dataclass
+class DNSAnswer:
+    """单个服务器对单个 (域名, 记录类型) 的查询结果"""
+    domain: str
+    rtype: str
+    server: str
+    rcode: Optional[int] = None
+    addresses: List[str] = field(default_factory=list)
+    ttl: Optional[int] = None  # 应答中地址记录的最小TTL
+    error: Optional[str] = None  # Timeout / NXDOMAIN / NoAnswer / SERVFAIL / ...
+    via_tcp: bool = False
+    elapsed: float = 0.0
+    from_cache: Optional[str] = None  # None / 'cache' / 'stale'
+
+    @property
+    def ok(self) -> bool:
+        return bool(self.addresses)
+
+
+@dataclass
+class DomainResolution:
+    """一个域名在所有服务器上的解析汇总"""
+    domain: str
+    answers: List[DNSAnswer] = field(default_factory=list)
+
+    def _collect(self, rtype: str) -> List[str]:
+        seen = []
+        for answer in self.answers:
+            if answer.rtype != rtype:
+                continue
+            for address in answer.addresses:
+                if address not in seen:
+                    seen.append(address)
+        return seen
+
+    @property
+    def ipv4(self) -> List[str]:
+        return self._collect('A')
+
+    @property
+    def ipv6(self) -> List[str]:
+        return self._collect('AAAA')
+
+    def server_answers(self, rtype: str = 'A') -> Dict[str, List[str]]:
+        """每个服务器返回的地址集合 {server: [ip, ...]}"""
+        return {a.server: list(a.addresses) for a in self.answers if a.rtype == rtype and a.ok}
+
+    def to_tuple(self, ipv6_enable: bool = False) -> Tuple[List[str], bool, List[str], bool]:
+        """兼容 get_ips_from_dns_servers 的 (ipv4, ok, ipv6, ok) 返回格式"""
+        ipv4 = self.ipv4
+        ipv6 = self.ipv6 if ipv6_enable else []
+        return ipv4, bool(ipv4), ipv6, bool(ipv6)
+
+
+# ---------------------------------------------------------------------------
+# 报文编解码
+# ---------------------------------------------------------------------------
+
+def encode_name(domain: str) -> bytes:
+    """域名编码为DNS标签序列"""
+    parts = []
+    for label in domain.strip('.').split('.'):
+        if not label:
+            continue
+        raw = label.encode('idna')
+        if len(raw) > 63:
+            raise DNSFormatError(f"标签过长: {label}")
+        parts.append(bytes([len(raw)]) + raw)
+    return b''.join(parts) + b'\x00'
+
+
+def wire_name(domain: str) -> str:
+    """域名在报文中的形式（IDNA 编码、小写），与 decode_name 的解析结果一致"""
+    return '.'.join(label.encode('idna').decode('ascii')
+                    for label in domain.strip('.').split('.') if label).lower()
+
+
+def build_query(domain: str, qtype: int, qid: int, edns: bool = True) -> bytes:
+    """构造递归查询报文"""
+    header = struct.pack('!HHHHHH', qid, 0x0100, 1, 0, 0, 1 if edns else 0)
+    question = encode_name(domain) + struct.pack('!HH', qtype, 1)
+    if edns:
+        # OPT 伪记录：根域名、类型41、CLASS=UDP负载大小
+        question += b'\x00' + struct.pack('!HHIH', QTYPE_OPT, EDNS_UDP_PAYLOAD, 0, 0)
+    return header + question
+
+
+def decode_name(data: bytes, offset: int) -> Tuple[str, int]:
+    """解析（可能带压缩指针的）域名，返回 (域名, 名称之后的偏移)"""
+    labels = []
+    end = None
+    jumps = 0
+    while True:
+        if offset >= len(data):
+            raise DNSFormatError("域名越界")
+        length = data[offset]
+        if length & 0xC0 == 0xC0:
+            if offset + 1 >= len(data):
+                raise DNSFormatError("压缩指针越界")
+            if end is None:
+                end = offset + 2
+            offset = ((length & 0x3F) << 8) | data[offset + 1]
+            jumps += 1
+            if jumps > 64:
+                raise DNSFormatError("压缩指针循环")
+            continue
+        offset += 1
+        if length == 0:
+            break
+        labels.append(data[offset:offset + length].decode('ascii', errors='replace'))
+        offset += length
+    return '.'.join(labels).lower(), (end if end is not None else offset)
+
+
+def parse_response(data: bytes) -> Dict:
+    """解析响应报文，返回 id/rcode/tc/question/records"""
+    if len(data) < 12:
+        raise DNSFormatError("报文过短")
+    qid, flags, qdcount, ancount, _, _ = struct.unpack('!HHHHHH', data[:12])
+    offset = 12
+    question = None
+    for _ in range(qdcount):
+        name, offset = decode_name(data, offset)
+        qtype, _ = struct.unpack('!HH', data[offset:offset + 4])
+        offset += 4
+        if question is None:
+            question = (name, qtype)
+
+    records = []
+    for _ in range(ancount):
+        name, offset = decode_name(data, offset)
+        if offset + 10 > len(data):
+            raise DNSFormatError("资源记录越界")
+        rtype, _, ttl, rdlength = struct.unpack('!HHIH', data[offset:offset + 10])
+        offset += 10
+        rdata = data[offset:offset + rdlength]
+        offset += rdlength
+        if rtype == QTYPE_A and rdlength == 4:
+            records.append((rtype, ttl, socket.inet_ntoa(rdata)))
+        elif rtype == QTYPE_AAAA and rdlength == 16:
+            records.append((rtype, ttl, socket.inet_ntop(socket.AF_INET6, rdata)))
+        elif rtype == QTYPE_CNAME:
+            records.append((rtype, ttl, decode_name(data, offset - rdlength)[0]))
+
+    return {
+        'id': qid,
+        'rcode': flags & 0x000F,
+        'tc': bool(flags & 0x0200),
+        'question': question,
+        'records': records
+    }
+
+
+def parse_server(server: ServerSpec, default_port: int = 53) -> Tuple[str, int]:
+    """'8.8.8.8' / ('127.0.0.1', 5353) / '127.0.0.1:5353' -> (host, port)"""
+    if isinstance(server, tuple):
+        return server[0], int(server[1])
+    if server.count(':') == 1:
+        host, port = server.rsplit(':', 1)
+        return host, int(port)
+    if server.startswith('[') and ']:' in server:
+        host, port = server[1:].split(']:', 1)
+        return host, int(port)
+    return server, default_port
+
+
+def server_label(host: str, port: int) -> str:
+    return host if port == 53 else f"{host}:{port}"
+
+
+# ---------------------------------------------------------------------------
+# 传输层
+# ---------------------------------------------------------------------------
+
+class _TokenBucket:
+    """每服务器查询速率限制"""
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.capacity = burst if burst is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class _UDPServerProtocol(asyncio.DatagramProtocol):
+    """单个DNS服务器的UDP端点，按 (查询ID, 问题) 将响应分发给等待者"""
+
+    def __init__(self):
+        self.transport = None
+        self.pending: Dict[int, Tuple[str, int, asyncio.Future]] = {}
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        try:
+            message = parse_response(data)
+        except (DNSFormatError, struct.error, UnicodeError):
+            return
+        waiter = self.pending.get(message['id'])
+        if waiter is None:
+            return
+        name, qtype, future = waiter
+        # 问题段不匹配的报文视为伪造/串扰，丢弃
+        if message['question'] is not None and message['question'] != (name, qtype):
+            return
+        if not future.done():
+            future.set_result(message)
+
+    def error_received(self, exc):
+        # ICMP 端口不可达等错误：让所有等待者尽快失败
+        for _, _, future in list(self.pending.values()):
+            if not future.done():
+                future.set_exception(exc)
+
+    def connection_lost(self, exc):
+        for _, _, future in list(self.pending.values()):
+            if not future.done():
+                future.set_exception(exc or ConnectionError("UDP端点已关闭"))
+
+    def allocate_id(self) -> int:
+        while True:
+            qid = random.randint(0, 0xFFFF)
+            if qid not in self.pending:
+                return qid
+
+
+class AsyncDNSResolver:
+    """异步批量DNS解析器"""
+
+    def __init__(self, servers: Iterable[ServerSpec], timeout: float = 5.0, retries: int = 2,
+                 max_concurrency: int = 200, per_server_qps: float = 50.0,
+                 tcp_fallback: bool = True, cache=None):
+        self.servers = [parse_server(s) for s in servers]
+        if not self.servers:
+            raise ValueError("至少需要一个DNS服务器")
+        self.timeout = timeout
+        self.retries = max(0, retries)
+        self.max_concurrency = max(1, max_concurrency)
+        self.per_server_qps = per_server_qps
+        self.tcp_fallback = tcp_fallback
+        self.cache = cache
+
+        self._endpoints: Dict[Tuple[str, int], _UDPServerProtocol] = {}
+        self._buckets: Dict[Tuple[str, int], _TokenBucket] = {}
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.stats = {'queries': 0, 'timeouts': 0, 'tcp_fallbacks': 0, 'errors': 0, 'cache_hits': 0}
+
+    async def _endpoint(self, server: Tuple[str, int]) -> _UDPServerProtocol:
+        protocol = self._endpoints.get(server)
+        if protocol is None or protocol.transport is None or protocol.transport.is_closing():
+            loop = asyncio.get_running_loop()
+            _, protocol = await loop.create_datagram_endpoint(_UDPServerProtocol, remote_addr=server)
+            self._endpoints[server] = protocol
+        return protocol
+
+    async def close(self):
+        for protocol in self._endpoints.values():
+            if protocol.transport is not None:
+                protocol.transport.close()
+        self._endpoints.clear()
+
+    async def _query_udp(self, server: Tuple[str, int], domain: str, qtype: int) -> Dict:
+        protocol = await self._endpoint(server)
+        loop = asyncio.get_running_loop()
+        qid = protocol.allocate_id()
+        future = loop.create_future()
+        # 响应问题段携带 IDNA 编码后的名称，按编码结果匹配
+        protocol.pending[qid] = (wire_name(domain), qtype, future)
+        try:
+            protocol.transport.sendto(build_query(domain, qtype, qid))
+            return await asyncio.wait_for(future, self.timeout)
+        finally:
+            protocol.pending.pop(qid, None)
+
+    async def _query_tcp(self, server: Tuple[str, int], domain: str, qtype: int) -> Dict:
+        qid = random.randint(0, 0xFFFF)
+        payload = build_query(domain, qtype, qid, edns=False)
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(*server), self.timeout)
+        try:
+            writer.write(struct.pack('!H', len(payload)) + payload)
+            await writer.drain()
+            length = struct.unpack('!H', await asyncio.wait_for(reader.readexactly(2), self.timeout))[0]
+            data = await asyncio.wait_for(reader.readexactly(length), self.timeout)
+        finally:
+            writer.close()
+        message = parse_response(data)
+        if message['id'] != qid:
+            raise DNSFormatError("TCP响应ID不匹配")
+        return message
+
+    async def query(self, domain: str, rtype: str, server: ServerSpec) -> DNSAnswer:
+        """向单个服务器查询单个记录类型（受限速与全局并发约束，命中缓存时不发查询）"""
+        host, port = parse_server(server)
+        qtype = QTYPE_CODES[rtype]
+        answer = DNSAnswer(domain=domain, rtype=rtype, server=server_label(host, port))
+
+        cached = self.cache.get(domain, rtype, answer.server) if self.cache is not None else None
+        if cached is not None and cached.is_fresh():
+            self.stats['cache_hits'] += 1
+            answer.addresses = list(cached.addresses)
+            answer.error = cached.error
+            answer.ttl = cached.ttl_remaining
+            answer.from_cache = 'cache'
+            return answer
+
+        await self._query_network(answer, host, port, qtype)
+
+        if self.cache is not None:
+            stored = self.cache.put(domain, rtype, answer.server, answer.addresses,
+                                    ttl=answer.ttl, error=answer.error, commit=False)
+            if stored is None and cached is not None:
+                # 超时/网络错误：使用过期旧值（serve-stale）
+                answer.addresses = list(cached.addresses)
+                answer.error = cached.error
+                answer.from_cache = 'stale'
+        return answer
+
+    async def _query_network(self, answer: DNSAnswer, host: str, port: int, qtype: int) -> DNSAnswer:
+        domain = answer.domain
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        bucket = self._buckets.setdefault((host, port), _TokenBucket(self.per_server_qps))
+
+        started = time.monotonic()
+        message = None
+        async with self._semaphore:
+            for _ in range(self.retries + 1):
+                await bucket.acquire()
+                self.stats['queries'] += 1
+                try:
+                    message = await self._query_udp((host, port), domain, qtype)
+                    break
+                except asyncio.TimeoutError:
+                    self.stats['timeouts'] += 1
+                    answer.error = 'Timeout'
+                except (OSError, DNSFormatError, struct.error) as e:
+                    self.stats['errors'] += 1
+                    answer.error = f"{type(e).__name__}: {e}"
+                    break
+
+            if message is not None and message['tc'] and self.tcp_fallback:
+                self.stats['tcp_fallbacks'] += 1
+                try:
+                    message = await self._query_tcp((host, port), domain, qtype)
+                    answer.via_tcp = True
+                except (asyncio.TimeoutError, OSError, DNSFormatError, struct.error, asyncio.IncompleteReadError) as e:
+                    # TCP失败时仍使用截断的UDP应答（可能只含部分记录）
+                    answer.error = f"TCP fallback failed: {type(e).__name__}"
+
+        answer.elapsed = time.monotonic() - started
+        if message is None:
+            return answer
+
+        answer.rcode = message['rcode']
+        records = [(ttl, addr) for rt, ttl, addr in message['records'] if rt == qtype]
+        answer.addresses = list(dict.fromkeys(addr for _, addr in records))
+        if records:
+            answer.ttl = min(ttl for ttl, _ in records)
+            answer.error = None
+        elif message['rcode'] == RCODE_NXDOMAIN:
+            answer.error = 'NXDOMAIN'
+        elif message['rcode'] == RCODE_NOERROR:
+            answer.error = 'NoAnswer'
+        elif message['rcode'] == RCODE_SERVFAIL:
+            answer.error = 'SERVFAIL'
+        elif message['rcode'] == RCODE_REFUSED:
+            answer.error = 'REFUSED'
+        else:
+            answer.error = f"RCODE {message['rcode']}"
+        return answer
+
+    async def resolve_domain(self, domain: str, ipv6_enable: bool = False) -> DomainResolution:
+        """在所有服务器上并发查询一个域名"""
+        rtypes = ['A', 'AAAA'] if ipv6_enable else ['A']
+        tasks = [self.query(domain, rtype, server) for server in self.servers for rtype in rtypes]
+        return DomainResolution(domain=domain, answers=list(await asyncio.gather(*tasks)))
+
+    async def resolve_many(self, domains: Iterable[str], ipv6_enable: bool = False,
+                           progress_callback=None) -> Dict[str, DomainResolution]:
+        """批量解析：所有域名 × 所有服务器 × 记录类型同时在途（受并发上限约束）"""
+        unique_domains = list(dict.fromkeys(d.strip() for d in domains if d and d.strip()))
+        results: Dict[str, DomainResolution] = {}
+        total = len(unique_domains)
+
+        async def _one(domain):
+            resolution = await self.resolve_domain(domain, ipv6_enable)
+            results[domain] = resolution
+            if progress_callback:
+                progress_callback(len(results), total, resolution)
+
+        try:
+            await asyncio.gather(*(_one(d) for d in unique_domains))
+        finally:
+            await self.close()
+            if self.cache is not None:
+                self.cache.flush()
+        return {d: results[d] for d in unique_domains}
+
+
+def resolve_domains(domains: Iterable[str], servers: Iterable[ServerSpec], ipv6_enable: bool = False,
+                    progress_callback=None, **resolver_kwargs) -> Dict[str, DomainResolution]:
+    """同步入口：在新事件循环中批量解析"""
+    resolver = AsyncDNSResolver(servers, **resolver_kwargs)
+    return asyncio.run(resolver.resolve_many(domains, ipv6_enable, progress_callback))
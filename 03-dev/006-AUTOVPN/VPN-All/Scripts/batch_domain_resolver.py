@@ -4,17 +4,28 @@
 """
 批量域名解析脚本
 用于处理大量域名的解析，避免单次解析超时
+
+- 进程内工作队列：对完整域名列表并发解析，不再逐批改写域名列表、逐批启动子进程
+- 断点续跑：进度定期写入状态文件，异常退出后再次运行自动跳过已完成的域名
+- 结果写入解析结果库（result_store），最后一次性原子导出IP列表
 """
 
 import os
 import sys
+import json
 import time
+import queue
 import shutil
+import hashlib
 import logging
-import subprocess
+import argparse
+import ipaddress
+import threading
 import traceback
 from datetime import datetime
 
+from result_store import get_result_store, export_ip_list
+
 # 获取脚本所在目录
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 # 获取项目根目录
@@ -26,18 +37,26 @@ IP_LIST_PATH = os.path.join(PROJECT_ROOT, "routes", "常用境外IP.txt")
 HOSTS_FILE_PATH = "C:/Windows/System32/drivers/etc/hosts"
 LOG_DIR = os.path.join(PROJECT_ROOT, "logs")
 LOG_FILE_NAME = "batch_domain_resolver.log"
+STATE_FILE_PATH = os.path.join(LOG_DIR, "batch_domain_resolver.state.json")
+# 旧版逐批替换域名列表时留下的备份文件
+LEGACY_BACKUP_PATH = os.path.join(PROJECT_ROOT, "routes", "需要获取IP的域名列表_backup.txt")
+
+# 任务配置
+WORKER_COUNT = 8  # 并发解析线程数
+CHECKPOINT_EVERY = 50  # 每完成多少个域名写一次状态文件
+CHECKPOINT_INTERVAL = 10  # 距上次写状态文件的最长间隔（秒）
+STATE_VERSION = 1
+
+logger = logging.getLogger(__name__)
 
-# 批处理配置
-BATCH_SIZE = 20  # 每批处理的域名数量
-BATCH_DELAY = 5  # 批次间延迟（秒）
 
 # 设置日志
 def setup_logging():
     if not os.path.exists(LOG_DIR):
         os.makedirs(LOG_DIR)
-    
+
     log_file_path = os.path.join(LOG_DIR, LOG_FILE_NAME)
-    
+
     logging.basicConfig(
         level=logging.INFO,
         format="%(asctime)s [%(levelname)s] %(message)s",
@@ -48,6 +67,7 @@ def setup_logging():
     )
     return logging.getLogger(__name__)
 
+
 # 读取域名列表
 def read_domain_list(file_path):
     domains = []
@@ -57,308 +77,297 @@ def read_domain_list(file_path):
                 line = line.strip()
                 if line and not line.startswith('#'):
                     domains.append(line)
-        return domains
+        # 去重并保持原有顺序
+        return list(dict.fromkeys(domains))
     except Exception as e:
         logger.error(f"读取域名列表失败: {e}")
         return []
 
-# 创建临时域名列表文件
-def create_temp_domain_file(domains, batch_index):
-    temp_file_path = os.path.join(PROJECT_ROOT, "routes", f"temp_domain_list_{batch_index}.txt")
+
+def atomic_write_text(path, content):
+    """写入临时文件后原子替换目标文件"""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(content)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def default_resolve(domain, ipv6_enable=False):
+    """进程内调用 resolve_ip_remote 的多DNS服务器解析（经持久化DNS缓存）"""
+    import resolve_ip_remote
+    if resolve_ip_remote.logger is None:
+        resolve_ip_remote.logger = logger
+    ipv4_list, ipv6_list, _, _ = resolve_ip_remote.get_ips_from_dns_servers(domain, ipv6_enable)
+    return ipv4_list, ipv6_list
+
+
+def _ip_sort_key(ip):
     try:
-        with open(temp_file_path, 'w', encoding='utf-8') as f:
-            f.write("# 需要获取IP的域名列表\n")
-            f.write("# 每行一个域名，支持通配符格式（如 *.example.com）\n")
-            f.write("# 自动清理：去除协议、路径、端口、注释等\n\n")
-            for domain in domains:
-                f.write(f"{domain}\n")
-        return temp_file_path
-    except Exception as e:
-        logger.error(f"创建临时域名文件失败: {e}")
+        return (0, int(ipaddress.ip_address(ip)))
+    except ValueError:
+        return (1, 0)
+
+
+# ---------------------------------------------------------------------------
+# 状态文件
+# ---------------------------------------------------------------------------
+
+def compute_job_id(domains, ipv6_enable=False):
+    """由域名列表和解析参数计算任务标识，列表变化后旧进度自动作废"""
+    digest = hashlib.sha1()
+    digest.update(b'ipv6' if ipv6_enable else b'ipv4')
+    for domain in sorted(domains):
+        digest.update(b'\n')
+        digest.update(domain.encode('utf-8'))
+    return digest.hexdigest()
+
+
+def load_state(state_path, job_id):
+    """读取状态文件；不存在、损坏或属于其他任务时返回 None"""
+    if not os.path.exists(state_path):
+        return None
+    try:
+        with open(state_path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"状态文件无法读取，重新开始: {e}")
+        return None
+    if state.get('version') != STATE_VERSION or state.get('job_id') != job_id:
+        logger.info("域名列表或解析参数已变化，忽略上次的进度")
         return None
+    return state
 
-# 处理单批域名
-def process_batch(domains, batch_index, total_batches):
-    logger.info(f"处理批次 {batch_index+1}/{total_batches}，包含 {len(domains)} 个域名")
-    
-    # 只在第一批次时备份原始域名列表
-    backup_path = os.path.join(PROJECT_ROOT, "routes", "需要获取IP的域名列表_backup.txt")
-    if batch_index == 0:  # 只在第一批次时备份
+
+def save_state(state_path, state):
+    state['updated_at'] = datetime.now().isoformat(timespec='seconds')
+    atomic_write_text(state_path, json.dumps(state, ensure_ascii=False))
+
+
+# ---------------------------------------------------------------------------
+# 结果合并
+# ---------------------------------------------------------------------------
+
+def merge_ip_results(existing, results):
+    """在内存中合并解析结果
+
+    existing: {域名: IP}，results: {域名: {'ipv4': [...], 'ipv6': [...]}}
+    原有IP仍在本次解析结果中时保留，避免hosts无谓变动；否则取地址最小的IPv4。
+    """
+    merged = dict(existing)
+    for domain, record in results.items():
+        ipv4_list = record.get('ipv4') or []
+        if not ipv4_list:
+            continue
+        previous = existing.get(domain)
+        merged[domain] = previous if previous in ipv4_list else min(ipv4_list, key=_ip_sort_key)
+    return merged
+
+
+# ---------------------------------------------------------------------------
+# 解析任务
+# ---------------------------------------------------------------------------
+
+class ResolverJob:
+    """带断点续跑的进程内批量解析任务"""
+
+    def __init__(self, domains, ipv6_enable=False, workers=WORKER_COUNT, state_path=STATE_FILE_PATH,
+                 ip_list_path=IP_LIST_PATH, resolve_func=None, checkpoint_every=CHECKPOINT_EVERY,
+                 checkpoint_interval=CHECKPOINT_INTERVAL, store=None):
+        self.domains = list(dict.fromkeys(domains))
+        self.ipv6_enable = ipv6_enable
+        self.workers = max(1, workers)
+        self.state_path = state_path
+        self.ip_list_path = ip_list_path
+        self.resolve_func = resolve_func or default_resolve
+        self.checkpoint_every = checkpoint_every
+        self.checkpoint_interval = checkpoint_interval
+        self.store = store
+        self.job_id = compute_job_id(self.domains, ipv6_enable)
+        self.state = None
+        self.resumed = 0
+        self._stop = threading.Event()
+
+    def _init_state(self, restart=False):
+        state = None if restart else load_state(self.state_path, self.job_id)
+        if state is None:
+            state = {
+                'version': STATE_VERSION,
+                'job_id': self.job_id,
+                'total': len(self.domains),
+                'created_at': datetime.now().isoformat(timespec='seconds'),
+                'results': {},
+                'failed': {},
+            }
+        self.state = state
+        self.resumed = len(state['results']) + len(state['failed'])
+        if self.resumed:
+            logger.info(f"从上次进度继续：已完成 {self.resumed}/{len(self.domains)} 个域名")
+
+    def pending_domains(self):
+        done = self.state['results'].keys() | self.state['failed'].keys()
+        return [domain for domain in self.domains if domain not in done]
+
+    def _worker(self, work_queue, result_queue):
+        while not self._stop.is_set():
+            try:
+                domain = work_queue.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                ipv4_list, ipv6_list = self.resolve_func(domain, self.ipv6_enable)
+                result_queue.put((domain, list(ipv4_list or []), list(ipv6_list or []), None))
+            except Exception as e:
+                result_queue.put((domain, [], [], f"{type(e).__name__}: {e}"))
+
+    def stop(self):
+        self._stop.set()
+
+    def run(self, restart=False, progress_callback=None):
+        """执行任务，返回 (成功数, 失败数)；中断时已完成部分保留在状态文件中"""
+        self._init_state(restart)
+        pending = self.pending_domains()
+        total = len(self.domains)
+        logger.info(f"待解析 {len(pending)} 个域名，{self.workers} 个并发线程")
+
+        work_queue = queue.Queue()
+        for domain in pending:
+            work_queue.put(domain)
+        result_queue = queue.Queue()
+        threads = [threading.Thread(target=self._worker, args=(work_queue, result_queue),
+                                    name=f"resolver-{i}", daemon=True)
+                   for i in range(min(self.workers, len(pending)))]
+        for thread in threads:
+            thread.start()
+
+        received = 0
+        since_checkpoint = 0
+        last_checkpoint = time.monotonic()
         try:
-            if os.path.exists(DOMAIN_LIST_PATH):
-                shutil.copy2(DOMAIN_LIST_PATH, backup_path)
-                logger.info(f"已备份原始域名列表到 {backup_path}")
-        except Exception as e:
-            logger.error(f"备份域名列表失败: {e}")
-            return False
-    
-    # 创建临时域名文件
-    temp_file_path = create_temp_domain_file(domains, batch_index)
-    if not temp_file_path:
-        return False
-    
-    # 替换原始域名列表
-    try:
-        shutil.copy2(temp_file_path, DOMAIN_LIST_PATH)
-        logger.info(f"已替换域名列表为批次 {batch_index+1} 的 {len(domains)} 个域名")
-    except Exception as e:
-        logger.error(f"替换域名列表失败: {e}")
-        return False
-    
-    # 调用解析脚本
-    resolve_script = os.path.join(SCRIPT_DIR, "resolve_ip_remote.py")
-    if not os.path.exists(resolve_script):
-        logger.error(f"解析脚本不存在: {resolve_script}")
-        return False
-    
-    try:
-        logger.info(f"开始执行解析脚本处理批次 {batch_index+1}...")
-        result = subprocess.run(
-            [sys.executable, resolve_script],
-            cwd=SCRIPT_DIR,
-            capture_output=True,
-            text=True,
-            encoding="utf-8",
-            errors="ignore"
-        )
-        
-        if result.returncode == 0:
-            logger.info(f"批次 {batch_index+1} 解析完成")
-            # 记录输出信息
-            if result.stdout:
-                for line in result.stdout.splitlines():
-                    if "[INFO]" in line or "成功" in line:
-                        logger.info(f"解析输出: {line}")
-            return True
-        else:
-            logger.error(f"批次 {batch_index+1} 解析失败，返回码: {result.returncode}")
-            if result.stderr:
-                logger.error(f"错误信息: {result.stderr}")
-            return False
-    except Exception as e:
-        logger.error(f"执行解析脚本失败: {e}")
-        return False
-    finally:
-        # 清理临时文件
+            while received < len(pending):
+                try:
+                    domain, ipv4_list, ipv6_list, error = result_queue.get(timeout=1.0)
+                except queue.Empty:
+                    if self._stop.is_set() or not any(thread.is_alive() for thread in threads):
+                        break
+                    continue
+                received += 1
+                since_checkpoint += 1
+                if ipv4_list or ipv6_list:
+                    self.state['results'][domain] = {'ipv4': ipv4_list, 'ipv6': ipv6_list}
+                else:
+                    self.state['failed'][domain] = error or '无解析结果'
+                    logger.warning(f"解析失败: {domain} ({self.state['failed'][domain]})")
+                if progress_callback:
+                    progress_callback(self.resumed + received, total)
+                if (since_checkpoint >= self.checkpoint_every or
+                        time.monotonic() - last_checkpoint >= self.checkpoint_interval):
+                    save_state(self.state_path, self.state)
+                    since_checkpoint = 0
+                    last_checkpoint = time.monotonic()
+        finally:
+            self._stop.set()
+            # 中断或异常时也保存已完成的进度
+            save_state(self.state_path, self.state)
+
+        return len(self.state['results']), len(self.state['failed'])
+
+    def finish(self):
+        """合并结果写入结果库，一次性导出IP列表，成功后删除状态文件"""
+        store = self.store if self.store is not None else get_result_store()
+        if len(store) == 0:
+            store.import_ip_list(self.ip_list_path)
+        existing = store.best_ips()
+        logger.info(f"结果库中已有 {len(existing)} 个域名的IP")
+        merged = merge_ip_results(existing, self.state['results'])
+        with store.batch():
+            for domain, record in self.state['results'].items():
+                store.upsert(domain, ipv4=record.get('ipv4') or [], ipv6=record.get('ipv6') or [],
+                             best_ip=merged.get(domain))
+            for domain, error in self.state['failed'].items():
+                store.record_failure(domain, error)
+        export_ip_list(store, self.ip_list_path)
+        merged = store.best_ips()
+        logger.info(f"IP列表已更新，共 {len(merged)} 个域名")
         try:
-            if os.path.exists(temp_file_path):
-                os.remove(temp_file_path)
-        except Exception as e:
-            logger.warning(f"清理临时文件失败: {e}")
+            os.remove(self.state_path)
+        except OSError:
+            pass
+        return merged
+
 
-# 恢复原始域名列表
+# 恢复旧版脚本遗留的原始域名列表备份
 def restore_domain_list(backup_path):
     try:
-        if os.path.exists(backup_path):
-            # 先检查备份文件是否有效
-            with open(backup_path, 'r', encoding='utf-8') as f:
-                backup_domains = [line.strip() for line in f if line.strip()]
-            
-            if not backup_domains:
-                logger.error(f"备份文件内容为空: {backup_path}")
-                return False
-                
-            logger.info(f"备份文件包含 {len(backup_domains)} 个域名")
-            
-            # 复制备份文件到原始文件
-            shutil.copy2(backup_path, DOMAIN_LIST_PATH)
-            logger.info("已恢复原始域名列表")
-            
-            # 验证恢复是否成功
-            if os.path.exists(DOMAIN_LIST_PATH):
-                with open(DOMAIN_LIST_PATH, 'r', encoding='utf-8') as f:
-                    restored_domains = [line.strip() for line in f if line.strip()]
-                
-                if len(restored_domains) == len(backup_domains):
-                    logger.info(f"恢复后的域名列表包含 {len(restored_domains)} 个域名，恢复成功")
-                    # 恢复成功后可以删除备份文件
-                    try:
-                        os.remove(backup_path)
-                        logger.info(f"已删除备份文件: {backup_path}")
-                    except Exception as e:
-                        logger.warning(f"删除备份文件失败: {e}")
-                    return True
-                else:
-                    logger.error(f"恢复后的域名数量不匹配: 备份 {len(backup_domains)} 个，恢复后 {len(restored_domains)} 个")
-                    return False
-            else:
-                logger.error(f"恢复后域名列表文件不存在: {DOMAIN_LIST_PATH}")
-                return False
-        else:
-            logger.error(f"备份文件不存在: {backup_path}")
+        with open(backup_path, 'r', encoding='utf-8') as f:
+            backup_domains = [line.strip() for line in f if line.strip()]
+        if not backup_domains:
+            logger.error(f"备份文件内容为空: {backup_path}")
             return False
+        shutil.copy2(backup_path, DOMAIN_LIST_PATH)
+        os.remove(backup_path)
+        logger.info(f"已从旧版备份恢复原始域名列表，包含 {len(backup_domains)} 个域名")
+        return True
     except Exception as e:
         logger.error(f"恢复域名列表失败: {e}")
         logger.error(traceback.format_exc())
         return False
 
-# 合并IP列表结果
-def merge_ip_results():
-    # 创建一个字典来存储所有批次的解析结果
-    all_results = {}
-    
-    # 读取当前IP列表文件
-    try:
-        if os.path.exists(IP_LIST_PATH):
-            with open(IP_LIST_PATH, 'r', encoding='utf-8') as f:
-                for line in f:
-                    line = line.strip()
-                    if line and not line.startswith('#'):
-                        parts = line.split('\t', 1)
-                        if len(parts) == 2:
-                            # 格式是 IP\t域名
-                            ip, domain = parts
-                            all_results[domain] = ip
-            logger.info(f"已读取现有IP列表，包含 {len(all_results)} 个域名的IP")
-    except Exception as e:
-        logger.error(f"读取IP列表失败: {e}")
-    
-    # 从日志中提取所有批次的解析结果
-    try:
-        log_file_path = os.path.join(LOG_DIR, LOG_FILE_NAME)
-        if os.path.exists(log_file_path):
-            with open(log_file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                log_content = f.read()
-                
-                # 使用正则表达式提取所有包含Selected for的行
-                import re
-                # 匹配格式: "==> Selected for domain.com (after connectivity check): 123.456.789.10"
-                selected_ips = re.findall(r"==> Selected for ([\w\.-]+) \(after connectivity check\): ([\d\.]+)", log_content)
-                
-                logger.info(f"从日志中找到了 {len(selected_ips)} 个域名的IP地址")
-                for domain, ip in selected_ips:
-                    all_results[domain] = ip
-                    logger.debug(f"从日志提取: 域名 {domain} -> IP {ip}")
-                    
-                logger.info(f"成功从日志中提取并合并了 {len(selected_ips)} 个域名的IP地址")
-    except Exception as e:
-        logger.error(f"从日志中提取IP地址失败: {e}")
-        import traceback
-        logger.error(traceback.format_exc())
-    
-    # 保存合并后的结果
-    try:
-        with open(IP_LIST_PATH, 'w', encoding='utf-8') as f:
-            for domain, ip in all_results.items():
-                f.write(f"{ip}\t{domain}\n")
-        logger.info(f"所有批次处理完成，IP列表已更新，共 {len(all_results)} 个域名")
-        return True
-    except Exception as e:
-        logger.error(f"保存合并后的IP列表失败: {e}")
-        return False
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="批量域名解析工具")
+    parser.add_argument("--ipv6", action="store_true", help="同时解析AAAA记录")
+    parser.add_argument("--workers", type=int, default=WORKER_COUNT, help="并发解析线程数")
+    parser.add_argument("--restart", action="store_true", help="忽略上次进度，重新解析全部域名")
+    return parser.parse_args(argv)
+
 
 # 主函数
-def main():
+def main(argv=None):
+    args = parse_args(argv)
     print("\n===== 批量域名解析工具 =====\n")
-    
-    # 检查是否有备份文件，如果有，先恢复
-    backup_path = os.path.join(PROJECT_ROOT, "routes", "需要获取IP的域名列表_backup.txt")
-    if os.path.exists(backup_path):
-        logger.info("发现上次的备份文件，先恢复原始域名列表")
-        restore_domain_list(backup_path)
-    
+
+    if os.path.exists(LEGACY_BACKUP_PATH):
+        logger.info("发现旧版脚本的备份文件，先恢复原始域名列表")
+        restore_domain_list(LEGACY_BACKUP_PATH)
+
     # 读取域名列表
     domains = read_domain_list(DOMAIN_LIST_PATH)
     if not domains:
         logger.error("域名列表为空或读取失败")
-        return
-    
-    total_domains = len(domains)
-    logger.info(f"共读取到 {total_domains} 个域名")
-    
-    # 计算批次数
-    total_batches = (total_domains + BATCH_SIZE - 1) // BATCH_SIZE
-    logger.info(f"将分为 {total_batches} 个批次处理，每批 {BATCH_SIZE} 个域名")
-    
-    # 备份原始域名列表
-    backup_path = os.path.join(PROJECT_ROOT, "routes", "需要获取IP的域名列表_backup.txt")
-    if os.path.exists(DOMAIN_LIST_PATH):
-        try:
-            # 读取原始域名列表
-            with open(DOMAIN_LIST_PATH, 'r', encoding='utf-8') as f:
-                original_domains = [line.strip() for line in f if line.strip()]
-            
-            if not original_domains:
-                logger.warning("原始域名列表为空，无需备份")
-            else:
-                # 创建备份
-                shutil.copy2(DOMAIN_LIST_PATH, backup_path)
-                
-                # 验证备份是否成功
-                if os.path.exists(backup_path):
-                    with open(backup_path, 'r', encoding='utf-8') as f:
-                        backup_domains = [line.strip() for line in f if line.strip()]
-                    
-                    if len(backup_domains) == len(original_domains):
-                        logger.info(f"已成功备份原始域名列表到 {backup_path}，包含 {len(backup_domains)} 个域名")
-                    else:
-                        logger.error(f"备份域名数量不匹配: 原始 {len(original_domains)} 个，备份 {len(backup_domains)} 个")
-                else:
-                    logger.error(f"备份文件创建失败: {backup_path}")
-        except Exception as e:
-            logger.error(f"备份原始域名列表失败: {e}")
-            logger.error(traceback.format_exc())
-    
-    # 批量处理
-    success_count = 0
-    for i in range(total_batches):
-        start_idx = i * BATCH_SIZE
-        end_idx = min((i + 1) * BATCH_SIZE, total_domains)
-        batch_domains = domains[start_idx:end_idx]
-        
-        print(f"\n[批次 {i+1}/{total_batches}] 处理 {len(batch_domains)} 个域名 ({start_idx+1}-{end_idx}/{total_domains})")
-        
-        if process_batch(batch_domains, i, total_batches):
-            success_count += 1
-        
-        # 最后一批次不需要延迟
-        if i < total_batches - 1:
-            print(f"等待 {BATCH_DELAY} 秒后处理下一批次...")
-            time.sleep(BATCH_DELAY)
-    
-    # 恢复原始域名列表
-    if not restore_domain_list(backup_path):
-        logger.error("恢复原始域名列表失败，尝试重新恢复")
-        # 如果第一次恢复失败，再尝试一次
-        if os.path.exists(backup_path):
-            try:
-                shutil.copy2(backup_path, DOMAIN_LIST_PATH)
-                logger.info("第二次尝试恢复原始域名列表")
-                if os.path.exists(DOMAIN_LIST_PATH):
-                    with open(DOMAIN_LIST_PATH, 'r', encoding='utf-8') as f:
-                        restored_domains = [line.strip() for line in f if line.strip()]
-                    logger.info(f"第二次恢复后的域名列表包含 {len(restored_domains)} 个域名")
-            except Exception as e:
-                logger.error(f"第二次恢复域名列表失败: {e}")
-                logger.error(traceback.format_exc())
-    
-    # 合并所有批次的结果
-    merge_ip_results()
-    
+        return 1
+
+    logger.info(f"共读取到 {len(domains)} 个域名")
+
+    job = ResolverJob(domains, ipv6_enable=args.ipv6, workers=args.workers)
+    started = time.time()
+
+    def report(done, total):
+        if done % 20 == 0 or done == total:
+            print(f"进度: {done}/{total} ({done / total:.0%})")
+
+    success_count, failed_count = job.run(restart=args.restart, progress_callback=report)
+    job.finish()
+
     # 输出结果
     print("\n===== 批量解析完成 =====")
-    print(f"总批次: {total_batches}, 成功: {success_count}, 失败: {total_batches - success_count}")
+    print(f"总域名: {len(domains)}, 成功: {success_count}, 失败: {failed_count}, 耗时: {time.time() - started:.1f}秒")
     print(f"解析结果已保存到: {IP_LIST_PATH}")
     print("\n批量解析完成，自动返回主菜单...")
+    return 0
+
 
 if __name__ == "__main__":
     logger = setup_logging()
-    backup_path = os.path.join(PROJECT_ROOT, "routes", "需要获取IP的域名列表_backup.txt")
     try:
-        main()
+        sys.exit(main())
     except KeyboardInterrupt:
-        print("\n用户中断操作")
-        # 恢复原始域名列表
-        if os.path.exists(backup_path):
-            logger.info("用户中断，尝试恢复原始域名列表")
-            restore_domain_list(backup_path)
+        print("\n用户中断操作，进度已保存，再次运行将从中断处继续")
     except Exception as e:
         logger.error(f"程序执行出错: {e}")
-        print(f"\n程序执行出错: {e}")
-        # 确保在异常时也恢复原始域名列表
-        if os.path.exists(backup_path):
-            logger.info("程序异常，尝试恢复原始域名列表")
-            restore_domain_list(backup_path)
-        import traceback
         logger.error(traceback.format_exc())
-        print("程序异常退出...")
\ No newline at end of file
+        print(f"\n程序执行出错: {e}")
+        print("程序异常退出...")
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+中国IP地址段数据
+替代 HybridIPClassifier 内置的简化（部分有误）网段列表
+
+- 导入 APNIC delegated-apnic-latest 格式的本地文件，提取指定国家（默认CN）的 IPv4/IPv6 分配记录
+- 相邻/重叠区间合并为最小区间集合
+- 写出紧凑二进制范围文件（小端）：16字节文件头 + IPv4 uint32 (起,止) 对 + IPv6 高64位 uint64 (起,止) 对
+- 分类器、PAC生成、hosts路由通过 mmap 直接加载（无需解析），二分查找
+- 命令行: python china_ip_data.py import delegated-apnic-latest [--country CN] [--output 路径]
+          python china_ip_data.py stats [--path 路径]
+"""
+
+import argparse
+import bisect
+import ipaddress
+import mmap
+import os
+import socket
+import struct
+import sys
+import threading
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.abspath(os.path.join(SCRIPT_DIR, ".."))
+
+DEFAULT_RANGE_FILE = os.environ.get(
+    'AUTOVPN_CHINA_RANGES', os.path.join(PROJECT_ROOT, "routes", "china_ip_ranges.bin")
+)
+
+# 文件头：魔数、格式版本、保留、IPv4区间数、IPv6区间数
+HEADER = struct.Struct('<4sHHII')
+MAGIC = b'CNIP'
+FORMAT_VERSION = 1
+
+Interval = Tuple[int, int]
+
+
+# ---------------------------------------------------------------------------
+# APNIC 数据导入
+# ---------------------------------------------------------------------------
+
+def parse_delegated(lines: Iterable[str], country: str = 'CN') -> Tuple[List[Interval], List[Interval]]:
+    """解析 delegated-apnic-latest 记录，返回 (IPv4区间, IPv6区间)
+
+    记录格式: registry|cc|type|start|value|date|status[|extensions]
+    IPv4 的 value 为地址数（不一定是2的幂），IPv6 的 value 为前缀长度；
+    版本行、summary 行与其他国家/类型的记录跳过。
+    """
+    country = country.upper()
+    v4: List[Interval] = []
+    v6: List[Interval] = []
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        fields = line.split('|')
+        if len(fields) < 7 or fields[1].upper() != country or fields[6] not in ('allocated', 'assigned'):
+            continue
+        kind, start, value = fields[2], fields[3], fields[4]
+        try:
+            if kind == 'ipv4':
+                first = int(ipaddress.IPv4Address(start))
+                v4.append((first, first + int(value) - 1))
+            elif kind == 'ipv6':
+                network = ipaddress.IPv6Network(f"{start}/{value}")
+                v6.append((int(network.network_address) >> 64, int(network.broadcast_address) >> 64))
+        except ValueError:
+            continue
+    return v4, v6
+
+
+def merge_intervals(intervals: Iterable[Interval]) -> List[Interval]:
+    """合并相邻与重叠区间，得到最小有序区间集合"""
+    merged: List[Interval] = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1] + 1:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def write_range_file(path: str, v4: Iterable[Interval], v6: Iterable[Interval] = ()) -> Tuple[int, int]:
+    """写出二进制范围文件（先合并），返回 (IPv4区间数, IPv6区间数)"""
+    v4, v6 = merge_intervals(v4), merge_intervals(v6)
+    v4_data = array('I', (x for pair in v4 for x in pair))
+    v6_data = array('Q', (x for pair in v6 for x in pair))
+    if sys.byteorder != 'little':
+        v4_data.byteswap()
+        v6_data.byteswap()
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, 0, len(v4), len(v6)))
+        f.write(v4_data.tobytes())
+        f.write(v6_data.tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return len(v4), len(v6)
+
+
+def import_delegated(source: str, output: str = DEFAULT_RANGE_FILE, country: str = 'CN') -> Tuple[int, int]:
+    """导入本地 delegated-apnic-latest 文件并写出二进制范围文件"""
+    with open(source, 'r', encoding='utf-8', errors='ignore') as f:
+        v4, v6 = parse_delegated(f, country)
+    return write_range_file(output, v4, v6)
+
+
+# ---------------------------------------------------------------------------
+# mmap 加载与查找
+# ---------------------------------------------------------------------------
+
+class RangeSet:
+    """二进制范围文件的只读视图（mmap），接口与 ip_prefix_index.PrefixIndex 的查找部分一致"""
+
+    def __init__(self, path: str, label: str = 'CN'):
+        self.path = path
+        self.label = label
+        self._file = open(path, 'rb')
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError(f"范围文件为空: {path}")
+        magic, version, _reserved, v4_count, v6_count = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            self.close()
+            raise ValueError(f"不是有效的范围文件: {path}")
+        v4_end = HEADER.size + v4_count * 8
+        if len(self._mmap) < v4_end + v6_count * 16:
+            self.close()
+            raise ValueError(f"范围文件不完整: {path}")
+        # 持有全部导出的 memoryview：mmap 只有在它们都释放后才能关闭
+        self._views: List[memoryview] = []
+        view = self._export(memoryview(self._mmap))
+        v4 = self._export(self._export(view[HEADER.size:v4_end]).cast('I'))
+        v6 = self._export(self._export(view[v4_end:v4_end + v6_count * 16]).cast('Q'))
+        if sys.byteorder != 'little':
+            # 大端主机：复制并转换字节序（放弃零拷贝）
+            v4, v6 = array('I', v4), array('Q', v6)
+            v4.byteswap()
+            v6.byteswap()
+        # 交错存储的 (起, 止) 对按步长切片，bisect 直接作用于视图
+        self.v4_starts, self.v4_ends = self._export(v4[0::2]), self._export(v4[1::2])
+        self.v6_starts, self.v6_ends = self._export(v6[0::2]), self._export(v6[1::2])
+
+    def _export(self, view):
+        if isinstance(view, memoryview):
+            self._views.append(view)
+        return view
+
+    def __len__(self):
+        return len(self.v4_starts) + len(self.v6_starts)
+
+    def lookup_int(self, version: int, number: int) -> Optional[str]:
+        if version == 4:
+            starts, ends = self.v4_starts, self.v4_ends
+        else:
+            starts, ends = self.v6_starts, self.v6_ends
+            number >>= 64
+        i = bisect.bisect_right(starts, number) - 1
+        return self.label if i >= 0 and number <= ends[i] else None
+
+    def lookup(self, ip: str) -> Optional[str]:
+        """IP在范围内时返回标签，否则（或地址无效）返回 None"""
+        try:
+            return self.lookup_int(4, int.from_bytes(socket.inet_pton(socket.AF_INET, ip), 'big'))
+        except OSError:
+            pass
+        try:
+            return self.lookup_int(6, int.from_bytes(socket.inet_pton(socket.AF_INET6, ip.split('%', 1)[0]), 'big'))
+        except OSError:
+            return None
+
+    def __contains__(self, ip: str) -> bool:
+        return self.lookup(ip) is not None
+
+    def lookup_many(self, ips: Iterable[str]) -> List[Optional[str]]:
+        return [self.lookup(ip) for ip in ips]
+
+    def ipv4_ranges(self) -> Iterator[Interval]:
+        return zip(self.v4_starts, self.v4_ends)
+
+    def ipv6_ranges(self) -> Iterator[Interval]:
+        """IPv6 区间（完整128位整数）"""
+        for start, end in zip(self.v6_starts, self.v6_ends):
+            yield start << 64, (end << 64) | 0xFFFFFFFFFFFFFFFF
+
+    def close(self):
+        # 先释放派生视图，再释放其来源（父视图仍被引用时 release 会失败）
+        for view in reversed(getattr(self, '_views', [])):
+            view.release()
+        self._views = []
+        mm = getattr(self, '_mmap', None)
+        if mm is not None:
+            mm.close()
+        self._file.close()
+
+
+_range_sets: Dict[str, RangeSet] = {}
+_range_sets_lock = threading.Lock()
+
+
+def get_china_ranges(path: Optional[str] = None) -> Optional[RangeSet]:
+    """进程内共享的中国IP范围（按路径缓存）；文件不存在或无效时返回 None"""
+    path = os.path.abspath(path or DEFAULT_RANGE_FILE)
+    with _range_sets_lock:
+        if path not in _range_sets:
+            if not os.path.exists(path):
+                return None
+            try:
+                _range_sets[path] = RangeSet(path)
+            except (OSError, ValueError, struct.error):
+                return None
+        return _range_sets[path]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='中国IP地址段数据（APNIC导入 / 二进制范围文件）')
+    sub = parser.add_subparsers(dest='command', required=True)
+    import_parser = sub.add_parser('import', help='导入 delegated-apnic-latest')
+    import_parser.add_argument('source')
+    import_parser.add_argument('--country', default='CN')
+    import_parser.add_argument('--output', default=DEFAULT_RANGE_FILE)
+    stats_parser = sub.add_parser('stats', help='显示范围文件统计')
+    stats_parser.add_argument('--path', default=DEFAULT_RANGE_FILE)
+    args = parser.parse_args(argv)
+
+    if args.command == 'import':
+        v4_count, v6_count = import_delegated(args.source, args.output, args.country)
+        print(f"已写入 {args.output}: IPv4 {v4_count} 个区间, IPv6 {v6_count} 个区间")
+    else:
+        ranges = RangeSet(args.path)
+        total = sum(end - start + 1 for start, end in ranges.ipv4_ranges())
+        print(f"{args.path}: IPv4 {len(ranges.v4_starts)} 个区间 ({total} 个地址), "
+              f"IPv6 {len(ranges.v6_starts)} 个区间")
+        ranges.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -8,15 +8,17 @@ import os
 import sys
 import time
 import json
-import socket
 import logging
 import subprocess
-import concurrent.futures
 from datetime import datetime
 from typing import List, Dict, Set
 import signal
 import threading
 
+from dns_cache import system_lookup, get_dns_cache
+from adaptive_concurrency import AIMDController, AdaptivePipeline, classify_dns_error
+from result_store import get_result_store, export_ip_list, export_failed_list
+
 # 配置日志
 log_filename = f'complete_domain_resolver_{datetime.now().strftime("%Y%m%d_%H%M%S")}.log'
 logging.basicConfig(
@@ -33,8 +35,10 @@ logger = logging.getLogger(__name__)
 stop_flag = threading.Event()
 resolved_ips = {}  # 域名 -> IP列表
 failed_domains = set()  # 解析失败的域名
+failure_reasons = {}  # 域名 -> 最后一次失败的结果分类
 success_count = 0
 fail_count = 0
+controller = AIMDController(initial=10, max_limit=64)  # 解析并发控制
 
 # 文件路径
 DOMAIN_LIST_FILE = r"S:\YDS-Lab\03-dev\006-AUTOVPN\VPN-All\routes\需要获取IP的域名列表.txt"
@@ -200,128 +204,62 @@ def load_domains() -> List[str]:
         logger.info("使用默认完整域名列表")
         return COMPLETE_DOMAINS
 
-def resolve_domain_with_retry(domain: str, max_retries: int = 3) -> List[str]:
-    """解析域名，带重试机制"""
+def resolve_domain(domain: str):
+    """单次解析域名（经持久化缓存），返回 (IP列表, 结果分类)"""
+    ips, error = system_lookup(domain, ipv6=True)
+    return ips, classify_dns_error(error)
+
+def _on_resolved(domain: str, ips: List[str], outcome: str):
+    """流水线回调：记录单个域名的最终结果（在流水线锁内调用）"""
     global success_count, fail_count
-    
-    for retry in range(max_retries):
-        if stop_flag.is_set():
-            return []
-            
-        try:
-            # 使用socket库进行DNS解析
-            ips = []
-            
-            # 尝试获取IPv4地址
-            try:
-                result = socket.gethostbyname_ex(domain)
-                ips.extend(result[2])
-            except:
-                pass
-            
-            # 尝试获取IPv6地址
-            try:
-                result = socket.getaddrinfo(domain, None, socket.AF_INET6)
-                for res in result:
-                    ip = res[4][0]
-                    if ip not in ips:
-                        ips.append(ip)
-            except:
-                pass
-            
-            if ips:
-                success_count += 1
-                logger.info(f"✅ {domain} -> {ips}")
-                return ips
-            else:
-                time.sleep(1)  # 短暂延迟后重试
-                
-        except Exception as e:
-            logger.warning(f"解析 {domain} 失败 (尝试 {retry + 1}/{max_retries}): {e}")
-            time.sleep(2 ** retry)  # 指数退避
-    
-    fail_count += 1
-    failed_domains.add(domain)
-    logger.error(f"❌ {domain} 解析失败")
-    return []
+    if ips:
+        success_count += 1
+        resolved_ips[domain] = ips
+        logger.info(f"✅ {domain} -> {ips}")
+    else:
+        fail_count += 1
+        failed_domains.add(domain)
+        failure_reasons[domain] = outcome
+        logger.error(f"❌ {domain} 解析失败 ({outcome})")
 
-def batch_resolve_domains(domains: List[str], batch_size: int = 15) -> Dict[str, List[str]]:
-    """批量解析域名"""
-    global resolved_ips
-    
-    logger.info(f"开始批量解析 {len(domains)} 个域名，每批 {batch_size} 个")
-    
-    total_batches = (len(domains) + batch_size - 1) // batch_size
-    
-    for batch_idx in range(total_batches):
-        if stop_flag.is_set():
-            break
-            
-        start_idx = batch_idx * batch_size
-        end_idx = min(start_idx + batch_size, len(domains))
-        batch_domains = domains[start_idx:end_idx]
-        
-        logger.info(f"处理批次 {batch_idx + 1}/{total_batches} ({len(batch_domains)} 个域名)")
-        
-        # 使用线程池并发解析
-        with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
-            future_to_domain = {executor.submit(resolve_domain_with_retry, domain): domain 
-                              for domain in batch_domains}
-            
-            for future in concurrent.futures.as_completed(future_to_domain):
-                if stop_flag.is_set():
-                    break
-                    
-                domain = future_to_domain[future]
-                try:
-                    ips = future.result()
-                    if ips:
-                        resolved_ips[domain] = ips
-                except Exception as e:
-                    logger.error(f"解析 {domain} 时发生异常: {e}")
-                    failed_domains.add(domain)
-        
-        # 批次间等待时间优化
-        if batch_idx < total_batches - 1:  # 不是最后一批
-            wait_time = min(3, max(1, len(batch_domains) // 10))  # 动态等待时间
-            logger.info(f"等待 {wait_time} 秒后继续...")
-            time.sleep(wait_time)
-    
+def batch_resolve_domains(domains: List[str], max_attempts: int = 3) -> Dict[str, List[str]]:
+    """通过自适应并发流水线解析全部域名
+
+    超时/SERVFAIL 比例升高时自动降低并发，恢复后逐步提高；临时性失败排到队尾重试，无批次间等待
+    """
+    logger.info(f"开始解析 {len(domains)} 个域名，初始并发 {controller.limit}，上限 {controller.max_limit}")
+    pipeline = AdaptivePipeline(resolve_domain, controller, max_attempts=max_attempts, stop_event=stop_flag)
+    try:
+        pipeline.run(domains, _on_resolved)
+    finally:
+        pipeline.close()
+    logger.info(f"⚙️ 自适应并发: 当前 {controller.limit}, 峰值 {controller.stats['peak_limit']}, "
+                f"降速 {controller.stats['decreases']} 次, 超时 {controller.stats['timeouts']}, "
+                f"SERVFAIL {controller.stats['servfails']}, 重试 {pipeline.stats['retries']}")
     return resolved_ips
 
 def save_failed_domains():
-    """保存解析失败的域名"""
+    """将解析失败的域名记入结果库并导出失败列表"""
     try:
-        with open(FAILED_DOMAINS_FILE, 'w', encoding='utf-8') as f:
-            f.write(f"# 域名解析失败列表\n")
-            f.write(f"# 更新时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-            f.write(f"# 总计: {len(failed_domains)} 个\n\n")
-            
-            for domain in sorted(failed_domains):
-                f.write(f"{domain}\n")
-        
+        store = get_result_store()
+        with store.batch():
+            for domain in failed_domains:
+                store.record_failure(domain, failure_reasons.get(domain))
+        export_failed_list(store, FAILED_DOMAINS_FILE)
         logger.info(f"已保存 {len(failed_domains)} 个失败域名到 {FAILED_DOMAINS_FILE}")
     except Exception as e:
         logger.error(f"保存失败域名列表失败: {e}")
 
 def save_resolved_ips():
-    """保存解析到的IP地址"""
+    """将解析到的IP记入结果库（按域名 upsert）并导出IP列表"""
     try:
-        all_ips = set()
-        for ips in resolved_ips.values():
-            all_ips.update(ips)
-        
-        with open(IP_OUTPUT_FILE, 'w', encoding='utf-8') as f:
-            f.write(f"# 常用境外IP地址\n")
-            f.write(f"# 更新时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-            f.write(f"# 域名总数: {len(resolved_ips)}\n")
-            f.write(f"# IP总数: {len(all_ips)}\n")
-            f.write(f"# 成功率: {(success_count/(success_count+fail_count)*100):.1f}%\n\n")
-            
-            for ip in sorted(all_ips):
-                f.write(f"{ip}\n")
-        
-        logger.info(f"已保存 {len(all_ips)} 个IP地址到 {IP_OUTPUT_FILE}")
+        store = get_result_store()
+        with store.batch():
+            for domain, ips in resolved_ips.items():
+                store.upsert(domain, ipv4=[ip for ip in ips if ':' not in ip],
+                             ipv6=[ip for ip in ips if ':' in ip])
+        export_ip_list(store, IP_OUTPUT_FILE)
+        logger.info(f"已保存 {len(resolved_ips)} 个域名的IP地址到 {IP_OUTPUT_FILE}")
     except Exception as e:
         logger.error(f"保存IP地址失败: {e}")
 
@@ -346,7 +284,7 @@ def monitor_progress():
         total = success_count + fail_count
         if total > 0:
             success_rate = (success_count / total) * 100
-            logger.info(f"📊 进度: {total}/{len(COMPLETE_DOMAINS)} 已处理, {success_count} 成功, {fail_count} 失败, 成功率: {success_rate:.1f}%")
+            logger.info(f"📊 进度: {total}/{len(COMPLETE_DOMAINS)} 已处理, {success_count} 成功, {fail_count} 失败, 成功率: {success_rate:.1f}%, 并发上限: {controller.limit}")
         
         time.sleep(30)  # 每30秒报告一次
 
@@ -401,6 +339,9 @@ def main():
         logger.info(f"✅ 成功: {success_count} 个")
         logger.info(f"❌ 失败: {fail_count} 个")
         logger.info(f"📊 成功率: {success_rate:.1f}%")
+        cache_stats = get_dns_cache().stats
+        logger.info(f"🗃️ DNS缓存: 命中 {cache_stats['hits']}, 负缓存命中 {cache_stats['negative_hits']}, "
+                    f"旧值 {cache_stats['stale_hits']}, 未命中 {cache_stats['misses']}")
         logger.info(f"📝 日志文件: {log_filename}")
         logger.info("=" * 60)
         
@@ -2,8 +2,17 @@
 # -*- coding: utf-8 -*-
 """
 优化的连接测试模块 - 增强的失败处理和重试机制
+
+- 连接池复用已握手的连接，存活检查不阻塞，支持空闲淘汰与每主机连接上限
+- 测试报告包含连接池命中/未命中与延迟直方图
+- 测试器每次尝试新建一次握手测延迟，连接用后关闭、不放回池中；连接池只提供每主机连接上限与握手延迟直方图，
+  响应时间不含等待连接池名额的时间，连接池已满单独报告为 pool_exhausted
+- 连接复用只用于保温健康检查：命中池中连接时对同一地址重新握手确认可达，失败时丢弃该连接
+- 命令行: --warm-wstunnel 对 wstunnel 服务端保持保温连接并周期性健康检查
 """
 
+import bisect
+import select
 import socket
 import time
 import logging
@@ -17,7 +26,7 @@ from dataclasses import dataclass
 from enum import Enum
 from datetime import datetime
 import threading
-import queue
+from collections import deque
 
 # 日志配置
 logging.basicConfig(
@@ -37,6 +46,7 @@ class TestResult(Enum):
     CONNECTION_REFUSED = "connection_refused"
     DNS_FAILED = "dns_failed"
     NETWORK_UNREACHABLE = "network_unreachable"
+    POOL_EXHAUSTED = "pool_exhausted"
     UNKNOWN_ERROR = "unknown_error"
 
 class RetryStrategy(Enum):
@@ -55,6 +65,8 @@ class ConnectionTestConfig:
     retry_strategy: RetryStrategy = RetryStrategy.EXPONENTIAL_BACKOFF
     max_concurrent_tests: int = 20
     connection_pool_size: int = 5
+    max_connections_per_host: int = 10
+    idle_timeout: float = 60.0
     enable_keepalive: bool = True
     keepalive_interval: float = 30.0
     failure_threshold: int = 5
@@ -92,126 +104,393 @@ class OptimizedConnectionResult:
     timestamp: str
     error_pattern: Optional[str] = None
 
+class LatencyHistogram:
+    """延迟直方图（毫秒，固定桶边界）"""
+    
+    BOUNDS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+    
+    def __init__(self):
+        self.counts = [0] * (len(self.BOUNDS_MS) + 1)
+        self.total = 0
+        self.sum_ms = 0.0
+        self.max_ms = 0.0
+    
+    def record(self, latency_ms: float):
+        self.counts[bisect.bisect_left(self.BOUNDS_MS, latency_ms)] += 1
+        self.total += 1
+        self.sum_ms += latency_ms
+        self.max_ms = max(self.max_ms, latency_ms)
+    
+    def percentile(self, p: float) -> float:
+        """近似分位数：返回第 p% 个样本所在桶的上界（溢出桶返回最大值）"""
+        if not self.total:
+            return 0.0
+        rank = max(1, int(self.total * p / 100 + 0.999999))
+        seen = 0
+        for bound, count in zip(self.BOUNDS_MS, self.counts):
+            seen += count
+            if seen >= rank:
+                return float(min(bound, self.max_ms))
+        return self.max_ms
+    
+    def to_dict(self) -> Dict:
+        buckets = {f"<={bound}ms": count for bound, count in zip(self.BOUNDS_MS, self.counts)}
+        buckets[f">{self.BOUNDS_MS[-1]}ms"] = self.counts[-1]
+        return {
+            "count": self.total,
+            "avg_ms": self.sum_ms / self.total if self.total else 0.0,
+            "p50_ms": self.percentile(50),
+            "p95_ms": self.percentile(95),
+            "max_ms": self.max_ms,
+            "buckets": buckets
+        }
+
+class PoolExhaustedError(socket.timeout):
+    """连接池达到每主机连接上限，且在超时前没有连接归还（本机资源不足，不代表目标不可达）"""
+
+
 class ConnectionPool:
-    """连接池管理器"""
+    """连接池管理器
+    
+    - 按 (主机, 端口, 地址族) 保存已完成握手的空闲连接，取用前先淘汰空闲超时的连接
+    - 存活检查不阻塞：select 零超时探测可读性，可读时 MSG_PEEK 区分对端关闭与未预期数据，两者都丢弃
+    - 每个主机的连接总数（使用中 + 空闲）不超过 max_per_host，达到上限时等待归还
+    - 命中/未命中计数与延迟直方图通过 metrics() 导出
+    """
     
-    def __init__(self, max_size: int = 5):
-        self.max_size = max_size
-        self.pools: Dict[str, queue.Queue] = {}
+    def __init__(self, max_size: int = 5, max_per_host: int = 10, idle_timeout: float = 60.0,
+                 keepalive: bool = True, resolver=None):
+        self.max_size = max_size  # 每个目标最多保留的空闲连接数
+        self.max_per_host = max_per_host
+        self.idle_timeout = idle_timeout
+        self.keepalive = keepalive
+        self.resolver = resolver or socket.getaddrinfo
+        self.pools: Dict[Tuple[str, int, int], deque] = {}  # 空闲连接 (socket, 空闲起始时间)，右端最新
         self.lock = threading.Lock()
+        self.slot_freed = threading.Condition(self.lock)
+        self.host_connections: Dict[str, int] = {}
         self.connection_stats: Dict[str, Dict] = {}
+        self.histograms = {"hit": LatencyHistogram(), "miss": LatencyHistogram(), "connect": LatencyHistogram()}
     
-    def get_connection(self, host: str, port: int, timeout: float) -> Optional[socket.socket]:
-        """从连接池获取连接"""
+    def _stats(self, host: str, port: int) -> Dict[str, int]:
         pool_key = f"{host}:{port}"
+        if pool_key not in self.connection_stats:
+            self.connection_stats[pool_key] = {"created": 0, "reused": 0, "failed": 0, "evicted": 0, "connect_errors": 0}
+        return self.connection_stats[pool_key]
+    
+    def acquire(self, host: str, port: int, timeout: float,
+                family: int = socket.AF_UNSPEC) -> Tuple[socket.socket, bool]:
+        """获取已连接的socket，返回 (连接, 是否复用)；无法连接时抛出 OSError"""
+        conn, reused, _connect_ms = self.acquire_timed(host, port, timeout, family)
+        return conn, reused
+    
+    def acquire_timed(self, host: str, port: int, timeout: float,
+                      family: int = socket.AF_UNSPEC) -> Tuple[socket.socket, bool, Optional[float]]:
+        """同 acquire，另返回本次握手耗时（毫秒，不含等待连接池名额的时间；复用时为 None）
+        
+        达到每主机上限且等待超时时抛出 PoolExhaustedError。
+        """
+        start = time.perf_counter()
+        deadline = time.monotonic() + timeout
+        key = (host, port, family)
         
         with self.lock:
-            if pool_key not in self.pools:
-                self.pools[pool_key] = queue.Queue(maxsize=self.max_size)
-                self.connection_stats[pool_key] = {"created": 0, "reused": 0, "failed": 0}
-            
-            pool = self.pools[pool_key]
-            
-            try:
-                # 尝试从池中获取连接
-                conn = pool.get_nowait()
+            stats = self._stats(host, port)
+            idle = self.pools.setdefault(key, deque())
+            while True:
+                self._evict_expired(key)
+                while idle:
+                    conn, _ = idle.pop()  # 最近归还的连接最可能存活
+                    if self._is_connection_valid(conn):
+                        stats["reused"] += 1
+                        self.histograms["hit"].record((time.perf_counter() - start) * 1000)
+                        return conn, True, None
+                    stats["failed"] += 1
+                    self._discard(host, conn)
                 
-                # 检查连接是否仍然有效
-                if self._is_connection_valid(conn):
-                    self.connection_stats[pool_key]["reused"] += 1
-                    return conn
-                else:
-                    # 连接无效，关闭它
-                    try:
-                        conn.close()
-                    except:
-                        pass
-                    self.connection_stats[pool_key]["failed"] += 1
-            except queue.Empty:
-                pass
-            
-            # 创建新连接
-            try:
-                conn = self._create_connection(host, port, timeout)
-                if conn:
-                    self.connection_stats[pool_key]["created"] += 1
-                    return conn
-            except Exception as e:
-                logger.warning(f"创建连接失败 {host}:{port} - {e}")
+                if self.host_connections.get(host, 0) < self.max_per_host or self._evict_oldest_idle(host):
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolExhaustedError(f"连接池已满: {host} 已有 {self.max_per_host} 个连接")
+                self.slot_freed.wait(remaining)
             
+            self.host_connections[host] = self.host_connections.get(host, 0) + 1
+        
+        conn, connect_ms = self._connect_reserved(host, port, family, max(deadline - time.monotonic(), 0.001))
+        with self.lock:
+            self.histograms["miss"].record((time.perf_counter() - start) * 1000)
+        return conn, False, connect_ms
+    
+    def release(self, host: str, port: int, conn: socket.socket, reusable: bool = True,
+                family: int = socket.AF_UNSPEC):
+        """归还连接：可复用且空闲队列未满时放回池中，否则关闭"""
+        with self.lock:
+            idle = self.pools.get((host, port, family))
+            if reusable and idle is not None and len(idle) < self.max_size and conn.fileno() != -1:
+                idle.append((conn, time.monotonic()))
+                self.slot_freed.notify_all()
+            else:
+                self._discard(host, conn)
+    
+    def get_connection(self, host: str, port: int, timeout: float) -> Optional[socket.socket]:
+        """从连接池获取连接（失败时返回 None）"""
+        try:
+            return self.acquire(host, port, timeout)[0]
+        except OSError as e:
+            logger.warning(f"创建连接失败 {host}:{port} - {e}")
             return None
     
     def return_connection(self, host: str, port: int, conn: socket.socket, is_valid: bool = True):
         """将连接返回到连接池"""
-        if not is_valid:
-            try:
-                conn.close()
-            except:
-                pass
-            return
-        
-        pool_key = f"{host}:{port}"
+        self.release(host, port, conn, is_valid)
+    
+    def prewarm(self, host: str, port: int, count: int, timeout: float, family: int = socket.AF_UNSPEC) -> int:
+        """保证目标至少有 count 个存活的空闲连接，返回新建的连接数"""
+        key = (host, port, family)
+        with self.lock:
+            stats = self._stats(host, port)
+            idle = self.pools.setdefault(key, deque())
+            self._evict_expired(key)
+            for entry in list(idle):
+                if not self._is_connection_valid(entry[0]):
+                    idle.remove(entry)
+                    stats["failed"] += 1
+                    self._discard(host, entry[0])
+            missing = min(count, self.max_size) - len(idle)
         
+        created = 0
+        for _ in range(missing):
+            with self.lock:
+                if self.host_connections.get(host, 0) >= self.max_per_host:
+                    break
+                self.host_connections[host] = self.host_connections.get(host, 0) + 1
+            try:
+                conn, _connect_ms = self._connect_reserved(host, port, family, timeout)
+            except OSError as e:
+                logger.warning(f"预热连接失败 {host}:{port} - {e}")
+                break
+            self.release(host, port, conn, True, family)
+            created += 1
+        return created
+    
+    def evict_idle(self) -> int:
+        """淘汰所有空闲超时的连接，返回淘汰数"""
         with self.lock:
-            if pool_key in self.pools:
-                pool = self.pools[pool_key]
-                try:
-                    pool.put_nowait(conn)
-                except queue.Full:
-                    # 池已满，关闭连接
-                    try:
-                        conn.close()
-                    except:
-                        pass
-    
-    def _create_connection(self, host: str, port: int, timeout: float) -> Optional[socket.socket]:
-        """创建新连接"""
+            return sum(self._evict_expired(key) for key in list(self.pools))
+    
+    def close(self):
+        """关闭全部空闲连接"""
+        with self.lock:
+            for (host, _, _), idle in self.pools.items():
+                while idle:
+                    self._discard(host, idle.pop()[0])
+    
+    def _connect_reserved(self, host: str, port: int, family: int, timeout: float) -> Tuple[socket.socket, float]:
+        """在已占用的主机名额内建立连接，返回 (连接, 握手毫秒)；失败时释放名额"""
+        start = time.perf_counter()
         try:
-            # 获取地址信息
-            addr_info = socket.getaddrinfo(host, port, socket.AF_UNSPEC, socket.SOCK_STREAM)
-            
-            if not addr_info:
-                return None
-            
-            # 尝试连接第一个可用的地址
-            family, socktype, proto, canonname, sockaddr = addr_info[0]
-            
-            sock = socket.socket(family, socket.SOCK_STREAM)
-            sock.settimeout(timeout)
-            
-            # 启用TCP keepalive
-            sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
-            
-            return sock
-            
-        except Exception as e:
-            logger.warning(f"创建连接失败 {host}:{port} - {e}")
-            return None
+            conn = self._create_connection(host, port, family, timeout)
+        except BaseException:
+            with self.lock:
+                self._stats(host, port)["connect_errors"] += 1
+                self._release_slot(host)
+            raise
+        connect_ms = (time.perf_counter() - start) * 1000
+        with self.lock:
+            self._stats(host, port)["created"] += 1
+            self.histograms["connect"].record(connect_ms)
+        return conn, connect_ms
+    
+    def _create_connection(self, host: str, port: int, family: int, timeout: float) -> socket.socket:
+        """解析并依次尝试各地址，返回已完成握手的连接"""
+        addr_info = self.resolver(host, port, family, socket.SOCK_STREAM)
+        if not addr_info:
+            raise socket.gaierror(f"无法解析地址: {host}")
+        
+        last_error = None
+        for af, socktype, proto, canonname, sockaddr in addr_info:
+            sock = socket.socket(af, socket.SOCK_STREAM)
+            try:
+                sock.settimeout(timeout)
+                if self.keepalive:
+                    # 启用TCP keepalive
+                    sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+                sock.connect(sockaddr)
+                return sock
+            except OSError as e:
+                sock.close()
+                last_error = e
+        raise last_error
+    
+    def _evict_expired(self, key: Tuple[str, int, int]) -> int:
+        """淘汰目标的空闲超时连接（调用方持有锁）"""
+        idle = self.pools.get(key)
+        now = time.monotonic()
+        evicted = 0
+        while idle and now - idle[0][1] > self.idle_timeout:
+            self._discard(key[0], idle.popleft()[0])
+            evicted += 1
+        if evicted:
+            self._stats(key[0], key[1])["evicted"] += evicted
+        return evicted
+    
+    def _evict_oldest_idle(self, host: str) -> bool:
+        """主机名额已满时关闭该主机其他目标上最久未用的空闲连接（调用方持有锁）"""
+        candidates = [(idle[0][1], key) for key, idle in self.pools.items() if key[0] == host and idle]
+        if not candidates:
+            return False
+        _, key = min(candidates)
+        self._discard(host, self.pools[key].popleft()[0])
+        self._stats(key[0], key[1])["evicted"] += 1
+        return True
+    
+    def _discard(self, host: str, conn: socket.socket):
+        """关闭连接并释放主机名额（调用方持有锁）"""
+        try:
+            conn.close()
+        except OSError:
+            pass
+        self._release_slot(host)
+    
+    def _release_slot(self, host: str):
+        self.host_connections[host] = max(self.host_connections.get(host, 0) - 1, 0)
+        self.slot_freed.notify_all()
     
     def _is_connection_valid(self, conn: socket.socket) -> bool:
-        """检查连接是否仍然有效"""
+        """检查空闲连接是否仍然有效（不阻塞）"""
         try:
-            # 尝试非阻塞读取
-            conn.settimeout(0)
-            try:
-                data = conn.recv(1, socket.MSG_PEEK)
+            if conn.fileno() == -1:
+                return False
+            readable, _, errored = select.select([conn], [], [conn], 0)
+            if errored:
+                return False
+            if not readable:
+                # 无数据可读且未收到 FIN：连接存活
                 return True
-            except socket.error:
-                # 没有数据可读，连接可能仍然有效
-                return True
-        except:
+            # 可读时 recv 不会阻塞：读到 EOF 表示对端已关闭；空闲连接上出现数据说明协议状态不同步
+            data = conn.recv(1, socket.MSG_PEEK)
+            logger.debug("空闲连接上有未读数据，丢弃" if data else "空闲连接已被对端关闭")
+            return False
+        except (OSError, ValueError):
             return False
     
     def get_stats(self) -> Dict[str, Dict]:
         """获取连接池统计信息"""
-        return self.connection_stats.copy()
+        with self.lock:
+            return {key: stats.copy() for key, stats in self.connection_stats.items()}
+    
+    def metrics(self) -> Dict:
+        """连接池指标：命中/未命中、淘汰数与延迟直方图"""
+        with self.lock:
+            totals = {name: sum(stats[name] for stats in self.connection_stats.values())
+                      for name in ("created", "reused", "failed", "evicted", "connect_errors")}
+            hits = totals["reused"]
+            misses = self.histograms["miss"].total + totals["connect_errors"]
+            return {
+                "hits": hits,
+                "misses": misses,
+                "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+                "created": totals["created"],
+                "stale_dropped": totals["failed"],
+                "idle_evicted": totals["evicted"],
+                "connect_errors": totals["connect_errors"],
+                "idle_connections": sum(len(idle) for idle in self.pools.values()),
+                "connections_by_host": {host: n for host, n in self.host_connections.items() if n},
+                "latency_ms": {name: histogram.to_dict() for name, histogram in self.histograms.items()},
+                "per_target": {key: stats.copy() for key, stats in self.connection_stats.items()}
+            }
+
+def _measure_handshake(family: int, sockaddr: Tuple, timeout: float) -> float:
+    """对指定地址完成一次TCP握手并立即关闭，返回耗时（毫秒）"""
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    try:
+        sock.settimeout(timeout)
+        start = time.perf_counter()
+        sock.connect(sockaddr)
+        return (time.perf_counter() - start) * 1000
+    finally:
+        sock.close()
+
+class WarmConnectionKeeper:
+    """保温连接：为健康检查目标（如 wstunnel 服务端）常驻存活的空闲连接
+    
+    后台线程按间隔淘汰超时连接并补足 min_idle 个存活连接；health_check() 优先取用池中连接，
+    命中时对同一地址重新握手确认对端仍可达（省去解析与选址，不省去往返）。
+    """
+    
+    def __init__(self, pool: ConnectionPool, targets: List[Tuple[str, int]], interval: float = 30.0,
+                 min_idle: int = 1, timeout: float = 5.0):
+        self.pool = pool
+        self.targets = targets
+        self.interval = interval
+        self.min_idle = min_idle
+        self.timeout = timeout
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+    
+    def __enter__(self):
+        self.start()
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+    
+    def refill(self) -> int:
+        """淘汰超时连接并补足各目标的空闲连接，返回新建数"""
+        self.pool.evict_idle()
+        return sum(self.pool.prewarm(host, port, self.min_idle, self.timeout) for host, port in self.targets)
+    
+    def health_check(self, host: str, port: int) -> Dict:
+        """健康检查：取用（或新建）连接，命中池中连接时重新握手复核，通过后归还"""
+        start = time.perf_counter()
+        try:
+            conn, reused = self.pool.acquire(host, port, self.timeout)
+        except OSError as e:
+            return {"target": f"{host}:{port}", "ok": False, "reused": False,
+                    "latency_ms": (time.perf_counter() - start) * 1000, "error": str(e)}
+        if reused:
+            # 存活检查只能发现已收到的 FIN/数据：对端静默失效时需要一次往返才能确认
+            try:
+                _measure_handshake(conn.family, conn.getpeername(), self.timeout)
+            except OSError as e:
+                self.pool.release(host, port, conn, reusable=False)
+                return {"target": f"{host}:{port}", "ok": False, "reused": True,
+                        "latency_ms": (time.perf_counter() - start) * 1000, "error": str(e)}
+        self.pool.release(host, port, conn)
+        return {"target": f"{host}:{port}", "ok": True, "reused": reused,
+                "latency_ms": (time.perf_counter() - start) * 1000, "error": None}
+    
+    def start(self):
+        if self._thread is None:
+            self._stopped.clear()
+            self.refill()
+            self._thread = threading.Thread(target=self._run, name="warm-connections", daemon=True)
+            self._thread.start()
+    
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+    
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.refill()
+            except Exception as e:
+                logger.warning(f"保温连接补充失败: {e}")
 
 class OptimizedConnectionTester:
     """优化的连接测试器"""
     
     def __init__(self, config: Optional[ConnectionTestConfig] = None):
         self.config = config or ConnectionTestConfig()
-        self.connection_pool = ConnectionPool(self.config.connection_pool_size)
+        self.connection_pool = ConnectionPool(self.config.connection_pool_size,
+                                              self.config.max_connections_per_host,
+                                              self.config.idle_timeout,
+                                              self.config.enable_keepalive)
+        self.last_report: Dict = {}
         self.failure_history: Dict[str, List[TestAttempt]] = {}
         self.success_rate_tracker: Dict[str, float] = {}
         self.adaptive_timeout = self.config.timeout
@@ -239,7 +518,9 @@ class OptimizedConnectionTester:
                 test_result = self._perform_single_test(host, port, current_timeout, ip_version)
                 
                 end_time = time.time()
-                response_time = (end_time - start_time) * 1000  # 转换为毫秒
+                response_time = test_result.response_time
+                if response_time is None:
+                    response_time = (end_time - start_time) * 1000  # 转换为毫秒
                 
                 # 创建尝试记录
                 attempt = TestAttempt(
@@ -325,9 +606,11 @@ class OptimizedConnectionTester:
         # 生成推荐动作
         recommended_action = self._generate_recommendation(final_result, failure_rate, avg_response_time)
         
-        # 更新历史记录和成功率
+        # 更新历史记录和成功率（连接池已满是本机资源问题，不计入目标的成功率）
         self._update_failure_history(host, port, attempts)
-        self._update_success_rate_tracker(host, port, successful_attempts, len(attempts))
+        measured_attempts = sum(1 for attempt in attempts if attempt.result != TestResult.POOL_EXHAUSTED)
+        if measured_attempts:
+            self._update_success_rate_tracker(host, port, successful_attempts, measured_attempts)
         
         result = OptimizedConnectionResult(
             host=host,
@@ -353,71 +636,50 @@ class OptimizedConnectionTester:
         return result
     
     def _perform_single_test(self, host: str, port: int, timeout: float, ip_version: str) -> NamedTuple:
-        """执行单次连接测试"""
+        """执行单次连接测试：在连接池的主机名额内新建一次握手，测得延迟后关闭连接
+        
+        连接不放回池中（复测已有连接同样需要一次握手，复用不减少开销），池中因此没有可命中的空闲连接。
+        """
         
         class SingleTestResult(NamedTuple):
             result: TestResult
             error_message: Optional[str] = None
             ip_address: Optional[str] = None
+            response_time: Optional[float] = None  # 握手耗时（毫秒），不含等待连接池名额的时间
+        
+        family = {"ipv4": socket.AF_INET, "ipv6": socket.AF_INET6}.get(ip_version, socket.AF_UNSPEC)
         
         try:
-            # 从连接池获取连接
-            conn = self.connection_pool.get_connection(host, port, timeout)
-            
-            if conn is None:
-                return SingleTestResult(TestResult.UNKNOWN_ERROR, "无法创建连接")
+            conn, reused, connect_ms = self.connection_pool.acquire_timed(host, port, timeout, family)
             
             try:
-                # 获取地址信息并连接
-                if ip_version == "ipv4":
-                    addr_info = socket.getaddrinfo(host, port, socket.AF_INET, socket.SOCK_STREAM)
-                elif ip_version == "ipv6":
-                    addr_info = socket.getaddrinfo(host, port, socket.AF_INET6, socket.SOCK_STREAM)
-                else:
-                    addr_info = socket.getaddrinfo(host, port, socket.AF_UNSPEC, socket.SOCK_STREAM)
-                
-                if not addr_info:
-                    return SingleTestResult(TestResult.DNS_FAILED, "无法解析地址")
-                
-                # 使用第一个地址
-                family, socktype, proto, canonname, sockaddr = addr_info[0]
-                
-                # 如果是新连接，执行连接
-                if conn.fileno() == -1:  # 文件描述符无效，需要重新连接
-                    conn.connect(sockaddr)
-                
-                # 获取IP地址
-                ip_address = sockaddr[0]
-                
-                # 连接成功
-                self.connection_pool.return_connection(host, port, conn, True)
-                return SingleTestResult(TestResult.SUCCESS, ip_address=ip_address)
-                
-            except socket.timeout:
-                self.connection_pool.return_connection(host, port, conn, False)
-                return SingleTestResult(TestResult.TIMEOUT, "连接超时")
-                
-            except socket.gaierror as e:
-                self.connection_pool.return_connection(host, port, conn, False)
-                return SingleTestResult(TestResult.DNS_FAILED, f"DNS解析失败: {str(e)}")
-                
-            except ConnectionRefusedError:
-                self.connection_pool.return_connection(host, port, conn, False)
-                return SingleTestResult(TestResult.CONNECTION_REFUSED, "连接被拒绝")
-                
-            except OSError as e:
-                self.connection_pool.return_connection(host, port, conn, False)
-                if e.errno == 51:  # Network is unreachable
-                    return SingleTestResult(TestResult.NETWORK_UNREACHABLE, "网络不可达")
-                else:
-                    return SingleTestResult(TestResult.UNKNOWN_ERROR, f"网络错误: {str(e)}")
-                    
-            except Exception as e:
-                self.connection_pool.return_connection(host, port, conn, False)
-                return SingleTestResult(TestResult.UNKNOWN_ERROR, f"未知错误: {str(e)}")
-                
+                ip_address = conn.getpeername()[0]
+                if reused:
+                    # 其他调用方放回池中的连接：同样对该地址握手测延迟
+                    connect_ms = _measure_handshake(conn.family, conn.getpeername(), timeout)
+            finally:
+                self.connection_pool.release(host, port, conn, False, family)
+            
+            return SingleTestResult(TestResult.SUCCESS, ip_address=ip_address, response_time=connect_ms)
+            
+        except PoolExhaustedError as e:
+            return SingleTestResult(TestResult.POOL_EXHAUSTED, str(e))
+            
+        except socket.timeout:
+            return SingleTestResult(TestResult.TIMEOUT, "连接超时")
+            
         except socket.gaierror as e:
             return SingleTestResult(TestResult.DNS_FAILED, f"DNS解析失败: {str(e)}")
+            
+        except ConnectionRefusedError:
+            return SingleTestResult(TestResult.CONNECTION_REFUSED, "连接被拒绝")
+            
+        except OSError as e:
+            if e.errno == 51:  # Network is unreachable
+                return SingleTestResult(TestResult.NETWORK_UNREACHABLE, "网络不可达")
+            else:
+                return SingleTestResult(TestResult.UNKNOWN_ERROR, f"网络错误: {str(e)}")
+                
         except Exception as e:
             return SingleTestResult(TestResult.UNKNOWN_ERROR, f"连接创建失败: {str(e)}")
     
@@ -551,6 +813,8 @@ class OptimizedConnectionTester:
             return "check_network_configuration"
         elif final_result == TestResult.DNS_FAILED:
             return "check_dns_configuration_try_alternative_dns"
+        elif final_result == TestResult.POOL_EXHAUSTED:
+            return "increase_max_connections_per_host_or_reduce_concurrency"
         else:
             return "investigate_network_connectivity"
     
@@ -608,10 +872,10 @@ class OptimizedConnectionTester:
         
         return results
     
-    def _generate_test_report(self, results: List[OptimizedConnectionResult]):
-        """生成测试报告"""
+    def _generate_test_report(self, results: List[OptimizedConnectionResult]) -> Dict:
+        """生成测试报告（同时保存在 last_report 中，含连接池指标）"""
         if not results:
-            return
+            return {}
         
         total_tests = len(results)
         successful_tests = sum(1 for r in results if r.success)
@@ -647,18 +911,68 @@ class OptimizedConnectionTester:
             logger.info(f"  最慢响应时间: {max(response_times):.1f}ms")
         
         # 连接池统计
-        pool_stats = self.connection_pool.get_stats()
-        if pool_stats:
+        pool_metrics = self.connection_pool.metrics()
+        if pool_metrics["per_target"]:
             logger.info(f"\n连接池统计:")
-            total_created = sum(stats["created"] for stats in pool_stats.values())
-            total_reused = sum(stats["reused"] for stats in pool_stats.values())
-            logger.info(f"  创建连接数: {total_created}")
-            logger.info(f"  重用连接数: {total_reused}")
-            if total_created + total_reused > 0:
-                reuse_rate = total_reused / (total_created + total_reused) * 100
-                logger.info(f"  连接重用率: {reuse_rate:.1f}%")
+            logger.info(f"  命中(复用): {pool_metrics['hits']}, 未命中(新握手): {pool_metrics['misses']}, "
+                        f"命中率: {pool_metrics['hit_rate']*100:.1f}%")
+            logger.info(f"  失效丢弃: {pool_metrics['stale_dropped']}, 空闲淘汰: {pool_metrics['idle_evicted']}, "
+                        f"连接错误: {pool_metrics['connect_errors']}")
+            for name, label in (("hit", "命中取用"), ("miss", "新建取用"), ("connect", "握手")):
+                histogram = pool_metrics["latency_ms"][name]
+                if histogram["count"]:
+                    logger.info(f"  {label}延迟: n={histogram['count']}, p50<={histogram['p50_ms']:.0f}ms, "
+                                f"p95<={histogram['p95_ms']:.0f}ms, max={histogram['max_ms']:.1f}ms")
         
         logger.info("=" * 60)
+        
+        self.last_report = {
+            "total_tests": total_tests,
+            "successful_tests": successful_tests,
+            "total_attempts": total_attempts,
+            "successful_attempts": successful_attempts,
+            "result_distribution": result_counts,
+            "connection_pool": pool_metrics
+        }
+        return self.last_report
+
+def run_warm_health_checks(endpoint: Optional[str] = None, interval: float = 30.0, checks: int = 0,
+                           config: Optional[ConnectionTestConfig] = None) -> List[Dict]:
+    """对 wstunnel 服务端保持保温连接并周期性健康检查；checks 为 0 时持续运行直到中断"""
+    config = config or ConnectionTestConfig()
+    if endpoint:
+        host, _, port = endpoint.rpartition(':')
+        host, port = host.strip('[]'), int(port)
+    else:
+        from common.utils import load_config
+        env = load_config() or {}
+        host, port = env.get('SERVER_IP', '192.210.206.52'), int(env.get('SERVER_PORT', '443'))
+    
+    pool = ConnectionPool(config.connection_pool_size, config.max_connections_per_host,
+                          config.idle_timeout, config.enable_keepalive)
+    results = deque(maxlen=checks or 100)  # 持续运行时只保留最近的结果
+    performed = 0
+    logger.info(f"保温连接健康检查: {host}:{port}，间隔 {interval} 秒")
+    try:
+        with WarmConnectionKeeper(pool, [(host, port)], interval, timeout=config.timeout) as keeper:
+            while not checks or performed < checks:
+                result = keeper.health_check(host, port)
+                results.append(result)
+                performed += 1
+                if result["ok"]:
+                    logger.info(f"健康检查通过 {result['target']}: {result['latency_ms']:.1f}ms"
+                                f"{'（复用保温连接）' if result['reused'] else '（新建连接）'}")
+                else:
+                    logger.warning(f"健康检查失败 {result['target']}: {result['error']}")
+                if not checks or performed < checks:
+                    time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        metrics = pool.metrics()
+        logger.info(f"连接池命中率: {metrics['hit_rate']*100:.1f}% ({metrics['hits']}/{metrics['hits'] + metrics['misses']})")
+        pool.close()
+    return list(results)
 
 def main():
     """主函数"""
@@ -675,6 +989,10 @@ def main():
                        default="exponential", help="重试策略")
     parser.add_argument("--output", help="输出结果到文件")
     parser.add_argument("--detailed", action="store_true", help="详细输出")
+    parser.add_argument("--warm-wstunnel", action="store_true", help="对wstunnel服务端保持保温连接并周期性健康检查")
+    parser.add_argument("--endpoint", help="健康检查目标 主机:端口（默认读取config.env中的SERVER_IP/SERVER_PORT）")
+    parser.add_argument("--interval", type=float, default=30.0, help="健康检查间隔（秒）")
+    parser.add_argument("--checks", type=int, default=0, help="健康检查次数（0表示持续运行）")
     
     args = parser.parse_args()
     
@@ -682,6 +1000,11 @@ def main():
     if args.detailed:
         logger.setLevel(logging.DEBUG)
     
+    if args.warm_wstunnel:
+        config = ConnectionTestConfig(timeout=args.timeout)
+        results = run_warm_health_checks(args.endpoint, args.interval, args.checks, config)
+        return 0 if results and results[-1]["ok"] else 1
+    
     # 获取测试目标
     targets = []
     if args.hosts:
@@ -762,7 +1085,7 @@ def main():
                 })
             
             with open(args.output, 'w', encoding='utf-8') as f:
-                json.dump(output_data, f, ensure_ascii=False, indent=2)
+                json.dump({"results": output_data, "report": tester.last_report}, f, ensure_ascii=False, indent=2)
             
             logger.info(f"结果已保存到: {args.output}")
         except Exception as e:
@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""
+AUTOVPN 持久化DNS应答缓存
+供 final_auto_resolver / complete_domain_resolver / resolve_ip_local / resolve_ip_remote /
+get_clean_ips_v2 / add_single_domain / autovpn_menu 共用
+
+- SQLite（WAL）存储，键为 (域名, 记录类型, 服务器)
+- 按应答TTL过期（限制在 min_ttl ~ max_ttl 之间），无TTL的来源使用 default_ttl
+- 负缓存：NXDOMAIN / NoAnswer 按 negative_ttl 缓存
+- stale-while-revalidate：过期不久的条目先返回旧值，后台线程刷新；
+  刷新失败（超时/网络错误）时继续使用旧值
+"""
+
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional, Tuple
+
+DEFAULT_CACHE_PATH = os.environ.get(
+    'AUTOVPN_DNS_CACHE',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dns_cache.sqlite3')
+)
+
+# 可负缓存的错误（权威否定应答）；其余错误（超时等）不写入缓存
+NEGATIVE_ERRORS = ('NXDOMAIN', 'NoAnswer')
+
+# 系统解析器（socket.getaddrinfo）对应的服务器键
+SYSTEM_SERVER = 'system'
+
+# fetch 函数返回 (地址列表, TTL, 错误)
+FetchResult = Tuple[List[str], Optional[int], Optional[str]]
+
+
+@dataclass
+class CacheEntry:
+    """缓存条目"""
+    domain: str
+    rtype: str
+    server: str
+    addresses: List[str] = field(default_factory=list)
+    error: Optional[str] = None
+    expires_at: float = 0.0
+    stored_at: float = 0.0
+    source: str = 'cache'  # cache / stale / network
+
+    @property
+    def ok(self) -> bool:
+        return bool(self.addresses)
+
+    @property
+    def negative(self) -> bool:
+        return not self.addresses and self.error in NEGATIVE_ERRORS
+
+    def is_fresh(self, now: Optional[float] = None) -> bool:
+        return (now or time.time()) < self.expires_at
+
+    @property
+    def ttl_remaining(self) -> int:
+        return max(0, int(self.expires_at - time.time()))
+
+
+class DNSCache:
+    """TTL感知的持久化DNS缓存"""
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, min_ttl: int = 60, max_ttl: int = 86400,
+                 default_ttl: int = 3600, negative_ttl: int = 300, stale_ttl: int = 86400,
+                 revalidate_workers: int = 4):
+        self.path = path
+        self.min_ttl = min_ttl
+        self.max_ttl = max_ttl
+        self.default_ttl = default_ttl
+        self.negative_ttl = negative_ttl
+        self.stale_ttl = stale_ttl  # 过期后仍可作为旧值返回的时长
+        self.revalidate_workers = revalidate_workers
+
+        self._lock = threading.RLock()
+        self._pending_writes = 0
+        self._revalidating = set()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.stats = {'hits': 0, 'stale_hits': 0, 'negative_hits': 0, 'misses': 0, 'revalidations': 0}
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS dns_answers (
+                    domain TEXT NOT NULL,
+                    rtype TEXT NOT NULL,
+                    server TEXT NOT NULL,
+                    addresses TEXT NOT NULL,
+                    error TEXT,
+                    expires_at REAL NOT NULL,
+                    stored_at REAL NOT NULL,
+                    PRIMARY KEY (domain, rtype, server)
+                )
+            ''')
+            self._conn.commit()
+
+    # ------------------------------------------------------------------
+    # 基础读写
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _key(domain: str) -> str:
+        return domain.strip().strip('.').lower()
+
+    def _clamp_ttl(self, ttl: Optional[int], negative: bool) -> int:
+        if negative:
+            return self.negative_ttl
+        if ttl is None:
+            return self.default_ttl
+        return max(self.min_ttl, min(self.max_ttl, int(ttl)))
+
+    def get(self, domain: str, rtype: str, server: str) -> Optional[CacheEntry]:
+        """读取条目（含已过期条目），超过 stale_ttl 的条目视为不存在"""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT addresses, error, expires_at, stored_at FROM dns_answers '
+                'WHERE domain = ? AND rtype = ? AND server = ?',
+                (self._key(domain), rtype, server)
+            ).fetchone()
+        if row is None:
+            return None
+        entry = CacheEntry(domain=domain, rtype=rtype, server=server, addresses=json.loads(row[0]),
+                           error=row[1], expires_at=row[2], stored_at=row[3])
+        if time.time() > entry.expires_at + self.stale_ttl:
+            return None
+        return entry
+
+    def put(self, domain: str, rtype: str, server: str, addresses: List[str],
+            ttl: Optional[int] = None, error: Optional[str] = None, commit: bool = True) -> Optional[CacheEntry]:
+        """写入应答；非否定性的失败（超时等）不缓存，返回 None"""
+        addresses = list(dict.fromkeys(addresses or []))
+        negative = not addresses
+        if negative and error not in NEGATIVE_ERRORS:
+            return None
+        now = time.time()
+        entry = CacheEntry(domain=domain, rtype=rtype, server=server, addresses=addresses,
+                           error=None if addresses else error,
+                           expires_at=now + self._clamp_ttl(ttl, negative), stored_at=now,
+                           source='network')
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO dns_answers VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (self._key(domain), rtype, server, json.dumps(addresses), entry.error,
+                 entry.expires_at, entry.stored_at)
+            )
+            self._pending_writes += 1
+            if commit or self._pending_writes >= 500:
+                self._conn.commit()
+                self._pending_writes = 0
+        return entry
+
+    def flush(self):
+        """提交批量写入"""
+        with self._lock:
+            if self._pending_writes:
+                self._conn.commit()
+                self._pending_writes = 0
+
+    def purge(self, older_than: Optional[float] = None) -> int:
+        """删除超过 stale_ttl 的过期条目"""
+        cutoff = time.time() - (older_than if older_than is not None else self.stale_ttl)
+        with self._lock:
+            cursor = self._conn.execute('DELETE FROM dns_answers WHERE expires_at < ?', (cutoff,))
+            self._conn.commit()
+            return cursor.rowcount
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        with self._lock:
+            self.flush()
+            self._conn.close()
+
+    # ------------------------------------------------------------------
+    # 查询入口
+    # ------------------------------------------------------------------
+
+    def _count_hit(self, entry: CacheEntry):
+        if entry.negative:
+            self.stats['negative_hits'] += 1
+        else:
+            self.stats['hits'] += 1
+
+    def _store_fetch(self, domain: str, rtype: str, server: str, result: FetchResult) -> Optional[CacheEntry]:
+        addresses, ttl, error = result
+        return self.put(domain, rtype, server, addresses, ttl=ttl, error=error)
+
+    def _revalidate(self, domain: str, rtype: str, server: str, fetch: Callable[[], FetchResult]):
+        key = (self._key(domain), rtype, server)
+        with self._lock:
+            if key in self._revalidating:
+                return
+            self._revalidating.add(key)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.revalidate_workers,
+                                                    thread_name_prefix='dns-revalidate')
+        self.stats['revalidations'] += 1
+
+        def _run():
+            try:
+                self._store_fetch(domain, rtype, server, fetch())
+            except Exception:
+                # 刷新失败时保留旧值，下次查询再试
+                pass
+            finally:
+                with self._lock:
+                    self._revalidating.discard(key)
+
+        self._executor.submit(_run)
+
+    def lookup(self, domain: str, rtype: str, server: str, fetch: Callable[[], FetchResult],
+               revalidate_in_background: bool = True) -> CacheEntry:
+        """带缓存的查询
+
+        fetch() 返回 (地址列表, TTL, 错误)；错误为 NXDOMAIN/NoAnswer 时写入负缓存。
+        - 新鲜条目：直接返回
+        - 过期但在 stale_ttl 内：后台刷新并返回旧值（revalidate_in_background=False 时同步刷新，失败再用旧值）
+        - 无条目：同步查询
+        """
+        entry = self.get(domain, rtype, server)
+        if entry is not None and entry.is_fresh():
+            self._count_hit(entry)
+            return entry
+
+        if entry is not None and revalidate_in_background:
+            self.stats['stale_hits'] += 1
+            entry.source = 'stale'
+            self._revalidate(domain, rtype, server, fetch)
+            return entry
+
+        self.stats['misses'] += 1
+        try:
+            result = fetch()
+        except Exception as e:
+            result = ([], None, f"{type(e).__name__}: {e}")
+
+        stored = self._store_fetch(domain, rtype, server, result)
+        if stored is not None:
+            return stored
+        if entry is not None:
+            # 网络失败时使用旧值（serve-stale）
+            self.stats['stale_hits'] += 1
+            entry.source = 'stale'
+            return entry
+        addresses, _, error = result
+        return CacheEntry(domain=domain, rtype=rtype, server=server, addresses=list(addresses or []),
+                          error=error, source='network')
+
+
+# ---------------------------------------------------------------------------
+# 系统解析器（socket）便捷入口
+# ---------------------------------------------------------------------------
+
+def _system_fetch(domain: str, family: int) -> FetchResult:
+    """通过 getaddrinfo 解析；系统解析器不提供TTL，使用缓存默认TTL"""
+    try:
+        infos = socket.getaddrinfo(domain, None, family, socket.SOCK_STREAM)
+    except socket.gaierror as e:
+        if e.errno in (getattr(socket, 'EAI_NONAME', None), getattr(socket, 'EAI_NODATA', None)):
+            return [], None, 'NXDOMAIN'
+        if e.errno == getattr(socket, 'EAI_AGAIN', None):
+            # 临时失败：上游服务器超时或返回 SERVFAIL
+            return [], None, 'SERVFAIL'
+        return [], None, f"gaierror: {e}"
+    addresses = list(dict.fromkeys(info[4][0] for info in infos))
+    return addresses, None, None if addresses else 'NoAnswer'
+
+
+def system_lookup(domain: str, ipv6: bool = True,
+                  cache: Optional['DNSCache'] = None) -> Tuple[List[str], Optional[str]]:
+    """使用系统解析器解析 A（及 AAAA）记录，返回 (地址列表, 错误)
+
+    有地址时错误为 None；全部失败时优先返回临时性错误（SERVFAIL/超时），其次为否定应答。
+    """
+    cache = cache or get_dns_cache()
+    rtypes = [('A', socket.AF_INET)]
+    if ipv6:
+        rtypes.append(('AAAA', socket.AF_INET6))
+    addresses = []
+    errors = []
+    for rtype, family in rtypes:
+        entry = cache.lookup(domain, rtype, SYSTEM_SERVER, lambda f=family: _system_fetch(domain, f))
+        for address in entry.addresses:
+            if address not in addresses:
+                addresses.append(address)
+        if entry.error:
+            errors.append(entry.error)
+    if addresses:
+        return addresses, None
+    transient = [error for error in errors if error not in NEGATIVE_ERRORS]
+    return addresses, (transient or errors or ['NoAnswer'])[0]
+
+
+def system_resolve(domain: str, ipv6: bool = True, cache: Optional['DNSCache'] = None) -> List[str]:
+    """使用系统解析器解析 A（及 AAAA）记录，结果经持久化缓存"""
+    return system_lookup(domain, ipv6, cache)[0]
+
+
+_default_cache: Optional[DNSCache] = None
+_default_lock = threading.Lock()
+
+
+def get_dns_cache(path: Optional[str] = None) -> DNSCache:
+    """获取进程内共享的DNS缓存实例"""
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None or (path and os.path.abspath(path) != os.path.abspath(_default_cache.path)):
+            _default_cache = DNSCache(path or DEFAULT_CACHE_PATH)
+        return _default_cache
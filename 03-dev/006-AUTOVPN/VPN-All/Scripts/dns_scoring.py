@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+DNS共识评分引擎
+替代 get_clean_ips_v2.select_best_ip 中逐域名、逐候选IP、逐步写日志的评分循环
+
+- 保留每个DNS服务器各自的应答集合：命中次数 = 返回该IP的服务器数（同一服务器重复应答只计一次）
+- 所有域名的候选IP平铺为列式数组（CSR 偏移），命中次数与得分对全部域名一次性批量计算
+- 有 NumPy 时向量化计算，否则回退到标准库 array + 列表推导，两种路径结果一致
+- 特征权重（连通性/命中/地理/延迟）与淘汰阈值集中在 ScoringWeights，可从JSON文件加载
+"""
+
+import json
+import math
+from array import array
+from dataclasses import dataclass, field, fields
+from typing import Callable, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple, Union
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None
+    NUMPY_AVAILABLE = False
+
+# 地理特征分类（geo_class 取值）
+GEO_PREFERRED = 0
+GEO_PREFERRED_US = 1
+GEO_UNKNOWN = 2
+GEO_OTHER = 3
+GEO_FAILED = 4
+
+# 连通性特征分类（conn 取值）
+CONN_UNTESTED = 0
+CONN_OK = 1
+CONN_FAILED = 2
+
+# {server: [ip, ...]} 或 [(server, [ip, ...]), ...]
+ServerAnswers = Union[Mapping[str, Iterable[str]], Iterable[Tuple[str, Iterable[str]]]]
+# 连通性探测回调：按得分从高到低传入候选IP，返回 {ip: (可达 True/False/None, 延迟秒数或None)}
+ProbeFunc = Callable[[List[str]], Mapping[str, Tuple[Optional[bool], Optional[float]]]]
+
+DEFAULT_PREFERRED_COUNTRIES = ("US", "CA", "GB", "AU", "NZ", "SG", "JP", "KR", "DE", "FR", "NL")
+
+
+@dataclass
+class ScoringWeights:
+    """评分特征权重与淘汰阈值（默认值与原 select_best_ip 的加减分一致）"""
+    hit: float = 20.0                  # 每个确认该IP的DNS服务器
+    preferred_country: float = 50.0    # 优选国家
+    us_bonus: float = 10.0             # 优选国家中的美国额外加分
+    unknown_country: float = 0.0       # 国家未知（N/A）
+    other_country: float = -10.0       # 非优选国家
+    geo_failed: float = -30.0          # 地理位置查询失败
+    connectable: float = 60.0          # 连通性测试通过
+    unreachable: float = -200.0        # 连通性测试失败
+    latency_per_ms: float = 0.0        # 已测得连接延迟时每毫秒加减分（原逻辑不计延迟，默认关闭）
+    reject_unreachable_below: float = 0.0  # 最佳IP未确认连通且得分低于此值时放弃
+    reject_below: float = -50.0            # 最佳IP得分低于此值时放弃
+    preferred_countries: Tuple[str, ...] = field(default=DEFAULT_PREFERRED_COUNTRIES)
+
+    @classmethod
+    def from_dict(cls, data: Mapping) -> 'ScoringWeights':
+        """忽略未知键；preferred_countries 接受列表"""
+        known = {f.name for f in fields(cls)}
+        values = {k: v for k, v in data.items() if k in known}
+        if 'preferred_countries' in values:
+            values['preferred_countries'] = tuple(values['preferred_countries'])
+        return cls(**values)
+
+    @classmethod
+    def load(cls, path: str) -> 'ScoringWeights':
+        """从JSON文件加载权重，文件不存在时使用默认值"""
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return cls.from_dict(json.load(f))
+        except FileNotFoundError:
+            return cls()
+
+    def geo_table(self) -> List[float]:
+        """按 geo_class 下标取值的地理得分表"""
+        return [self.preferred_country, self.preferred_country + self.us_bonus,
+                self.unknown_country, self.other_country, self.geo_failed]
+
+    def conn_table(self) -> List[float]:
+        """按 conn 下标取值的连通性得分表"""
+        return [0.0, self.connectable, self.unreachable]
+
+    def geo_class(self, geo_info: Optional[Mapping]) -> int:
+        if not geo_info or geo_info.get("error"):
+            return GEO_FAILED
+        country = geo_info.get("countryCode")
+        if country in self.preferred_countries:
+            return GEO_PREFERRED_US if country == "US" else GEO_PREFERRED
+        if country == "N/A":
+            return GEO_UNKNOWN
+        return GEO_OTHER
+
+
+def count_dns_hits(server_answers: ServerAnswers) -> Dict[str, int]:
+    """单个域名的命中次数 {ip: 返回该IP的服务器数}，按首次出现顺序"""
+    items = server_answers.items() if isinstance(server_answers, Mapping) else server_answers
+    counts: Dict[str, int] = {}
+    for _server, ips in items:
+        for ip in dict.fromkeys(ips):
+            counts[ip] = counts.get(ip, 0) + 1
+    return counts
+
+
+class CandidateTable:
+    """所有域名的候选IP平铺存储
+
+    第 d 个域名的候选位于 [offsets[d], offsets[d+1])，域名内按IP字符串排序。
+    每个候选的特征为并列数组：hits / geo_class / conn / latency_ms。
+    """
+
+    def __init__(self, domains: List[str], offsets: Sequence[int], ips: List[str], hits: Sequence[int]):
+        self.domains = domains
+        self.offsets = array('q', offsets)
+        self.ips = ips
+        self.hits = array('l', hits)
+        self.geo: List[Optional[Mapping]] = [None] * len(ips)
+        self.geo_class = array('b', [GEO_FAILED]) * len(ips)
+        self.conn = array('b', [CONN_UNTESTED]) * len(ips)
+        self.latency_ms = array('d', [math.nan]) * len(ips)
+        self.scores: Optional[List[float]] = None
+        self._index = {domain: i for i, domain in enumerate(domains)}
+
+    def __len__(self):
+        return len(self.ips)
+
+    def span(self, domain: str) -> range:
+        d = self._index[domain]
+        return range(self.offsets[d], self.offsets[d + 1])
+
+    def domain_index(self) -> array:
+        """每个候选所属域名的下标"""
+        result = array('l')
+        for d in range(len(self.domains)):
+            result.extend([d] * (self.offsets[d + 1] - self.offsets[d]))
+        return result
+
+    @classmethod
+    def from_server_answers(cls, answers: Mapping[str, ServerAnswers]) -> 'CandidateTable':
+        """由 {域名: {服务器: [ip]}} 批量计算命中次数并建表"""
+        domains = list(answers)
+        # 每个 (域名, 服务器) 的应答先去重，再编码为 域名下标*IP数 + IP编号 的整数键
+        per_server = []
+        for d, domain in enumerate(domains):
+            server_answers = answers[domain]
+            items = server_answers.items() if isinstance(server_answers, Mapping) else server_answers
+            per_server.extend((d, set(ips)) for _server, ips in items)
+        ip_names = sorted({ip for _d, ips in per_server for ip in ips})
+        ip_ids = {ip: i for i, ip in enumerate(ip_names)}
+        stride = max(1, len(ip_names))
+        keys = array('q', [d * stride + ip_ids[ip] for d, ips in per_server for ip in ips])
+
+        if NUMPY_AVAILABLE and len(keys):
+            unique, counts = np.unique(np.asarray(keys), return_counts=True)
+            unique, counts = unique.tolist(), counts.tolist()
+        else:
+            tally: Dict[int, int] = {}
+            for key in keys:
+                tally[key] = tally.get(key, 0) + 1
+            unique = sorted(tally)
+            counts = [tally[key] for key in unique]
+
+        offsets = [0] * (len(domains) + 1)
+        for key in unique:
+            offsets[key // stride + 1] += 1
+        for d in range(len(domains)):
+            offsets[d + 1] += offsets[d]
+        return cls(domains, offsets, [ip_names[key % stride] for key in unique], counts)
+
+    @classmethod
+    def from_candidates(cls, candidates: Mapping[str, Iterable[Mapping]]) -> 'CandidateTable':
+        """由 {域名: [{"ip", "dns_hits", "geo_info"}, ...]}（select_best_ip 的输入格式）建表"""
+        domains, offsets, ips, hits, geo = [], [0], [], [], []
+        for domain, items in candidates.items():
+            domains.append(domain)
+            for item in sorted(items, key=lambda c: c["ip"]):
+                ips.append(item["ip"])
+                hits.append(item.get("dns_hits", 0))
+                geo.append(item.get("geo_info"))
+            offsets.append(len(ips))
+        table = cls(domains, offsets, ips, hits)
+        table.geo = geo
+        return table
+
+    def set_geo(self, geo_results: Mapping[str, Mapping], weights: 'ScoringWeights'):
+        """按IP填充地理信息并分类；可在建表后、评分前调用"""
+        for i, ip in enumerate(self.ips):
+            if ip in geo_results:
+                self.geo[i] = geo_results[ip]
+        self.classify_geo(weights)
+
+    def classify_geo(self, weights: 'ScoringWeights'):
+        # 同一IP常见于多个域名，分类结果按IP复用
+        classes: Dict[str, int] = {}
+        for i, info in enumerate(self.geo):
+            ip = self.ips[i]
+            if ip not in classes:
+                classes[ip] = weights.geo_class(info)
+            self.geo_class[i] = classes[ip]
+
+    def candidates(self, domain: str) -> List[Dict]:
+        """某域名的候选明细（按最终得分从高到低），用于日志"""
+        rows = [{"ip": self.ips[i], "score": self.scores[i] if self.scores is not None else None,
+                 "dns_hits": self.hits[i], "geo": self.geo[i],
+                 "connectable": {CONN_OK: True, CONN_FAILED: False}.get(self.conn[i]),
+                 "latency_ms": None if math.isnan(self.latency_ms[i]) else self.latency_ms[i]}
+                for i in self.span(domain)]
+        if self.scores is not None:
+            rows.sort(key=lambda r: r["score"], reverse=True)
+        return rows
+
+
+class ScoringEngine:
+    """对 CandidateTable 中全部候选一次性计算得分并逐域名选出最佳IP"""
+
+    def __init__(self, weights: Optional[ScoringWeights] = None):
+        self.weights = weights if weights is not None else ScoringWeights()
+
+    def build(self, answers: Mapping[str, ServerAnswers],
+              geo_results: Optional[Mapping[str, Mapping]] = None) -> CandidateTable:
+        table = CandidateTable.from_server_answers(answers)
+        table.set_geo(geo_results or {}, self.weights)
+        return table
+
+    def build_from_candidates(self, candidates: Mapping[str, Iterable[Mapping]]) -> CandidateTable:
+        table = CandidateTable.from_candidates(candidates)
+        table.classify_geo(self.weights)
+        return table
+
+    def scores(self, table: CandidateTable, with_connectivity: bool = True) -> List[float]:
+        """向量化计算得分：命中 + 地理 (+ 连通性 + 延迟)"""
+        w = self.weights
+        if not len(table):
+            return []
+        if NUMPY_AVAILABLE:
+            score = np.asarray(table.hits) * w.hit + np.asarray(w.geo_table())[np.asarray(table.geo_class)]
+            if with_connectivity:
+                score = score + np.asarray(w.conn_table())[np.asarray(table.conn)]
+                latency = np.asarray(table.latency_ms)
+                score = score + np.where(np.isnan(latency), 0.0, latency * w.latency_per_ms)
+            return score.tolist()
+        geo_table, conn_table = w.geo_table(), w.conn_table()
+        score = [h * w.hit + geo_table[g] for h, g in zip(table.hits, table.geo_class)]
+        if with_connectivity:
+            score = [s + conn_table[c] + (0.0 if math.isnan(lat) else lat * w.latency_per_ms)
+                     for s, c, lat in zip(score, table.conn, table.latency_ms)]
+        return score
+
+    @staticmethod
+    def rank(table: CandidateTable, scores: Sequence[float]) -> List[int]:
+        """按 (域名, 得分降序) 稳定排序后的候选下标；同分保持IP顺序"""
+        if NUMPY_AVAILABLE and len(table):
+            return np.lexsort((-np.asarray(scores, dtype=np.float64), np.asarray(table.domain_index()))).tolist()
+        domain_index = table.domain_index()
+        return sorted(range(len(table)), key=lambda i: (domain_index[i], -scores[i]))
+
+    def select(self, table: CandidateTable, probe: Optional[ProbeFunc] = None) -> Dict[str, Optional[str]]:
+        """返回 {域名: 最佳IP或None}
+
+        先按命中与地理得分排名；probe 给出时逐域名按排名探测连通性（可提前结束），
+        再统一计算最终得分。各域名最佳IP为最终得分最高者（同分取初始排名靠前者）。
+        """
+        w = self.weights
+        base = self.scores(table, with_connectivity=False)
+        order = self.rank(table, base)
+        if probe is not None:
+            for d in range(len(table.domains)):
+                ranked = order[table.offsets[d]:table.offsets[d + 1]]
+                if not ranked:
+                    continue
+                results = probe([table.ips[i] for i in ranked])
+                for i in ranked:
+                    reachable, latency = results.get(table.ips[i], (None, None))
+                    table.conn[i] = CONN_OK if reachable is True else CONN_FAILED if reachable is False else CONN_UNTESTED
+                    if reachable and latency is not None:
+                        table.latency_ms[i] = latency * 1000.0
+        final = self.scores(table, with_connectivity=True)
+        table.scores = final
+
+        selected: Dict[str, Optional[str]] = {}
+        for d, domain in enumerate(table.domains):
+            ranked = order[table.offsets[d]:table.offsets[d + 1]]
+            if not ranked:
+                selected[domain] = None
+                continue
+            best = max(ranked, key=lambda i: final[i])  # max 返回首个最大值，即初始排名靠前者
+            if table.conn[best] != CONN_OK and final[best] < w.reject_unreachable_below:
+                selected[domain] = None
+            elif final[best] < w.reject_below:
+                selected[domain] = None
+            else:
+                selected[domain] = table.ips[best]
+        return selected
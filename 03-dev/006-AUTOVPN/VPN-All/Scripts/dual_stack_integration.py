@@ -2,16 +2,20 @@
 # -*- coding: utf-8 -*-
 """
 双栈集成模块 - 将智能双栈路由集成到现有VPN系统
+
+- 域名经进程内解析器（dns_cache）并发解析，不再逐个调用 nslookup
+- 路由缓存驱动增量分析：只重测超过有效期或 DNS 应答变化的域名
 """
 
+import concurrent.futures
+import ipaddress
 import json
 import logging
 import os
 import sys
-import subprocess
 import time
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import Callable, Dict, List, Optional, Tuple
 from dataclasses import dataclass
 
 # 添加脚本目录到Python路径
@@ -19,6 +23,7 @@ scripts_dir = Path(__file__).parent
 sys.path.append(str(scripts_dir))
 
 from smart_dual_stack import SmartDualStackRouter, IPVersion
+from dns_cache import system_resolve
 
 # 日志配置
 logging.basicConfig(
@@ -41,16 +46,21 @@ class DomainRoutingConfig:
     quality_score: float
     last_updated: str
     routing_priority: int
+    tested_at: float = 0.0  # 最近一次连接测试的时间戳（旧缓存为0，视为过期）
 
 class DualStackIntegration:
     """双栈集成管理器"""
     
-    def __init__(self, config_file: str = "dual_stack_config.json"):
+    def __init__(self, config_file: str = "dual_stack_config.json", cache_file: str = "routing_cache.json",
+                 resolver: Optional[Callable[[str], List[str]]] = None):
         self.config_file = config_file
         self.config = self._load_config()
         self.router = SmartDualStackRouter()
         self.routing_cache: Dict[str, DomainRoutingConfig] = {}
-        self.cache_file = "routing_cache.json"
+        self.cache_file = cache_file
+        # 解析器：域名 -> 地址列表（A 与 AAAA），默认使用带持久化缓存的系统解析
+        self.resolver = resolver or (lambda domain: system_resolve(domain, ipv6=True))
+        self.analysis_stats = {"total": 0, "cached": 0, "expired": 0, "dns_changed": 0, "new": 0}
         self.load_routing_cache()
     
     def _load_config(self) -> Dict:
@@ -74,6 +84,7 @@ class DualStackIntegration:
                 "enabled": True,
                 "auto_switch": True,
                 "quality_threshold_ms": 500,
+                "max_concurrent_tests": 10,
                 "update_interval_hours": 24
             },
             "routing_rules": {
@@ -111,7 +122,8 @@ class DualStackIntegration:
                     "ipv6_addresses": config.ipv6_addresses,
                     "quality_score": config.quality_score,
                     "last_updated": config.last_updated,
-                    "routing_priority": config.routing_priority
+                    "routing_priority": config.routing_priority,
+                    "tested_at": config.tested_at
                 }
             
             with open(cache_path, 'w', encoding='utf-8') as f:
@@ -121,8 +133,44 @@ class DualStackIntegration:
         except Exception as e:
             logger.error(f"保存路由缓存失败: {e}")
     
+    def _cache_ttl_seconds(self) -> float:
+        """缓存条目的有效期（秒），取 update_interval_hours"""
+        return float(self.config.get("smart_dual_stack", {}).get("update_interval_hours", 24)) * 3600
+
+    def _max_workers(self) -> int:
+        """解析与测试的并发数"""
+        return max(1, int(self.config.get("smart_dual_stack", {}).get("max_concurrent_tests", 10)))
+
+    def _select_domains_to_test(self, domains: List[str],
+                                domain_ips: Dict[str, Dict[str, List[str]]]) -> List[str]:
+        """挑选需要重测的域名：无缓存、超过有效期或 DNS 应答变化
+
+        解析失败（无地址）时沿用缓存地址，不因临时故障触发重测。
+        """
+        ttl = self._cache_ttl_seconds()
+        now = time.time()
+        stats = {"total": len(domains), "cached": 0, "expired": 0, "dns_changed": 0, "new": 0}
+        to_test = []
+        for domain in domains:
+            cached = self.routing_cache.get(domain)
+            ips = domain_ips.get(domain, {"ipv4": [], "ipv6": []})
+            if cached is None:
+                stats["new"] += 1
+                to_test.append(domain)
+            elif now - cached.tested_at > ttl:
+                stats["expired"] += 1
+                to_test.append(domain)
+            elif (ips["ipv4"] or ips["ipv6"]) and (
+                    set(ips["ipv4"]) != set(cached.ipv4_addresses) or set(ips["ipv6"]) != set(cached.ipv6_addresses)):
+                stats["dns_changed"] += 1
+                to_test.append(domain)
+            else:
+                stats["cached"] += 1
+        self.analysis_stats = stats
+        return to_test
+
     def analyze_domain_list(self, domain_file: str = "常用境外IP.txt") -> Dict[str, DomainRoutingConfig]:
-        """分析域名列表的双栈路由配置"""
+        """分析域名列表的双栈路由配置（增量：仅重测过期或 DNS 变化的域名）"""
         try:
             domain_file_path = scripts_dir / domain_file
             if not domain_file_path.exists():
@@ -138,24 +186,23 @@ class DualStackIntegration:
                         # 提取域名（假设格式是：域名 IP地址...）
                         parts = line.split()
                         if parts:
-                            domain = parts[0]
-                            if domain not in domains:
-                                domains.append(domain)
+                            domains.append(parts[0])
+            domains = list(dict.fromkeys(domains))
             
             logger.info(f"分析 {len(domains)} 个域名的双栈路由配置")
             
-            # 使用智能双栈路由器测试
-            test_domains = domains[:50]  # 限制测试数量，避免过多请求
-            logger.info(f"实际测试 {len(test_domains)} 个域名")
-            
-            test_results = self.router.batch_test_hosts(test_domains)
+            # 先并发解析全部域名，再与缓存比较挑出需要重测的域名
+            domain_ips = self._get_domain_ips(domains)
+            test_domains = self._select_domains_to_test(domains, domain_ips)
+            stats = self.analysis_stats
+            logger.info(f"实际测试 {len(test_domains)} 个域名（新增 {stats['new']}，过期 {stats['expired']}，"
+                        f"DNS变化 {stats['dns_changed']}，沿用缓存 {stats['cached']}）")
             
-            # 获取IP地址（这里需要调用现有的解析脚本）
-            domain_ips = self._get_domain_ips(test_domains)
+            test_results = self.router.batch_test_hosts(test_domains) if test_domains else {}
             
             # 生成路由配置
             routing_configs = {}
-            for domain in test_domains:
+            for domain in domains:
                 if domain in test_results:
                     decision = test_results[domain]
                     ips = domain_ips.get(domain, {"ipv4": [], "ipv6": []})
@@ -170,14 +217,18 @@ class DualStackIntegration:
                         ipv6_addresses=ips["ipv6"],
                         quality_score=quality_score,
                         last_updated=time.strftime("%Y-%m-%d %H:%M:%S"),
-                        routing_priority=self._calculate_priority(quality_score, decision)
+                        routing_priority=self._calculate_priority(quality_score, decision),
+                        tested_at=time.time()
                     )
                     
                     routing_configs[domain] = config
                     self.routing_cache[domain] = config
+                elif domain in self.routing_cache:
+                    routing_configs[domain] = self.routing_cache[domain]
             
-            # 保存缓存
-            self.save_routing_cache()
+            # 仅在有新测试结果时保存缓存
+            if test_results:
+                self.save_routing_cache()
             
             logger.info(f"完成 {len(routing_configs)} 个域名的双栈路由分析")
             return routing_configs
@@ -186,42 +237,33 @@ class DualStackIntegration:
             logger.error(f"分析域名列表失败: {e}")
             return {}
     
+    def _resolve_domain(self, domain: str) -> Dict[str, List[str]]:
+        """解析单个域名并按地址族拆分"""
+        ipv4_ips = []
+        ipv6_ips = []
+        try:
+            for address in self.resolver(domain):
+                try:
+                    version = ipaddress.ip_address(address).version
+                except ValueError:
+                    continue
+                target = ipv4_ips if version == 4 else ipv6_ips
+                if address not in target:
+                    target.append(address)
+        except Exception as e:
+            logger.warning(f"获取 {domain} 的IP地址失败: {e}")
+        return {"ipv4": ipv4_ips, "ipv6": ipv6_ips}
+
     def _get_domain_ips(self, domains: List[str]) -> Dict[str, Dict[str, List[str]]]:
-        """获取域名的IP地址"""
+        """获取域名的IP地址（进程内并发解析）"""
         domain_ips = {}
+        if not domains:
+            return domain_ips
         
         try:
-            # 调用现有的解析脚本获取IP地址
-            for domain in domains:
-                ipv4_ips = []
-                ipv6_ips = []
-                
-                try:
-                    # 使用nslookup获取IPv4地址
-                    result = subprocess.run(['nslookup', domain], 
-                                          capture_output=True, text=True, timeout=10)
-                    
-                    if result.returncode == 0:
-                        lines = result.stdout.split('\n')
-                        for line in lines:
-                            line = line.strip()
-                            if line and not line.startswith('***') and '.' in line:
-                                # 简单的IPv4检测
-                                parts = line.split()
-                                for part in parts:
-                                    if self._is_ipv4(part):
-                                        ipv4_ips.append(part)
-                                    elif self._is_ipv6(part):
-                                        ipv6_ips.append(part)
-                
-                except Exception as e:
-                    logger.warning(f"获取 {domain} 的IP地址失败: {e}")
-                
-                domain_ips[domain] = {
-                    "ipv4": list(set(ipv4_ips)),
-                    "ipv6": list(set(ipv6_ips))
-                }
-                
+            with concurrent.futures.ThreadPoolExecutor(max_workers=min(self._max_workers(), len(domains))) as executor:
+                for domain, ips in zip(domains, executor.map(self._resolve_domain, domains)):
+                    domain_ips[domain] = ips
         except Exception as e:
             logger.error(f"批量获取域名IP失败: {e}")
         
@@ -1,4 +1,5 @@
 #!/usr/bin/python3
+import os
 import socket
 import time
 import random
@@ -16,6 +17,41 @@ except ImportError as e:
         file=sys.stderr)
     sys.exit(1)
 
+# 异步批量解析引擎（与本脚本一同上传时启用，否则回退到逐服务器串行查询）
+try:
+    from async_dns_resolver import resolve_domains as async_resolve_domains
+    ASYNC_DNS_AVAILABLE = True
+except ImportError:
+    ASYNC_DNS_AVAILABLE = False
+
+# 持久化DNS缓存（与本脚本一同上传时启用）：重复运行只查询过期条目
+try:
+    from dns_cache import get_dns_cache
+    DNS_CACHE_AVAILABLE = True
+except ImportError:
+    DNS_CACHE_AVAILABLE = False
+
+# 并发TCP连通性探测（与本脚本一同上传时启用），否则逐IP逐端口串行探测
+try:
+    from tcp_prober import ConnectivityProber, best_first_stop
+    TCP_PROBER_AVAILABLE = True
+except ImportError:
+    TCP_PROBER_AVAILABLE = False
+
+# 离线IP地理位置库（与本脚本一同上传时启用），否则逐IP调用 ip-api.com
+try:
+    from ip_geo import get_geolocator
+    GEO_LOCAL_AVAILABLE = True
+except ImportError:
+    GEO_LOCAL_AVAILABLE = False
+
+# DNS共识评分引擎（与本脚本一同上传时启用）：全部域名一次性批量评分，否则逐域名调用 select_best_ip
+try:
+    from dns_scoring import ScoringEngine, ScoringWeights
+    DNS_SCORING_AVAILABLE = True
+except ImportError:
+    DNS_SCORING_AVAILABLE = False
+
 # Configuration
 DNS_SERVERS_TO_USE = [
     '8.8.8.8',
@@ -40,15 +76,26 @@ IP_API_URL_TEMPLATE = "http://ip-api.com/json/{ip}?fields=status,message,country
 IP_API_TIMEOUT_SEC = 10  # Increased timeout for ip-api.com
 # Ensures max 24 calls per minute, per user request for safety.
 IP_API_SLEEP_SEC = 2.5
+# 离线库未命中时是否使用 ip-api 批量接口（结果持久化缓存）
+GEO_ONLINE_FALLBACK = True
 
 DNS_TIMEOUT_SEC = 5  # Timeout for each DNS query
 DNS_LIFETIME_SEC = 12  # Total lifetime for a resolve operation across retries
 # dnspython's resolve() method handles retries internally based on
 # lifetime vs timeout.
 
+# 异步批量解析：全局在途查询上限、每个DNS服务器每秒查询数、超时重试次数
+DNS_MAX_CONCURRENCY = 200
+DNS_PER_SERVER_QPS = 50
+DNS_RETRIES = 2
+
 # 新增：TCP连接测试相关配置
 CONNECTIVITY_PORTS_TO_CHECK = [80, 443]
 CONNECTIVITY_TIMEOUT_SEC = 2  # Short timeout for TCP connect
+CONNECTIVITY_CACHE_SEC = 300  # 同一IP的可达性结果在此时间内复用
+
+# 评分权重（连通性/命中/地理/延迟）配置文件，不存在时使用默认权重
+SCORING_WEIGHTS_PATH = "./scoring_weights.json"
 
 # 修改日志路径为远程服务器上的路径
 LOG_FILE_PATH = "./get_clean_ips_v2.log"
@@ -71,8 +118,64 @@ def log_message(message, print_to_stdout=True):
             file=sys.stderr)
 
 
+def resolve_domains_bulk(domains, ipv6_enable=False, server_answers=None):
+    """Resolves all domains against all DNS_SERVERS_TO_USE at once.
+
+    Returns {domain: (ipv4_list, ipv4_ok, ipv6_list, ipv6_ok)}, the same shape as
+    get_ips_from_dns_servers. Falls back to serial per-domain queries when the
+    async engine is not available. If server_answers is a dict, it is filled with
+    each server's own IPv4 answer set: {domain: {dns_server: [ip, ...]}}.
+    """
+    if not ASYNC_DNS_AVAILABLE:
+        results = {}
+        for domain in domains:
+            per_server = {}
+            results[domain] = get_ips_from_dns_servers_serial(domain, ipv6_enable, per_server)
+            if server_answers is not None:
+                server_answers[domain] = per_server
+        return results
+
+    def _progress(done, total, resolution):
+        for answer in resolution.answers:
+            if answer.ok:
+                log_message(
+                    f"    Found {answer.rtype}: {answer.addresses} for {resolution.domain} via {answer.server}"
+                    f"{' (TCP)' if answer.via_tcp else ''}",
+                    print_to_stdout=False)
+            else:
+                log_message(
+                    f"  {answer.rtype} query for {resolution.domain} via {answer.server}: {answer.error}",
+                    print_to_stdout=False)
+        if total > 1 and (done % 100 == 0 or done == total):
+            log_message(f"  DNS resolution progress: {done}/{total} ({done / total * 100:.1f}%)")
+
+    resolutions = async_resolve_domains(
+        domains, DNS_SERVERS_TO_USE, ipv6_enable=ipv6_enable, progress_callback=_progress,
+        timeout=DNS_TIMEOUT_SEC, retries=DNS_RETRIES,
+        max_concurrency=DNS_MAX_CONCURRENCY, per_server_qps=DNS_PER_SERVER_QPS,
+        cache=get_dns_cache() if DNS_CACHE_AVAILABLE else None)
+    cached = sum(1 for r in resolutions.values() for a in r.answers if a.from_cache)
+    total_answers = sum(len(r.answers) for r in resolutions.values())
+    if DNS_CACHE_AVAILABLE and len(resolutions) > 1:
+        log_message(f"  DNS cache: {cached}/{total_answers} answers served from cache")
+    if server_answers is not None:
+        for domain, resolution in resolutions.items():
+            server_answers[domain] = resolution.server_answers('A')
+    return {domain: resolution.to_tuple(ipv6_enable) for domain, resolution in resolutions.items()}
+
+
 def get_ips_from_dns_servers(domain, ipv6_enable=False):
     """Queries multiple DNS servers for a domain and returns a list of unique IPs found by any server."""
+    if ASYNC_DNS_AVAILABLE:
+        return resolve_domains_bulk([domain], ipv6_enable)[domain]
+    return get_ips_from_dns_servers_serial(domain, ipv6_enable)
+
+
+def get_ips_from_dns_servers_serial(domain, ipv6_enable=False, server_answers=None):
+    """Serial fallback: queries each DNS server in turn via dnspython.
+
+    If server_answers is a dict, it is filled with {dns_server: [ipv4, ...]}.
+    """
     unique_ips_found = set()
     unique_ipv6_ips_found = set()
     
@@ -112,6 +215,8 @@ def get_ips_from_dns_servers(domain, ipv6_enable=False):
                         f"    Found IPv4: {ip} for {domain} via {server_ip}",
                         print_to_stdout=False)
                     unique_ips_found.add(ip)
+                    if server_answers is not None:
+                        server_answers.setdefault(server_ip, []).append(ip)
             
             # For AAAA records (IPv6) - 如果IPv6启用
             if ipv6_enable:
@@ -164,7 +269,22 @@ def get_ips_from_dns_servers(domain, ipv6_enable=False):
         return list(unique_ips_found), ipv4_success, [], False
 
 
+def get_ip_geo_info_bulk(ip_addresses):
+    """Geolocates many IPs at once: offline range database, persistent cache,
+    then the ip-api batch endpoint for misses. Returns {ip: geo_info}."""
+    if not GEO_LOCAL_AVAILABLE:
+        return {ip: get_ip_geo_info_online(ip) for ip in ip_addresses}
+    geolocator = get_geolocator(online_fallback=GEO_ONLINE_FALLBACK,
+                                logger=lambda m: log_message(m, print_to_stdout=False))
+    return geolocator.lookup_many(ip_addresses)
+
+
 def get_ip_geo_info(ip_address):
+    """Gets geolocation info for an IP (offline database first, ip-api.com as fallback)."""
+    return get_ip_geo_info_bulk([ip_address])[ip_address]
+
+
+def get_ip_geo_info_online(ip_address):
     """Gets geolocation info for an IP using ip-api.com."""
     url = IP_API_URL_TEMPLATE.format(ip=ip_address)
     geo_info = {
@@ -224,23 +344,7 @@ def select_best_ip(domain, ip_geo_list_with_dns_hits):
         dns_hit_count = item["dns_hits"]
         score = 0
 
-        # 步骤1: TCP 连接性测试 (新)
-        is_connectable = check_ip_connectivity(
-            ip, CONNECTIVITY_PORTS_TO_CHECK, CONNECTIVITY_TIMEOUT_SEC)
-        connectivity_score_adjustment = 0
-        if is_connectable:
-            connectivity_score_adjustment = 60  # 主要的积极信号
-            log_message(
-                f"    IP_SELECT: IP {ip} passed connectivity test. Score bonus: +{connectivity_score_adjustment}",
-                print_to_stdout=False)
-        else:
-            connectivity_score_adjustment = -200  # 非常大的负面信号，基本排除此IP
-            log_message(
-                f"    IP_SELECT: IP {ip} FAILED connectivity test. Score penalty: {connectivity_score_adjustment}",
-                print_to_stdout=False)
-        score += connectivity_score_adjustment
-
-        # 步骤2: DNS命中次数评分
+        # 步骤1: DNS命中次数评分（连通性在所有候选评分后统一并发探测）
         # Each DNS server confirming an IP is a strong signal
         dns_score = dns_hit_count * 20
         score += dns_score
@@ -248,7 +352,7 @@ def select_best_ip(domain, ip_geo_list_with_dns_hits):
             f"    IP_SELECT: IP {ip}, DNS hits {dns_hit_count}. Score bonus: +{dns_score}",
             print_to_stdout=False)
 
-        # 步骤3: 地理位置评分
+        # 步骤2: 地理位置评分
         geo_score_adjustment = 0
         if geo_info and not geo_info["error"]:
             if geo_info["countryCode"] in PREFERRED_COUNTRIES:
@@ -279,11 +383,36 @@ def select_best_ip(domain, ip_geo_list_with_dns_hits):
                            "score": score,
                            "geo": geo_info,
                            "dns_hits": dns_hit_count,
-                           "connectable": is_connectable})
+                           "connectable": None})
 
     if not candidates:
         return None
 
+    # 步骤3: TCP 连接性测试 - 所有候选并发探测，得分最高者连通即提前结束
+    candidates.sort(key=lambda x: x["score"], reverse=True)
+    connectivity = check_ips_connectivity(
+        [c["ip"] for c in candidates], CONNECTIVITY_PORTS_TO_CHECK, CONNECTIVITY_TIMEOUT_SEC,
+        early_stop=True)
+    for c in candidates:
+        c["connectable"] = connectivity.get(c["ip"])
+        if c["connectable"] is True:
+            connectivity_score_adjustment = 60  # 主要的积极信号
+            log_message(
+                f"    IP_SELECT: IP {c['ip']} passed connectivity test. Score bonus: +{connectivity_score_adjustment}",
+                print_to_stdout=False)
+        elif c["connectable"] is False:
+            connectivity_score_adjustment = -200  # 非常大的负面信号，基本排除此IP
+            log_message(
+                f"    IP_SELECT: IP {c['ip']} FAILED connectivity test. Score penalty: {connectivity_score_adjustment}",
+                print_to_stdout=False)
+        else:
+            # 得分更高的候选已连通，该IP无法胜出，未完成探测
+            connectivity_score_adjustment = 0
+            log_message(
+                f"    IP_SELECT: IP {c['ip']} connectivity not tested (higher-ranked IP already connectable).",
+                print_to_stdout=False)
+        c["score"] += connectivity_score_adjustment
+
     # 按最终得分排序
     candidates.sort(key=lambda x: x["score"], reverse=True)
 
@@ -312,53 +441,85 @@ def select_best_ip(domain, ip_geo_list_with_dns_hits):
 
 
 def get_dns_hit_counts(domain_ips_map_from_all_dns):
-    """ Takes a list of (dns_server, ip_list) tuples and returns a dict of {ip: count} """
+    """ Takes {dns_server: ip_list} (or a list of (dns_server, ip_list) tuples) and returns
+    {ip: number of servers that returned it}. Repeated answers from one server count once. """
+    if isinstance(domain_ips_map_from_all_dns, dict):
+        domain_ips_map_from_all_dns = domain_ips_map_from_all_dns.items()
     ip_counts = {}
-    # This function is not directly used in current flow, replaced by direct counting in process_domains
-    # Retained for potential future use if data structure changes
+    for _dns_server, ip_list in domain_ips_map_from_all_dns:
+        for ip in set(ip_list):
+            ip_counts[ip] = ip_counts.get(ip, 0) + 1
     return ip_counts
 
 
-def process_domains_new(input_file_path, output_file_path, ipv6_enable=False):
-    log_message(
-        f"Processing domain list: {input_file_path}",
-        print_to_stdout=True)
-    try:
-        with open(input_file_path, 'r', encoding='utf-8-sig') as f_in:
-            domains = [line.strip() for line in f_in if line.strip()
-                       and not line.startswith('#')]
-    except FileNotFoundError:
-        log_message(
-            f"CRITICAL Error: Input domain list file not found at {input_file_path}. Script will exit.")
-        return
-    except Exception as e:
+_scoring_engine = None
+
+
+def get_scoring_engine():
+    """Shared scoring engine; weights come from SCORING_WEIGHTS_PATH if present."""
+    global _scoring_engine
+    if _scoring_engine is None:
+        if os.path.exists(SCORING_WEIGHTS_PATH):
+            weights = ScoringWeights.load(SCORING_WEIGHTS_PATH)
+        else:
+            weights = ScoringWeights(preferred_countries=tuple(PREFERRED_COUNTRIES))
+        _scoring_engine = ScoringEngine(weights)
+    return _scoring_engine
+
+
+def probe_ranked_ips(ranked_ips):
+    """Connectivity probe for the scoring engine: {ip: (reachable, latency_sec)}."""
+    connectivity = check_ips_connectivity(
+        ranked_ips, CONNECTIVITY_PORTS_TO_CHECK, CONNECTIVITY_TIMEOUT_SEC, early_stop=True)
+    results = {}
+    for ip, reachable in connectivity.items():
+        latency = _connectivity_prober.details(ip)['latency'] if _connectivity_prober is not None else None
+        results[ip] = (reachable, latency)
+    return results
+
+
+def select_best_ips_batch(server_answers, geo_results):
+    """Scores every domain's candidates in one vectorized pass, then probes connectivity
+    per domain best-first. Returns {domain: best_ip or None}."""
+    engine = get_scoring_engine()
+    table = engine.build(server_answers, geo_results)
+    selected = engine.select(table, probe=probe_ranked_ips)
+    for domain, best_ip in selected.items():
+        candidates = table.candidates(domain)
+        if not candidates:
+            continue
+        # 每个域名一行候选明细（仅写日志文件），替代逐候选、逐步骤的日志
         log_message(
-            f"CRITICAL Error reading domain list file {input_file_path}: {e}. Script will exit.")
-        return
+            f"  IP Selection for {domain}: " + "; ".join(
+                f"{c['ip']} score={c['score']:.1f} hits={c['dns_hits']} conn={c['connectable']}"
+                f" country={c['geo'].get('countryCode', 'N/A') if c['geo'] else 'N/A'}"
+                for c in candidates),
+            print_to_stdout=False)
+        if best_ip:
+            log_message(f"  ==> Selected for {domain}: {best_ip} (score {candidates[0]['score']:.1f})")
+        else:
+            log_message(
+                f"  WARNING: Best IP {candidates[0]['ip']} for {domain} (Score: {candidates[0]['score']:.1f}) "
+                f"is unreachable or scored too low. Not selecting.")
+    return selected
 
-    if not domains:
-        log_message("No domains found in the input file. Exiting.")
-        return
 
-    log_message(f"Found {len(domains)} domains to process.")
+def select_best_ips_serial(domains, dns_results, server_answers, geo_results, ipv6_enable=False):
+    """Per-domain fallback when the scoring engine is not available. Returns {domain: best_ip}."""
     final_domain_ip_map = {}
-
     for i, domain in enumerate(domains):
         progress = (i + 1) / len(domains) * 100
         log_message(f"Processing domain {i + 1}/{len(domains)} ({progress:.1f}%): {domain}")
 
-        # Step 1: Get all IPs from all configured DNS servers
-        all_ips_from_dns_query, dns_success, ipv6_ips, ipv6_success = get_ips_from_dns_servers(domain, ipv6_enable)
+        all_ips_from_dns_query, dns_success, ipv6_ips, ipv6_success = dns_results.get(domain, ([], False, [], False))
         if not dns_success and not (ipv6_enable and ipv6_success):
             log_message(
                 f"  No IPs found for {domain} from any specified DNS server after retries.")
             continue  # Move to next domain
 
-        # Count hits for each IP across all DNS servers
-        ip_hit_counts = {}
-        for ip_addr in all_ips_from_dns_query:
-            ip_hit_counts[ip_addr] = ip_hit_counts.get(ip_addr, 0) + 1
-            
+        # Count hits for each IP across all DNS servers (one per server that returned it)
+        ip_hit_counts = get_dns_hit_counts(server_answers.get(domain) or {"unknown": all_ips_from_dns_query})
+
         # 统计IPv6地址命中次数
         ipv6_hit_counts = {}
         if ipv6_enable and ipv6_success:
@@ -379,11 +540,11 @@ def process_domains_new(input_file_path, output_file_path, ipv6_enable=False):
         log_message(
             f"  Unique IPs from DNS for {domain}: {unique_ips_to_geolocate}. Hit counts: {ip_hit_counts}")
 
-        # Step 2: Get Geo Info for unique IPs
+        # Geo info for unique IPs (already looked up in bulk)
         ip_geo_data_with_hits = []
         if unique_ips_to_geolocate:
             for ip_addr in unique_ips_to_geolocate:
-                geo_info = get_ip_geo_info(ip_addr)
+                geo_info = geo_results.get(ip_addr) or get_ip_geo_info(ip_addr)
                 ip_geo_data_with_hits.append(
                     {"ip": ip_addr, "geo_info": geo_info, "dns_hits": ip_hit_counts.get(ip_addr, 0)})
 
@@ -399,6 +560,64 @@ def process_domains_new(input_file_path, output_file_path, ipv6_enable=False):
                 f"  ==> FAILED to select a reliable IP for {domain} after all checks (incl. connectivity).")
             # final_domain_ip_map[domain] = "RESOLUTION_FAILED" # Or skip
 
+    return final_domain_ip_map
+
+
+def process_domains_new(input_file_path, output_file_path, ipv6_enable=False):
+    log_message(
+        f"Processing domain list: {input_file_path}",
+        print_to_stdout=True)
+    try:
+        with open(input_file_path, 'r', encoding='utf-8-sig') as f_in:
+            domains = [line.strip() for line in f_in if line.strip()
+                       and not line.startswith('#')]
+    except FileNotFoundError:
+        log_message(
+            f"CRITICAL Error: Input domain list file not found at {input_file_path}. Script will exit.")
+        return
+    except Exception as e:
+        log_message(
+            f"CRITICAL Error reading domain list file {input_file_path}: {e}. Script will exit.")
+        return
+
+    if not domains:
+        log_message("No domains found in the input file. Exiting.")
+        return
+
+    log_message(f"Found {len(domains)} domains to process.")
+    final_domain_ip_map = {}
+
+    # Step 1: Resolve all domains against all configured DNS servers in one pass
+    dns_started = time.time()
+    server_answers = {}
+    dns_results = resolve_domains_bulk(domains, ipv6_enable, server_answers)
+    log_message(f"DNS resolution for {len(domains)} domains finished in {time.time() - dns_started:.1f}s")
+
+    # Step 2: Geolocate every unique IPv4 address from all domains in one pass
+    geo_started = time.time()
+    all_unique_ips = sorted({ip for ipv4, _, _, _ in dns_results.values() for ip in ipv4})
+    geo_results = get_ip_geo_info_bulk(all_unique_ips)
+    log_message(f"Geolocation for {len(all_unique_ips)} IPs finished in {time.time() - geo_started:.1f}s")
+
+    # Step 3 (batch): score all domains in one pass with real per-server hit counts
+    if DNS_SCORING_AVAILABLE:
+        scoring_started = time.time()
+        resolved = {domain: server_answers.get(domain) or {"unknown": dns_results[domain][0]}
+                    for domain in domains if dns_results.get(domain, ([], False, [], False))[1]}
+        for domain in domains:
+            if domain not in resolved:
+                log_message(f"  No IPs found for {domain} from any specified DNS server after retries.")
+        for domain, best_ip in select_best_ips_batch(resolved, geo_results).items():
+            if best_ip:
+                final_domain_ip_map[domain] = best_ip
+            else:
+                log_message(
+                    f"  ==> FAILED to select a reliable IP for {domain} after all checks (incl. connectivity).")
+        log_message(f"Scoring for {len(resolved)} domains finished in {time.time() - scoring_started:.1f}s")
+    else:
+        final_domain_ip_map.update(
+            select_best_ips_serial(domains, dns_results, server_answers, geo_results, ipv6_enable))
+
     # Step 4: Write results to output file
     try:
         # Ensure unique entries by domain (last one wins if somehow duplicated before this stage)
@@ -503,8 +722,44 @@ def check_network_ipv6_support():
 # 新增：TCP 连接测试函数
 
 
+_connectivity_prober = None
+
+
+def check_ips_connectivity(ip_addresses, ports_to_check, timeout_sec, early_stop=False):
+    """Probes all IPs and ports concurrently; returns {ip: True/False/None}.
+
+    With early_stop, ip_addresses must be ranked best-first: probing ends as soon as
+    the best not-yet-failed IP connects, leaving the rest as None (not tested).
+    Results are cached per IP for CONNECTIVITY_CACHE_SEC.
+    """
+    global _connectivity_prober
+    if not TCP_PROBER_AVAILABLE:
+        return {ip: check_ip_connectivity_serial(ip, ports_to_check, timeout_sec) for ip in ip_addresses}
+    if _connectivity_prober is None:
+        _connectivity_prober = ConnectivityProber(timeout=timeout_sec, cache_ttl=CONNECTIVITY_CACHE_SEC)
+    results = _connectivity_prober.probe_many(
+        ip_addresses, ports_to_check, stop_when=best_first_stop(list(ip_addresses)) if early_stop else None)
+    for ip, reachable in results.items():
+        details = _connectivity_prober.details(ip)
+        if reachable:
+            latency = f" ({details['latency'] * 1000:.0f} ms)" if details['latency'] is not None else ""
+            log_message(
+                f"    CONN_TEST: {ip} reachable on port {details['port']}{latency}",
+                print_to_stdout=False)
+        elif reachable is False:
+            log_message(
+                f"    CONN_TEST: Failed to connect to {ip} on any of the specified ports {ports_to_check}.",
+                print_to_stdout=True)
+    return results
+
+
 def check_ip_connectivity(ip_address, ports_to_check, timeout_sec):
     """Checks TCP connectivity to an IP on specified ports."""
+    return bool(check_ips_connectivity([ip_address], ports_to_check, timeout_sec)[ip_address])
+
+
+def check_ip_connectivity_serial(ip_address, ports_to_check, timeout_sec):
+    """Serial fallback: tries each port in turn with a blocking connect."""
     for port in ports_to_check:
         log_message(
             f"    CONN_TEST: Attempting TCP connect to {ip_address} on port {port} (timeout: {timeout_sec}s)...",
@@ -577,9 +832,17 @@ if __name__ == "__main__":
     log_message(
         f"IP-API Timeout: {IP_API_TIMEOUT_SEC}s, Sleep: {IP_API_SLEEP_SEC}s",
         print_to_stdout=False)  # Log to file only
+    log_message(
+        f"Geo Engine: {'offline range database' if GEO_LOCAL_AVAILABLE else 'per-IP ip-api.com'}, "
+        f"Online fallback: {GEO_ONLINE_FALLBACK}",
+        print_to_stdout=False)  # Log to file only
     log_message(
         f"DNS Timeout: {DNS_TIMEOUT_SEC}s, Lifetime: {DNS_LIFETIME_SEC}s",
         print_to_stdout=False)  # Log to file only
+    log_message(
+        f"DNS Engine: {'async bulk' if ASYNC_DNS_AVAILABLE else 'serial dnspython'}, "
+        f"Concurrency: {DNS_MAX_CONCURRENCY}, Per-server QPS: {DNS_PER_SERVER_QPS}",
+        print_to_stdout=False)  # Log to file only
     log_message(
         f"Connectivity Ports: {CONNECTIVITY_PORTS_TO_CHECK}, Timeout: {CONNECTIVITY_TIMEOUT_SEC}s",
         print_to_stdout=True)
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+hosts文件引擎
+替代 update_hosts / add_single_domain / autovpn_menu / test_option17 / HybridHostsRouter 各自读写hosts的逻辑
+
+- 流式分词：逐行读取一次，每行归类为 空行/注释/区域标记/条目/无效行，区域标记判断每行只调用一次
+- 区域索引：区域名 → 条目行号；域名 → 行号（O(1) 查找，与系统一致取第一次出现）
+- AUTOVPN 区块（'# AUTOVPN自动写入' 及其后连续的条目行，夹在其中的无效行也属于区块）整体替换，
+  区块外的内容保持原样；合并写入与删除域名只作用于区块内，不改动用户维护的条目
+- 原子写入：同目录临时文件 + 一次 fsync + os.replace，保留原文件换行符
+- 写入后按 SHA-256 校验和验证，不再重新读取并逐条查找
+"""
+
+import hashlib
+import ipaddress
+import os
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+HOSTS_FILE = r'C:\Windows\System32\drivers\etc\hosts'
+AUTOVPN_MARKER = '# AUTOVPN自动写入'
+
+# 区域标记判断：注释行 → 区域名（非标记返回 None）
+SectionResolver = Callable[[str], Optional[str]]
+
+
+class HostsLine(NamedTuple):
+    kind: str  # blank, comment, marker, autovpn, entry, invalid
+    text: str  # 原始内容（不含换行符）
+    ip: Optional[str] = None
+    names: Tuple[str, ...] = ()
+    section: Optional[str] = None
+
+
+def _is_ip(text: str) -> bool:
+    try:
+        ipaddress.ip_address(text.split('%', 1)[0])
+        return True
+    except ValueError:
+        return False
+
+
+def is_valid_hostname(name: str) -> bool:
+    """hosts 条目可用的主机名：点分标签，每段 1-63 个字母/数字/连字符/下划线，不以连字符开头或结尾"""
+    if not name or len(name) > 253 or _is_ip(name):
+        return False
+    for label in name.split('.'):
+        if not 0 < len(label) <= 63 or label[0] == '-' or label[-1] == '-':
+            return False
+        if not all(c.isascii() and (c.isalnum() or c in '-_') for c in label):
+            return False
+    return True
+
+
+def is_valid_entry(ip: str, name: str) -> bool:
+    return _is_ip(ip) and is_valid_hostname(name)
+
+
+def tokenize(lines: Iterable[str], section_of: Optional[SectionResolver] = None) -> Iterator[HostsLine]:
+    """逐行分词；section_of 只对注释行调用一次"""
+    section = None
+    for raw in lines:
+        text = raw.rstrip('\r\n')
+        stripped = text.strip()
+        if not stripped:
+            yield HostsLine('blank', text, section=section)
+            continue
+        if stripped.startswith('#'):
+            if stripped == AUTOVPN_MARKER:
+                yield HostsLine('autovpn', text, section=section)
+                continue
+            marker = section_of(stripped) if section_of else None
+            if marker:
+                section = marker
+                yield HostsLine('marker', text, section=section)
+            else:
+                yield HostsLine('comment', text, section=section)
+            continue
+        parts = stripped.split('#', 1)[0].split()
+        if len(parts) >= 2 and _is_ip(parts[0]):
+            yield HostsLine('entry', text, parts[0], tuple(parts[1:]), section)
+        else:
+            yield HostsLine('invalid', text, parts[0] if parts else None, tuple(parts[1:]), section)
+
+
+def file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class HostsFile:
+    """内存中的hosts文件：行列表 + 区域/域名索引"""
+
+    def __init__(self, lines: Iterable[HostsLine] = (), path: Optional[str] = None,
+                 newline: str = os.linesep):
+        self.path = path
+        self.newline = newline
+        self.lines: List[HostsLine] = list(lines)
+        self.digest: Optional[str] = None
+        self._reindex()
+
+    @classmethod
+    def load(cls, path: str = HOSTS_FILE, section_of: Optional[SectionResolver] = None,
+             missing_ok: bool = True) -> 'HostsFile':
+        """流式读取；文件不存在且 missing_ok 时返回空文件"""
+        if not os.path.exists(path) and missing_ok:
+            return cls(path=path)
+        newline: List[str] = []
+
+        def raw_lines(f):
+            for raw in f:
+                if not newline and raw.endswith('\n'):
+                    newline.append('\r\n' if raw.endswith('\r\n') else '\n')
+                yield raw
+
+        with open(path, 'r', encoding='utf-8', errors='surrogateescape', newline='') as f:
+            lines = list(tokenize(raw_lines(f), section_of))
+        return cls(lines, path, newline[0] if newline else os.linesep)
+
+    # ------------------------------------------------------------------
+    # 索引与查询
+    # ------------------------------------------------------------------
+
+    def _reindex(self):
+        self.domains: Dict[str, int] = {}
+        self.sections: Dict[str, List[int]] = {}
+        # AUTOVPN 区块内的条目行号（可能存在多个旧区块）
+        self.autovpn_lines: List[int] = []
+        in_block = False
+        for i, line in enumerate(self.lines):
+            if line.kind == 'autovpn':
+                in_block = True
+                continue
+            if line.kind == 'invalid' and in_block:
+                continue  # 无效行不截断区块
+            if line.kind != 'entry':
+                in_block = False
+                continue
+            if in_block:
+                self.autovpn_lines.append(i)
+            for name in line.names:
+                self.domains.setdefault(name.lower(), i)
+            if line.section:
+                self.sections.setdefault(line.section, []).append(i)
+
+    def lookup(self, domain: str) -> Optional[str]:
+        """域名当前对应的IP（第一条生效记录）"""
+        index = self.domains.get(domain.lower())
+        return self.lines[index].ip if index is not None else None
+
+    def __contains__(self, domain: str) -> bool:
+        return domain.lower() in self.domains
+
+    def shadowed(self, entries: Iterable[Tuple[str, str]]) -> List[str]:
+        """不会生效的 (IP, 域名)：第一条生效记录在 AUTOVPN 区块之外且指向其他IP，返回这些域名
+
+        合并写入只改动区块内的条目，系统按第一条记录解析，这些域名仍解析到区块外的IP。
+        """
+        block = set(self.autovpn_lines)
+        names: List[str] = []
+        for ip, name in entries:
+            index = self.domains.get(name.lower())
+            if index is not None and index not in block and self.lines[index].ip != ip and name not in names:
+                names.append(name)
+        return names
+
+    def section_ips(self, section: str) -> List[str]:
+        return [self.lines[i].ip for i in self.sections.get(section, ())]
+
+    def autovpn_entries(self) -> List[Tuple[str, str]]:
+        """AUTOVPN 区块中的 (IP, 域名)"""
+        return [(self.lines[i].ip, name) for i in self.autovpn_lines for name in self.lines[i].names]
+
+    # ------------------------------------------------------------------
+    # 修改
+    # ------------------------------------------------------------------
+
+    def remove_domains(self, domains: Iterable[str]) -> int:
+        """从 AUTOVPN 区块的条目行中移除这些域名，行内不再有域名时删除该行；返回移除数
+
+        区块外（用户维护）的条目不受影响。
+        """
+        targets = {d.lower() for d in domains}
+        block = set(self.autovpn_lines)
+        removed = 0
+        lines: List[HostsLine] = []
+        for i, line in enumerate(self.lines):
+            if i in block and any(name.lower() in targets for name in line.names):
+                names = tuple(name for name in line.names if name.lower() not in targets)
+                removed += len(line.names) - len(names)
+                if not names:
+                    continue
+                line = line._replace(names=names, text=f"{line.ip}\t{' '.join(names)}")
+            lines.append(line)
+        self.lines = lines
+        self._reindex()
+        return removed
+
+    def replace_autovpn_block(self, entries: Iterable[Tuple[str, str]]):
+        """替换 AUTOVPN 区块：删除所有旧区块标记行与其连续条目（含夹在其中的无效行），在第一个区块位置写入新区块
+
+        没有区块时追加到文件末尾（与前文以空行分隔），区块后保留一个空行。
+        """
+        block = [HostsLine('autovpn', AUTOVPN_MARKER)]
+        block += [HostsLine('entry', f"{ip}\t{name}", ip, (name,)) for ip, name in entries]
+        lines: List[HostsLine] = []
+        insert_at = None
+        in_block = False
+        for line in self.lines:
+            if line.kind == 'autovpn':
+                if insert_at is None:
+                    insert_at = len(lines)
+                in_block = True
+                continue
+            if in_block and line.kind in ('entry', 'invalid'):
+                continue
+            in_block = False
+            lines.append(line)
+        if insert_at is None:
+            while lines and lines[-1].kind == 'blank':
+                lines.pop()
+            if lines:
+                lines.append(HostsLine('blank', ''))
+            insert_at = len(lines)
+        after = lines[insert_at:]
+        if not after or after[0].kind != 'blank':
+            block.append(HostsLine('blank', ''))
+        # 区块内条目继承所在位置的区域
+        section = lines[insert_at - 1].section if insert_at else None
+        block = [line._replace(section=section) for line in block]
+        self.lines = lines[:insert_at] + block + after
+        self._reindex()
+
+    def upsert(self, entries: Iterable[Tuple[str, str]]) -> int:
+        """写入 (IP, 域名)：先从 AUTOVPN 区块移除这些域名，再并入区块；返回写入数
+
+        区块外已有的同名条目不变，写入后可用 shadowed 检查不会生效的域名。
+        """
+        entries = list(dict.fromkeys(entries))
+        self.remove_domains(name for _ip, name in entries)
+        self.replace_autovpn_block(self.autovpn_entries() + entries)
+        return len(entries)
+
+    # ------------------------------------------------------------------
+    # 输出
+    # ------------------------------------------------------------------
+
+    def render(self) -> bytes:
+        text = ''.join(line.text + self.newline for line in self.lines)
+        return text.encode('utf-8', errors='surrogateescape')
+
+    def checksum(self) -> str:
+        return hashlib.sha256(self.render()).hexdigest()
+
+    def save(self, path: Optional[str] = None, verify: bool = True) -> str:
+        """原子写入并返回 SHA-256；校验和不一致时抛出 OSError"""
+        path = path or self.path or HOSTS_FILE
+        self.digest = write_atomic(path, self.render(), verify)
+        self.path = path
+        return self.digest
+
+
+def write_atomic(path: str, data: bytes, verify: bool = True) -> str:
+    """同目录临时文件 + 一次 fsync + os.replace，返回 SHA-256；verify 时按校验和验证"""
+    expected = hashlib.sha256(data).hexdigest()
+    tmp_path = os.path.join(os.path.dirname(os.path.abspath(path)),
+                            f".{os.path.basename(path)}.{os.getpid()}.tmp")
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        try:
+            os.replace(tmp_path, path)
+        except PermissionError:
+            # hosts 文件常被设为只读
+            os.chmod(path, 0o666)
+            os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+    if verify and file_digest(path) != expected:
+        raise OSError(f"hosts文件校验失败: {path}")
+    return expected
+
+
+def update_autovpn_entries(entries: Iterable[Tuple[str, str]], path: str = HOSTS_FILE,
+                           replace: bool = False) -> int:
+    """读取 → 写入 AUTOVPN 条目 → 原子保存，返回写入条目数
+
+    replace=True 时整个 AUTOVPN 区块替换为 entries，否则按域名合并。
+    """
+    hosts = HostsFile.load(path)
+    entries = list(dict.fromkeys(entries))
+    if replace:
+        hosts.replace_autovpn_block(entries)
+    else:
+        hosts.upsert(entries)
+    hosts.save()
+    return len(entries)
@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""
+hosts文件变更日志
+替代每次更新 hosts 前 shutil.copy 生成的完整 .bak 副本
+
+- 每次更新只记录相对上一状态的行级差量，以及新增/删除/变更的条目摘要
+- 首次记录或检测到外部修改时保存完整基线；每隔 checkpoint_interval 次变更保存一次完整检查点
+- 任一记录点的内容 = 最近的检查点 + 其后的差量依次应用，可回滚到任意记录点（回滚本身也记入日志）
+- SQLite（WAL）存储，检查点内容 zlib 压缩
+
+用法:
+    python hosts_journal.py list [--hosts 路径] [--limit 20]
+    python hosts_journal.py show ID
+    python hosts_journal.py restore ID [--hosts 路径] [--dry-run]
+    python hosts_journal.py checkpoint [--hosts 路径]
+"""
+
+import argparse
+import difflib
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from hosts_file import HOSTS_FILE, tokenize, write_atomic
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.abspath(os.path.join(SCRIPT_DIR, '..'))
+
+DEFAULT_JOURNAL_PATH = os.environ.get(
+    'AUTOVPN_HOSTS_JOURNAL',
+    os.path.join(PROJECT_ROOT, 'backups', 'hosts_journal.sqlite3')
+)
+DEFAULT_CHECKPOINT_INTERVAL = 20
+
+
+def _digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _split(data: bytes) -> List[str]:
+    return data.decode('utf-8', errors='surrogateescape').splitlines(keepends=True)
+
+
+def _join(lines: List[str]) -> bytes:
+    return ''.join(lines).encode('utf-8', errors='surrogateescape')
+
+
+def make_delta(before: bytes, after: bytes) -> List[Tuple[int, int, List[str]]]:
+    """行级差量：[(起始行, 结束行, 替换为的行), ...]，行号相对 before"""
+    a, b = _split(before), _split(after)
+    matcher = difflib.SequenceMatcher(None, a, b)
+    return [(i1, i2, b[j1:j2]) for tag, i1, i2, j1, j2 in matcher.get_opcodes() if tag != 'equal']
+
+
+def apply_delta(data: bytes, delta: List[Tuple[int, int, List[str]]]) -> bytes:
+    lines = _split(data)
+    for start, end, replacement in reversed(delta):
+        lines[start:end] = replacement
+    return _join(lines)
+
+
+def _entries(data: bytes) -> Dict[str, str]:
+    """域名 → IP（第一次出现）"""
+    entries: Dict[str, str] = {}
+    for line in tokenize(_split(data)):
+        if line.kind == 'entry':
+            for name in line.names:
+                entries.setdefault(name.lower(), line.ip)
+    return entries
+
+
+def summarize(before: bytes, after: bytes) -> Dict[str, Dict]:
+    """条目级摘要：新增 {域名: IP}、删除 {域名: IP}、变更 {域名: [旧IP, 新IP]}"""
+    old, new = _entries(before), _entries(after)
+    return {
+        'added': {d: ip for d, ip in new.items() if d not in old},
+        'removed': {d: ip for d, ip in old.items() if d not in new},
+        'changed': {d: [old[d], ip] for d, ip in new.items() if d in old and old[d] != ip},
+    }
+
+
+class HostsJournal:
+    """hosts文件变更日志（按hosts文件路径分别记录）"""
+
+    def __init__(self, path: str = DEFAULT_JOURNAL_PATH,
+                 checkpoint_interval: int = DEFAULT_CHECKPOINT_INTERVAL):
+        self.path = path
+        self.checkpoint_interval = max(1, checkpoint_interval)
+        self._lock = threading.RLock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS changes (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    hosts_path TEXT NOT NULL,
+                    created REAL NOT NULL,
+                    description TEXT,
+                    checksum TEXT NOT NULL,
+                    delta TEXT,
+                    summary TEXT NOT NULL DEFAULT '{}',
+                    checkpoint BLOB
+                )
+            ''')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS idx_changes_path ON changes(hosts_path, id)')
+            self._conn.commit()
+
+    @staticmethod
+    def _key(hosts_path: str) -> str:
+        return os.path.normcase(os.path.abspath(hosts_path))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # ------------------------------------------------------------------
+    # 记录
+    # ------------------------------------------------------------------
+
+    def _head(self, key: str) -> Optional[Tuple[int, str]]:
+        return self._conn.execute(
+            'SELECT id, checksum FROM changes WHERE hosts_path = ? ORDER BY id DESC LIMIT 1', (key,)
+        ).fetchone()
+
+    def _deltas_since_checkpoint(self, key: str) -> int:
+        row = self._conn.execute(
+            'SELECT MAX(id) FROM changes WHERE hosts_path = ? AND checkpoint IS NOT NULL', (key,)).fetchone()
+        return self._conn.execute(
+            'SELECT COUNT(*) FROM changes WHERE hosts_path = ? AND id > ?', (key, row[0] or 0)).fetchone()[0]
+
+    def _insert(self, key: str, description: str, data: bytes, delta=None, summary=None,
+                checkpoint: bool = False) -> int:
+        cursor = self._conn.execute(
+            'INSERT INTO changes (hosts_path, created, description, checksum, delta, summary, checkpoint) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (key, time.time(), description, _digest(data),
+             json.dumps(delta, ensure_ascii=False) if delta is not None else None,
+             json.dumps(summary or {}, ensure_ascii=False),
+             zlib.compress(data) if checkpoint else None))
+        return cursor.lastrowid
+
+    def record(self, hosts_path: str, before: Optional[bytes], after: bytes,
+               description: str = '') -> Optional[int]:
+        """记录一次更新，内容未变化时返回 None
+
+        before 与日志中的最新状态不一致（外部修改、首次记录）时先保存完整基线。
+        """
+        key = self._key(hosts_path)
+        before = before or b''
+        with self._lock:
+            head = self._head(key)
+            if head is None or head[1] != _digest(before):
+                self._insert(key, '基线' if head is None else '外部修改', before, checkpoint=True)
+            if _digest(after) == _digest(before):
+                self._conn.commit()
+                return None
+            checkpoint = self._deltas_since_checkpoint(key) + 1 >= self.checkpoint_interval
+            change_id = self._insert(key, description, after, make_delta(before, after),
+                                     summarize(before, after), checkpoint)
+            self._conn.commit()
+            return change_id
+
+    @contextmanager
+    def track(self, hosts_path: str = HOSTS_FILE, description: str = '') -> Iterator[None]:
+        """记录块内对hosts文件的修改（块正常结束时）"""
+        before = _read(hosts_path)
+        yield
+        after = _read(hosts_path)
+        if after is not None:
+            self.record(hosts_path, before, after, description)
+
+    def checkpoint(self, hosts_path: str = HOSTS_FILE, description: str = '检查点') -> Optional[int]:
+        """保存当前内容的完整检查点；与最新记录一致时不重复保存"""
+        data = _read(hosts_path)
+        if data is None:
+            return None
+        key = self._key(hosts_path)
+        with self._lock:
+            head = self._head(key)
+            if head is not None and head[1] == _digest(data):
+                return head[0]
+            change_id = self._insert(key, description, data, checkpoint=True)
+            self._conn.commit()
+            return change_id
+
+    # ------------------------------------------------------------------
+    # 查询与回滚
+    # ------------------------------------------------------------------
+
+    def history(self, hosts_path: str = HOSTS_FILE, limit: int = 20) -> List[Dict]:
+        """最近的记录（新 → 旧）"""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT id, created, description, checksum, summary, checkpoint IS NOT NULL FROM changes '
+                'WHERE hosts_path = ? ORDER BY id DESC LIMIT ?', (self._key(hosts_path), limit)).fetchall()
+        return [{'id': r[0], 'created': r[1], 'description': r[2], 'checksum': r[3],
+                 'summary': json.loads(r[4]), 'checkpoint': bool(r[5])} for r in rows]
+
+    def get(self, change_id: int) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT id, hosts_path, created, description, checksum, summary, checkpoint IS NOT NULL '
+                'FROM changes WHERE id = ?', (change_id,)).fetchone()
+        if row is None:
+            return None
+        return {'id': row[0], 'hosts_path': row[1], 'created': row[2], 'description': row[3],
+                'checksum': row[4], 'summary': json.loads(row[5]), 'checkpoint': bool(row[6])}
+
+    def content_at(self, change_id: int) -> bytes:
+        """记录点的完整内容：最近检查点 + 其后差量"""
+        with self._lock:
+            row = self._conn.execute('SELECT hosts_path FROM changes WHERE id = ?', (change_id,)).fetchone()
+            if row is None:
+                raise KeyError(f"记录不存在: #{change_id}")
+            key = row[0]
+            base_id, blob = self._conn.execute(
+                'SELECT id, checkpoint FROM changes WHERE hosts_path = ? AND id <= ? AND checkpoint IS NOT NULL '
+                'ORDER BY id DESC LIMIT 1', (key, change_id)).fetchone()
+            deltas = self._conn.execute(
+                'SELECT delta, checksum FROM changes WHERE hosts_path = ? AND id > ? AND id <= ? ORDER BY id',
+                (key, base_id, change_id)).fetchall()
+        data = zlib.decompress(blob)
+        for delta, checksum in deltas:
+            # 外部修改的基线也是检查点，因此区间内只有差量记录
+            data = apply_delta(data, json.loads(delta))
+            if _digest(data) != checksum:
+                raise ValueError(f"变更日志校验失败: #{change_id}")
+        return data
+
+    def restore(self, change_id: int, hosts_path: Optional[str] = None) -> Optional[int]:
+        """把hosts文件恢复到记录点内容（原子写入），回滚操作本身记入日志"""
+        record = self.get(change_id)
+        if record is None:
+            raise KeyError(f"记录不存在: #{change_id}")
+        hosts_path = hosts_path or record['hosts_path']
+        data = self.content_at(change_id)
+        before = _read(hosts_path)
+        write_atomic(hosts_path, data)
+        return self.record(hosts_path, before, data, f"回滚到 #{change_id}")
+
+
+def _read(path: str) -> Optional[bytes]:
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+_journals: Dict[str, HostsJournal] = {}
+_journals_lock = threading.Lock()
+
+
+def get_hosts_journal(path: Optional[str] = None) -> HostsJournal:
+    """进程内共享的变更日志实例"""
+    path = os.path.abspath(path or DEFAULT_JOURNAL_PATH)
+    with _journals_lock:
+        if path not in _journals:
+            _journals[path] = HostsJournal(path)
+        return _journals[path]
+
+
+def _format_summary(summary: Dict) -> str:
+    return (f"+{len(summary.get('added', {}))} -{len(summary.get('removed', {}))} "
+            f"~{len(summary.get('changed', {}))}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='hosts文件变更日志')
+    parser.add_argument('--journal', default=DEFAULT_JOURNAL_PATH)
+    sub = parser.add_subparsers(dest='command', required=True)
+    list_parser = sub.add_parser('list', help='列出最近的变更')
+    list_parser.add_argument('--hosts', default=HOSTS_FILE)
+    list_parser.add_argument('--limit', type=int, default=20)
+    show_parser = sub.add_parser('show', help='显示一条记录的条目变更')
+    show_parser.add_argument('id', type=int)
+    restore_parser = sub.add_parser('restore', help='恢复到记录点')
+    restore_parser.add_argument('id', type=int)
+    restore_parser.add_argument('--hosts', default=None)
+    restore_parser.add_argument('--dry-run', action='store_true', help='只显示恢复后相对当前内容的条目变化')
+    checkpoint_parser = sub.add_parser('checkpoint', help='保存当前内容的完整检查点')
+    checkpoint_parser.add_argument('--hosts', default=HOSTS_FILE)
+    args = parser.parse_args(argv)
+
+    journal = get_hosts_journal(args.journal)
+    if args.command == 'list':
+        for item in journal.history(args.hosts, args.limit):
+            created = datetime.fromtimestamp(item['created']).strftime('%Y-%m-%d %H:%M:%S')
+            mark = ' [检查点]' if item['checkpoint'] else ''
+            print(f"#{item['id']:<5} {created}  {_format_summary(item['summary']):<14} "
+                  f"{item['description'] or ''}{mark}")
+    elif args.command == 'show':
+        item = journal.get(args.id)
+        if item is None:
+            print(f"记录不存在: #{args.id}")
+            return 1
+        print(f"#{item['id']} {item['hosts_path']} {item['description'] or ''}")
+        for domain, ip in item['summary'].get('added', {}).items():
+            print(f"  + {ip}\t{domain}")
+        for domain, ip in item['summary'].get('removed', {}).items():
+            print(f"  - {ip}\t{domain}")
+        for domain, (old, new) in item['summary'].get('changed', {}).items():
+            print(f"  ~ {domain}: {old} -> {new}")
+    elif args.command == 'restore':
+        item = journal.get(args.id)
+        if item is None:
+            print(f"记录不存在: #{args.id}")
+            return 1
+        hosts_path = args.hosts or item['hosts_path']
+        if args.dry_run:
+            changes = summarize(_read(hosts_path) or b'', journal.content_at(args.id))
+            print(f"恢复到 #{args.id} 将产生: {_format_summary(changes)}")
+        else:
+            journal.restore(args.id, hosts_path)
+            print(f"已恢复 {hosts_path} 到 #{args.id}")
+    else:
+        change_id = journal.checkpoint(args.hosts)
+        print(f"检查点: #{change_id}" if change_id else "hosts文件不存在")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
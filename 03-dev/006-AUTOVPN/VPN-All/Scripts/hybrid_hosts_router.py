@@ -13,7 +13,12 @@ import subprocess
 import ipaddress
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Set, Tuple
+from typing import Dict, List, Optional, Set, Tuple
+
+from china_ip_data import get_china_ranges
+from route_compiler import apply_batch, load_route_state, plan_routes, save_route_state
+from hosts_file import HostsFile
+from hosts_journal import get_hosts_journal
 
 # 配置日志
 logging.basicConfig(
@@ -30,12 +35,15 @@ class HybridHostsRouter:
         self.backup_dir = r"S:\YDS-Lab\03-dev\006-AUTOVPN\VPN-All\backups"
         self.config_file = "hybrid_routing_config.json"
         self.routes_dir = r"S:\YDS-Lab\03-dev\006-AUTOVPN\VPN-All\routes"
+        # 本工具添加的路由（差量删除只针对这些路由）
+        self.route_state_file = os.path.join(self.routes_dir, "installed_routes.json")
         
         # 确保备份目录存在
         os.makedirs(self.backup_dir, exist_ok=True)
         os.makedirs(self.routes_dir, exist_ok=True)
         
         self.config = self._load_config()
+        self.route_plan = None
         self.physical_interface = self._get_physical_interface()
         self.virtual_interface = self._get_virtual_interface()
         
@@ -72,7 +80,9 @@ class HybridHostsRouter:
                 "physical_gateway": "192.168.1.1",  # 物理网关
                 "virtual_gateway": "10.9.0.1",     # WireGuard网关
                 "physical_metric": 10,              # 物理路由优先级
-                "virtual_metric": 5                  # 虚拟路由优先级
+                "virtual_metric": 5,                 # 虚拟路由优先级
+                "summarize_aggressiveness": 0,       # 前缀聚合强度：0为无损合并，k为放宽到/(32-k)
+                "route_auto_sections": False         # auto 策略区域按中国IP范围分流（关闭时跳过该区域）
             },
             "validation": {
                 "enable_tunnel_check": True,         # 启用隧道验证
@@ -158,8 +168,8 @@ class HybridHostsRouter:
         }
         
         try:
-            with open(self.hosts_file, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
+            # 单次流式分词，区域标记判断每行只调用一次
+            hosts = HostsFile.load(self.hosts_file, section_of=self._is_section_marker, missing_ok=False)
         except FileNotFoundError:
             logger.error(f"hosts文件不存在: {self.hosts_file}")
             return sections
@@ -167,37 +177,16 @@ class HybridHostsRouter:
             logger.error(f"读取hosts文件失败: {e}")
             return sections
         
-        current_section = None
-        
-        for line_num, line in enumerate(lines, 1):
-            line = line.strip()
-            
-            # 跳过空行和注释行
-            if not line or line.startswith('#') and not self._is_section_marker(line):
-                continue
-            
-            # 检查区域标记
-            section_marker = self._is_section_marker(line)
-            if section_marker:
-                current_section = section_marker
-                logger.info(f"找到区域标记: {current_section} (第{line_num}行)")
-                continue
-            
-            # 如果当前没有区域，跳过
-            if not current_section:
+        for line_num, line in enumerate(hosts.lines, 1):
+            # 区域外的行、注释与空行跳过
+            if line.section not in sections or line.kind not in ('entry', 'invalid'):
                 continue
-            
             # 解析IP地址行 (格式: IP地址 域名)
-            if ' ' in line or '\t' in line:
-                parts = line.split()
-                if len(parts) >= 2:
-                    ip = parts[0].strip()
-                    # 验证IP地址格式
-                    if self._is_valid_ip(ip):
-                        sections[current_section].append(ip)
-                        logger.debug(f"添加IP到 {current_section}: {ip}")
-                    else:
-                        logger.warning(f"第{line_num}行: 无效IP格式: {ip}")
+            if line.kind == 'entry' and self._is_valid_ip(line.ip):
+                sections[line.section].append(line.ip)
+                logger.debug(f"添加IP到 {line.section}: {line.ip}")
+            elif line.names:
+                logger.warning(f"第{line_num}行: 无效IP格式: {line.ip}")
         
         # 去重并统计
         for section in sections:
@@ -245,19 +234,11 @@ class HybridHostsRouter:
             return False
     
     def backup_hosts_file(self) -> bool:
-        """备份hosts文件"""
+        """备份hosts文件（变更日志检查点，内容未变化时不重复保存）"""
         try:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            backup_file = os.path.join(self.backup_dir, f"hosts_backup_{timestamp}")
-            
             if os.path.exists(self.hosts_file):
-                with open(self.hosts_file, 'r', encoding='utf-8') as src:
-                    content = src.read()
-                
-                with open(backup_file, 'w', encoding='utf-8') as dst:
-                    dst.write(content)
-                
-                logger.info(f"hosts文件已备份到: {backup_file}")
+                change_id = get_hosts_journal().checkpoint(self.hosts_file, "混合路由配置前检查点")
+                logger.info(f"hosts文件已记入变更日志: #{change_id}")
                 return True
             else:
                 logger.warning("hosts文件不存在，无法备份")
@@ -331,13 +312,18 @@ class HybridHostsRouter:
         return template
     
     def generate_routing_commands(self, sections: Dict[str, List[str]]) -> List[str]:
-        """生成路由配置命令"""
-        commands = []
-        
-        # 清空现有路由（保留默认路由）
-        commands.append("echo 清空现有混合路由规则...")
+        """生成路由配置命令
+
+        同一网关的IP合并为最少的覆盖前缀，并与当前路由表比较，只输出需要删除/添加的差量；
+        只删除本工具此前添加的路由（route_state_file）
+        """
+        # auto 策略默认跳过；开启 route_auto_sections 后按IP归属决定：
+        # 中国IP走物理网卡，其余走虚拟网卡（APNIC范围文件，mmap加载）
+        route_auto = self.config["routing"].get("route_auto_sections", False)
+        china_ranges = get_china_ranges() if route_auto else None
+        groups: Dict[Tuple[str, int], List[str]] = {}
         
-        # 为每个区域生成路由命令
+        # 按区域策略把IP归入 (网关, 跃点数) 组
         for section_name, ips in sections.items():
             if not ips:
                 continue
@@ -346,78 +332,54 @@ class HybridHostsRouter:
             route_policy = section_config["route_policy"]
             metric = section_config["metric"]
             
-            if route_policy == "physical":
-                gateway = self.config["routing"]["physical_gateway"]
-                base_metric = self.config["routing"]["physical_metric"]
-            elif route_policy == "virtual":
-                gateway = self.config["routing"]["virtual_gateway"]  
-                base_metric = self.config["routing"]["virtual_metric"]
-            else:  # auto
-                # 特殊处理，根据IP类型决定
-                continue
-            
-            commands.append(f"echo 配置 {section_name} 区域路由 ({len(ips)} 个IP)...")
+            if route_policy == "auto":
+                if not route_auto:
+                    logger.info(f"{section_name} 区域为自动策略，未开启 route_auto_sections，跳过")
+                    continue
+                if china_ranges is None:
+                    logger.warning(f"{section_name} 区域为自动策略，但缺少中国IP范围文件，跳过")
+                    continue
+                policy_groups = {"physical": [], "virtual": []}
+                for ip in ips:
+                    policy_groups["physical" if ip in china_ranges else "virtual"].append(ip)
+            else:
+                policy_groups = {route_policy: ips}
             
-            for ip in ips:
-                try:
-                    # 验证IP地址
-                    ipaddress.IPv4Address(ip)
-                    
-                    # 生成路由命令
-                    route_cmd = f"route add {ip} mask 255.255.255.255 {gateway} metric {base_metric + metric}"
-                    commands.append(route_cmd)
-                    
-                except ValueError:
-                    logger.warning(f"跳过无效IP: {ip}")
+            for policy, policy_ips in policy_groups.items():
+                gateway = self.config["routing"][f"{policy}_gateway"]
+                base_metric = self.config["routing"][f"{policy}_metric"]
+                groups.setdefault((gateway, base_metric + metric), []).extend(policy_ips)
+        
+        aggressiveness = self.config["routing"].get("summarize_aggressiveness", 0)
+        plan = plan_routes(groups, aggressiveness, owned=load_route_state(self.route_state_file))
+        self.route_plan = plan
+        
+        max_entries = self.config["validation"]["max_route_entries"]
+        if len(plan.desired) > max_entries:
+            logger.warning(f"路由条目 {len(plan.desired)} 超过上限 {max_entries}，可提高 summarize_aggressiveness")
+        logger.info(f"{plan.host_count} 个IP合并为 {len(plan.desired)} 条路由，"
+                    f"需添加 {len(plan.to_add)} 条、删除 {len(plan.to_delete)} 条")
         
-        return commands
+        return plan.commands()
     
     def apply_routing_config(self, commands: List[str]) -> bool:
-        """应用路由配置"""
+        """应用路由配置（差量命令写入一个批处理文件，一次调用执行）"""
         try:
-            # 创建批处理文件
-            batch_file = os.path.join(self.routes_dir, "apply_hybrid_routing.bat")
-            
-            batch_content = "@echo off\necho 应用混合路由配置...\necho.\n"
-            
-            for cmd in commands:
-                batch_content += f"{cmd}\n"
-                batch_content += "if %errorlevel% neq 0 echo 命令执行失败: {}\n".format(cmd)
-            
-            batch_content += "\necho 路由配置应用完成！\npause"
-            
-            with open(batch_file, 'w', encoding='utf-8') as f:
-                f.write(batch_content)
-            
-            logger.info(f"路由配置文件已生成: {batch_file}")
-            
-            # 可选：直接执行路由命令
-            logger.info("开始应用路由配置...")
-            success_count = 0
-            total_count = 0
-            
-            for cmd in commands:
-                if cmd.startswith("route add"):
-                    total_count += 1
-                    try:
-                        result = subprocess.run(
-                            cmd,
-                            shell=True,
-                            capture_output=True,
-                            text=True,
-                            timeout=10
-                        )
-                        
-                        if result.returncode == 0:
-                            success_count += 1
-                            logger.debug(f"路由添加成功: {cmd}")
-                        else:
-                            logger.warning(f"路由添加失败: {cmd}, 错误: {result.stderr}")
-                            
-                    except Exception as e:
-                        logger.error(f"执行路由命令失败: {cmd}, 错误: {e}")
+            if not commands:
+                logger.info("路由表已是最新，无需变更")
+                if self.route_plan is not None:
+                    save_route_state(self.route_state_file, self.route_plan.owned_after())
+                return True
             
-            logger.info(f"路由配置完成: 成功 {success_count}/{total_count}")
+            batch_file = os.path.join(self.routes_dir, "apply_hybrid_routing.bat")
+            logger.info(f"开始应用路由配置: {len(commands)} 条命令 ({batch_file})")
+            success_count, failed = apply_batch(batch_file, commands)
+            for cmd in failed:
+                logger.warning(f"路由命令执行失败: {cmd}")
+            if self.route_plan is not None:
+                save_route_state(self.route_state_file, self.route_plan.owned_after(failed))
+            
+            logger.info(f"路由配置完成: 成功 {success_count}/{len(commands)}")
             return success_count > 0
             
         except Exception as e:
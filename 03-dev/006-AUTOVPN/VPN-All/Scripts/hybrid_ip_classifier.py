@@ -2,6 +2,11 @@
 """
 混合IP智能分类器
 根据IP地址的地理位置、连接质量等因素智能分类路由策略
+
+- 中国IP/CDN判断为本地索引查找，直接产出结果
+- 其余IP的质量探测（延迟、丢包、带宽）在有界线程池中并发执行，按完成顺序流式产出
+- 同一IP的探测结果在进程内共享缓存（带TTL），并发请求同一IP时只探测一次
+- 探测函数可替换（probes 参数），便于本地桩测试
 """
 
 import os
@@ -9,10 +14,21 @@ import json
 import logging
 import subprocess
 import ipaddress
-from typing import Dict, List, Optional, Tuple
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 from dataclasses import dataclass
 from pathlib import Path
 
+from ip_prefix_index import PrefixIndex
+from china_ip_data import get_china_ranges
+
+# 中国IP范围文件（每行一个 CIDR 或 起始-结束），存在时替代内置的简化网段列表
+DEFAULT_CHINA_RANGE_FILES = [
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "routes", "china_ip_ranges.txt")
+]
+
 # 配置日志
 logger = logging.getLogger(__name__)
 logging.basicConfig(
@@ -29,14 +45,38 @@ class IPClassification:
     reasoning: str
     recommended_route: str  # physical, virtual, auto
 
+
+# 质量探测函数：IP地址 -> 0-100 评分
+ProbeFunc = Callable[[str], float]
+
 class HybridIPClassifier:
     """混合IP智能分类器"""
     
-    def __init__(self, config_file: str = "hybrid_ip_config.json"):
+    def __init__(self, config_file: str = "hybrid_ip_config.json",
+                 probes: Optional[Dict[str, ProbeFunc]] = None):
+        """probes: 替换默认探测函数，键为 latency / packet_loss / bandwidth"""
         self.config_file = config_file
         self.config = self._load_config()
+        self.probes: Dict[str, ProbeFunc] = {
+            "latency": self._test_latency,
+            "packet_loss": self._test_packet_loss,
+            "bandwidth": self._test_bandwidth
+        }
+        if probes:
+            unknown = set(probes) - set(self.probes)
+            if unknown:
+                raise ValueError(f"未知的探测类型: {', '.join(sorted(unknown))}")
+            self.probes.update(probes)
+        # IP质量评分缓存 {ip: (评分, 探测时间)}；进行中的探测 {ip: Future}
+        self._quality_cache: Dict[str, Tuple[float, float]] = {}
+        self._quality_inflight: Dict[str, Future] = {}
+        self._quality_lock = threading.Lock()
+        self.probe_stats = {"probed": 0, "cache_hits": 0, "shared": 0}
         self.china_ip_ranges = self._load_china_ip_ranges()
         self.cdn_providers = self._load_cdn_providers()
+        # 编译后的前缀索引：有序整数区间 + 二分查找，覆盖 IPv4/IPv6
+        self.china_index = self._build_china_index()
+        self.cdn_index = PrefixIndex.from_labeled(self.cdn_providers)
         self.special_services = self._load_special_services()
         
     def _load_config(self) -> Dict:
@@ -58,6 +98,10 @@ class HybridIPClassifier:
                 "china": ["223.5.5.5", "180.76.76.76"],  # 国内测试服务器
                 "foreign": ["8.8.8.8", "1.1.1.1"],  # 国外测试服务器
                 "cdn": ["104.16.0.0", "172.67.0.0"]  # CDN测试服务器
+            },
+            "probing": {
+                "max_workers": 16,  # 并发探测线程数
+                "cache_ttl": 600  # IP质量评分缓存有效期（秒）
             }
         }
         
@@ -79,8 +123,28 @@ class HybridIPClassifier:
             logger.warning(f"加载配置文件失败，使用默认配置: {e}")
             return default_config
     
-    def _load_china_ip_ranges(self) -> List[ipaddress.IPv4Network]:
-        """加载中国IP地址段"""
+    def _build_china_index(self):
+        """构建中国IP前缀索引
+
+        优先级：APNIC 二进制范围文件（mmap）→ 文本范围文件（编译结果缓存为 pickle）→ 内置网段
+        """
+        ranges = get_china_ranges(self.config.get("china_ip_range_bin"))
+        if ranges is not None:
+            logger.info(f"已加载APNIC中国IP范围: {len(ranges)} 个区间")
+            return ranges
+        range_files = self.config.get("china_ip_range_files") or DEFAULT_CHINA_RANGE_FILES
+        index = PrefixIndex.load_files([(path, "CN") for path in range_files])
+        if len(index):
+            logger.info(f"已加载中国IP范围文件: {len(index)} 个区间")
+            return index
+        return PrefixIndex.from_ranges(self.china_ip_ranges, "CN")
+    
+    def _load_china_ip_ranges(self) -> List[str]:
+        """内置中国IP地址段（CIDR字符串）
+
+        仅在没有 APNIC 数据时兜底使用；完整数据请用 china_ip_data.py import
+        delegated-apnic-latest 生成二进制范围文件。
+        """
         # 这里使用简化的中国IP段，实际应用中应该使用完整的APNIC数据
         china_ranges = [
             "1.0.1.0/24", "1.0.2.0/23", "1.0.8.0/21", "1.0.32.0/19",
@@ -131,7 +195,7 @@ class HybridIPClassifier:
             "223.0.0.0/22", "223.4.0.0/14", "223.16.0.0/12", "223.32.0.0/11"
         ]
         
-        return [ipaddress.IPv4Network(range_str) for range_str in china_ranges]
+        return china_ranges
     
     def _load_cdn_providers(self) -> Dict[str, List[str]]:
         """加载CDN提供商IP段"""
@@ -157,95 +221,128 @@ class HybridIPClassifier:
     def classify_ip(self, ip_address: str) -> IPClassification:
         """智能分类IP地址"""
         try:
-            ip_obj = ipaddress.IPv4Address(ip_address)
-            
-            # 1. 检查是否为中国IP
-            if self._is_china_ip(ip_address):
-                return IPClassification(
-                    ip_address=ip_address,
-                    category="domestic",
-                    confidence=self.config["classification_rules"]["china_priority"],
-                    reasoning="IP地址属于中国境内地址段",
-                    recommended_route="physical"
-                )
-            
-            # 2. 检查是否为CDN IP
-            cdn_provider = self._is_cdn_ip(ip_address)
-            if cdn_provider:
-                return IPClassification(
-                    ip_address=ip_address,
-                    category="foreign_cdn",
-                    confidence=90.0,
-                    reasoning=f"IP地址属于{cdn_provider} CDN网络",
-                    recommended_route="virtual"
-                )
-            
-            # 3. 测试连接质量
-            quality_score = self._test_ip_quality(ip_address)
-            
-            if quality_score >= self.config["classification_rules"]["quality_threshold"]:
-                return IPClassification(
-                    ip_address=ip_address,
-                    category="foreign_direct",
-                    confidence=quality_score,
-                    reasoning=f"国外直连IP，连接质量评分{quality_score:.1f}",
-                    recommended_route="virtual"
-                )
-            else:
-                return IPClassification(
-                    ip_address=ip_address,
-                    category="foreign_cdn",
-                    confidence=quality_score,
-                    reasoning=f"国外CDN IP，连接质量评分{quality_score:.1f}",
-                    recommended_route="virtual"
-                )
-                
+            return self._classify_static(ip_address) or self._classify_by_quality(ip_address)
+        except Exception as e:
+            return self._error_classification(ip_address, e)
+    
+    def _classify_probed(self, ip_address: str) -> IPClassification:
+        """地址段无法判定的IP：只做质量探测（不重复地址段检查）"""
+        try:
+            return self._classify_by_quality(ip_address)
         except Exception as e:
-            logger.error(f"IP分类失败 {ip_address}: {e}")
+            return self._error_classification(ip_address, e)
+    
+    def _classify_static(self, ip_address: str) -> Optional[IPClassification]:
+        """按地址段分类（无网络操作），需要质量探测时返回 None"""
+        ipaddress.ip_address(ip_address)
+        
+        # 1. 检查是否为中国IP
+        if self._is_china_ip(ip_address):
+            return IPClassification(
+                ip_address=ip_address,
+                category="domestic",
+                confidence=self.config["classification_rules"]["china_priority"],
+                reasoning="IP地址属于中国境内地址段",
+                recommended_route="physical"
+            )
+        
+        # 2. 检查是否为CDN IP
+        cdn_provider = self._is_cdn_ip(ip_address)
+        if cdn_provider:
+            return IPClassification(
+                ip_address=ip_address,
+                category="foreign_cdn",
+                confidence=90.0,
+                reasoning=f"IP地址属于{cdn_provider} CDN网络",
+                recommended_route="virtual"
+            )
+        return None
+    
+    def _classify_by_quality(self, ip_address: str) -> IPClassification:
+        """3. 测试连接质量（带缓存）"""
+        quality_score = self._cached_quality(ip_address)
+        
+        if quality_score >= self.config["classification_rules"]["quality_threshold"]:
+            return IPClassification(
+                ip_address=ip_address,
+                category="foreign_direct",
+                confidence=quality_score,
+                reasoning=f"国外直连IP，连接质量评分{quality_score:.1f}",
+                recommended_route="virtual"
+            )
+        else:
             return IPClassification(
                 ip_address=ip_address,
-                category="unknown",
-                confidence=0.0,
-                reasoning=f"分类过程中发生错误: {str(e)}",
-                recommended_route="virtual"  # 默认走虚拟网卡
+                category="foreign_cdn",
+                confidence=quality_score,
+                reasoning=f"国外CDN IP，连接质量评分{quality_score:.1f}",
+                recommended_route="virtual"
             )
     
+    def _error_classification(self, ip_address: str, error: Exception) -> IPClassification:
+        logger.error(f"IP分类失败 {ip_address}: {error}")
+        return IPClassification(
+            ip_address=ip_address,
+            category="unknown",
+            confidence=0.0,
+            reasoning=f"分类过程中发生错误: {str(error)}",
+            recommended_route="virtual"  # 默认走虚拟网卡
+        )
+    
     def _is_china_ip(self, ip_address: str) -> bool:
         """检查是否为中国IP"""
-        try:
-            ip_obj = ipaddress.IPv4Address(ip_address)
-            for china_range in self.china_ip_ranges:
-                if ip_obj in china_range:
-                    return True
-            return False
-        except Exception as e:
-            logger.error(f"中国IP检查失败 {ip_address}: {e}")
-            return False
+        return self.china_index.lookup(ip_address) is not None
     
     def _is_cdn_ip(self, ip_address: str) -> Optional[str]:
         """检查是否为CDN IP，返回CDN提供商名称"""
+        return self.cdn_index.lookup(ip_address)
+    
+    def _cached_quality(self, ip_address: str) -> float:
+        """IP质量评分（共享缓存）：缓存有效时直接返回，同一IP正在探测时等待其结果"""
+        ttl = self.config["probing"]["cache_ttl"]
+        with self._quality_lock:
+            cached = self._quality_cache.get(ip_address)
+            if cached is not None and time.monotonic() - cached[1] <= ttl:
+                self.probe_stats["cache_hits"] += 1
+                return cached[0]
+            future = self._quality_inflight.get(ip_address)
+            owner = future is None
+            if owner:
+                future = self._quality_inflight[ip_address] = Future()
+                self.probe_stats["probed"] += 1
+            else:
+                self.probe_stats["shared"] += 1
+        if not owner:
+            return future.result()
+        
         try:
-            ip_obj = ipaddress.IPv4Address(ip_address)
-            for provider, ranges in self.cdn_providers.items():
-                for cidr_range in ranges:
-                    if ip_obj in ipaddress.IPv4Network(cidr_range):
-                        return provider
-            return None
-        except Exception as e:
-            logger.error(f"CDN IP检查失败 {ip_address}: {e}")
-            return None
+            score = self._test_ip_quality(ip_address)
+            with self._quality_lock:
+                self._quality_cache[ip_address] = (score, time.monotonic())
+            future.set_result(score)
+            return score
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._quality_lock:
+                self._quality_inflight.pop(ip_address, None)
+    
+    def clear_quality_cache(self):
+        with self._quality_lock:
+            self._quality_cache.clear()
     
     def _test_ip_quality(self, ip_address: str) -> float:
         """测试IP连接质量，返回0-100的评分"""
         try:
             # 1. 延迟测试
-            latency_score = self._test_latency(ip_address)
+            latency_score = self.probes["latency"](ip_address)
             
             # 2. 丢包率测试
-            packet_loss_score = self._test_packet_loss(ip_address)
+            packet_loss_score = self.probes["packet_loss"](ip_address)
             
             # 3. 带宽测试（简化版）
-            bandwidth_score = self._test_bandwidth(ip_address)
+            bandwidth_score = self.probes["bandwidth"](ip_address)
             
             # 综合评分
             total_score = (latency_score * 0.4 + packet_loss_score * 0.4 + bandwidth_score * 0.2)
@@ -348,20 +445,58 @@ class HybridIPClassifier:
             logger.error(f"带宽测试失败 {ip_address}: {e}")
             return 50.0  # 默认中等带宽
     
-    def batch_classify(self, ip_addresses: List[str]) -> List[IPClassification]:
-        """批量分类IP地址"""
-        results = []
+    def _iter_classify_indexed(self, ip_addresses: Iterable[str],
+                               max_workers: Optional[int] = None) -> Iterator[Tuple[int, IPClassification]]:
+        """按完成顺序产出 (输入序号, 分类结果)
+
+        地址段可判定的IP直接产出；需要质量探测的提交到有界线程池，
+        在途任务不超过线程数的2倍，输入可以是生成器，不会一次性全部排队。
+        """
+        max_workers = max(1, max_workers or self.config["probing"]["max_workers"])
+        pending: Dict[Future, int] = {}
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ip-probe") as executor:
+            for index, ip_addr in enumerate(ip_addresses):
+                try:
+                    result = self._classify_static(ip_addr)
+                except Exception as e:
+                    result = self._error_classification(ip_addr, e)
+                if result is not None:
+                    yield index, result
+                    continue
+                pending[executor.submit(self._classify_probed, ip_addr)] = index
+                if len(pending) >= max_workers * 2:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield pending.pop(future), future.result()
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield pending.pop(future), future.result()
+    
+    def iter_classify(self, ip_addresses: Iterable[str],
+                      max_workers: Optional[int] = None) -> Iterator[IPClassification]:
+        """并发分类，结果按完成顺序流式产出（可直接传给 generate_routing_config）"""
+        for _index, classification in self._iter_classify_indexed(ip_addresses, max_workers):
+            yield classification
+    
+    def batch_classify(self, ip_addresses: List[str],
+                       max_workers: Optional[int] = None) -> List[IPClassification]:
+        """批量分类IP地址（并发探测），结果与输入顺序一致"""
+        results: List[Optional[IPClassification]] = [None] * len(ip_addresses)
         total = len(ip_addresses)
         
-        for i, ip_addr in enumerate(ip_addresses):
-            logger.info(f"分类进度: {i+1}/{total} - {ip_addr}")
-            classification = self.classify_ip(ip_addr)
-            results.append(classification)
+        for done, (index, classification) in enumerate(
+                self._iter_classify_indexed(ip_addresses, max_workers), 1):
+            logger.info(f"分类进度: {done}/{total} - {classification.ip_address}")
+            results[index] = classification
             
         return results
     
-    def generate_routing_config(self, classifications: List[IPClassification]) -> str:
-        """生成路由配置脚本"""
+    def generate_routing_config(self, classifications: Iterable[IPClassification]) -> str:
+        """生成路由配置脚本
+
+        classifications 可以是列表，也可以是 iter_classify 的流式结果（边分类边汇总）
+        """
         physical_routes = []
         virtual_routes = []
         
@@ -389,7 +524,7 @@ class HybridIPClassifier:
 # 统计信息
 # 物理网卡路由: {len(physical_routes)} 条
 # 虚拟网卡路由: {len(virtual_routes)} 条
-# 总计: {len(classifications)} 个IP地址
+# 总计: {len(physical_routes) + len(virtual_routes)} 个IP地址
 """
         
         return config_script
@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+"""
+离线IP地理位置查询
+替代 get_clean_ips_v2.get_ip_geo_info 的逐IP ip-api.com 调用
+
+- 从CSV导入国家/ASN范围库（起止IP或CIDR），编译为有序数组，bisect二分查找
+- 编译结果按CSV的 mtime/大小 缓存为 pickle，再次加载无需重新解析CSV
+- 本地库未命中的IP可选走 ip-api.com 批量接口（每次最多100个），结果持久化缓存（SQLite）
+- 返回与 get_ip_geo_info 相同的字典结构: ip / countryCode / isp / org / error
+"""
+
+import bisect
+import csv
+import ipaddress
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import urllib.request
+from array import array
+from typing import Dict, Iterable, List, Optional, Tuple
+
+MODULE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 范围库CSV（多个用 os.pathsep 分隔），默认 Scripts/geo/ip_country.csv
+DEFAULT_GEO_DB_PATHS = os.environ.get(
+    'AUTOVPN_GEO_DB', os.path.join(MODULE_DIR, 'geo', 'ip_country.csv')
+).split(os.pathsep)
+DEFAULT_GEO_CACHE_PATH = os.environ.get(
+    'AUTOVPN_GEO_CACHE', os.path.join(MODULE_DIR, 'ip_geo_cache.sqlite3')
+)
+
+IP_API_BATCH_URL = "http://ip-api.com/batch?fields=status,message,countryCode,isp,org,query"
+IP_API_BATCH_SIZE = 100  # 批量接口单次上限
+IP_API_BATCH_INTERVAL_SEC = 4.5  # 批量接口限速 15次/分钟
+IP_API_TIMEOUT_SEC = 10
+
+COMPILED_FORMAT_VERSION = 1
+
+
+def _empty_geo(ip: str) -> Dict:
+    return {"ip": ip, "countryCode": "N/A", "isp": "N/A", "org": "N/A", "error": None}
+
+
+class GeoRangeDatabase:
+    """国家/ASN范围库：有序起始地址数组 + 二分查找
+
+    CSV每行支持以下格式（首列自动识别，表头行与 # 注释行跳过）:
+      start_ip,end_ip,country[,asn,org]
+      cidr,country[,asn,org]
+      start_int,end_int,country[,asn,org]
+    范围之间不应重叠；重叠时以起始地址较大者为准。
+    """
+
+    def __init__(self):
+        # IPv4 起止地址用紧凑的无符号数组，IPv6 超出64位用列表
+        self.v4_starts = array('L')
+        self.v4_ends = array('L')
+        self.v4_values = array('L')
+        self.v6_starts: List[int] = []
+        self.v6_ends: List[int] = []
+        self.v6_values: List[int] = []
+        # (countryCode, asn, org) 去重表，范围通过下标引用
+        self.labels: List[Tuple[str, str, str]] = []
+        self.sources: List[str] = []
+
+    def __len__(self):
+        return len(self.v4_starts) + len(self.v6_starts)
+
+    @staticmethod
+    def _parse_bound(value: str) -> Tuple[int, int]:
+        """返回 (版本, 整数地址)"""
+        value = value.strip()
+        if value.isdigit():
+            number = int(value)
+            return (4 if number <= 0xFFFFFFFF else 6), number
+        address = ipaddress.ip_address(value)
+        return address.version, int(address)
+
+    def _parse_row(self, row: List[str]) -> Optional[Tuple[int, int, int, Tuple[str, str, str]]]:
+        if not row or not row[0].strip() or row[0].lstrip().startswith('#'):
+            return None
+        try:
+            if '/' in row[0]:
+                network = ipaddress.ip_network(row[0].strip(), strict=False)
+                version, start, end = network.version, int(network.network_address), int(network.broadcast_address)
+                rest = row[1:]
+            else:
+                version, start = self._parse_bound(row[0])
+                end_version, end = self._parse_bound(row[1])
+                if row[0].strip().isdigit():
+                    # 整数格式按结束地址判断版本
+                    version = end_version
+                elif end_version != version:
+                    return None
+                rest = row[2:]
+        except (ValueError, IndexError):
+            # 表头或无法解析的行
+            return None
+        country = (rest[0].strip().upper() if rest else '') or 'N/A'
+        asn = rest[1].strip() if len(rest) > 1 else ''
+        org = rest[2].strip() if len(rest) > 2 else ''
+        return version, start, end, (country, asn, org)
+
+    def load_csv(self, path: str):
+        """导入CSV（可多次调用合并多个文件），导入后需调用 build()"""
+        label_index = {label: i for i, label in enumerate(self.labels)}
+        delimiter = '\t' if path.endswith(('.tsv', '.tsv.txt')) else ','
+        v4, v6 = [], []
+        with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+            for row in csv.reader(f, delimiter=delimiter):
+                parsed = self._parse_row(row)
+                if parsed is None:
+                    continue
+                version, start, end, label = parsed
+                index = label_index.get(label)
+                if index is None:
+                    index = label_index[label] = len(self.labels)
+                    self.labels.append(label)
+                (v4 if version == 4 else v6).append((start, end, index))
+        self._merge(v4, v6)
+        self.sources.append(path)
+
+    def _merge(self, v4: List[Tuple[int, int, int]], v6: List[Tuple[int, int, int]]):
+        existing_v4 = list(zip(self.v4_starts, self.v4_ends, self.v4_values))
+        existing_v6 = list(zip(self.v6_starts, self.v6_ends, self.v6_values))
+        merged_v4 = sorted(existing_v4 + v4)
+        merged_v6 = sorted(existing_v6 + v6)
+        self.v4_starts = array('L', (r[0] for r in merged_v4))
+        self.v4_ends = array('L', (r[1] for r in merged_v4))
+        self.v4_values = array('L', (r[2] for r in merged_v4))
+        self.v6_starts = [r[0] for r in merged_v6]
+        self.v6_ends = [r[1] for r in merged_v6]
+        self.v6_values = [r[2] for r in merged_v6]
+
+    def lookup(self, ip: str) -> Optional[Tuple[str, str, str]]:
+        """二分查找 IP 所在范围，返回 (countryCode, asn, org)"""
+        try:
+            address = ipaddress.ip_address(ip)
+        except ValueError:
+            return None
+        number = int(address)
+        if address.version == 4:
+            starts, ends, values = self.v4_starts, self.v4_ends, self.v4_values
+        else:
+            starts, ends, values = self.v6_starts, self.v6_ends, self.v6_values
+        i = bisect.bisect_right(starts, number) - 1
+        if i >= 0 and number <= ends[i]:
+            return self.labels[values[i]]
+        return None
+
+    # ------------------------------------------------------------------
+    # 编译缓存
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _fingerprint(paths: List[str]) -> List[Tuple[str, int, int]]:
+        result = []
+        for path in paths:
+            st = os.stat(path)
+            result.append((os.path.abspath(path), st.st_size, st.st_mtime_ns))
+        return result
+
+    def save_compiled(self, path: str):
+        payload = {
+            'version': COMPILED_FORMAT_VERSION,
+            'fingerprint': self._fingerprint(self.sources),
+            'v4': (self.v4_starts, self.v4_ends, self.v4_values),
+            'v6': (self.v6_starts, self.v6_ends, self.v6_values),
+            'labels': self.labels,
+            'sources': self.sources
+        }
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, csv_paths: Iterable[str], compiled_path: Optional[str] = None) -> 'GeoRangeDatabase':
+        """加载范围库：编译缓存与CSV一致时直接读取 pickle，否则重新导入并写回缓存"""
+        paths = [p for p in csv_paths if p and os.path.exists(p)]
+        db = cls()
+        if not paths:
+            return db
+        compiled_path = compiled_path or f"{paths[0]}.compiled.pickle"
+        try:
+            with open(compiled_path, 'rb') as f:
+                payload = pickle.load(f)
+            if (payload.get('version') == COMPILED_FORMAT_VERSION
+                    and payload.get('fingerprint') == cls._fingerprint(paths)):
+                db.v4_starts, db.v4_ends, db.v4_values = payload['v4']
+                db.v6_starts, db.v6_ends, db.v6_values = payload['v6']
+                db.labels = payload['labels']
+                db.sources = payload['sources']
+                return db
+        except (OSError, pickle.UnpicklingError, EOFError, KeyError, ValueError):
+            pass
+        for path in paths:
+            db.load_csv(path)
+        try:
+            db.save_compiled(compiled_path)
+        except OSError:
+            pass
+        return db
+
+
+class IPGeolocator:
+    """IP地理位置查询：离线范围库 → 持久化缓存 → ip-api 批量接口（可选）"""
+
+    def __init__(self, db_paths: Optional[Iterable[str]] = None, cache_path: str = DEFAULT_GEO_CACHE_PATH,
+                 online_fallback: bool = True, cache_ttl_days: float = 30, logger=None):
+        self.database = GeoRangeDatabase.load(db_paths if db_paths is not None else DEFAULT_GEO_DB_PATHS)
+        self.online_fallback = online_fallback
+        self.cache_ttl = cache_ttl_days * 86400
+        self.logger = logger
+        self.stats = {'local': 0, 'cache': 0, 'online': 0, 'failed': 0, 'reserved': 0}
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(cache_path)), exist_ok=True)
+        self._conn = sqlite3.connect(cache_path, check_same_thread=False, timeout=30)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS ip_geo (
+                ip TEXT PRIMARY KEY,
+                info TEXT NOT NULL,
+                fetched_at REAL NOT NULL
+            )
+        ''')
+        self._conn.commit()
+
+    def _log(self, message: str):
+        if self.logger:
+            self.logger(message)
+
+    def _cache_get_many(self, ips: List[str]) -> Dict[str, Dict]:
+        found = {}
+        cutoff = time.time() - self.cache_ttl
+        with self._lock:
+            for i in range(0, len(ips), 500):
+                chunk = ips[i:i + 500]
+                rows = self._conn.execute(
+                    f"SELECT ip, info FROM ip_geo WHERE fetched_at >= ? AND ip IN ({','.join('?' * len(chunk))})",
+                    [cutoff] + chunk
+                ).fetchall()
+                for ip, info in rows:
+                    found[ip] = json.loads(info)
+        return found
+
+    def _cache_put_many(self, infos: List[Dict]):
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO ip_geo VALUES (?, ?, ?)',
+                [(info['ip'], json.dumps(info, ensure_ascii=False), now) for info in infos]
+            )
+            self._conn.commit()
+
+    def _query_ip_api_batch(self, ips: List[str]) -> Dict[str, Dict]:
+        """调用 ip-api 批量接口，返回成功查询的结果（失败的IP不缓存）"""
+        results = {}
+        for i in range(0, len(ips), IP_API_BATCH_SIZE):
+            if i:
+                time.sleep(IP_API_BATCH_INTERVAL_SEC)
+            chunk = ips[i:i + IP_API_BATCH_SIZE]
+            request = urllib.request.Request(
+                IP_API_BATCH_URL, data=json.dumps(chunk).encode('utf-8'),
+                headers={'Content-Type': 'application/json'}, method='POST'
+            )
+            try:
+                with urllib.request.urlopen(request, timeout=IP_API_TIMEOUT_SEC) as response:
+                    data = json.loads(response.read().decode('utf-8'))
+            except Exception as e:
+                self._log(f"    ip-api batch query failed for {len(chunk)} IPs: {e}")
+                continue
+            for item in data:
+                ip = item.get('query')
+                if not ip:
+                    continue
+                info = _empty_geo(ip)
+                if item.get('status') == 'success':
+                    info.update(countryCode=item.get('countryCode', 'N/A'),
+                                isp=item.get('isp', 'N/A'), org=item.get('org', 'N/A'))
+                else:
+                    info['error'] = item.get('message', 'ip-api.com returned non-success status')
+                results[ip] = info
+        return results
+
+    def lookup_many(self, ips: Iterable[str]) -> Dict[str, Dict]:
+        """批量查询，返回 {ip: geo_info}"""
+        pending = list(dict.fromkeys(ips))
+        results: Dict[str, Dict] = {}
+
+        # 1. 保留/私有地址与离线范围库
+        misses = []
+        for ip in pending:
+            info = _empty_geo(ip)
+            try:
+                address = ipaddress.ip_address(ip)
+            except ValueError:
+                info['error'] = 'invalid IP'
+                results[ip] = info
+                self.stats['failed'] += 1
+                continue
+            if not address.is_global:
+                info['error'] = 'reserved range'
+                results[ip] = info
+                self.stats['reserved'] += 1
+                continue
+            label = self.database.lookup(ip)
+            if label is not None:
+                country, asn, org = label
+                info.update(countryCode=country, isp=org or asn or 'N/A', org=org or 'N/A')
+                info['source'] = 'local'
+                results[ip] = info
+                self.stats['local'] += 1
+            else:
+                misses.append(ip)
+
+        # 2. 持久化缓存
+        if misses:
+            cached = self._cache_get_many(misses)
+            for ip, info in cached.items():
+                info['source'] = 'cache'
+                results[ip] = info
+            self.stats['cache'] += len(cached)
+            misses = [ip for ip in misses if ip not in cached]
+
+        # 3. ip-api 批量接口
+        if misses and self.online_fallback:
+            self._log(f"    Geo: {len(misses)} IPs not in local database, querying ip-api batch endpoint...")
+            fetched = self._query_ip_api_batch(misses)
+            self._cache_put_many([info for info in fetched.values() if not info['error']])
+            for ip, info in fetched.items():
+                info['source'] = 'ip-api'
+                results[ip] = info
+            self.stats['online'] += len(fetched)
+            misses = [ip for ip in misses if ip not in fetched]
+
+        for ip in misses:
+            info = _empty_geo(ip)
+            info['error'] = 'not found in local geo database'
+            results[ip] = info
+            self.stats['failed'] += 1
+        return {ip: results[ip] for ip in pending}
+
+    def lookup(self, ip: str) -> Dict:
+        return self.lookup_many([ip])[ip]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_default_geolocator: Optional[IPGeolocator] = None
+_default_lock = threading.Lock()
+
+
+def get_geolocator(**kwargs) -> IPGeolocator:
+    """获取进程内共享的地理位置查询实例"""
+    global _default_geolocator
+    with _default_lock:
+        if _default_geolocator is None:
+            _default_geolocator = IPGeolocator(**kwargs)
+        return _default_geolocator
@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""
+IP前缀索引（IPv4 + IPv6）
+替代 HybridIPClassifier 中逐个 IPv4Network 线性判断 ip in network 的查找方式
+
+- 网段（CIDR 或 起始-结束）转换为整数区间，同标签的相邻/重叠区间合并，按起始地址排序
+- 查找：bisect 二分，O(log n)；IPv4 起止地址为紧凑的无符号数组
+- 从范围文件构建时按文件 mtime/大小 缓存为 pickle，再次加载无需重新解析
+- 命令行: python ip_prefix_index.py bench [--count 1000000] 对随机IP做分类基准测试
+"""
+
+import argparse
+import bisect
+import ipaddress
+import os
+import pickle
+import random
+import socket
+import sys
+import time
+from array import array
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+COMPILED_FORMAT_VERSION = 1
+
+
+def parse_range(text: str) -> Tuple[int, int, int]:
+    """CIDR / 单个地址 / 起始-结束 → (版本, 起始整数, 结束整数)"""
+    text = text.strip()
+    if '-' in text:
+        first, last = (ipaddress.ip_address(part.strip()) for part in text.split('-', 1))
+        if first.version != last.version or int(last) < int(first):
+            raise ValueError(f"无效的地址范围: {text}")
+        return first.version, int(first), int(last)
+    network = ipaddress.ip_network(text, strict=False)
+    return network.version, int(network.network_address), int(network.broadcast_address)
+
+
+def ip_to_int(ip: str) -> Tuple[int, int]:
+    """地址字符串 → (版本, 整数)；inet_pton 比 ipaddress 快一个数量级"""
+    try:
+        return 4, int.from_bytes(socket.inet_pton(socket.AF_INET, ip), 'big')
+    except OSError:
+        pass
+    try:
+        return 6, int.from_bytes(socket.inet_pton(socket.AF_INET6, ip.split('%', 1)[0]), 'big')
+    except OSError:
+        raise ValueError(f"无效的IP地址: {ip}")
+
+
+class PrefixIndex:
+    """带标签的有序区间索引
+
+    不同标签的区间不应重叠；重叠时重叠部分归属于起始地址较小的区间。
+    """
+
+    def __init__(self):
+        self.v4_starts = array('L')
+        self.v4_ends = array('L')
+        self.v4_values = array('H')
+        self.v6_starts: List[int] = []
+        self.v6_ends: List[int] = []
+        self.v6_values: List[int] = []
+        self.labels: List[str] = []
+        self.sources: List[str] = []
+        self._pending: List[Tuple[int, int, int, int]] = []
+
+    def __len__(self):
+        return len(self.v4_starts) + len(self.v6_starts)
+
+    # ------------------------------------------------------------------
+    # 构建
+    # ------------------------------------------------------------------
+
+    def _label_id(self, label: str) -> int:
+        try:
+            return self.labels.index(label)
+        except ValueError:
+            self.labels.append(label)
+            return len(self.labels) - 1
+
+    def add(self, text: str, label: str = '') -> bool:
+        """添加一个网段，无法解析时返回 False；添加完成后需调用 build()"""
+        try:
+            version, start, end = parse_range(text)
+        except ValueError:
+            return False
+        self._pending.append((version, start, end, self._label_id(label)))
+        return True
+
+    def add_many(self, ranges: Iterable[str], label: str = '') -> int:
+        return sum(1 for text in ranges if self.add(text, label))
+
+    def load_file(self, path: str, label: str = '') -> int:
+        """读取范围文件：每行一个 CIDR 或 起始-结束，# 开头为注释，行内第一列有效"""
+        count = 0
+        with open(path, 'r', encoding='utf-8-sig') as f:
+            for line in f:
+                line = line.split('#', 1)[0].strip()
+                if line and self.add(line.split()[0], label):
+                    count += 1
+        self.sources.append(path)
+        return count
+
+    @staticmethod
+    def _merge(intervals: List[Tuple[int, int, int]]) -> List[Tuple[int, int, int]]:
+        merged: List[Tuple[int, int, int]] = []
+        for start, end, value in sorted(intervals):
+            if merged:
+                last_start, last_end, last_value = merged[-1]
+                if value == last_value and start <= last_end + 1:
+                    merged[-1] = (last_start, max(last_end, end), value)
+                    continue
+                if start <= last_end:
+                    if end <= last_end:
+                        continue
+                    start = last_end + 1
+            merged.append((start, end, value))
+        return merged
+
+    def build(self) -> 'PrefixIndex':
+        """合并待添加网段与已有区间"""
+        v4 = list(zip(self.v4_starts, self.v4_ends, self.v4_values))
+        v6 = list(zip(self.v6_starts, self.v6_ends, self.v6_values))
+        for version, start, end, value in self._pending:
+            (v4 if version == 4 else v6).append((start, end, value))
+        self._pending = []
+        v4, v6 = self._merge(v4), self._merge(v6)
+        self.v4_starts = array('L', (r[0] for r in v4))
+        self.v4_ends = array('L', (r[1] for r in v4))
+        self.v4_values = array('H', (r[2] for r in v4))
+        self.v6_starts = [r[0] for r in v6]
+        self.v6_ends = [r[1] for r in v6]
+        self.v6_values = [r[2] for r in v6]
+        return self
+
+    @classmethod
+    def from_ranges(cls, ranges: Iterable[str], label: str = '') -> 'PrefixIndex':
+        index = cls()
+        index.add_many(ranges, label)
+        return index.build()
+
+    @classmethod
+    def from_labeled(cls, labeled: Dict[str, Iterable[str]]) -> 'PrefixIndex':
+        """{标签: [网段, ...]}，例如 {CDN提供商: CIDR列表}"""
+        index = cls()
+        for label, ranges in labeled.items():
+            index.add_many(ranges, label)
+        return index.build()
+
+    # ------------------------------------------------------------------
+    # 查找
+    # ------------------------------------------------------------------
+
+    def lookup_int(self, version: int, number: int) -> Optional[str]:
+        if version == 4:
+            starts, ends, values = self.v4_starts, self.v4_ends, self.v4_values
+        else:
+            starts, ends, values = self.v6_starts, self.v6_ends, self.v6_values
+        i = bisect.bisect_right(starts, number) - 1
+        if i >= 0 and number <= ends[i]:
+            return self.labels[values[i]]
+        return None
+
+    def lookup(self, ip: str) -> Optional[str]:
+        """返回IP所在区间的标签，不在任何区间或地址无效时返回 None"""
+        try:
+            version, number = ip_to_int(ip)
+        except ValueError:
+            return None
+        return self.lookup_int(version, number)
+
+    def __contains__(self, ip: str) -> bool:
+        return self.lookup(ip) is not None
+
+    def lookup_many(self, ips: Iterable[str]) -> List[Optional[str]]:
+        """批量查找（局部变量绑定，省去逐次属性查找）"""
+        bisect_right = bisect.bisect_right
+        pton, af4, af6 = socket.inet_pton, socket.AF_INET, socket.AF_INET6
+        from_bytes = int.from_bytes
+        labels = self.labels
+        v4 = (self.v4_starts, self.v4_ends, self.v4_values)
+        v6 = (self.v6_starts, self.v6_ends, self.v6_values)
+        results: List[Optional[str]] = []
+        append = results.append
+        for ip in ips:
+            try:
+                number = from_bytes(pton(af4, ip), 'big')
+                starts, ends, values = v4
+            except OSError:
+                try:
+                    number = from_bytes(pton(af6, ip.split('%', 1)[0]), 'big')
+                except OSError:
+                    append(None)
+                    continue
+                starts, ends, values = v6
+            i = bisect_right(starts, number) - 1
+            append(labels[values[i]] if i >= 0 and number <= ends[i] else None)
+        return results
+
+    # ------------------------------------------------------------------
+    # 编译缓存
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _fingerprint(paths: Sequence[str]) -> List[Tuple[str, int, int]]:
+        result = []
+        for path in paths:
+            st = os.stat(path)
+            result.append((os.path.abspath(path), st.st_size, st.st_mtime_ns))
+        return result
+
+    def save_compiled(self, path: str):
+        payload = {
+            'version': COMPILED_FORMAT_VERSION,
+            'fingerprint': self._fingerprint(self.sources),
+            'v4': (self.v4_starts, self.v4_ends, self.v4_values),
+            'v6': (self.v6_starts, self.v6_ends, self.v6_values),
+            'labels': self.labels,
+            'sources': self.sources
+        }
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load_files(cls, labeled_paths: Sequence[Tuple[str, str]],
+                   compiled_path: Optional[str] = None) -> 'PrefixIndex':
+        """从 [(范围文件, 标签), ...] 加载：编译缓存与文件一致时直接读取 pickle，否则重新构建并写回缓存"""
+        labeled_paths = [(path, label) for path, label in labeled_paths if path and os.path.exists(path)]
+        index = cls()
+        if not labeled_paths:
+            return index
+        paths = [path for path, _label in labeled_paths]
+        compiled_path = compiled_path or f"{paths[0]}.compiled.pickle"
+        try:
+            with open(compiled_path, 'rb') as f:
+                payload = pickle.load(f)
+            if (payload.get('version') == COMPILED_FORMAT_VERSION
+                    and payload.get('fingerprint') == cls._fingerprint(paths)):
+                index.v4_starts, index.v4_ends, index.v4_values = payload['v4']
+                index.v6_starts, index.v6_ends, index.v6_values = payload['v6']
+                index.labels = payload['labels']
+                index.sources = payload['sources']
+                return index
+        except (OSError, pickle.UnpicklingError, EOFError, KeyError, ValueError):
+            pass
+        for path, label in labeled_paths:
+            index.load_file(path, label)
+        index.build()
+        try:
+            index.save_compiled(compiled_path)
+        except OSError:
+            pass
+        return index
+
+
+# ---------------------------------------------------------------------------
+# 基准测试
+# ---------------------------------------------------------------------------
+
+def random_ips(count: int, seed: int = 1) -> List[str]:
+    rng = random.Random(seed)
+    return [socket.inet_ntoa(rng.getrandbits(32).to_bytes(4, 'big')) for _ in range(count)]
+
+
+def benchmark(count: int = 1000000, linear_sample: int = 20000) -> Dict[str, float]:
+    """用 HybridIPClassifier 的网段对随机IPv4分类，对比原线性扫描（抽样后按比例折算）"""
+    import tempfile
+    from hybrid_ip_classifier import HybridIPClassifier
+
+    classifier = HybridIPClassifier(config_file=os.path.join(tempfile.mkdtemp(), 'hybrid_ip_config.json'))
+    ips = random_ips(count)
+
+    started = time.perf_counter()
+    china = classifier.china_index.lookup_many(ips)
+    cdn = classifier.cdn_index.lookup_many(ips)
+    indexed = time.perf_counter() - started
+
+    sample = ips[:linear_sample]
+    networks = [ipaddress.ip_network(r) for r in classifier.china_ip_ranges]
+    cdn_networks = [(p, ipaddress.ip_network(r)) for p, ranges in classifier.cdn_providers.items() for r in ranges]
+    started = time.perf_counter()
+    for ip in sample:
+        address = ipaddress.IPv4Address(ip)
+        if not any(address in network for network in networks):
+            next((p for p, network in cdn_networks if address in network), None)
+    linear = (time.perf_counter() - started) * count / len(sample)
+
+    return {
+        'count': count,
+        'china_hits': sum(1 for r in china if r is not None),
+        'cdn_hits': sum(1 for r in cdn if r is not None),
+        'indexed_sec': indexed,
+        'linear_sec_estimated': linear,
+        'speedup': linear / indexed if indexed else float('inf'),
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='IP前缀索引')
+    sub = parser.add_subparsers(dest='command', required=True)
+    bench = sub.add_parser('bench', help='对随机IP做分类基准测试')
+    bench.add_argument('--count', type=int, default=1000000)
+    args = parser.parse_args(argv)
+
+    if args.command == 'bench':
+        result = benchmark(args.count)
+        print(f"随机IPv4: {result['count']} 个 (中国 {result['china_hits']} / CDN {result['cdn_hits']})")
+        print(f"前缀索引: {result['indexed_sec']:.2f}s ({result['count'] / result['indexed_sec']:.0f} IP/s)")
+        print(f"线性扫描(估算): {result['linear_sec_estimated']:.2f}s")
+        print(f"加速比: {result['speedup']:.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
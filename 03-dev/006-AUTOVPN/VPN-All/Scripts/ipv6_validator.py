@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+IPv6域名并发验证流水线
+替代 validate_ipv6_domains / quick_validate_ipv6 / resolve_ip_remote 中逐域名、逐服务器、
+逐地址逐端口（每次5秒超时）的串行验证
+
+- 第一阶段：全部域名的 A/AAAA 记录通过异步批量解析引擎一次性查询（经持久化DNS缓存）
+- 第二阶段：所有待测地址按端口并发发起非阻塞连接（tcp_prober），总耗时约为一个超时周期
+- 验证结果持久化（SQLite），以地址集合指纹判断记录是否变化：
+  记录未变且上次验证未过期的域名直接复用结果，只重新验证变化或过期的域名
+- 结果字典结构沿用原逐域名验证函数（test_domain_ipv6_support）的字段
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+DEFAULT_CACHE_PATH = os.environ.get(
+    'AUTOVPN_IPV6_CACHE',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ipv6_validation.sqlite3')
+)
+
+# (名称, 服务器) 与原验证脚本一致
+DEFAULT_DNS_SERVERS = [
+    ("Google", "8.8.8.8"),
+    ("Cloudflare", "1.1.1.1"),
+    ("Quad9", "9.9.9.9"),
+    ("OpenDNS", "208.67.222.222"),
+]
+
+# 验证结果有效期（秒），超过后即使记录未变化也重新验证
+DEFAULT_MAX_AGE = 24 * 3600
+
+# 解析函数：domains -> {域名: (ipv4列表, ipv6列表, 错误列表)}
+ResolveFunc = Callable[[List[str]], Mapping[str, Tuple[List[str], List[str], List[str]]]]
+# 探测函数：(地址列表, 端口) -> {地址: 是否可连接}
+ProbeFunc = Callable[[List[str], int], Mapping[str, Optional[bool]]]
+
+
+def empty_result(domain: str) -> Dict:
+    """单个域名的验证结果结构"""
+    return {
+        "domain": domain,
+        "supports_ipv6": False,
+        "ipv6_addresses": [],
+        "ipv4_addresses": [],
+        "connectivity_test": {
+            "ipv6_http_reachable": False,
+            "ipv6_https_reachable": False,
+            "ipv4_http_reachable": False,
+            "ipv4_https_reachable": False
+        },
+        "dns_servers_tested": [],
+        "errors": []
+    }
+
+
+def records_fingerprint(ipv4: Iterable[str], ipv6: Iterable[str]) -> str:
+    """地址集合指纹（与应答顺序无关）"""
+    text = ','.join(sorted(set(ipv6))) + '|' + ','.join(sorted(set(ipv4)))
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+class IPv6Validator:
+    """批量IPv6验证器
+
+    resolve_func / probe_func 可替换（默认分别使用 async_dns_resolver 与 tcp_prober）。
+    """
+
+    def __init__(self, servers: Sequence[Tuple[str, str]] = DEFAULT_DNS_SERVERS, timeout: float = 3.0,
+                 ports: Tuple[int, int] = (80, 443), max_age: float = DEFAULT_MAX_AGE,
+                 cache_path: Optional[str] = DEFAULT_CACHE_PATH, resolve_func: Optional[ResolveFunc] = None,
+                 probe_func: Optional[ProbeFunc] = None, logger: Optional[Callable[[str], None]] = None):
+        self.servers = list(servers)
+        self.timeout = timeout
+        self.http_port, self.https_port = ports
+        self.max_age = max_age
+        self.cache_path = cache_path
+        self._resolve = resolve_func or self._resolve_async
+        self._probe = probe_func or self._probe_tcp
+        self._log = logger or (lambda message: None)
+        self._lock = threading.RLock()
+        self._conn = None
+        if cache_path:
+            os.makedirs(os.path.dirname(os.path.abspath(cache_path)), exist_ok=True)
+            self._conn = sqlite3.connect(cache_path, check_same_thread=False)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS ipv6_validation ('
+                'domain TEXT PRIMARY KEY, fingerprint TEXT NOT NULL, checked_at REAL NOT NULL, '
+                'result TEXT NOT NULL)'
+            )
+            self._conn.commit()
+        self.stats = {'resolved': 0, 'validated': 0, 'reused': 0, 'probes': 0}
+
+    # ------------------------------------------------------------------
+    # 默认解析 / 探测实现
+    # ------------------------------------------------------------------
+
+    def _resolve_async(self, domains: List[str]) -> Dict[str, Tuple[List[str], List[str], List[str]]]:
+        from async_dns_resolver import resolve_domains
+        try:
+            from dns_cache import get_dns_cache
+            cache = get_dns_cache()
+        except ImportError:
+            cache = None
+        names = {server: name for name, server in self.servers}
+        resolutions = resolve_domains(domains, [server for _name, server in self.servers], ipv6_enable=True,
+                                      timeout=self.timeout, cache=cache)
+        results = {}
+        for domain, resolution in resolutions.items():
+            errors = [f"{names.get(a.server, a.server)} {a.rtype}查询失败: {a.error}"
+                      for a in resolution.answers if not a.ok and a.error]
+            results[domain] = (resolution.ipv4, resolution.ipv6, errors)
+        return results
+
+    def _probe_tcp(self, addresses: List[str], port: int) -> Dict[str, Optional[bool]]:
+        from tcp_prober import ConnectivityProber
+        # 每个端口独立探测器：探测器按IP缓存结果，不能跨端口复用
+        return ConnectivityProber(timeout=self.timeout, cache_ttl=0).probe_many(addresses, [port])
+
+    # ------------------------------------------------------------------
+    # 结果缓存
+    # ------------------------------------------------------------------
+
+    def _cached(self, domains: List[str]) -> Dict[str, Tuple[str, float, Dict]]:
+        if self._conn is None or not domains:
+            return {}
+        rows = {}
+        with self._lock:
+            for start in range(0, len(domains), 500):
+                chunk = domains[start:start + 500]
+                query = ('SELECT domain, fingerprint, checked_at, result FROM ipv6_validation '
+                         f'WHERE domain IN ({",".join("?" * len(chunk))})')
+                for domain, fingerprint, checked_at, result in self._conn.execute(query, chunk):
+                    rows[domain] = (fingerprint, checked_at, json.loads(result))
+        return rows
+
+    def _save(self, entries: List[Tuple[str, str, float, Dict]]):
+        if self._conn is None or not entries:
+            return
+        with self._lock:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO ipv6_validation (domain, fingerprint, checked_at, result) '
+                'VALUES (?, ?, ?, ?)',
+                [(domain, fingerprint, checked_at, json.dumps(result, ensure_ascii=False))
+                 for domain, fingerprint, checked_at, result in entries]
+            )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    # ------------------------------------------------------------------
+    # 流水线
+    # ------------------------------------------------------------------
+
+    def resolve(self, domains: Iterable[str]) -> Dict[str, Dict]:
+        """仅第一阶段：批量解析 A/AAAA，返回未做连通性测试的结果字典"""
+        domains = list(dict.fromkeys(domains))
+        resolved = self._resolve(domains) if domains else {}
+        self.stats['resolved'] += len(domains)
+        results = {}
+        for domain in domains:
+            ipv4, ipv6, errors = resolved.get(domain, ([], [], ['DNS解析失败']))
+            result = empty_result(domain)
+            result["ipv4_addresses"] = list(dict.fromkeys(ipv4))
+            result["ipv6_addresses"] = list(dict.fromkeys(ipv6))
+            result["supports_ipv6"] = bool(result["ipv6_addresses"])
+            result["dns_servers_tested"] = [name for name, _server in self.servers]
+            result["errors"] = list(errors)
+            results[domain] = result
+        return results
+
+    def probe_addresses(self, addresses: Iterable[str]) -> Dict[str, Dict[int, bool]]:
+        """所有地址在 HTTP/HTTPS 端口上并发探测，返回 {地址: {端口: 是否可连接}}"""
+        addresses = list(dict.fromkeys(addresses))
+        if not addresses:
+            return {}
+        ports = [self.http_port, self.https_port]
+        with ThreadPoolExecutor(max_workers=len(ports)) as pool:
+            per_port = dict(zip(ports, pool.map(lambda port: self._probe(addresses, port), ports)))
+        self.stats['probes'] += len(addresses) * len(ports)
+        return {address: {port: bool(per_port[port].get(address)) for port in ports} for address in addresses}
+
+    def validate(self, domains: Iterable[str], force: bool = False,
+                 progress_callback: Optional[Callable[[Dict], None]] = None) -> Dict[str, Dict]:
+        """批量验证，返回 {域名: 结果字典}（按输入顺序）
+
+        记录未变化且上次验证未超过 max_age 的域名复用缓存结果（result["cached"] 为 True），
+        force=True 时全部重新验证。
+        """
+        results = self.resolve(domains)
+        now = time.time()
+        cached = {} if force else self._cached(list(results))
+        fingerprints = {domain: records_fingerprint(r["ipv4_addresses"], r["ipv6_addresses"])
+                        for domain, r in results.items()}
+
+        todo = []
+        for domain, result in results.items():
+            entry = cached.get(domain)
+            if entry and entry[0] == fingerprints[domain] and now - entry[1] <= self.max_age:
+                result["connectivity_test"] = entry[2]["connectivity_test"]
+                result["cached"] = True
+                self.stats['reused'] += 1
+            elif result["supports_ipv6"]:
+                todo.append(domain)
+            else:
+                result["cached"] = False
+        if todo:
+            self._log(f"并发验证 {len(todo)} 个域名的IPv6连通性（复用 {self.stats['reused']} 个缓存结果）")
+        reachability = self.probe_addresses(
+            [a for d in todo for a in results[d]["ipv6_addresses"] + results[d]["ipv4_addresses"]])
+
+        to_save = []
+        for domain, result in results.items():
+            if domain in todo:
+                result["cached"] = False
+                test = result["connectivity_test"]
+                for family in ("ipv6", "ipv4"):
+                    states = [reachability[a] for a in result[f"{family}_addresses"]]
+                    test[f"{family}_http_reachable"] = any(s[self.http_port] for s in states)
+                    test[f"{family}_https_reachable"] = any(s[self.https_port] for s in states)
+                self.stats['validated'] += 1
+            if not result["cached"]:
+                to_save.append((domain, fingerprints[domain], now, result))
+            if progress_callback:
+                progress_callback(result)
+        self._save(to_save)
+        return results
+
+
+def validate_connectivity(addresses: Iterable[str], timeout: float = 3.0,
+                          ports: Tuple[int, int] = (80, 443)) -> Dict[str, Dict[int, bool]]:
+    """不经缓存，直接并发探测一组地址，返回 {地址: {端口: 是否可连接}}"""
+    return IPv6Validator(timeout=timeout, ports=ports, cache_path=None).probe_addresses(addresses)
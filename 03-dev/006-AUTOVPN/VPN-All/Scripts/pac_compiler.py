@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+"""
+PAC编译器
+替代 wstunnel_proxy.PAC_TEMPLATE 中的 isInNet / 正则链（其中还混入了 Python 的 re.search，浏览器无法执行）
+
+- 域名后缀表：直连后缀与代理后缀编译为一个 JS 对象（哈希表），按主机名逐级去掉最左标签查找，
+  最长后缀优先，查找次数 = 标签数
+- 中国IPv4范围：合并后的有序整数数组（起、止），JS 端二分查找
+- 局域网/回环只对 IP 字面量判断（整数比较），不调用会触发浏览器 DNS 的 isInNet
+- 后缀表命中时不做 DNS；未命中的主机名才 dnsResolve 后按中国IP判断（可关闭）
+- Python 端 CompiledPac.find_proxy 与生成的 JS 逻辑一致，用于基准测试与校验
+- 命令行: python pac_compiler.py bench [--count 100000]
+          python pac_compiler.py build --output proxy.pac [--proxy "SOCKS5 127.0.0.1:1081; DIRECT"]
+"""
+
+import argparse
+import bisect
+import functools
+import json
+import os
+import random
+import re
+import socket
+import sys
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.abspath(os.path.join(SCRIPT_DIR, ".."))
+FOREIGN_DOMAIN_FILE = os.path.join(PROJECT_ROOT, "routes", "境外域名大全.txt")
+
+DIRECT, PROXY = 0, 1
+
+# 国内常见域名（原 PAC_TEMPLATE 中的直连规则）
+DEFAULT_DIRECT_SUFFIXES = (
+    "cn", "baidu.com", "qq.com", "163.com", "weibo.com", "taobao.com",
+    "tmall.com", "jd.com", "alipay.com",
+)
+
+# 局域网/回环（IP 字面量）
+PRIVATE_RANGES = (
+    (0x0A000000, 0x0AFFFFFF),  # 10.0.0.0/8
+    (0x7F000000, 0x7FFFFFFF),  # 127.0.0.0/8
+    (0xAC100000, 0xAC1FFFFF),  # 172.16.0.0/12
+    (0xC0A80000, 0xC0A8FFFF),  # 192.168.0.0/16
+)
+
+PRIVATE_STARTS = [start for start, _end in PRIVATE_RANGES]
+PRIVATE_ENDS = [end for _start, end in PRIVATE_RANGES]
+
+Interval = Tuple[int, int]
+
+PAC_JS = """// AUTOVPN 智能分流PAC（pac_compiler 生成，请勿手工编辑）
+// 域名后缀: __SUFFIX_COUNT__ 条, 中国IPv4区间: __RANGE_COUNT__ 个
+var PROXY = __PROXY__;
+// 后缀 -> 0 直连 / 1 代理
+var SUFFIXES = __SUFFIXES__;
+var PRIVATE_STARTS = __PRIVATE_STARTS__;
+var PRIVATE_ENDS = __PRIVATE_ENDS__;
+var CHINA_STARTS = __CHINA_STARTS__;
+var CHINA_ENDS = __CHINA_ENDS__;
+var RESOLVE_UNKNOWN = __RESOLVE_UNKNOWN__;
+var IPV4 = /^\\d{1,3}\\.\\d{1,3}\\.\\d{1,3}\\.\\d{1,3}$/;
+
+function suffixRule(host) {
+    var pos = 0;
+    while (true) {
+        var rule = SUFFIXES[host.substring(pos)];
+        if (rule === 0 || rule === 1)
+            return rule;
+        pos = host.indexOf(".", pos) + 1;
+        if (pos === 0)
+            return -1;
+    }
+}
+
+function ipToInt(ip) {
+    var p = ip.split(".");
+    return ((p[0] << 24) >>> 0) + (p[1] << 16) + (p[2] << 8) + (p[3] << 0);
+}
+
+function inRanges(n, starts, ends) {
+    var lo = 0, hi = starts.length - 1;
+    while (lo <= hi) {
+        var mid = (lo + hi) >> 1;
+        if (n < starts[mid])
+            hi = mid - 1;
+        else if (n > ends[mid])
+            lo = mid + 1;
+        else
+            return true;
+    }
+    return false;
+}
+
+function FindProxyForURL(url, host) {
+    host = host.toLowerCase();
+    if (isPlainHostName(host))
+        return "DIRECT";
+
+    var ip = null;
+    if (IPV4.test(host)) {
+        ip = host;
+        if (inRanges(ipToInt(ip), PRIVATE_STARTS, PRIVATE_ENDS))
+            return "DIRECT";
+    } else {
+        var rule = suffixRule(host);
+        if (rule === 0)
+            return "DIRECT";
+        if (rule === 1)
+            return PROXY;
+        if (!RESOLVE_UNKNOWN || CHINA_STARTS.length === 0)
+            return PROXY;
+        ip = dnsResolve(host);
+        if (!ip)
+            return PROXY;
+    }
+
+    if (inRanges(ipToInt(ip), CHINA_STARTS, CHINA_ENDS))
+        return "DIRECT";
+    return PROXY;
+}
+"""
+
+
+def normalize_domain(domain: str) -> Optional[str]:
+    """去掉通配符前缀、首尾点与空白；无效时返回 None"""
+    domain = domain.strip().lower().lstrip('*').strip('.')
+    if not domain or any(c.isspace() for c in domain) or '/' in domain or domain == '__proto__':
+        return None
+    return domain
+
+
+def load_domain_file(path: str) -> List[str]:
+    """每行一个域名（# 注释，支持 *.example.com）"""
+    domains = []
+    if not os.path.exists(path):
+        return domains
+    with open(path, 'r', encoding='utf-8-sig', errors='ignore') as f:
+        for line in f:
+            domain = normalize_domain(line.split('#', 1)[0])
+            if domain:
+                domains.append(domain)
+    return domains
+
+
+def load_proxy_domains(paths: Sequence[str] = (FOREIGN_DOMAIN_FILE,), include_store: bool = True) -> List[str]:
+    """境外域名：域名列表文件 + 解析结果库中已解析的域名"""
+    domains = [d for path in paths for d in load_domain_file(path)]
+    if include_store:
+        try:
+            from result_store import get_result_store
+            domains.extend(record.domain for record in get_result_store().resolved())
+        except Exception:
+            pass
+    return domains
+
+
+def _ipv4_to_int(host: str) -> Optional[int]:
+    try:
+        return int.from_bytes(socket.inet_aton(host), 'big') if host.count('.') == 3 else None
+    except OSError:
+        return None
+
+
+class CompiledPac:
+    """编译后的分流规则：后缀表 + 有序区间；find_proxy 与生成的 JS 判断逻辑一致"""
+
+    def __init__(self, proxy: str, direct_suffixes: Iterable[str] = DEFAULT_DIRECT_SUFFIXES,
+                 proxy_suffixes: Iterable[str] = (), china_ranges: Iterable[Interval] = (),
+                 resolve_unknown: bool = True):
+        self.proxy = proxy
+        self.resolve_unknown = resolve_unknown
+        self.suffixes: Dict[str, int] = {}
+        for domain in proxy_suffixes:
+            domain = normalize_domain(domain)
+            if domain:
+                self.suffixes[domain] = PROXY
+        # 同一后缀同时出现在两个列表时直连优先
+        for domain in direct_suffixes:
+            domain = normalize_domain(domain)
+            if domain:
+                self.suffixes[domain] = DIRECT
+        ranges = sorted(china_ranges)
+        self.china_starts = [start for start, _end in ranges]
+        self.china_ends = [end for _start, end in ranges]
+
+    @classmethod
+    def from_sources(cls, proxy: str, proxy_domains: Optional[Iterable[str]] = None,
+                     china_ranges=None, **kwargs) -> 'CompiledPac':
+        """默认数据：境外域名列表 + APNIC 中国IP范围文件（不存在时不做IP判断）"""
+        if proxy_domains is None:
+            proxy_domains = load_proxy_domains()
+        if china_ranges is None:
+            from china_ip_data import get_china_ranges
+            range_set = get_china_ranges()
+            china_ranges = list(range_set.ipv4_ranges()) if range_set is not None else []
+        return cls(proxy, proxy_suffixes=proxy_domains, china_ranges=china_ranges, **kwargs)
+
+    # ------------------------------------------------------------------
+    # Python 端判断（与 JS 一致）
+    # ------------------------------------------------------------------
+
+    def suffix_rule(self, host: str) -> int:
+        suffixes = self.suffixes
+        pos = 0
+        while True:
+            rule = suffixes.get(host[pos:])
+            if rule is not None:
+                return rule
+            pos = host.find('.', pos) + 1
+            if pos == 0:
+                return -1
+
+    @staticmethod
+    def _in_ranges(n: int, starts: Sequence[int], ends: Sequence[int]) -> bool:
+        i = bisect.bisect_right(starts, n) - 1
+        return i >= 0 and n <= ends[i]
+
+    def find_proxy(self, host: str, resolve: Optional[Callable[[str], Optional[str]]] = None) -> str:
+        """resolve 对应浏览器的 dnsResolve；为 None 时未命中后缀表的主机名直接走代理"""
+        host = host.lower()
+        if '.' not in host:
+            return "DIRECT"
+        n = _ipv4_to_int(host)
+        if n is not None:
+            if self._in_ranges(n, PRIVATE_STARTS, PRIVATE_ENDS):
+                return "DIRECT"
+        else:
+            rule = self.suffix_rule(host)
+            if rule == DIRECT:
+                return "DIRECT"
+            if rule == PROXY or not self.resolve_unknown or not self.china_starts or resolve is None:
+                return self.proxy
+            ip = resolve(host)
+            n = _ipv4_to_int(ip) if ip else None
+            if n is None:
+                return self.proxy
+        return "DIRECT" if self._in_ranges(n, self.china_starts, self.china_ends) else self.proxy
+
+    # ------------------------------------------------------------------
+    # 生成 JS
+    # ------------------------------------------------------------------
+
+    def render(self) -> str:
+        dumps = functools.partial(json.dumps, ensure_ascii=False, separators=(',', ':'))
+        suffixes = dict(sorted(self.suffixes.items()))
+        replacements = {
+            "__SUFFIX_COUNT__": str(len(suffixes)),
+            "__RANGE_COUNT__": str(len(self.china_starts)),
+            "__PROXY__": dumps(self.proxy),
+            "__SUFFIXES__": dumps(suffixes),
+            "__PRIVATE_STARTS__": dumps(PRIVATE_STARTS),
+            "__PRIVATE_ENDS__": dumps(PRIVATE_ENDS),
+            "__CHINA_STARTS__": dumps(self.china_starts),
+            "__CHINA_ENDS__": dumps(self.china_ends),
+            "__RESOLVE_UNKNOWN__": "true" if self.resolve_unknown else "false",
+        }
+        return re.sub("|".join(replacements), lambda m: replacements[m.group(0)], PAC_JS)
+
+    def write(self, path: str) -> str:
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8', newline='\n') as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+        return path
+
+
+# ---------------------------------------------------------------------------
+# 基准测试
+# ---------------------------------------------------------------------------
+
+def random_hostnames(count: int, known: Sequence[str], seed: int = 1) -> List[str]:
+    """一半为已知域名的子域名，其余为随机主机名与IP字面量"""
+    rng = random.Random(seed)
+    labels = ['www', 'api', 'cdn', 'img', 'static', 'm', 'login']
+    tlds = ['com', 'net', 'org', 'io', 'cn', 'jp']
+    hosts = []
+    for i in range(count):
+        kind = i % 10
+        if kind < 5 and known:
+            hosts.append(f"{rng.choice(labels)}.{rng.choice(known)}")
+        elif kind < 9:
+            hosts.append(f"{rng.choice(labels)}.h{rng.getrandbits(24):x}.{rng.choice(tlds)}")
+        else:
+            hosts.append(socket.inet_ntoa(rng.getrandbits(32).to_bytes(4, 'big')))
+    return hosts
+
+
+def _linear_baseline(pac: CompiledPac) -> Callable[[str], str]:
+    """逐条后缀正则匹配（原 PAC 规则链的写法），用于对比"""
+    rules = [(re.compile(r'(^|\.)' + re.escape(suffix) + r'$'), rule) for suffix, rule in pac.suffixes.items()]
+
+    def find(host: str) -> str:
+        host = host.lower()
+        best, best_len = -1, -1
+        for pattern, rule in rules:
+            match = pattern.search(host)
+            if match and len(host) - match.start() > best_len:
+                best, best_len = rule, len(host) - match.start()
+        if best == DIRECT:
+            return "DIRECT"
+        if best == PROXY:
+            return pac.proxy
+        return pac.find_proxy(host)
+    return find
+
+
+def benchmark(count: int = 100000, pac: Optional[CompiledPac] = None,
+              linear_sample: int = 2000) -> Dict[str, float]:
+    """对 count 个主机名执行 PAC 判断（不做DNS），与逐条匹配的规则链对比"""
+    pac = pac or CompiledPac.from_sources("SOCKS5 127.0.0.1:1081; DIRECT")
+    known = sorted(pac.suffixes)
+    hosts = random_hostnames(count, known)
+
+    started = time.perf_counter()
+    results = [pac.find_proxy(host) for host in hosts]
+    compiled = time.perf_counter() - started
+
+    baseline = _linear_baseline(pac)
+    sample = hosts[:linear_sample]
+    started = time.perf_counter()
+    for host in sample:
+        baseline(host)
+    linear = (time.perf_counter() - started) * count / max(1, len(sample))
+
+    return {
+        'count': count,
+        'suffixes': len(pac.suffixes),
+        'china_ranges': len(pac.china_starts),
+        'direct': sum(1 for r in results if r == "DIRECT"),
+        'compiled_sec': compiled,
+        'linear_sec_estimated': linear,
+        'speedup': linear / compiled if compiled else float('inf'),
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='PAC编译器')
+    sub = parser.add_subparsers(dest='command', required=True)
+    bench = sub.add_parser('bench', help='对随机主机名执行PAC判断的基准测试')
+    bench.add_argument('--count', type=int, default=100000)
+    build = sub.add_parser('build', help='生成智能分流PAC文件')
+    build.add_argument('--output', required=True)
+    build.add_argument('--proxy', default="SOCKS5 127.0.0.1:1081; PROXY 127.0.0.1:8081; DIRECT")
+    build.add_argument('--no-resolve', action='store_true', help='未命中后缀表的主机名不做DNS直接走代理')
+    args = parser.parse_args(argv)
+
+    if args.command == 'bench':
+        result = benchmark(args.count)
+        print(f"主机名: {result['count']} 个 (后缀 {result['suffixes']} 条, 中国区间 {result['china_ranges']} 个, "
+              f"直连 {result['direct']})")
+        print(f"编译后查找: {result['compiled_sec']:.3f}s ({result['count'] / result['compiled_sec']:.0f} 次/秒)")
+        print(f"逐条匹配(估算): {result['linear_sec_estimated']:.2f}s")
+        print(f"加速比: {result['speedup']:.1f}x")
+    else:
+        pac = CompiledPac.from_sources(args.proxy, resolve_unknown=not args.no_resolve)
+        pac.write(args.output)
+        print(f"已生成 {args.output}: 后缀 {len(pac.suffixes)} 条, 中国区间 {len(pac.china_starts)} 个")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,56 +2,10 @@
 """
 快速IPv6域名验证脚本 - 简化版
 专注于测试最可靠的IPv6域名
+只做 AAAA/A 批量解析（ipv6_validator 第一阶段），不测试连通性
 """
 
-import dns.resolver
-import socket
-import time
-import sys
-from typing import List, Dict
-
-def quick_ipv6_test(domain: str) -> Dict:
-    """快速测试域名IPv6支持"""
-    result = {
-        "domain": domain,
-        "supports_ipv6": False,
-        "ipv6_addresses": [],
-        "ipv4_addresses": [],
-        "errors": []
-    }
-    
-    try:
-        # 使用Google DNS测试AAAA记录
-        resolver = dns.resolver.Resolver()
-        resolver.nameservers = ["8.8.8.8"]
-        resolver.timeout = 3
-        resolver.lifetime = 5
-        
-        # 测试AAAA记录 (IPv6)
-        try:
-            ipv6_answers = resolver.resolve(domain, "AAAA")
-            for rdata in ipv6_answers:
-                ipv6_addr = rdata.address
-                if ipv6_addr and ipv6_addr not in result["ipv6_addresses"]:
-                    result["ipv6_addresses"].append(ipv6_addr)
-                    result["supports_ipv6"] = True
-        except Exception as e:
-            result["errors"].append(f"AAAA查询失败: {str(e)}")
-        
-        # 测试A记录 (IPv4) 用于对比
-        try:
-            ipv4_answers = resolver.resolve(domain, "A")
-            for rdata in ipv4_answers:
-                ipv4_addr = rdata.address
-                if ipv4_addr and ipv4_addr not in result["ipv4_addresses"]:
-                    result["ipv4_addresses"].append(ipv4_addr)
-        except Exception as e:
-            result["errors"].append(f"A查询失败: {str(e)}")
-            
-    except Exception as e:
-        result["errors"].append(f"DNS解析失败: {str(e)}")
-    
-    return result
+from ipv6_validator import IPv6Validator
 
 def main():
     """主函数 - 测试核心IPv6域名"""
@@ -87,10 +41,13 @@ def main():
     ipv6_supported = []
     ipv6_not_supported = []
     
+    # 所有域名一次性批量解析（仅使用 Google DNS）
+    results = IPv6Validator(servers=[("Google", "8.8.8.8")], cache_path=None).resolve(core_ipv6_domains)
+    
     for i, domain in enumerate(core_ipv6_domains, 1):
-        print(f"正在测试 {i}/{len(core_ipv6_domains)}: {domain}")
+        print(f"已测试 {i}/{len(core_ipv6_domains)}: {domain}")
         
-        result = quick_ipv6_test(domain)
+        result = results[domain]
         
         if result["supports_ipv6"] and result["ipv6_addresses"]:
             ipv6_supported.append(result)
@@ -98,9 +55,6 @@ def main():
         else:
             ipv6_not_supported.append(result)
             print(f"  ❌ {domain} 不支持IPv6")
-        
-        # 短暂延迟避免过快
-        time.sleep(0.3)
     
     # 生成结果文件
     print(f"\n验证完成!")
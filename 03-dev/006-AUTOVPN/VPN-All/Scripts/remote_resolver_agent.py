@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+境外服务器常驻解析代理
+替代"每个域名上传一次脚本、exec 一次、删除一次"的远程解析方式
+
+- 通过一条 SSH 会话启动一个常驻远程进程（python3 -c，无需上传文件），
+  以 JSON lines 协议收发请求/应答，多个域名流水线式发送
+- 远程进程内多线程解析（有 dig 时用 dig 获取TTL，否则用 getaddrinfo）
+- 传输层可替换：ParamikoTransport（SSH 通道）/ LocalProcessTransport（本机子进程，无需SSH，用于测试）
+- 会话中断时自动重建一次并重发未完成的请求
+"""
+
+import abc
+import base64
+import itertools
+import json
+import queue
+import subprocess
+import sys
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# 应答结果 (地址列表, TTL, 错误)，与 dns_cache 的 fetch 约定一致
+FetchResult = Tuple[List[str], Optional[int], Optional[str]]
+
+AGENT_NAME = 'autovpn-resolver'
+AGENT_VERSION = 1
+
+# 远程代理源码：仅依赖标准库，兼容 Python 3.6+
+AGENT_SOURCE = r'''
+import json, shutil, socket, subprocess, sys, threading
+from concurrent.futures import ThreadPoolExecutor
+
+BACKEND = sys.argv[1] if len(sys.argv) > 1 and sys.argv[1] != 'auto' else ('dig' if shutil.which('dig') else 'socket')
+_out_lock = threading.Lock()
+
+
+def emit(obj):
+    with _out_lock:
+        sys.stdout.write(json.dumps(obj) + '\n')
+        sys.stdout.flush()
+
+
+def resolve_dig(domain, rtype):
+    proc = subprocess.run(['dig', '+noall', '+answer', '+comments', '+time=3', '+tries=2', domain, rtype],
+                          stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, universal_newlines=True, timeout=30)
+    addresses, ttls = [], []
+    for line in proc.stdout.splitlines():
+        if 'status: NXDOMAIN' in line:
+            return [], None, 'NXDOMAIN'
+        if 'status: SERVFAIL' in line:
+            return [], None, 'SERVFAIL'
+        fields = line.split()
+        if len(fields) >= 5 and not line.startswith(';') and fields[3] == rtype:
+            addresses.append(fields[4])
+            if fields[1].isdigit():
+                ttls.append(int(fields[1]))
+    if addresses:
+        return addresses, min(ttls) if ttls else None, None
+    if 'status: NOERROR' in proc.stdout:
+        return [], None, 'NoAnswer'
+    return [], None, 'Timeout' if 'timed out' in proc.stdout else 'RemoteFailed'
+
+
+def resolve_socket(domain, rtype):
+    family = socket.AF_INET6 if rtype == 'AAAA' else socket.AF_INET
+    try:
+        infos = socket.getaddrinfo(domain, None, family, socket.SOCK_STREAM)
+    except socket.gaierror as e:
+        if e.errno in (getattr(socket, 'EAI_NONAME', None), getattr(socket, 'EAI_NODATA', None)):
+            return [], None, 'NXDOMAIN'
+        if e.errno == getattr(socket, 'EAI_AGAIN', None):
+            return [], None, 'SERVFAIL'
+        return [], None, 'RemoteFailed'
+    addresses = []
+    for info in infos:
+        if info[4][0] not in addresses:
+            addresses.append(info[4][0])
+    return addresses, None, None if addresses else 'NoAnswer'
+
+
+RESOLVE = resolve_dig if BACKEND == 'dig' else resolve_socket
+
+
+def handle(request):
+    rtype = request.get('rtype', 'A')
+    try:
+        addresses, ttl, error = RESOLVE(request['domain'], rtype)
+    except Exception as e:
+        addresses, ttl, error = [], None, 'RemoteFailed: %s' % e
+    emit({'id': request['id'], 'domain': request['domain'], 'rtype': rtype,
+          'addresses': addresses, 'ttl': ttl, 'error': error})
+
+
+emit({'agent': 'autovpn-resolver', 'version': 1, 'backend': BACKEND})
+pool = ThreadPoolExecutor(max_workers=16)
+for line in sys.stdin:
+    line = line.strip()
+    if not line:
+        continue
+    try:
+        request = json.loads(line)
+    except ValueError:
+        continue
+    if request.get('op') == 'quit':
+        break
+    pool.submit(handle, request)
+pool.shutdown(wait=True)
+'''
+
+
+def agent_command(python: str = 'python3', backend: str = 'auto') -> str:
+    """启动远程代理的单条 shell 命令（源码以 base64 内联，不落盘）"""
+    encoded = base64.b64encode(AGENT_SOURCE.encode('utf-8')).decode('ascii')
+    return f"{python} -u -c \"import base64;exec(base64.b64decode('{encoded}').decode())\" {backend}"
+
+
+class AgentError(Exception):
+    """远程代理会话异常"""
+
+
+# ---------------------------------------------------------------------------
+# 传输层
+# ---------------------------------------------------------------------------
+
+class _LineTransport(abc.ABC):
+    """按行收发的传输层基类：后台线程读取应答行，readline 支持超时"""
+
+    def __init__(self, reader, writer):
+        self._writer = writer
+        self._lines: queue.Queue = queue.Queue()
+        self._reader_thread = threading.Thread(target=self._pump, args=(reader,), daemon=True)
+        self._reader_thread.start()
+
+    def _pump(self, reader):
+        try:
+            for line in reader:
+                if isinstance(line, bytes):
+                    line = line.decode('utf-8', errors='ignore')
+                self._lines.put(line)
+        except (OSError, ValueError, EOFError):
+            pass
+        finally:
+            self._lines.put(None)
+
+    def send(self, line: str):
+        self._writer.write(line + '\n')
+        self._writer.flush()
+
+    def readline(self, timeout: Optional[float] = None) -> Optional[str]:
+        """读取一行；连接关闭返回 None，超时抛出 AgentError"""
+        try:
+            line = self._lines.get(timeout=timeout)
+        except queue.Empty:
+            raise AgentError('远程代理应答超时')
+        if line is None:
+            self._lines.put(None)
+        return line
+
+    @abc.abstractmethod
+    def close(self):
+        """关闭底层连接"""
+
+
+class ParamikoTransport(_LineTransport):
+    """在已建立的 paramiko SSHClient 上开一个会话通道运行远程代理"""
+
+    def __init__(self, ssh_client, command: Optional[str] = None):
+        transport = ssh_client.get_transport()
+        if transport is None or not transport.is_active():
+            raise AgentError('SSH连接不可用')
+        self._channel = transport.open_session()
+        self._channel.exec_command(command or agent_command())
+        super().__init__(self._channel.makefile('r'), self._channel.makefile_stdin('wb'))
+
+    @classmethod
+    def factory(cls, ssh_client, command: Optional[str] = None) -> Callable[[], 'ParamikoTransport']:
+        return lambda: cls(ssh_client, command)
+
+    def send(self, line: str):
+        self._writer.write((line + '\n').encode('utf-8'))
+        self._writer.flush()
+
+    def close(self):
+        try:
+            self._channel.close()
+        except Exception:
+            pass
+
+
+class LocalProcessTransport(_LineTransport):
+    """在本机子进程中运行代理（不经SSH），用于测试或本机直连解析"""
+
+    def __init__(self, backend: str = 'auto', argv: Optional[List[str]] = None):
+        self.process = subprocess.Popen(
+            argv or [sys.executable, '-u', '-c', AGENT_SOURCE, backend],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            universal_newlines=True, encoding='utf-8'
+        )
+        super().__init__(self.process.stdout, self.process.stdin)
+
+    @classmethod
+    def factory(cls, backend: str = 'auto') -> Callable[[], 'LocalProcessTransport']:
+        return lambda: cls(backend)
+
+    def close(self):
+        for stream in (self.process.stdin, self.process.stdout):
+            try:
+                stream.close()
+            except Exception:
+                pass
+        try:
+            self.process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+
+# ---------------------------------------------------------------------------
+# 客户端
+# ---------------------------------------------------------------------------
+
+class RemoteResolverAgent:
+    """常驻远程解析代理客户端
+
+    transport_factory 每次调用返回一个新的传输层；会话在首次解析时建立，之后一直复用。
+    """
+
+    def __init__(self, transport_factory: Callable[[], _LineTransport], max_in_flight: int = 64,
+                 timeout: float = 30.0, max_restarts: int = 1):
+        self._factory = transport_factory
+        self.max_in_flight = max(1, max_in_flight)
+        self.timeout = timeout
+        self.max_restarts = max_restarts
+        self.backend: Optional[str] = None
+        self._transport: Optional[_LineTransport] = None
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.stats = {'sessions': 0, 'requests': 0, 'restarts': 0}
+
+    def _ensure_started(self):
+        if self._transport is not None:
+            return
+        self._transport = self._factory()
+        line = self._transport.readline(self.timeout)
+        try:
+            hello = json.loads(line) if line else {}
+        except ValueError:
+            hello = {}
+        if hello.get('agent') != AGENT_NAME or hello.get('version') != AGENT_VERSION:
+            self._drop_transport()
+            raise AgentError(f"远程代理启动失败: {line!r}")
+        self.backend = hello.get('backend')
+        self.stats['sessions'] += 1
+
+    def _drop_transport(self):
+        if self._transport is not None:
+            self._transport.close()
+            self._transport = None
+
+    def resolve_many(self, domains: Iterable[str], rtype: str = 'A') -> Dict[str, FetchResult]:
+        """流水线式解析多个域名，返回 {域名: (地址列表, TTL, 错误)}"""
+        todo = list(dict.fromkeys(domains))
+        results: Dict[str, FetchResult] = {}
+        restarts = 0
+        with self._lock:
+            while todo:
+                in_flight: Dict[int, str] = {}
+                try:
+                    self._ensure_started()
+                    while todo or in_flight:
+                        while todo and len(in_flight) < self.max_in_flight:
+                            request_id = next(self._ids)
+                            domain = todo.pop(0)
+                            self._transport.send(json.dumps({'id': request_id, 'domain': domain, 'rtype': rtype}))
+                            in_flight[request_id] = domain
+                            self.stats['requests'] += 1
+                        line = self._transport.readline(self.timeout)
+                        if line is None:
+                            raise AgentError('远程代理连接已断开')
+                        try:
+                            reply = json.loads(line)
+                        except ValueError:
+                            continue
+                        domain = in_flight.pop(reply.get('id'), None)
+                        if domain is None:
+                            continue
+                        results[domain] = (list(reply.get('addresses') or []), reply.get('ttl'), reply.get('error'))
+                except (AgentError, OSError, EOFError) as e:
+                    self._drop_transport()
+                    todo = list(in_flight.values()) + todo
+                    restarts += 1
+                    self.stats['restarts'] += 1
+                    if restarts > self.max_restarts:
+                        for domain in todo:
+                            results[domain] = ([], None, f"RemoteFailed: {e}")
+                        break
+        return results
+
+    def resolve(self, domain: str, rtype: str = 'A') -> FetchResult:
+        """解析单个域名（一次往返）"""
+        return self.resolve_many([domain], rtype)[domain]
+
+    def close(self):
+        with self._lock:
+            if self._transport is not None:
+                try:
+                    self._transport.send(json.dumps({'op': 'quit'}))
+                except (OSError, ValueError):
+                    pass
+                self._drop_transport()
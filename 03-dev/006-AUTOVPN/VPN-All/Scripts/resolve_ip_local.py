@@ -16,6 +16,8 @@ except ImportError as e:
     print(f"Error: Missing required Python libraries. Please install dnspython using pip3. Details: {e}")
     sys.exit(1)
 
+from dns_cache import get_dns_cache
+
 # Configuration
 DNS_SERVERS_TO_USE = [
     '8.8.8.8',
@@ -24,34 +26,43 @@ DNS_SERVERS_TO_USE = [
     '208.67.222.222',
     '208.67.220.220']  # Google, Cloudflare, Quad9, OpenDNS1, OpenDNS2
 
-def get_ips_from_dns_servers(domain):
-    """Queries multiple DNS servers for a domain and returns a list of unique IPs found by any server."""
-    unique_ips_found = set()
+def _fetch_a_records(domain, server_ip):
+    """Queries one DNS server over TCP; returns (ips, ttl, error) for the DNS cache."""
     resolver = dns.resolver.Resolver()
     resolver.timeout = 5
     resolver.lifetime = 12
+    resolver.nameservers = [server_ip]
+    try:
+        answers = resolver.resolve(domain, 'A', tcp=True)
+    except dns.resolver.NXDOMAIN:
+        return [], None, 'NXDOMAIN'
+    except dns.resolver.NoAnswer:
+        return [], None, 'NoAnswer'
+    except dns.exception.Timeout:
+        return [], None, 'Timeout'
+    return [rdata.address for rdata in answers if rdata.address], answers.rrset.ttl, None
+
+
+def get_ips_from_dns_servers(domain):
+    """Queries multiple DNS servers for a domain and returns a list of unique IPs found by any server."""
+    unique_ips_found = set()
+    cache = get_dns_cache()
 
     for server_ip in DNS_SERVERS_TO_USE:
-        resolver.nameservers = [server_ip]
-        try:
-            print(f"  Querying {domain} via DNS {server_ip}...")
-            answers = resolver.resolve(domain, 'A', tcp=True)
-            for rdata in answers:
-                ip = rdata.address
-                if ip:
-                    print(f"    Found IP: {ip} for {domain} via {server_ip}")
-                    unique_ips_found.add(ip)
-        except dns.resolver.NXDOMAIN:
+        entry = cache.lookup(domain, 'A', server_ip, lambda s=server_ip: _fetch_a_records(domain, s))
+        if entry.source == 'network':
+            print(f"  Queried {domain} via DNS {server_ip}.")
+            time.sleep(0.1)
+        for ip in entry.addresses:
+            print(f"    Found IP: {ip} for {domain} via {server_ip}"
+                  f"{' (cached)' if entry.source != 'network' else ''}")
+            unique_ips_found.add(ip)
+        if entry.error == 'NXDOMAIN':
             print(f"  Domain {domain} not found (NXDOMAIN) via {server_ip}.")
-        except dns.exception.Timeout:
-            print(f"  Timeout querying {domain} via {server_ip}.")
-        except dns.resolver.NoAnswer:
+        elif entry.error == 'NoAnswer':
             print(f"  No A records for {domain} via {server_ip} (NoAnswer).")
-        except dns.resolver.NoNameservers:
-            print(f"  No nameservers available for query via {server_ip} (NoNameservers).")
-        except Exception as e:
-            print(f"  Error querying {domain} via {server_ip}: {type(e).__name__} {e}")
-        time.sleep(0.1)
+        elif entry.error:
+            print(f"  Error querying {domain} via {server_ip}: {entry.error}")
     return list(unique_ips_found), len(unique_ips_found) > 0
 
 def process_domains(input_file_path, output_file_path):
@@ -1,7 +1,6 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import socket
 import dns.resolver
 import dns.exception
 import time
@@ -12,6 +11,9 @@ import logging
 import paramiko
 from typing import List, Dict, Optional, Tuple
 
+from dns_cache import get_dns_cache
+from ipv6_validator import validate_connectivity
+
 # 新增：TCP连接测试相关配置
 CONNECTIVITY_PORTS_TO_CHECK = [80, 443]
 CONNECTIVITY_TIMEOUT_SEC = 2  # Short timeout for TCP connect
@@ -92,55 +94,44 @@ def log_aaaa_record_statistics(ipv6_addresses, domain, dns_server, query_time):
     if ipv6_addresses:
         logger.info(f"   发现的IPv6地址: {', '.join(ipv6_addresses[:5])}{'...' if len(ipv6_addresses) > 5 else ''}")
 
+def validate_ipv6_connectivity_many(domain_ipv6, timeout=5):
+    """并发验证多个域名的IPv6地址连接性
+
+    所有域名的所有地址在 80/443 端口上同时探测，返回 {域名: (整体可连接, 成功率, 逐地址结果)}
+    """
+    reachability = validate_connectivity(
+        [ip for addresses in domain_ipv6.values() for ip in addresses], timeout=timeout,
+        ports=tuple(CONNECTIVITY_PORTS_TO_CHECK))
+    summary = {}
+    for domain, ipv6_addresses in domain_ipv6.items():
+        if not ipv6_addresses:
+            summary[domain] = (False, 0, [])
+            continue
+        connection_results = []
+        for ipv6_addr in ipv6_addresses:
+            ports = [port for port, ok in reachability.get(ipv6_addr, {}).items() if ok]
+            connection_results.append({
+                "ipv6": ipv6_addr,
+                "connectable": bool(ports),
+                "ports_tested": ports,
+                "error": None
+            })
+            for port in ports:
+                logger.info(f"✅ IPv6连接测试成功 - {domain} [{ipv6_addr}]:{port}")
+            if not ports:
+                logger.debug(f"❌ IPv6连接测试失败 - {domain} [{ipv6_addr}]")
+
+        successful = sum(1 for r in connection_results if r["connectable"])
+        success_rate = successful / len(ipv6_addresses)
+        overall_connectable = success_rate >= 0.5  # 50%成功率认为整体可连接
+        logger.info(f"📊 IPv6连接性测试统计 - {domain}: {successful}/{len(ipv6_addresses)} 成功 (成功率: {success_rate:.1%})")
+        summary[domain] = (overall_connectable, success_rate, connection_results)
+    return summary
+
+
 def validate_ipv6_connectivity(ipv6_addresses, domain, timeout=5):
     """验证IPv6地址的连接性"""
-    
-    if not ipv6_addresses:
-        return False, 0, []
-    
-    successful_connections = 0
-    connection_results = []
-    
-    for ipv6_addr in ipv6_addresses:
-        result = {
-            "ipv6": ipv6_addr,
-            "connectable": False,
-            "ports_tested": [],
-            "error": None
-        }
-        
-        try:
-            # 测试常用端口
-            for port in [80, 443]:
-                sock = socket.socket(socket.AF_INET6, socket.SOCK_STREAM)
-                sock.settimeout(timeout)
-                
-                try:
-                    result_code = sock.connect_ex((ipv6_addr, port))
-                    if result_code == 0:
-                        result["connectable"] = True
-                        result["ports_tested"].append(port)
-                        successful_connections += 1
-                        logger.info(f"✅ IPv6连接测试成功 - {domain} [{ipv6_addr}]:{port}")
-                    else:
-                        logger.debug(f"❌ IPv6连接测试失败 - {domain} [{ipv6_addr}]:{port} (错误码: {result_code})")
-                except Exception as e:
-                    logger.debug(f"❌ IPv6连接测试异常 - {domain} [{ipv6_addr}]:{port} - {e}")
-                finally:
-                    sock.close()
-                    
-        except Exception as e:
-            result["error"] = str(e)
-            logger.error(f"❌ IPv6连接测试严重错误 - {domain} [{ipv6_addr}] - {e}")
-        
-        connection_results.append(result)
-    
-    success_rate = (successful_connections / len(ipv6_addresses)) if ipv6_addresses else 0
-    overall_connectable = success_rate >= 0.5  # 50%成功率认为整体可连接
-    
-    logger.info(f"📊 IPv6连接性测试统计 - {domain}: {successful_connections}/{len(ipv6_addresses)} 成功 (成功率: {success_rate:.1%})")
-    
-    return overall_connectable, success_rate, connection_results
+    return validate_ipv6_connectivity_many({domain: ipv6_addresses}, timeout)[domain]
 
 
 def validate_dns_servers_ipv6_capability():
@@ -293,8 +284,17 @@ class SSHManager:
         self.ssh = None
         self.connected = False
     
+    def is_active(self):
+        """当前SSH连接是否仍然可用"""
+        if not self.connected or self.ssh is None:
+            return False
+        transport = self.ssh.get_transport()
+        return transport is not None and transport.is_active()
+    
     def connect(self):
-        """建立SSH连接"""
+        """建立SSH连接（已有可用连接时直接复用）"""
+        if self.is_active():
+            return True
         try:
             self.ssh = paramiko.SSHClient()
             self.ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
@@ -387,47 +387,57 @@ class SSHManager:
             logger.info("🔌 SSH连接已关闭")
 
 
+def _fetch_dns_records(domain, rtype, dns_server):
+    """向单个DNS服务器查询，返回 (地址列表, TTL, 错误) 供DNS缓存使用"""
+    resolver = dns.resolver.Resolver()
+    resolver.nameservers = [dns_server]
+    resolver.timeout = DNS_TIMEOUT_SEC
+    resolver.lifetime = DNS_LIFETIME_SEC
+    try:
+        answers = resolver.resolve(domain, rtype)
+    except dns.resolver.NXDOMAIN:
+        return [], None, 'NXDOMAIN'
+    except dns.resolver.NoAnswer:
+        return [], None, 'NoAnswer'
+    except dns.exception.Timeout:
+        return [], None, 'Timeout'
+    return [rdata.address for rdata in answers], answers.rrset.ttl, None
+
+
 def get_ips_from_dns_servers(domain, ipv6_enable=False):
-    """从多个DNS服务器获取IP地址"""
+    """从多个DNS服务器获取IP地址（经持久化DNS缓存，未过期的应答不再查询）"""
     ipv4_addresses = set()
     ipv6_addresses = set()
     successful_queries = 0
     total_queries = 0
+    cache = get_dns_cache()
     
     # 测试的DNS服务器列表
     dns_servers = ['8.8.8.8', '1.1.1.1', '9.9.9.9', '208.67.222.222']
     
     for dns_server in dns_servers:
         total_queries += 1
-        resolver = dns.resolver.Resolver()
-        resolver.nameservers = [dns_server]
-        resolver.timeout = DNS_TIMEOUT_SEC
-        resolver.lifetime = DNS_LIFETIME_SEC
         
-        try:
-            # 查询A记录 (IPv4)
-            answers = resolver.resolve(domain, 'A')
-            for rdata in answers:
-                ipv4_addresses.add(str(rdata))
-            successful_queries += 1
-            
-            # 如果启用IPv6，查询AAAA记录
-            if ipv6_enable:
-                try:
-                    answers = resolver.resolve(domain, 'AAAA')
-                    ipv6_found = [rdata.address for rdata in answers]
-                    for ipv6_addr in ipv6_found:
-                        ipv6_addresses.add(ipv6_addr)
-                    
-                    # 记录AAAA统计信息
-                    if AAAA_RECORD_ENABLE and ipv6_found:
-                        log_aaaa_record_statistics(ipv6_found, domain, dns_server, 0.1)
-                        
-                except Exception as e:
-                    logger.debug(f"AAAA记录查询失败 {domain} @ {dns_server}: {e}")
-            
-        except Exception as e:
-            logger.debug(f"DNS查询失败 {domain} @ {dns_server}: {e}")
+        # 查询A记录 (IPv4)
+        entry = cache.lookup(domain, 'A', dns_server,
+                             lambda s=dns_server: _fetch_dns_records(domain, 'A', s))
+        if not entry.ok:
+            logger.debug(f"DNS查询失败 {domain} @ {dns_server}: {entry.error}")
+            continue
+        ipv4_addresses.update(entry.addresses)
+        successful_queries += 1
+        
+        # 如果启用IPv6，查询AAAA记录
+        if ipv6_enable:
+            entry_v6 = cache.lookup(domain, 'AAAA', dns_server,
+                                    lambda s=dns_server: _fetch_dns_records(domain, 'AAAA', s))
+            if entry_v6.ok:
+                ipv6_addresses.update(entry_v6.addresses)
+                # 记录AAAA统计信息（仅统计实际查询）
+                if AAAA_RECORD_ENABLE and entry_v6.source == 'network':
+                    log_aaaa_record_statistics(entry_v6.addresses, domain, dns_server, 0.1)
+            elif entry_v6.error:
+                logger.debug(f"AAAA记录查询失败 {domain} @ {dns_server}: {entry_v6.error}")
     
     # 如果启用IPv6且AAAA记录查询启用，验证DNS服务器IPv6能力
     if ipv6_enable and AAAA_RECORD_ENABLE:
@@ -503,6 +513,7 @@ def main():
     # 解析每个域名
     all_ipv4_addresses = []
     all_ipv6_addresses = []
+    domain_ipv6 = {}
     
     for domain in domains:
         logger.info(f"\n🔍 开始解析域名: {domain}")
@@ -513,11 +524,14 @@ def main():
         all_ipv4_addresses.extend(ipv4_list)
         all_ipv6_addresses.extend(ipv6_list)
         
-        # 如果启用了IPv6，验证IPv6地址的连接性
         if IPv6_ENABLE and ipv6_list:
-            logger.info(f"🔍 开始验证IPv6地址连接性: {domain}")
-            connectable, success_rate, results = validate_ipv6_connectivity(ipv6_list, domain)
-            logger.info(f"📊 IPv6连接性测试结果: {'可连接' if connectable else '不可连接'} (成功率: {success_rate:.1%})")
+            domain_ipv6[domain] = ipv6_list
+    
+    # 如果启用了IPv6，所有域名的IPv6地址一次性并发验证连接性
+    if domain_ipv6:
+        logger.info(f"🔍 开始并发验证 {len(domain_ipv6)} 个域名的IPv6地址连接性")
+        for domain, (connectable, success_rate, _results) in validate_ipv6_connectivity_many(domain_ipv6).items():
+            logger.info(f"📊 IPv6连接性测试结果 - {domain}: {'可连接' if connectable else '不可连接'} (成功率: {success_rate:.1%})")
     
     # 去重并排序
     unique_ipv4 = sorted(list(set(all_ipv4_addresses)))
@@ -0,0 +1,408 @@
+#!/usr/bin/env python3
+"""
+AUTOVPN 域名解析结果库
+以域名为主键的索引化存储，替代各脚本反复全量读写 routes/ 下的文本文件
+
+- SQLite（WAL）存储：域名 → IPv4/IPv6 列表、最佳IP、评分、地理信息、最近解析时间、连续失败次数
+- 按域名 upsert：只更新传入的字段，单个域名的变更不触发任何文件重写
+- 导出器按需重新生成 常用境外IP.txt / 解析失败域名列表.txt / 境外域名大全.csv，
+  内容未变化时不写盘，写入采用临时文件 + 原子替换
+- 首次使用时可从现有文本文件导入
+
+用法:
+    python result_store.py import     # 从 routes/ 下现有文件导入
+    python result_store.py export     # 重新生成全部文本文件
+    python result_store.py stats
+"""
+
+import argparse
+import csv
+import hashlib
+import io
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.abspath(os.path.join(SCRIPT_DIR, '..'))
+ROUTES_DIR = os.path.join(PROJECT_ROOT, 'routes')
+
+DEFAULT_STORE_PATH = os.environ.get(
+    'AUTOVPN_RESULT_STORE',
+    os.path.join(ROUTES_DIR, 'resolution_store.sqlite3')
+)
+IP_LIST_PATH = os.path.join(ROUTES_DIR, '常用境外IP.txt')
+FAILED_LIST_PATH = os.path.join(ROUTES_DIR, '解析失败域名列表.txt')
+DOMAIN_CSV_PATH = os.path.join(ROUTES_DIR, '境外域名大全.csv')
+# 境外域名大全.csv 为 Excel 直接编辑的 GBK 编码、制表符分隔文件
+DOMAIN_CSV_ENCODING = 'gbk'
+DOMAIN_CSV_HEADER = ['分类', '域名', '备注']
+
+_COLUMNS = ('domain', 'ipv4', 'ipv6', 'best_ip', 'score', 'geo', 'last_resolved',
+            'failures', 'last_error', 'last_attempt', 'category', 'note')
+_JSON_COLUMNS = ('ipv4', 'ipv6', 'geo')
+
+
+@dataclass
+class DomainRecord:
+    """单个域名的解析结果"""
+    domain: str
+    ipv4: List[str] = field(default_factory=list)
+    ipv6: List[str] = field(default_factory=list)
+    best_ip: Optional[str] = None
+    score: Optional[float] = None
+    geo: Optional[Dict] = None
+    last_resolved: Optional[float] = None
+    failures: int = 0
+    last_error: Optional[str] = None
+    last_attempt: Optional[float] = None
+    category: Optional[str] = None
+    note: Optional[str] = None
+
+    @property
+    def ip(self) -> Optional[str]:
+        """hosts/路由使用的IP：最佳IP，否则第一个IPv4"""
+        return self.best_ip or (self.ipv4[0] if self.ipv4 else None)
+
+
+class ResultStore:
+    """以域名为主键的解析结果库"""
+
+    def __init__(self, path: str = DEFAULT_STORE_PATH):
+        self.path = path
+        self._lock = threading.RLock()
+        self._in_batch = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS domains (
+                    domain TEXT PRIMARY KEY,
+                    ipv4 TEXT NOT NULL DEFAULT '[]',
+                    ipv6 TEXT NOT NULL DEFAULT '[]',
+                    best_ip TEXT,
+                    score REAL,
+                    geo TEXT,
+                    last_resolved REAL,
+                    failures INTEGER NOT NULL DEFAULT 0,
+                    last_error TEXT,
+                    last_attempt REAL,
+                    category TEXT,
+                    note TEXT
+                )
+            ''')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS idx_domains_failures ON domains(failures)')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS idx_domains_last_resolved ON domains(last_resolved)')
+            self._conn.commit()
+
+    @staticmethod
+    def _key(domain: str) -> str:
+        return domain.strip().strip('.').lower()
+
+    @staticmethod
+    def _row_to_record(row) -> DomainRecord:
+        values = dict(zip(_COLUMNS, row))
+        for column in _JSON_COLUMNS:
+            values[column] = json.loads(values[column]) if values[column] else None
+        values['ipv4'] = values['ipv4'] or []
+        values['ipv6'] = values['ipv6'] or []
+        return DomainRecord(**values)
+
+    def _commit(self):
+        if not self._in_batch:
+            self._conn.commit()
+
+    @contextmanager
+    def batch(self):
+        """批量写入：块内的所有 upsert 在同一事务中提交"""
+        with self._lock:
+            self._in_batch += 1
+            try:
+                yield self
+            except Exception:
+                self._in_batch -= 1
+                if not self._in_batch:
+                    self._conn.rollback()
+                raise
+            else:
+                self._in_batch -= 1
+                self._commit()
+
+    # ------------------------------------------------------------------
+    # 写入
+    # ------------------------------------------------------------------
+
+    def _write(self, record: DomainRecord):
+        values = [getattr(record, column) for column in _COLUMNS]
+        for index, column in enumerate(_COLUMNS):
+            if column in _JSON_COLUMNS and values[index] is not None:
+                values[index] = json.dumps(values[index], ensure_ascii=False)
+        self._conn.execute(
+            f"INSERT OR REPLACE INTO domains ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})",
+            values
+        )
+        self._commit()
+
+    def _load(self, domain: str) -> DomainRecord:
+        return self.get(domain) or DomainRecord(domain=self._key(domain))
+
+    def upsert(self, domain: str, ipv4: Optional[Iterable[str]] = None, ipv6: Optional[Iterable[str]] = None,
+               best_ip: Optional[str] = None, score: Optional[float] = None, geo: Optional[Dict] = None,
+               resolved_at: Optional[float] = None):
+        """记录一次成功解析；未传入的字段保持原值，失败计数清零"""
+        now = resolved_at or time.time()
+        with self._lock:
+            record = self._load(domain)
+            if ipv4 is not None:
+                record.ipv4 = list(dict.fromkeys(ipv4))
+            if ipv6 is not None:
+                record.ipv6 = list(dict.fromkeys(ipv6))
+            if best_ip is not None:
+                record.best_ip = best_ip
+            elif record.best_ip not in record.ipv4 + record.ipv6:
+                # 原最佳IP已不在新的解析结果中
+                record.best_ip = None
+            if score is not None:
+                record.score = score
+            if geo is not None:
+                record.geo = geo
+            record.last_resolved = now
+            record.last_attempt = now
+            record.failures = 0
+            record.last_error = None
+            self._write(record)
+
+    def record_failure(self, domain: str, error: Optional[str] = None, attempted_at: Optional[float] = None):
+        """记录一次解析失败；保留上次成功的结果"""
+        with self._lock:
+            record = self._load(domain)
+            record.failures += 1
+            record.last_error = error
+            record.last_attempt = attempted_at or time.time()
+            self._write(record)
+
+    def set_metadata(self, domain: str, category: Optional[str] = None, note: Optional[str] = None):
+        """设置域名分类与备注（境外域名大全.csv 的列）"""
+        with self._lock:
+            record = self._load(domain)
+            if category is not None:
+                record.category = category
+            if note is not None:
+                record.note = note
+            self._write(record)
+
+    def delete(self, domain: str) -> bool:
+        with self._lock:
+            cursor = self._conn.execute('DELETE FROM domains WHERE domain = ?', (self._key(domain),))
+            self._commit()
+            return cursor.rowcount > 0
+
+    def close(self):
+        with self._lock:
+            self._conn.commit()
+            self._conn.close()
+
+    # ------------------------------------------------------------------
+    # 查询
+    # ------------------------------------------------------------------
+
+    def get(self, domain: str) -> Optional[DomainRecord]:
+        with self._lock:
+            row = self._conn.execute(f"SELECT {', '.join(_COLUMNS)} FROM domains WHERE domain = ?",
+                                     (self._key(domain),)).fetchone()
+        return self._row_to_record(row) if row else None
+
+    def __contains__(self, domain: str) -> bool:
+        with self._lock:
+            return self._conn.execute('SELECT 1 FROM domains WHERE domain = ?',
+                                      (self._key(domain),)).fetchone() is not None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM domains').fetchone()[0]
+
+    def records(self, where: str = '', params: tuple = ()) -> Iterator[DomainRecord]:
+        """按域名排序遍历记录；where 为附加的 SQL 条件"""
+        sql = f"SELECT {', '.join(_COLUMNS)} FROM domains {('WHERE ' + where) if where else ''} ORDER BY domain"
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        for row in rows:
+            yield self._row_to_record(row)
+
+    def resolved(self) -> Iterator[DomainRecord]:
+        """有可用IP的域名"""
+        return self.records("ipv4 != '[]' OR ipv6 != '[]'")
+
+    def failed(self, min_failures: int = 1) -> Iterator[DomainRecord]:
+        """最近一次及之前连续失败 min_failures 次以上的域名"""
+        return self.records('failures >= ?', (min_failures,))
+
+    def stale(self, max_age: float) -> List[str]:
+        """超过 max_age 秒未成功解析（或从未解析）的域名，用于增量重解析"""
+        cutoff = time.time() - max_age
+        return [record.domain for record in self.records('last_resolved IS NULL OR last_resolved < ?', (cutoff,))]
+
+    def best_ips(self) -> Dict[str, str]:
+        """{域名: hosts/路由使用的IP}"""
+        return {record.domain: record.ip for record in self.resolved() if record.ip}
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            row = self._conn.execute('''
+                SELECT COUNT(*),
+                       SUM(CASE WHEN ipv4 != '[]' OR ipv6 != '[]' THEN 1 ELSE 0 END),
+                       SUM(CASE WHEN failures > 0 THEN 1 ELSE 0 END),
+                       SUM(CASE WHEN ipv6 != '[]' THEN 1 ELSE 0 END)
+                FROM domains
+            ''').fetchone()
+        return {'domains': row[0], 'resolved': row[1] or 0, 'failed': row[2] or 0, 'with_ipv6': row[3] or 0}
+
+    # ------------------------------------------------------------------
+    # 导入现有文本文件
+    # ------------------------------------------------------------------
+
+    def import_ip_list(self, path: str = IP_LIST_PATH) -> int:
+        """导入 "IP\\t域名" 格式的 常用境外IP.txt"""
+        if not os.path.exists(path):
+            return 0
+        count = 0
+        resolved_at = os.path.getmtime(path)
+        with open(path, 'r', encoding='utf-8') as f, self.batch():
+            for line in f:
+                parts = line.strip().split(None, 1)
+                if len(parts) != 2 or parts[0].startswith('#') or parts[1].startswith('#'):
+                    continue
+                ip, domain = parts[0], parts[1].strip()
+                family = 'ipv6' if ':' in ip else 'ipv4'
+                existing = self.get(domain)
+                addresses = list(getattr(existing, family, []) or []) if existing else []
+                if ip not in addresses:
+                    addresses.append(ip)
+                self.upsert(domain, best_ip=ip, resolved_at=resolved_at, **{family: addresses})
+                count += 1
+        return count
+
+    def import_domain_csv(self, path: str = DOMAIN_CSV_PATH, encoding: str = DOMAIN_CSV_ENCODING) -> int:
+        """导入 境外域名大全.csv 的分类与备注"""
+        if not os.path.exists(path):
+            return 0
+        count = 0
+        with open(path, 'r', encoding=encoding, errors='replace', newline='') as f, self.batch():
+            for row in csv.reader(f, delimiter='\t'):
+                if len(row) < 2 or row[:2] == DOMAIN_CSV_HEADER[:2] or not row[1].strip():
+                    continue
+                self.set_metadata(row[1].strip(), category=row[0].strip() or None,
+                                  note=row[2].strip() if len(row) > 2 and row[2].strip() else None)
+                count += 1
+        return count
+
+    def import_legacy(self) -> Dict[str, int]:
+        """从 routes/ 下现有文件导入（库为空时调用）"""
+        return {'ip_list': self.import_ip_list(), 'domain_csv': self.import_domain_csv()}
+
+
+# ---------------------------------------------------------------------------
+# 导出
+# ---------------------------------------------------------------------------
+
+def _write_if_changed(path: str, content: str, encoding: str = 'utf-8') -> bool:
+    """内容变化时原子写入，返回是否写盘"""
+    data = content.encode(encoding, errors='replace')
+    if os.path.exists(path):
+        with open(path, 'rb') as f:
+            if hashlib.sha256(f.read()).digest() == hashlib.sha256(data).digest():
+                return False
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return True
+
+
+def export_ip_list(store: ResultStore, path: str = IP_LIST_PATH) -> bool:
+    """生成 常用境外IP.txt（IP\\t域名，每个域名一行）"""
+    lines = [f"{record.ip}\t{record.domain}\n" for record in store.resolved() if record.ip]
+    return _write_if_changed(path, ''.join(lines))
+
+
+def export_failed_list(store: ResultStore, path: str = FAILED_LIST_PATH) -> bool:
+    """生成 解析失败域名列表.txt"""
+    failed = list(store.failed())
+    lines = [
+        "# 域名解析失败列表\n",
+        f"# 总计: {len(failed)} 个\n",
+        "# 格式: 域名\t连续失败次数\t最近错误\t最近尝试时间\n\n",
+    ]
+    for record in failed:
+        attempted = datetime.fromtimestamp(record.last_attempt).strftime('%Y-%m-%d %H:%M:%S') \
+            if record.last_attempt else ''
+        lines.append(f"{record.domain}\t{record.failures}\t{record.last_error or ''}\t{attempted}\n")
+    return _write_if_changed(path, ''.join(lines))
+
+
+def export_domain_csv(store: ResultStore, path: str = DOMAIN_CSV_PATH, encoding: str = DOMAIN_CSV_ENCODING) -> bool:
+    """生成 境外域名大全.csv（分类\\t域名\\t备注），按分类、域名排序"""
+    records = sorted(store.records('category IS NOT NULL OR note IS NOT NULL'),
+                     key=lambda record: (record.category or '', record.domain))
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter='\t', lineterminator='\n')
+    writer.writerow(DOMAIN_CSV_HEADER)
+    for record in records:
+        writer.writerow([record.category or '', record.domain, record.note or ''])
+    return _write_if_changed(path, buffer.getvalue(), encoding=encoding)
+
+
+def export_all(store: ResultStore) -> Dict[str, bool]:
+    return {
+        IP_LIST_PATH: export_ip_list(store),
+        FAILED_LIST_PATH: export_failed_list(store),
+        DOMAIN_CSV_PATH: export_domain_csv(store),
+    }
+
+
+_default_store: Optional[ResultStore] = None
+_default_lock = threading.Lock()
+
+
+def get_result_store(path: Optional[str] = None) -> ResultStore:
+    """获取进程内共享的结果库；库为空时自动从现有文本文件导入"""
+    global _default_store
+    with _default_lock:
+        if _default_store is None or (path and os.path.abspath(path) != os.path.abspath(_default_store.path)):
+            _default_store = ResultStore(path or DEFAULT_STORE_PATH)
+            if len(_default_store) == 0:
+                _default_store.import_legacy()
+        return _default_store
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AUTOVPN 域名解析结果库")
+    parser.add_argument('command', choices=['import', 'export', 'stats'])
+    parser.add_argument('--store', default=DEFAULT_STORE_PATH, help='结果库路径')
+    args = parser.parse_args()
+
+    store = ResultStore(args.store)
+    if args.command == 'import':
+        counts = store.import_legacy()
+        print(f"✅ 已导入: 常用境外IP.txt {counts['ip_list']} 条, 境外域名大全.csv {counts['domain_csv']} 条")
+    elif args.command == 'export':
+        for path, written in export_all(store).items():
+            print(f"{'✅ 已更新' if written else '⏭️ 无变化'}: {path}")
+    stats = store.stats()
+    print(f"📊 域名 {stats['domains']}, 已解析 {stats['resolved']}, 失败 {stats['failed']}, 含IPv6 {stats['with_ipv6']}")
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+路由编译器
+替代 HybridHostsRouter 逐IP生成 route add <ip> mask 255.255.255.255 并逐条执行的方式
+
+- 按网关汇总：同一网关的主机地址用 ipaddress.collapse_addresses 合并为最少的覆盖前缀
+- 聚合强度（aggressiveness）：0 为无损合并；k>0 时先把每个地址放宽到 /(32-k) 再合并，
+  放宽后与其他网关冲突的网段退回无损合并
+- 与当前路由表（route print -4）比较，只生成需要删除/添加的差量
+- 本工具添加的路由连同配置的跃点数记录在状态文件中，删除只针对这些路由，不触及其他程序或系统的路由；
+  配置的跃点数变化时删除后重新添加
+- 差量写入一个批处理文件，一次 cmd /c 调用执行完毕
+"""
+
+import ipaddress
+import json
+import logging
+import os
+import subprocess
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 批处理中失败命令的输出前缀，用于统计执行结果
+FAILED_MARKER = "ROUTE_FAILED"
+
+RouteKey = Tuple[ipaddress.IPv4Network, str]
+# 本工具拥有的路由 → 添加时配置的跃点数（旧版状态文件未记录时为 None）
+OwnedRoutes = Dict[RouteKey, Optional[int]]
+
+
+class Route(NamedTuple):
+    network: ipaddress.IPv4Network
+    gateway: str
+    metric: int = 1
+
+    @property
+    def key(self) -> RouteKey:
+        """路由表比较键：route print 显示的跃点数包含接口跃点数，不参与比较
+
+        跃点数变化通过状态文件中记录的配置值检测（diff_routes）
+        """
+        return self.network, self.gateway
+
+    def add_command(self) -> str:
+        return (f"route add {self.network.network_address} mask {self.network.netmask} "
+                f"{self.gateway} metric {self.metric}")
+
+    def delete_command(self) -> str:
+        return f"route delete {self.network.network_address} mask {self.network.netmask} {self.gateway}"
+
+
+@dataclass
+class RoutePlan:
+    """编译结果：目标路由集合与相对当前路由表的差量
+
+    owned 为规划时仍在路由表中、由本工具添加的路由及其配置的跃点数
+    """
+    desired: List[Route]
+    to_add: List[Route] = field(default_factory=list)
+    to_delete: List[Route] = field(default_factory=list)
+    host_count: int = 0
+    owned: OwnedRoutes = field(default_factory=dict)
+
+    def commands(self) -> List[str]:
+        """先删除后添加（同一网段改网关时不会冲突）"""
+        return ([route.delete_command() for route in self.to_delete]
+                + [route.add_command() for route in self.to_add])
+
+    def owned_after(self, failed: Iterable[str] = ()) -> OwnedRoutes:
+        """执行命令后本工具拥有的路由（failed 为执行失败的命令）"""
+        failed = set(failed)
+        owned = dict(self.owned)
+        for route in self.to_delete:
+            if route.delete_command() not in failed:
+                owned.pop(route.key, None)
+        for route in self.to_add:
+            if route.add_command() not in failed:
+                owned[route.key] = route.metric
+        return owned
+
+
+def _parse_hosts(ips: Iterable[str]) -> List[ipaddress.IPv4Address]:
+    addresses = []
+    for ip in ips:
+        try:
+            addresses.append(ipaddress.IPv4Address(ip))
+        except ValueError:
+            logger.warning(f"跳过无效IP: {ip}")
+    return addresses
+
+
+def compile_routes(groups: Dict[Tuple[str, int], Iterable[str]], aggressiveness: int = 0) -> List[Route]:
+    """{(网关, 跃点数): [IP, ...]} → 最小覆盖前缀的路由列表
+
+    aggressiveness=k 时地址放宽到 /(32-k)，会把同网段内未列出的地址一并路由到该网关；
+    同一放宽网段被多个网关使用时，这些地址保持无损合并。
+    """
+    if not 0 <= aggressiveness <= 24:
+        raise ValueError(f"聚合强度应在 0-24 之间: {aggressiveness}")
+    addresses = {group: _parse_hosts(ips) for group, ips in groups.items()}
+
+    # 同一地址出现在多个网关组时只保留第一个组（与 hosts 分区顺序一致）
+    owner: Dict[ipaddress.IPv4Address, Tuple[str, int]] = {}
+    for group, group_addresses in addresses.items():
+        for address in group_addresses:
+            owner.setdefault(address, group)
+    addresses = {group: [a for a in group_addresses if owner[a] == group]
+                 for group, group_addresses in addresses.items()}
+
+    widened: Dict[Tuple[str, int], Dict[ipaddress.IPv4Network, List[ipaddress.IPv4Address]]] = {}
+    claimed: Dict[ipaddress.IPv4Network, Set[Tuple[str, int]]] = {}
+    prefix = 32 - aggressiveness
+    for group, group_addresses in addresses.items():
+        buckets = widened.setdefault(group, {})
+        for address in group_addresses:
+            network = ipaddress.IPv4Network((int(address) >> aggressiveness << aggressiveness, prefix))
+            buckets.setdefault(network, []).append(address)
+            claimed.setdefault(network, set()).add(group)
+
+    routes: List[Route] = []
+    for (gateway, metric), buckets in widened.items():
+        networks: List[ipaddress.IPv4Network] = []
+        for network, bucket in buckets.items():
+            if len(claimed[network]) == 1:
+                networks.append(network)
+            else:
+                networks.extend(ipaddress.IPv4Network(a) for a in bucket)
+        routes.extend(Route(network, gateway, metric) for network in ipaddress.collapse_addresses(networks))
+    return routes
+
+
+def parse_route_print(output: str) -> List[Route]:
+    """解析 Windows route print -4 的活动路由（网络目标、掩码、网关、接口、跃点数）"""
+    routes: List[Route] = []
+    active = False
+    for line in output.splitlines():
+        stripped = line.strip()
+        if stripped.startswith(('Active Routes', '活动路由')):
+            active = True
+            continue
+        if stripped.startswith(('Persistent Routes', '永久路由')):
+            break
+        parts = stripped.split()
+        if not active or len(parts) != 5:
+            continue
+        try:
+            network = ipaddress.IPv4Network(f"{parts[0]}/{parts[1]}")
+            gateway = str(ipaddress.IPv4Address(parts[2]))
+            metric = int(parts[4])
+        except ValueError:
+            continue  # 表头行、On-link 路由
+        routes.append(Route(network, gateway, metric))
+    return routes
+
+
+def get_installed_routes(runner: Callable[..., subprocess.CompletedProcess] = subprocess.run) -> List[Route]:
+    """读取当前IPv4路由表"""
+    try:
+        result = runner(["route", "print", "-4"], capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.SubprocessError) as e:
+        logger.warning(f"读取路由表失败: {e}")
+        return []
+    if result.returncode != 0:
+        logger.warning(f"读取路由表失败: {result.stderr}")
+        return []
+    return parse_route_print(result.stdout)
+
+
+def load_route_state(path: str) -> OwnedRoutes:
+    """读取本工具添加过的路由及其跃点数；文件不存在或损坏时视为没有
+
+    条目为 [网段, 网关, 跃点数]；旧版的 [网段, 网关] 条目跃点数记为 None
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            entries = json.load(f).get("routes", [])
+        owned: OwnedRoutes = {}
+        for network, gateway, *rest in entries:
+            key = (ipaddress.IPv4Network(network), str(ipaddress.IPv4Address(gateway)))
+            owned[key] = int(rest[0]) if rest else None
+        return owned
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError, TypeError, AttributeError) as e:
+        logger.warning(f"路由状态文件无效，忽略: {path} ({e})")
+        return {}
+
+
+def save_route_state(path: str, owned: OwnedRoutes):
+    """原子写入本工具拥有的路由及其跃点数"""
+    entries = [[str(network), gateway, metric] for (network, gateway), metric in sorted(owned.items())]
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({"routes": entries}, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def diff_routes(desired: Iterable[Route], installed: Iterable[Route],
+                owned: Optional[OwnedRoutes] = None) -> Tuple[List[Route], List[Route]]:
+    """返回 (待添加, 待删除)
+
+    只删除 owned 中（本工具添加的）且仍在路由表中的路由；其他程序或系统添加的路由
+    （包括与目标路由相同的）不会被删除或接管。本工具添加的路由配置的跃点数变化
+    （或旧状态文件未记录跃点数）时先删除再按新跃点数添加。
+    """
+    desired = list(desired)
+    owned = owned or {}
+    wanted = {route.key for route in desired}
+    present = {route.key for route in installed}
+    changed = [route for route in desired
+               if route.key in present and route.key in owned and owned[route.key] != route.metric]
+    to_add = [route for route in desired if route.key not in present] + changed
+    stale = ((set(owned) & present) - wanted) | {route.key for route in changed}
+    to_delete = [Route(network, gateway) for network, gateway in sorted(stale)]
+    return to_add, to_delete
+
+
+def plan_routes(groups: Dict[Tuple[str, int], Iterable[str]], aggressiveness: int = 0,
+                installed: Optional[Iterable[Route]] = None,
+                owned: Optional[OwnedRoutes] = None) -> RoutePlan:
+    """编译并与当前路由表比较；installed 为 None 时读取本机路由表
+
+    owned 为本工具此前添加的路由（load_route_state），执行后用 RoutePlan.owned_after 更新。
+    """
+    groups = {group: list(ips) for group, ips in groups.items()}
+    desired = compile_routes(groups, aggressiveness)
+    if installed is None:
+        installed = get_installed_routes()
+    installed = list(installed)
+    present = {route.key for route in installed}
+    owned = {key: metric for key, metric in (owned or {}).items() if key in present}
+    to_add, to_delete = diff_routes(desired, installed, owned)
+    return RoutePlan(desired, to_add, to_delete, host_count=sum(len(ips) for ips in groups.values()),
+                     owned=owned)
+
+
+def write_batch_file(path: str, commands: List[str]) -> str:
+    """写出批处理文件：逐条执行，失败时输出 FAILED_MARKER 行，不中断后续命令"""
+    lines = ["@echo off"]
+    for command in commands:
+        lines.append(command + " >nul")
+        lines.append(f"if errorlevel 1 echo {FAILED_MARKER} {command}")
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("\r\n".join(lines) + "\r\n")
+    return path
+
+
+def apply_batch(path: str, commands: List[str], timeout: int = 300,
+                runner: Callable[..., subprocess.CompletedProcess] = subprocess.run) -> Tuple[int, List[str]]:
+    """一次调用执行全部路由命令，返回 (成功数, 失败命令列表)"""
+    if not commands:
+        return 0, []
+    write_batch_file(path, commands)
+    result = runner(["cmd", "/c", path], capture_output=True, text=True, timeout=timeout)
+    failed = [line.split(FAILED_MARKER, 1)[1].strip()
+              for line in (result.stdout or "").splitlines() if line.startswith(FAILED_MARKER)]
+    return len(commands) - len(failed), failed
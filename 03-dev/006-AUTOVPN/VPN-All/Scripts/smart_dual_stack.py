@@ -3,6 +3,10 @@
 """
 智能双栈分流系统 - Smart Dual-Stack Routing System
 根据连接质量智能选择IPv4或IPv6路径
+
+- 批量测试时所有 (主机, 端口, 地址族) 任务在共享线程池中并发执行，线程数即全局并发上限
+- getaddrinfo 结果按 (主机, 地址族) 缓存，同一主机的多个端口只解析一次
+- 命令行: --benchmark N 在本地监听端口阵列上对比逐主机串行与全局并发的耗时
 """
 
 import socket
@@ -10,10 +14,12 @@ import time
 import json
 import logging
 import concurrent.futures
+import selectors
 import subprocess
 import os
 import sys
-from typing import Dict, List, Tuple, Optional
+import threading
+from typing import Callable, Dict, List, Tuple, Optional
 from dataclasses import dataclass
 from enum import Enum
 
@@ -24,6 +30,7 @@ TEST_PORT_HTTPS = 443
 MAX_CONCURRENT_TESTS = 10  # 最大并发测试数
 QUALITY_THRESHOLD_MS = 500  # 质量阈值（毫秒）
 RETRY_COUNT = 2  # 重试次数
+ADDRINFO_CACHE_TTL = 300  # getaddrinfo 结果缓存时间（秒）
 
 # 日志配置
 logging.basicConfig(
@@ -70,9 +77,89 @@ class DualStackDecision:
 class SmartDualStackRouter:
     """智能双栈路由器"""
     
-    def __init__(self):
+    def __init__(self, max_workers: int = MAX_CONCURRENT_TESTS, resolver: Optional[Callable] = None,
+                 addrinfo_ttl: float = ADDRINFO_CACHE_TTL):
         self.test_results: List[ConnectionTestResult] = []
         self.ipv6_enabled = self._check_ipv6_availability()
+        self.max_workers = max_workers
+        # 解析函数签名与 socket.getaddrinfo 相同，便于测试与基准注入
+        self.resolver = resolver or socket.getaddrinfo
+        self.addrinfo_ttl = addrinfo_ttl
+        self._executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+        self._addrinfo_cache: Dict[Tuple[str, int], Tuple[object, float]] = {}
+        self._addrinfo_inflight: Dict[Tuple[str, int], concurrent.futures.Future] = {}
+        self._lock = threading.Lock()
+        self.resolve_stats = {"resolved": 0, "cache_hits": 0, "shared": 0}
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+    
+    def _get_executor(self) -> concurrent.futures.ThreadPoolExecutor:
+        """共享线程池（首次使用时创建），线程数即全局并发上限"""
+        with self._lock:
+            if self._executor is None:
+                self._executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="dual-stack")
+            return self._executor
+    
+    def close(self):
+        """关闭共享线程池"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+    
+    def clear_addrinfo_cache(self):
+        with self._lock:
+            self._addrinfo_cache.clear()
+    
+    def _getaddrinfo(self, host: str, port: int, family: int) -> List[tuple]:
+        """带缓存的 getaddrinfo：按 (主机, 地址族) 缓存，端口在返回时替换
+
+        解析失败同样缓存，同一主机正在解析时等待其结果。
+        """
+        key = (host, family)
+        with self._lock:
+            cached = self._addrinfo_cache.get(key)
+            if cached is not None and time.monotonic() - cached[1] <= self.addrinfo_ttl:
+                self.resolve_stats["cache_hits"] += 1
+                outcome = cached[0]
+                future = None
+            else:
+                future = self._addrinfo_inflight.get(key)
+                owner = future is None
+                if owner:
+                    future = self._addrinfo_inflight[key] = concurrent.futures.Future()
+                    self.resolve_stats["resolved"] += 1
+                else:
+                    self.resolve_stats["shared"] += 1
+        
+        if future is not None:
+            if owner:
+                try:
+                    outcome = self.resolver(host, None, family, socket.SOCK_STREAM)
+                except socket.gaierror as e:
+                    outcome = e
+                except BaseException as e:
+                    future.set_exception(e)
+                    with self._lock:
+                        self._addrinfo_inflight.pop(key, None)
+                    raise
+                with self._lock:
+                    if self.addrinfo_ttl > 0:
+                        self._addrinfo_cache[key] = (outcome, time.monotonic())
+                    self._addrinfo_inflight.pop(key, None)
+                future.set_result(outcome)
+            else:
+                outcome = future.result()
+        
+        if isinstance(outcome, socket.gaierror):
+            raise socket.gaierror(*outcome.args)
+        return [(af, socktype, proto, canonname, sockaddr[:1] + (port,) + sockaddr[2:])
+                for af, socktype, proto, canonname, sockaddr in outcome]
         
     def _check_ipv6_availability(self) -> bool:
         """检查系统IPv6可用性"""
@@ -102,13 +189,13 @@ class SmartDualStackRouter:
             if ip_version == IPVersion.IPV4:
                 family = socket.AF_INET
                 # 获取IPv4地址
-                addr_info = socket.getaddrinfo(host, port, socket.AF_INET, socket.SOCK_STREAM)
+                addr_info = self._getaddrinfo(host, port, socket.AF_INET)
             elif ip_version == IPVersion.IPV6:
                 family = socket.AF_INET6
-                addr_info = socket.getaddrinfo(host, port, socket.AF_INET6, socket.SOCK_STREAM)
+                addr_info = self._getaddrinfo(host, port, socket.AF_INET6)
             else:
                 # 双栈模式，让系统自动选择
-                addr_info = socket.getaddrinfo(host, port, socket.AF_UNSPEC, socket.SOCK_STREAM)
+                addr_info = self._getaddrinfo(host, port, socket.AF_UNSPEC)
             
             if not addr_info:
                 return ConnectionTestResult(
@@ -124,6 +211,8 @@ class SmartDualStackRouter:
             # 使用第一个可用的地址
             family, socktype, proto, canonname, sockaddr = addr_info[0]
             
+            # 响应时间只计连接握手，不含（已缓存的）解析耗时
+            start_time = time.time()
             with socket.socket(family, socket.SOCK_STREAM) as sock:
                 sock.settimeout(timeout)
                 sock.connect(sockaddr)
@@ -194,6 +283,35 @@ class SmartDualStackRouter:
                 error_message=str(e)
             )
     
+    def _build_tasks(self, host: str, ports: List[int]) -> List[Tuple[str, int, IPVersion]]:
+        """生成单个主机的 (主机, 端口, IP版本) 测试任务"""
+        tasks = []
+        for port in ports:
+            # IPv4测试
+            tasks.append((host, port, IPVersion.IPV4))
+            
+            # IPv6测试（仅在系统支持IPv6时）
+            if self.ipv6_enabled:
+                tasks.append((host, port, IPVersion.IPV6))
+        return tasks
+    
+    def _run_tasks(self, tasks: List[Tuple[str, int, IPVersion]]) -> Dict[str, List[ConnectionTestResult]]:
+        """在共享线程池中一次性提交全部任务，按主机汇总结果"""
+        executor = self._get_executor()
+        future_to_task = {
+            executor.submit(self._test_single_connection, host, port, ip_version): (host, port, ip_version)
+            for host, port, ip_version in tasks
+        }
+        
+        results: Dict[str, List[ConnectionTestResult]] = {host: [] for host, _, _ in tasks}
+        for future in concurrent.futures.as_completed(future_to_task):
+            host = future_to_task[future][0]
+            try:
+                results[host].append(future.result())
+            except Exception as e:
+                logger.error(f"测试任务执行失败: {e}")
+        return results
+    
     def test_host_dual_stack(self, host: str, ports: List[int] = None) -> DualStackDecision:
         """测试主机的双栈连接质量"""
         if ports is None:
@@ -201,31 +319,7 @@ class SmartDualStackRouter:
         
         logger.info(f"开始测试主机 {host} 的双栈连接质量...")
         
-        all_results = []
-        
-        # 准备测试任务
-        test_tasks = []
-        for port in ports:
-            # IPv4测试
-            test_tasks.append((host, port, IPVersion.IPV4))
-            
-            # IPv6测试（仅在系统支持IPv6时）
-            if self.ipv6_enabled:
-                test_tasks.append((host, port, IPVersion.IPV6))
-        
-        # 使用线程池并发测试
-        with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_CONCURRENT_TESTS) as executor:
-            future_to_task = {
-                executor.submit(self._test_single_connection, host, port, ip_version): (host, port, ip_version)
-                for host, port, ip_version in test_tasks
-            }
-            
-            for future in concurrent.futures.as_completed(future_to_task):
-                try:
-                    result = future.result()
-                    all_results.append(result)
-                except Exception as e:
-                    logger.error(f"测试任务执行失败: {e}")
+        all_results = self._run_tasks(self._build_tasks(host, ports))[host]
         
         # 分析结果并做出决策
         decision = self._analyze_results(all_results)
@@ -341,18 +435,23 @@ class SmartDualStackRouter:
         return quality_score
     
     def batch_test_hosts(self, hosts: List[str], ports: List[int] = None) -> Dict[str, DualStackDecision]:
-        """批量测试多个主机的双栈连接质量"""
+        """批量测试多个主机的双栈连接质量（全部任务共享线程池并发执行）"""
         if ports is None:
             ports = [TEST_PORT_HTTP, TEST_PORT_HTTPS]
         
+        hosts = list(dict.fromkeys(hosts))
         results = {}
         
-        logger.info(f"开始批量测试 {len(hosts)} 个主机的双栈连接质量...")
+        logger.info(f"开始批量测试 {len(hosts)} 个主机的双栈连接质量（并发上限 {self.max_workers}）...")
         
-        for i, host in enumerate(hosts, 1):
+        tasks = [task for host in hosts for task in self._build_tasks(host, ports)]
+        host_results = self._run_tasks(tasks)
+        
+        for host in hosts:
             try:
-                logger.info(f"正在测试第 {i}/{len(hosts)} 个主机: {host}")
-                decision = self.test_host_dual_stack(host, ports)
+                all_results = host_results.get(host, [])
+                decision = self._analyze_results(all_results)
+                decision.test_results = all_results
                 results[host] = decision
                 
                 # 记录测试结果摘要
@@ -418,6 +517,100 @@ class SmartDualStackRouter:
         
         return recommendations
 
+class ListenerFarm:
+    """本地监听端口阵列（基准测试用）：在 127.0.0.1 上打开若干端口，后台线程接受并立即关闭连接
+
+    resolve() 与 socket.getaddrinfo 签名相同，把任意主机名解析到 127.0.0.1，可模拟解析延迟。
+    """
+    
+    def __init__(self, port_count: int = 2, dns_delay: float = 0.0):
+        self.dns_delay = dns_delay
+        self.resolve_calls = 0
+        self._selector = selectors.DefaultSelector()
+        self._listeners = []
+        for _ in range(port_count):
+            listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            listener.bind(("127.0.0.1", 0))
+            listener.listen(1024)
+            listener.setblocking(False)
+            self._selector.register(listener, selectors.EVENT_READ)
+            self._listeners.append(listener)
+        self.ports = [listener.getsockname()[1] for listener in self._listeners]
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._accept_loop, name="listener-farm", daemon=True)
+        self._thread.start()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+    
+    def _accept_loop(self):
+        while not self._stopped.is_set():
+            for key, _ in self._selector.select(timeout=0.1):
+                try:
+                    conn, _ = key.fileobj.accept()
+                    conn.close()
+                except (BlockingIOError, OSError):
+                    pass
+    
+    def resolve(self, host, port, family=0, type=0, proto=0, flags=0):
+        self.resolve_calls += 1
+        if self.dns_delay:
+            time.sleep(self.dns_delay)
+        if family == socket.AF_INET6:
+            raise socket.gaierror(socket.EAI_NONAME, "Name or service not known")
+        return [(socket.AF_INET, socket.SOCK_STREAM, socket.IPPROTO_TCP, "", ("127.0.0.1", port or 0))]
+    
+    def close(self):
+        self._stopped.set()
+        self._thread.join()
+        for listener in self._listeners:
+            self._selector.unregister(listener)
+            listener.close()
+        self._selector.close()
+
+def benchmark(host_count: int = 200, port_count: int = 2, dns_delay: float = 0.02,
+              max_workers: int = MAX_CONCURRENT_TESTS) -> Dict:
+    """本地监听端口阵列上的基准测试：逐主机串行（原批量方式）对比全局并发 + 解析缓存"""
+    hosts = [f"host{i}.farm.test" for i in range(host_count)]
+    previous_level = logger.level
+    logger.setLevel(logging.WARNING)
+    try:
+        with ListenerFarm(port_count, dns_delay) as farm:
+            with SmartDualStackRouter(max_workers, resolver=farm.resolve, addrinfo_ttl=0) as router:
+                start = time.perf_counter()
+                sequential = {host: router.test_host_dual_stack(host, farm.ports) for host in hosts}
+                sequential_sec = time.perf_counter() - start
+            sequential_resolves, farm.resolve_calls = farm.resolve_calls, 0
+            
+            with SmartDualStackRouter(max_workers, resolver=farm.resolve) as router:
+                start = time.perf_counter()
+                parallel = router.batch_test_hosts(hosts, farm.ports)
+                parallel_sec = time.perf_counter() - start
+                resolve_stats = dict(router.resolve_stats)
+            parallel_resolves = farm.resolve_calls
+    finally:
+        logger.setLevel(previous_level)
+    
+    def successes(decisions):
+        return sum(1 for d in decisions.values() for r in d.test_results if r.success)
+    
+    return {
+        "hosts": host_count,
+        "connections": host_count * port_count,
+        "max_workers": max_workers,
+        "sequential_sec": sequential_sec,
+        "parallel_sec": parallel_sec,
+        "speedup": sequential_sec / parallel_sec if parallel_sec else float("inf"),
+        "sequential_resolves": sequential_resolves,
+        "parallel_resolves": parallel_resolves,
+        "sequential_successes": successes(sequential),
+        "parallel_successes": successes(parallel),
+        "resolve_stats": resolve_stats,
+    }
+
 def main():
     """主函数"""
     import argparse
@@ -429,9 +622,16 @@ def main():
     parser.add_argument("--output", help="输出结果到文件")
     parser.add_argument("--ipv6-only", action="store_true", help="仅测试IPv6")
     parser.add_argument("--ipv4-only", action="store_true", help="仅测试IPv4")
+    parser.add_argument("--benchmark", type=int, metavar="N", help="在本地监听端口阵列上对 N 个主机做基准测试")
+    parser.add_argument("--dns-delay", type=float, default=0.02, help="基准测试模拟的解析延迟（秒）")
     
     args = parser.parse_args()
     
+    if args.benchmark:
+        result = benchmark(args.benchmark, len(args.ports), args.dns_delay)
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+        return 0
+    
     # 获取主机列表
     hosts = []
     if args.hosts:
@@ -470,6 +670,7 @@ def main():
     else:
         # 完整双栈测试
         test_results = router.batch_test_hosts(hosts, args.ports)
+        router.close()
         recommendations = router.generate_routing_recommendations(test_results)
         
         # 输出结果
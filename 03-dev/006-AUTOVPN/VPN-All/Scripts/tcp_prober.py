@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+并发TCP连通性探测
+替代逐IP、逐端口的阻塞 socket.create_connection
+
+- 非阻塞套接字 + selectors：所有候选IP的所有端口同时发起连接
+- 同一IP任一端口连通即判定可达，并立即关闭该IP的其余连接
+- stop_when 回调实现 happy-eyeballs 式提前结束：结果已足以做出选择时放弃其余探测
+- 按IP缓存可达性结果（可配置有效期），同一次运行中重复出现的IP不再探测
+"""
+
+import errno
+import selectors
+import socket
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# 连接进行中的 errno（Windows 为 WSAEWOULDBLOCK）
+_IN_PROGRESS = {0, errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EALREADY, getattr(errno, 'WSAEWOULDBLOCK', 10035)}
+
+
+class ConnectivityProber:
+    """并发TCP连通性探测器"""
+
+    def __init__(self, timeout: float = 2.0, cache_ttl: float = 300.0, max_sockets: int = 256):
+        self.timeout = timeout
+        self.cache_ttl = cache_ttl
+        self.max_sockets = max(1, max_sockets)
+        self._cache: Dict[str, Tuple[bool, float, Optional[int], Optional[float]]] = {}
+        self._lock = threading.Lock()
+        self.stats = {'probed': 0, 'cache_hits': 0, 'sockets': 0, 'early_stops': 0}
+
+    # ------------------------------------------------------------------
+    # 缓存
+    # ------------------------------------------------------------------
+
+    def cached(self, ip: str) -> Optional[bool]:
+        """返回有效期内的缓存结果，无缓存时返回 None"""
+        with self._lock:
+            entry = self._cache.get(ip)
+        if entry is None or time.monotonic() - entry[1] > self.cache_ttl:
+            return None
+        return entry[0]
+
+    def details(self, ip: str) -> Dict:
+        """缓存中的探测详情：可达性、连通端口、连接耗时"""
+        with self._lock:
+            entry = self._cache.get(ip)
+        if entry is None:
+            return {'reachable': None, 'port': None, 'latency': None}
+        return {'reachable': entry[0], 'port': entry[2], 'latency': entry[3]}
+
+    def _store(self, ip: str, reachable: bool, port: Optional[int] = None, latency: Optional[float] = None):
+        with self._lock:
+            self._cache[ip] = (reachable, time.monotonic(), port, latency)
+
+    def invalidate(self, ip: Optional[str] = None):
+        with self._lock:
+            if ip is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(ip, None)
+
+    # ------------------------------------------------------------------
+    # 探测
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _open(ip: str, port: int) -> Tuple[Optional[socket.socket], Optional[bool]]:
+        """发起非阻塞连接，返回 (套接字, 立即得到的结果)"""
+        family = socket.AF_INET6 if ':' in ip else socket.AF_INET
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.setblocking(False)
+        try:
+            code = sock.connect_ex((ip, port))
+        except OSError:
+            sock.close()
+            return None, False
+        if code == 0:
+            return sock, True
+        if code in _IN_PROGRESS:
+            return sock, None
+        sock.close()
+        return None, False
+
+    def probe_many(self, ips: Iterable[str], ports: Iterable[int],
+                   stop_when: Optional[Callable[[Dict[str, Optional[bool]]], bool]] = None) -> Dict[str, Optional[bool]]:
+        """并发探测多个IP，返回 {ip: True/False/None}
+
+        None 表示因 stop_when 提前结束而未完成探测（不写入缓存）。
+        stop_when 在每个IP得出结果后以当前结果字典调用，返回 True 即结束。
+        """
+        ips = list(dict.fromkeys(ips))
+        ports = list(ports)
+        results: Dict[str, Optional[bool]] = {}
+        for ip in ips:
+            cached = self.cached(ip)
+            if cached is not None:
+                self.stats['cache_hits'] += 1
+            results[ip] = cached
+        if stop_when is not None and stop_when(results):
+            return results
+
+        # 待发起的连接 (ip, port)，按IP顺序排列，同一IP的各端口相邻
+        queue: List[Tuple[str, int]] = [(ip, port) for ip in ips if results[ip] is None for port in ports]
+        remaining_ports = {ip: len(ports) for ip in ips if results[ip] is None}
+        if not queue:
+            return results
+
+        selector = selectors.DefaultSelector()
+        # 每个IP的在途套接字
+        active: Dict[str, List[socket.socket]] = {}
+        started_at: Dict[socket.socket, float] = {}
+
+        def close_ip(ip: str):
+            for sock in active.pop(ip, []):
+                try:
+                    selector.unregister(sock)
+                except (KeyError, ValueError):
+                    pass
+                started_at.pop(sock, None)
+                sock.close()
+
+        def finish(ip: str, reachable: bool, port: Optional[int] = None, latency: Optional[float] = None) -> bool:
+            if results.get(ip) is not None:
+                return False
+            results[ip] = reachable
+            self._store(ip, reachable, port, latency)
+            self.stats['probed'] += 1
+            close_ip(ip)
+            return stop_when is not None and stop_when(results)
+
+        def port_failed(ip: str) -> bool:
+            remaining_ports[ip] -= 1
+            if remaining_ports[ip] <= 0:
+                return finish(ip, False)
+            return False
+
+        stopped = False
+        try:
+            while (queue or started_at) and not stopped:
+                # 补充在途连接直到上限
+                while queue and len(started_at) < self.max_sockets and not stopped:
+                    ip, port = queue.pop(0)
+                    if results.get(ip) is not None:
+                        continue
+                    sock, immediate = self._open(ip, port)
+                    self.stats['sockets'] += 1
+                    if immediate is True:
+                        sock.close()
+                        stopped = finish(ip, True, port, 0.0)
+                    elif immediate is False:
+                        stopped = port_failed(ip)
+                    else:
+                        selector.register(sock, selectors.EVENT_WRITE, (ip, port))
+                        active.setdefault(ip, []).append(sock)
+                        started_at[sock] = time.monotonic()
+                if stopped or not started_at:
+                    continue
+
+                now = time.monotonic()
+                wait = max(0.0, min(started_at.values()) + self.timeout - now)
+                for key, _ in selector.select(timeout=wait):
+                    sock = key.fileobj
+                    ip, port = key.data
+                    if sock not in started_at:
+                        continue
+                    latency = time.monotonic() - started_at[sock]
+                    error = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                    if error == 0:
+                        stopped = finish(ip, True, port, latency)
+                    else:
+                        selector.unregister(sock)
+                        started_at.pop(sock, None)
+                        active[ip].remove(sock)
+                        sock.close()
+                        stopped = port_failed(ip)
+                    if stopped:
+                        break
+
+                # 超时的连接
+                now = time.monotonic()
+                for sock, started in list(started_at.items()):
+                    if stopped:
+                        break
+                    if now - started >= self.timeout:
+                        ip, _ = selector.get_key(sock).data
+                        selector.unregister(sock)
+                        started_at.pop(sock, None)
+                        active[ip].remove(sock)
+                        sock.close()
+                        stopped = port_failed(ip)
+        finally:
+            if stopped:
+                self.stats['early_stops'] += 1
+            for ip in list(active):
+                close_ip(ip)
+            selector.close()
+        return results
+
+    def is_reachable(self, ip: str, ports: Iterable[int]) -> bool:
+        """探测单个IP（任一端口连通即可达）"""
+        return bool(self.probe_many([ip], ports)[ip])
+
+
+def best_first_stop(ranked_ips: List[str]) -> Callable[[Dict[str, Optional[bool]]], bool]:
+    """happy-eyeballs 式提前结束条件
+
+    ranked_ips 按（不含连通性的）得分从高到低排列：排在最前面、尚未判定不可达的IP
+    一旦连通，其余IP无论结果如何都无法胜出，此时即可结束探测。
+    """
+    def _stop(results: Dict[str, Optional[bool]]) -> bool:
+        for ip in ranked_ips:
+            state = results.get(ip)
+            if state is False:
+                continue
+            return state is True
+        return True
+    return _stop
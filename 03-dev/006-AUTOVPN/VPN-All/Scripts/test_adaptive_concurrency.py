@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+AIMD 自适应并发控制测试
+"""
+
+import threading
+import time
+
+from adaptive_concurrency import (AIMDController, AdaptivePipeline, OK, TIMEOUT, SERVFAIL,
+                                  NEGATIVE, classify_dns_error)
+
+
+def test_aimd_increase_and_decrease():
+    """成功时加性增，超时/SERVFAIL超过阈值时乘性减"""
+    controller = AIMDController(initial=4, max_limit=16, window=20, error_threshold=0.1)
+    for _ in range(40):
+        assert controller.acquire()
+        controller.release(OK)
+    grown = controller.limit
+    assert 8 <= grown <= 16
+
+    for _ in range(grown):
+        controller.acquire()
+        controller.release(TIMEOUT)
+    assert controller.limit <= grown // 2 + 1
+    assert controller.stats['decreases'] >= 1 and controller.stats['timeouts'] == grown
+
+    # 否定应答不影响并发
+    before = controller.limit
+    controller.acquire()
+    controller.release(NEGATIVE)
+    assert controller.limit >= before
+
+
+def test_classify_dns_error():
+    """DNS错误字符串归类"""
+    assert classify_dns_error(None) == OK
+    assert classify_dns_error('NXDOMAIN') == NEGATIVE
+    assert classify_dns_error('SERVFAIL') == SERVFAIL
+    assert classify_dns_error('Timeout') == TIMEOUT
+    assert classify_dns_error('gaierror: [Errno -3] timed out') == TIMEOUT
+
+
+def test_pipeline_tracks_upstream_capacity():
+    """上游只能承受有限并发时，并发上限收敛并重试超时请求"""
+    capacity = 6
+    active = [0]
+    peak = [0]
+    lock = threading.Lock()
+    attempts = {}
+
+    def worker(item):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+            overloaded = active[0] > capacity
+            attempts[item] = attempts.get(item, 0) + 1
+        try:
+            time.sleep(0.002)
+            if item.startswith('nx'):
+                return [], NEGATIVE
+            return ([], TIMEOUT) if overloaded else ([item], OK)
+        finally:
+            with lock:
+                active[0] -= 1
+
+    controller = AIMDController(initial=32, max_limit=32, window=20, error_threshold=0.1)
+    pipeline = AdaptivePipeline(worker, controller, max_attempts=5)
+    done = []
+    items = [f"d{i}.test" for i in range(300)] + ['nx.test']
+    results = pipeline.run(items, lambda item, result, outcome: done.append(outcome))
+    pipeline.close()
+
+    assert len(results) == len(items) and len(done) == len(items)
+    assert controller.stats['decreases'] >= 1
+    assert controller.limit < 32
+    assert attempts['nx.test'] == 1
+    assert sum(1 for outcome in done if outcome == OK) >= 290
+    assert pipeline.stats['retries'] > 0
+
+
+def test_pipeline_stop():
+    """停止信号置位后不再派发新任务"""
+    stop = threading.Event()
+    calls = []
+
+    def worker(item):
+        calls.append(item)
+        if len(calls) >= 5:
+            stop.set()
+        return item, OK
+
+    pipeline = AdaptivePipeline(worker, AIMDController(initial=1, max_limit=1), stop_event=stop)
+    pipeline.run(range(100))
+    pipeline.close()
+    assert len(calls) < 10
+
+
+def main():
+    for test in (test_aimd_increase_and_decrease, test_classify_dns_error,
+                 test_pipeline_tracks_upstream_capacity, test_pipeline_stop):
+        test()
+        print(f"✓ {test.__doc__}")
+
+
+if __name__ == "__main__":
+    main()
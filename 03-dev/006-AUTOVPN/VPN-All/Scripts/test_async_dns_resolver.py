@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+异步DNS解析引擎测试
+使用本地UDP/TCP DNS桩服务器，无需外网
+"""
+
+import asyncio
+import socket
+import socketserver
+import struct
+import threading
+import time
+
+from async_dns_resolver import (
+    AsyncDNSResolver, QTYPE_A, QTYPE_AAAA, decode_name, resolve_domains
+)
+
+# 桩服务器记录表
+STUB_RECORDS = {
+    'a.test': {QTYPE_A: ['10.0.0.1', '10.0.0.2'], QTYPE_AAAA: ['2001:db8::1']},
+    'b.test': {QTYPE_A: ['10.0.0.3']},
+    'xn--fiqs8s.test': {QTYPE_A: ['10.0.0.4']},  # 中国.test
+}
+TRUNCATED_DOMAIN = 'big.test'
+TRUNCATED_ADDRESSES = [f'10.1.0.{i}' for i in range(1, 41)]
+NXDOMAIN = 'nx.test'
+SILENT_DOMAIN = 'silent.test'
+
+
+def _parse_question(data):
+    qid = struct.unpack('!H', data[:2])[0]
+    name, offset = decode_name(data, 12)
+    qtype = struct.unpack('!H', data[offset:offset + 2])[0]
+    return qid, name, qtype, data[12:offset + 4]
+
+
+def _build_answer(qid, question, qtype, addresses, rcode=0, tc=False, ttl=300):
+    flags = 0x8180 | rcode | (0x0200 if tc else 0)
+    body = b''
+    for address in addresses:
+        if qtype == QTYPE_A:
+            rdata = socket.inet_aton(address)
+        else:
+            rdata = socket.inet_pton(socket.AF_INET6, address)
+        body += b'\xc0\x0c' + struct.pack('!HHIH', qtype, 1, ttl, len(rdata)) + rdata
+    header = struct.pack('!HHHHHH', qid, flags, 1, len(addresses), 0, 0)
+    return header + question + body
+
+
+def _stub_reply(data, over_tcp):
+    qid, name, qtype, question = _parse_question(data)
+    if name == SILENT_DOMAIN:
+        return None
+    if name == NXDOMAIN:
+        return _build_answer(qid, question, qtype, [], rcode=3)
+    if name == TRUNCATED_DOMAIN and qtype == QTYPE_A:
+        if over_tcp:
+            return _build_answer(qid, question, qtype, TRUNCATED_ADDRESSES)
+        return _build_answer(qid, question, qtype, [], tc=True)
+    return _build_answer(qid, question, qtype, STUB_RECORDS.get(name, {}).get(qtype, []))
+
+
+class _UDPHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        data, sock = self.request
+        self.server.query_count += 1
+        reply = _stub_reply(data, over_tcp=False)
+        if reply is not None:
+            sock.sendto(reply, self.client_address)
+
+
+class _TCPHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        length = struct.unpack('!H', self.request.recv(2))[0]
+        data = b''
+        while len(data) < length:
+            data += self.request.recv(length - len(data))
+        reply = _stub_reply(data, over_tcp=True)
+        self.request.sendall(struct.pack('!H', len(reply)) + reply)
+
+
+class StubDNSServer:
+    """本地DNS桩服务器（UDP + TCP 同端口）"""
+
+    def __init__(self):
+        self.udp = socketserver.ThreadingUDPServer(('127.0.0.1', 0), _UDPHandler)
+        self.udp.query_count = 0
+        self.port = self.udp.server_address[1]
+        self.tcp = socketserver.ThreadingTCPServer(('127.0.0.1', self.port), _TCPHandler)
+        for server in (self.udp, self.tcp):
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    @property
+    def address(self):
+        return ('127.0.0.1', self.port)
+
+    def close(self):
+        for server in (self.udp, self.tcp):
+            server.shutdown()
+            server.server_close()
+
+
+def test_bulk_resolution_shape():
+    """批量解析返回与 get_ips_from_dns_servers 一致的四元组"""
+    stub_a, stub_b = StubDNSServer(), StubDNSServer()
+    try:
+        results = resolve_domains(['a.test', 'b.test'], [stub_a.address, stub_b.address],
+                                  ipv6_enable=True, timeout=1.0)
+        ipv4, ok4, ipv6, ok6 = results['a.test'].to_tuple(ipv6_enable=True)
+        assert sorted(ipv4) == ['10.0.0.1', '10.0.0.2'] and ok4
+        assert ipv6 == ['2001:db8::1'] and ok6
+        assert results['b.test'].to_tuple(ipv6_enable=True) == (['10.0.0.3'], True, [], False)
+        # 每个服务器的应答集合都被保留
+        assert len(results['a.test'].server_answers('A')) == 2
+        assert results['a.test'].answers[0].ttl == 300
+        # 国际化域名：响应问题段为 IDNA 编码形式，仍能匹配
+        idn = resolve_domains(['中国.test'], [stub_a.address], timeout=1.0)['中国.test']
+        assert idn.to_tuple() == (['10.0.0.4'], True, [], False)
+    finally:
+        stub_a.close()
+        stub_b.close()
+
+
+def test_nxdomain_and_timeout():
+    """NXDOMAIN 与无响应服务器"""
+    stub = StubDNSServer()
+    try:
+        results = resolve_domains([NXDOMAIN, SILENT_DOMAIN], [stub.address], timeout=0.3, retries=1)
+        assert results[NXDOMAIN].to_tuple() == ([], False, [], False)
+        assert results[NXDOMAIN].answers[0].error == 'NXDOMAIN'
+        assert results[SILENT_DOMAIN].answers[0].error == 'Timeout'
+    finally:
+        stub.close()
+
+
+def test_tcp_fallback_on_truncation():
+    """截断响应改用TCP重查"""
+    stub = StubDNSServer()
+    try:
+        answer = resolve_domains([TRUNCATED_DOMAIN], [stub.address], timeout=1.0)[TRUNCATED_DOMAIN].answers[0]
+        assert answer.via_tcp
+        assert answer.addresses == TRUNCATED_ADDRESSES
+    finally:
+        stub.close()
+
+
+def test_rate_limit_and_concurrency():
+    """每服务器限速生效，大批量域名全部完成"""
+    stub = StubDNSServer()
+    try:
+        domains = [f'host{i}.test' for i in range(60)]
+        resolver = AsyncDNSResolver([stub.address], timeout=1.0, max_concurrency=16, per_server_qps=100)
+        started = time.monotonic()
+        results = asyncio.run(resolver.resolve_many(domains))
+        elapsed = time.monotonic() - started
+        assert len(results) == 60
+        assert all(r.answers[0].error == 'NoAnswer' for r in results.values())
+        # 100 qps、突发100：60个查询不应触发等待，但也不应超过1秒
+        assert elapsed < 1.0
+        assert stub.udp.query_count == 60
+
+        limited = AsyncDNSResolver([stub.address], timeout=1.0, per_server_qps=20)
+        started = time.monotonic()
+        asyncio.run(limited.resolve_many(domains[:40]))
+        # 突发20后其余20个按 20 qps 放行，约需1秒
+        assert time.monotonic() - started >= 0.9
+    finally:
+        stub.close()
+
+
+def main():
+    for test in (test_bulk_resolution_shape, test_nxdomain_and_timeout,
+                 test_tcp_fallback_on_truncation, test_rate_limit_and_concurrency):
+        test()
+        print(f"✓ {test.__doc__}")
+
+
+if __name__ == "__main__":
+    main()
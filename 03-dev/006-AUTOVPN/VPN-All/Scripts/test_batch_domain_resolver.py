@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+批量域名解析任务测试（断点续跑、内存合并、原子写入）
+"""
+
+import json
+import os
+import tempfile
+import threading
+
+from batch_domain_resolver import ResolverJob, merge_ip_results
+from result_store import ResultStore
+
+
+def _paths():
+    directory = tempfile.mkdtemp()
+    return os.path.join(directory, 'state.json'), os.path.join(directory, '常用境外IP.txt')
+
+
+def _store(state_path):
+    return ResultStore(os.path.join(os.path.dirname(state_path), 'store.sqlite3'))
+
+
+def _fake_resolve(domain, ipv6_enable=False):
+    if domain.startswith('bad'):
+        return [], []
+    index = int(domain.split('.')[0][1:])
+    return [f"10.0.{index}.2", f"10.0.{index}.1"], []
+
+
+def test_full_run_writes_once():
+    """全部域名进程内解析，结果经结果库合并后写入"""
+    state_path, ip_path = _paths()
+    with open(ip_path, 'w', encoding='utf-8') as f:
+        f.write("198.18.0.1\t# IPv4地址\n10.0.0.2\td0.test\n1.1.1.1\tkeep.test\n")
+
+    domains = [f"d{i}.test" for i in range(30)] + ['bad.test']
+    store = _store(state_path)
+    job = ResolverJob(domains, state_path=state_path, ip_list_path=ip_path,
+                      resolve_func=_fake_resolve, workers=4, store=store)
+    assert job.run() == (30, 1)
+    merged = job.finish()
+
+    assert not os.path.exists(state_path)
+    assert merged['d0.test'] == '10.0.0.2'  # 原有IP仍有效时保留
+    assert merged['d5.test'] == '10.0.5.1'
+    assert merged['keep.test'] == '1.1.1.1'
+    assert 'bad.test' not in merged
+    with open(ip_path, encoding='utf-8') as f:
+        assert dict(reversed(line.split()) for line in f) == merged
+    assert store.get('bad.test').failures == 1
+    assert store.get('d5.test').ipv4 == ['10.0.5.2', '10.0.5.1']
+
+
+def test_resume_after_interrupt():
+    """中断后再次运行只解析未完成的域名"""
+    state_path, ip_path = _paths()
+    domains = [f"d{i}.test" for i in range(40)]
+    calls = []
+    lock = threading.Lock()
+
+    def stopping_resolve(domain, ipv6_enable=False):
+        with lock:
+            calls.append(domain)
+            if len(calls) == 15:
+                job.stop()  # 模拟进程中途退出
+        return _fake_resolve(domain)
+
+    job = ResolverJob(domains, state_path=state_path, ip_list_path=ip_path,
+                      resolve_func=stopping_resolve, workers=1, checkpoint_every=5)
+    assert job.run() == (15, 0)
+    with open(state_path, encoding='utf-8') as f:
+        saved = json.load(f)
+    assert len(saved['results']) == 15
+
+    resumed_calls = []
+
+    def counting_resolve(domain, ipv6_enable=False):
+        with lock:
+            resumed_calls.append(domain)
+        return _fake_resolve(domain)
+
+    job = ResolverJob(domains, state_path=state_path, ip_list_path=ip_path,
+                      resolve_func=counting_resolve, workers=4)
+    assert job.run() == (40, 0)
+    assert len(resumed_calls) == 25 and not set(resumed_calls) & set(saved['results'])
+
+    # 域名列表变化后不沿用旧进度
+    job = ResolverJob(domains + ['d99.test'], state_path=state_path, ip_list_path=ip_path,
+                      resolve_func=counting_resolve)
+    job._init_state()
+    assert job.resumed == 0
+
+
+def test_merge_prefers_existing_ip():
+    """合并时保留仍有效的原有IP"""
+    existing = {'a.test': '2.2.2.2', 'b.test': '9.9.9.9'}
+    results = {'a.test': {'ipv4': ['3.3.3.3', '2.2.2.2']},
+               'b.test': {'ipv4': ['10.0.0.1', '9.0.0.1']},
+               'c.test': {'ipv4': [], 'ipv6': ['::1']}}
+    merged = merge_ip_results(existing, results)
+    assert merged == {'a.test': '2.2.2.2', 'b.test': '9.0.0.1'}
+
+
+def main():
+    for test in (test_full_run_writes_once, test_resume_after_interrupt, test_merge_prefers_existing_ip):
+        test()
+        print(f"✓ {test.__doc__}")
+
+
+if __name__ == "__main__":
+    main()
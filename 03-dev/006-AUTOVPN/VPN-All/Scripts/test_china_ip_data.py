@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+中国IP地址段数据测试（APNIC导入、区间合并、mmap加载）
+"""
+
+import ipaddress
+import os
+import tempfile
+
+from china_ip_data import (parse_delegated, merge_intervals, write_range_file, import_delegated,
+                           RangeSet, get_china_ranges)
+
+DELEGATED_SAMPLE = """\
+2|apnic|20260101|70000|19830613|20251231|+1000
+apnic|*|ipv4|*|50000|summary
+apnic|*|ipv6|*|10000|summary
+apnic|CN|ipv4|1.0.1.0|256|20110414|allocated
+apnic|CN|ipv4|1.0.2.0|512|20110414|allocated
+apnic|CN|ipv4|1.0.8.0|2048|20110412|allocated
+apnic|JP|ipv4|126.0.0.0|16777216|20050107|allocated
+apnic|CN|ipv4|36.0.0.0|768|20100810|assigned
+apnic|CN|ipv4|36.0.3.0|256|20100810|reserved
+apnic|CN|ipv6|240e::|18|20150612|allocated
+apnic|CN|ipv6|2408:8000::|20|20130528|allocated
+apnic|HK|ipv6|2400:8900::|32|20100101|allocated
+"""
+
+
+def _ip(text):
+    return int(ipaddress.ip_address(text))
+
+
+def test_parse_and_merge():
+    """解析 delegated 格式：跳过版本/汇总行与其他国家，非2的幂地址数按区间处理并合并相邻区间"""
+    v4, v6 = parse_delegated(DELEGATED_SAMPLE.splitlines())
+    assert len(v4) == 4 and len(v6) == 2
+    merged = merge_intervals(v4)
+    # 1.0.1.0/24 与 1.0.2.0/23 相邻合并；36.0.0.0 起 768 个地址（非2的幂）
+    assert merged == [(_ip('1.0.1.0'), _ip('1.0.3.255')), (_ip('1.0.8.0'), _ip('1.0.15.255')),
+                      (_ip('36.0.0.0'), _ip('36.0.2.255'))]
+    assert merge_intervals([(1, 5), (3, 4), (6, 9), (20, 30)]) == [(1, 9), (20, 30)]
+
+
+def test_binary_file_mmap_lookup():
+    """二进制范围文件经 mmap 加载后二分查找，覆盖 IPv4/IPv6"""
+    directory = tempfile.mkdtemp()
+    source = os.path.join(directory, 'delegated-apnic-latest')
+    with open(source, 'w', encoding='utf-8') as f:
+        f.write(DELEGATED_SAMPLE)
+    output = os.path.join(directory, 'china_ip_ranges.bin')
+    assert import_delegated(source, output) == (3, 2)
+    # 文件头 16 字节 + 3 对 uint32 + 2 对 uint64
+    assert os.path.getsize(output) == 16 + 3 * 8 + 2 * 16
+
+    ranges = RangeSet(output)
+    assert '1.0.1.0' in ranges and '1.0.3.255' in ranges and '1.0.4.0' not in ranges
+    assert '36.0.2.1' in ranges and '36.0.3.1' not in ranges
+    assert '126.1.2.3' not in ranges  # 日本
+    assert ranges.lookup('240e:3b7::1') == 'CN' and ranges.lookup('2408:8000:1::1') == 'CN'
+    assert ranges.lookup('2400:8900::1') is None and ranges.lookup('bad') is None
+    assert ranges.lookup_many(['1.0.8.1', '8.8.8.8']) == ['CN', None]
+    assert list(ranges.ipv6_ranges())[0][0] == _ip('2408:8000::')
+    ranges.close()
+    assert ranges._mmap.closed and ranges._file.closed
+
+    assert get_china_ranges(output) is get_china_ranges(output)
+    assert get_china_ranges(os.path.join(directory, 'missing.bin')) is None
+
+    bad = os.path.join(directory, 'bad.bin')
+    with open(bad, 'wb') as f:
+        f.write(b'not a range file')
+    assert get_china_ranges(bad) is None
+
+    empty = os.path.join(directory, 'empty.bin')
+    write_range_file(empty, [])
+    assert len(RangeSet(empty)) == 0 and '1.0.1.1' not in RangeSet(empty)
+
+
+def main():
+    for test in (test_parse_and_merge, test_binary_file_mmap_lookup):
+        test()
+        print(f"✓ {test.__doc__}")
+
+
+if __name__ == "__main__":
+    main()
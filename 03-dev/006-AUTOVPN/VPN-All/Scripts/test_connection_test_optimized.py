@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+连接池与保温连接测试（本地监听端口，不访问外网）
+"""
+
+import socket
+import threading
+import time
+
+from connection_test_optimized import (ConnectionPool, ConnectionTestConfig, OptimizedConnectionTester,
+                                       PoolExhaustedError, WarmConnectionKeeper,
+                                       run_warm_health_checks)
+from connection_test_optimized import TestResult as ResultType  # 避免被 pytest 当作测试类收集
+
+
+class _Server:
+    """接受并保持连接的本地服务端，可主动关闭或向已接受的连接写数据"""
+
+    def __init__(self):
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.bind(('127.0.0.1', 0))
+        self.listener.listen(64)
+        self.port = self.listener.getsockname()[1]
+        self.accepted = []
+        self._thread = threading.Thread(target=self._accept, daemon=True)
+        self._thread.start()
+
+    def _accept(self):
+        while True:
+            try:
+                self.accepted.append(self.listener.accept()[0])
+            except OSError:
+                return
+
+    def wait_for(self, count):
+        deadline = time.time() + 2
+        while len(self.accepted) < count and time.time() < deadline:
+            time.sleep(0.005)
+        return self.accepted[count - 1]
+
+    def close(self):
+        self.listener.close()
+        for conn in self.accepted:
+            conn.close()
+
+
+def test_pool_reuse_liveness_and_limits():
+    """复用存活连接；对端关闭或写入数据的空闲连接被丢弃；空闲超时淘汰；每主机连接上限"""
+    server = _Server()
+    try:
+        pool = ConnectionPool(max_size=2, max_per_host=2, idle_timeout=0.2)
+        conn, reused = pool.acquire('127.0.0.1', server.port, 1.0)
+        assert not reused
+        pool.release('127.0.0.1', server.port, conn)
+        again, reused = pool.acquire('127.0.0.1', server.port, 1.0)
+        assert reused and again is conn
+
+        # 对端关闭：存活检查读到 EOF，不阻塞地丢弃并重新握手
+        pool.release('127.0.0.1', server.port, again)
+        server.wait_for(1).close()
+        time.sleep(0.05)
+        fresh, reused = pool.acquire('127.0.0.1', server.port, 1.0)
+        assert not reused and fresh is not conn
+        # 空闲连接上出现未预期数据同样丢弃
+        pool.release('127.0.0.1', server.port, fresh)
+        server.wait_for(2).sendall(b'x')
+        time.sleep(0.05)
+        first, reused = pool.acquire('127.0.0.1', server.port, 1.0)
+        assert not reused
+
+        # 每主机上限：两个连接都在使用中时第三个等待超时
+        second, _ = pool.acquire('127.0.0.1', server.port, 1.0)
+        start = time.time()
+        try:
+            pool.acquire('127.0.0.1', server.port, 0.1)
+            assert False, "应当超时"
+        except PoolExhaustedError:
+            assert time.time() - start >= 0.09
+        # 另一线程归还后等待者复用该连接
+        threading.Timer(0.05, pool.release, ('127.0.0.1', server.port, second)).start()
+        third, reused = pool.acquire('127.0.0.1', server.port, 1.0)
+        assert reused and third is second
+        pool.release('127.0.0.1', server.port, third)
+
+        time.sleep(0.3)
+        assert pool.evict_idle() == 1
+        metrics = pool.metrics()
+        assert metrics['hits'] == 2 and metrics['misses'] == 4 and metrics['stale_dropped'] == 2
+        assert metrics['idle_evicted'] == 1 and metrics['connections_by_host'] == {'127.0.0.1': 1}
+        assert metrics['latency_ms']['hit']['count'] == 2 and metrics['latency_ms']['connect']['count'] == 4
+        assert sum(metrics['latency_ms']['miss']['buckets'].values()) == 4
+        # 不可复用的连接归还时直接关闭
+        pool.release('127.0.0.1', server.port, first, reusable=False)
+        assert first.fileno() == -1
+        pool.close()
+        assert pool.metrics()['connections_by_host'] == {} and pool.metrics()['idle_connections'] == 0
+    finally:
+        server.close()
+
+
+def test_tester_report_and_warm_keeper():
+    """测试器每次尝试新建握手、连接不放回池中，报告导出连接池指标；保温连接预热后健康检查命中并复核"""
+    server = _Server()
+    try:
+        tester = OptimizedConnectionTester(ConnectionTestConfig(timeout=1.0, retry_count=1, max_concurrent_tests=2))
+        targets = [('127.0.0.1', server.port, 'ipv4')] * 6
+        results = tester.batch_test_with_optimization(targets)
+        assert all(r.success for r in results)
+        assert results[0].attempts[0].ip_address == '127.0.0.1'
+        assert all(a.response_time > 0 for r in results for a in r.attempts)
+        pool_report = tester.last_report['connection_pool']
+        assert pool_report['hits'] == 0 and pool_report['misses'] == 6
+        assert pool_report['latency_ms']['connect']['count'] == 6
+        assert pool_report['idle_connections'] == 0 and pool_report['connections_by_host'] == {}
+
+        pool = ConnectionPool(max_size=3, idle_timeout=60)
+        keeper = WarmConnectionKeeper(pool, [('127.0.0.1', server.port)], interval=0.05, min_idle=2, timeout=1.0)
+        assert keeper.refill() == 2 and keeper.refill() == 0
+        with keeper:
+            check = keeper.health_check('127.0.0.1', server.port)
+            assert check['ok'] and check['reused']
+            # 对端关闭全部连接后，后台线程补足存活连接
+            # 测试器 6 次握手、预热 2 个连接、命中后 1 次复核握手
+            server.wait_for(6 + 2 + 1)
+            for conn in list(server.accepted):
+                conn.close()
+            time.sleep(0.3)
+            assert keeper.health_check('127.0.0.1', server.port)['reused']
+        assert pool.metrics()['stale_dropped'] >= 2
+
+        checks = run_warm_health_checks(f'127.0.0.1:{server.port}', interval=0.01, checks=3)
+        assert [c['ok'] for c in checks] == [True] * 3 and all(c['reused'] for c in checks)
+        refused = socket.socket()
+        refused.bind(('127.0.0.1', 0))
+        port = refused.getsockname()[1]
+        refused.close()
+        assert not run_warm_health_checks(f'127.0.0.1:{port}', interval=0.01, checks=1)[0]['ok']
+    finally:
+        server.close()
+
+
+def test_tester_dead_peer_and_pool_exhaustion():
+    """连接池已满单独报告且不计入目标成功率；保温连接的对端已不可达时健康检查失败并丢弃该连接"""
+    server = _Server()
+    try:
+        config = ConnectionTestConfig(timeout=0.2, retry_count=1, max_connections_per_host=1,
+                                      adaptive_timeout_min=0.1)
+        tester = OptimizedConnectionTester(config)
+        assert tester.test_connection_with_retry('127.0.0.1', server.port, 'ipv4').success
+        key = f'127.0.0.1:{server.port}'
+        assert tester.success_rate_tracker[key] == 1.0
+
+        # 名额被占用：等待超时后报告 pool_exhausted，成功率不变
+        held, reused = tester.connection_pool.acquire('127.0.0.1', server.port, 1.0, socket.AF_INET)
+        assert not reused
+        result = tester.test_connection_with_retry('127.0.0.1', server.port, 'ipv4')
+        assert result.final_result == ResultType.POOL_EXHAUSTED and '连接池已满' in result.attempts[0].error_message
+        assert tester.success_rate_tracker[key] == 1.0
+        tester.connection_pool.release('127.0.0.1', server.port, held, False, socket.AF_INET)
+
+        # 监听端口关闭但已建立的连接未收到 FIN：池中连接仍"存活"，复核握手发现不可达
+        pool = ConnectionPool(max_size=1, idle_timeout=60)
+        keeper = WarmConnectionKeeper(pool, [('127.0.0.1', server.port)], timeout=0.2)
+        assert keeper.refill() == 1
+        server.listener.shutdown(socket.SHUT_RDWR)
+        server.listener.close()
+        check = keeper.health_check('127.0.0.1', server.port)
+        assert not check['ok'] and check['reused'] and check['error']
+        assert pool.metrics()['idle_connections'] == 0 and pool.metrics()['connections_by_host'] == {}
+        result = tester.test_connection_with_retry('127.0.0.1', server.port, 'ipv4')
+        assert result.final_result == ResultType.CONNECTION_REFUSED
+    finally:
+        server.close()
+
+
+def main():
+    for test in (test_pool_reuse_liveness_and_limits, test_tester_report_and_warm_keeper,
+                 test_tester_dead_peer_and_pool_exhaustion):
+        test()
+        print(f"✓ {test.__doc__}")
+
+
+if __name__ == "__main__":
+    main()
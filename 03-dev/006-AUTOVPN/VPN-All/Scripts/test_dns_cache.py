@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+持久化DNS缓存测试
+"""
+
+import asyncio
+import os
+import tempfile
+import threading
+import time
+
+from dns_cache import DNSCache
+from async_dns_resolver import AsyncDNSResolver, resolve_domains
+from test_async_dns_resolver import StubDNSServer, NXDOMAIN
+
+
+def _new_cache(**kwargs):
+    path = os.path.join(tempfile.mkdtemp(), 'dns_cache.sqlite3')
+    return DNSCache(path, **kwargs)
+
+
+def test_ttl_and_persistence():
+    """按TTL过期，重新打开后条目仍在"""
+    cache = _new_cache(min_ttl=1)
+    cache.put('Example.COM', 'A', '8.8.8.8', ['1.2.3.4'], ttl=120)
+    cache.put('short.test', 'A', '8.8.8.8', ['5.6.7.8'], ttl=1)
+    cache.close()
+
+    reopened = DNSCache(cache.path, min_ttl=1)
+    entry = reopened.get('example.com', 'A', '8.8.8.8')
+    assert entry.addresses == ['1.2.3.4'] and entry.is_fresh()
+    assert 110 < entry.ttl_remaining <= 120
+    assert reopened.get('example.com', 'A', '1.1.1.1') is None
+    time.sleep(1.1)
+    assert not reopened.get('short.test', 'A', '8.8.8.8').is_fresh()
+
+
+def test_negative_caching():
+    """NXDOMAIN 负缓存，超时不缓存"""
+    cache = _new_cache()
+    calls = []
+
+    def fetch_nx():
+        calls.append(1)
+        return [], None, 'NXDOMAIN'
+
+    first = cache.lookup('nx.test', 'A', 'system', fetch_nx)
+    second = cache.lookup('nx.test', 'A', 'system', fetch_nx)
+    assert first.negative and second.negative
+    assert len(calls) == 1 and cache.stats['negative_hits'] == 1
+
+    assert cache.put('slow.test', 'A', 'system', [], error='Timeout') is None
+    assert cache.get('slow.test', 'A', 'system') is None
+
+
+def test_stale_while_revalidate():
+    """过期条目先返回旧值，后台刷新"""
+    cache = _new_cache(min_ttl=0)
+    cache.put('swr.test', 'A', 'system', ['10.0.0.1'], ttl=0)
+    refreshed = threading.Event()
+
+    def fetch():
+        refreshed.set()
+        return ['10.0.0.2'], 300, None
+
+    entry = cache.lookup('swr.test', 'A', 'system', fetch)
+    assert entry.source == 'stale' and entry.addresses == ['10.0.0.1']
+    assert refreshed.wait(2)
+    cache.close()
+    assert DNSCache(cache.path).get('swr.test', 'A', 'system').addresses == ['10.0.0.2']
+
+    # 同步刷新失败时使用旧值
+    cache = _new_cache(min_ttl=0)
+    cache.put('swr.test', 'A', 'system', ['10.0.0.1'], ttl=0)
+    entry = cache.lookup('swr.test', 'A', 'system', lambda: ([], None, 'Timeout'),
+                         revalidate_in_background=False)
+    assert entry.source == 'stale' and entry.addresses == ['10.0.0.1']
+
+
+def test_async_resolver_uses_cache():
+    """批量解析重复运行时只查询过期条目"""
+    stub = StubDNSServer()
+    try:
+        cache = _new_cache()
+        first = resolve_domains(['a.test', 'b.test', NXDOMAIN], [stub.address], timeout=1.0, cache=cache)
+        assert stub.udp.query_count == 3
+        second = resolve_domains(['a.test', 'b.test', NXDOMAIN], [stub.address], timeout=1.0, cache=cache)
+        assert stub.udp.query_count == 3
+        assert second['a.test'].to_tuple() == first['a.test'].to_tuple()
+        assert second[NXDOMAIN].answers[0].error == 'NXDOMAIN'
+        assert all(r.answers[0].from_cache == 'cache' for r in second.values())
+
+        # 条目过期且服务器不可达时使用旧值
+        cache._conn.execute('UPDATE dns_answers SET expires_at = ?', (time.time() - 1,))
+        stub.close()
+        resolver = AsyncDNSResolver([stub.address], timeout=0.2, retries=0, cache=cache)
+        stale = asyncio.run(resolver.resolve_many(['a.test']))['a.test']
+        assert stale.answers[0].from_cache == 'stale'
+        assert sorted(stale.ipv4) == ['10.0.0.1', '10.0.0.2']
+    finally:
+        stub.close()
+
+
+def main():
+    for test in (test_ttl_and_persistence, test_negative_caching,
+                 test_stale_while_revalidate, test_async_resolver_uses_cache):
+        test()
+        print(f"✓ {test.__doc__}")
+
+
+if __name__ == "__main__":
+    main()
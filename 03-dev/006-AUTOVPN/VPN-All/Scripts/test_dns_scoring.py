@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+DNS共识评分引擎测试（连通性探测使用桩函数，无需网络）
+"""
+
+import json
+import os
+import tempfile
+
+from dns_scoring import ScoringEngine, ScoringWeights, CandidateTable, count_dns_hits
+
+US = {"countryCode": "US", "error": None}
+JP = {"countryCode": "JP", "error": None}
+CN = {"countryCode": "CN", "error": None}
+FAILED = {"countryCode": "N/A", "error": "lookup failed"}
+
+
+def test_hit_counts_per_server():
+    """命中次数按服务器计数，同一服务器重复应答只计一次"""
+    answers = {
+        'a.test': {'8.8.8.8': ['1.1.1.1', '2.2.2.2', '1.1.1.1'], '1.1.1.1': ['1.1.1.1'], '9.9.9.9': ['3.3.3.3']},
+        'b.test': [('8.8.8.8', ['2.2.2.2']), ('1.1.1.1', ['2.2.2.2'])],
+        'c.test': {},
+    }
+    table = CandidateTable.from_server_answers(answers)
+    assert list(table.offsets) == [0, 3, 4, 4]
+    assert [table.ips[i] for i in table.span('a.test')] == ['1.1.1.1', '2.2.2.2', '3.3.3.3']
+    assert [table.hits[i] for i in table.span('a.test')] == [2, 1, 1]
+    assert [table.hits[i] for i in table.span('b.test')] == [2]
+    assert count_dns_hits(answers['a.test']) == {'1.1.1.1': 2, '2.2.2.2': 1, '3.3.3.3': 1}
+    assert list(count_dns_hits({'x': ['9.0.0.2', '9.0.0.1', '9.0.0.3']})) == ['9.0.0.2', '9.0.0.1', '9.0.0.3']
+
+    from get_clean_ips_v2 import get_dns_hit_counts
+    assert get_dns_hit_counts(answers['a.test']) == count_dns_hits(answers['a.test'])
+    assert get_dns_hit_counts(answers['b.test']) == {'2.2.2.2': 2}
+
+
+def test_batch_selection_matches_legacy_rules():
+    """默认权重与原评分规则一致：命中*20、地理加减分、连通 +60 / 不通 -200"""
+    engine = ScoringEngine()
+    answers = {
+        # 1.0.0.1 命中3次且在美国，但不可达；1.0.0.2 命中1次，日本，可达
+        'a.test': {'s1': ['1.0.0.1', '1.0.0.2'], 's2': ['1.0.0.1'], 's3': ['1.0.0.1']},
+        # 唯一候选地理查询失败且不可达 -> 放弃
+        'b.test': {'s1': ['2.0.0.1']},
+        # 非优选国家但可达 -> 选中
+        'c.test': {'s1': ['3.0.0.1']},
+    }
+    geo = {'1.0.0.1': US, '1.0.0.2': JP, '2.0.0.1': FAILED, '3.0.0.1': CN}
+    reachable = {'1.0.0.1': False, '1.0.0.2': True, '2.0.0.1': False, '3.0.0.1': True}
+    probed = []
+
+    def probe(ranked):
+        probed.append(ranked)
+        return {ip: (reachable[ip], None) for ip in ranked}
+
+    table = engine.build(answers, geo)
+    assert engine.scores(table, with_connectivity=False) == [120.0, 70.0, -10.0, 10.0]
+    selected = engine.select(table, probe)
+    assert selected == {'a.test': '1.0.0.2', 'b.test': None, 'c.test': '3.0.0.1'}
+    # 探测按命中+地理得分从高到低的顺序传入
+    assert probed[0] == ['1.0.0.1', '1.0.0.2']
+    assert table.scores == [-80.0, 130.0, -210.0, 70.0]
+    assert [c['ip'] for c in table.candidates('a.test')] == ['1.0.0.2', '1.0.0.1']
+
+    # 单域名输入格式（select_best_ip 的候选列表）得到相同结果
+    candidates = {'a.test': [{"ip": "1.0.0.2", "geo_info": JP, "dns_hits": 1},
+                             {"ip": "1.0.0.1", "geo_info": US, "dns_hits": 3}]}
+    assert engine.select(engine.build_from_candidates(candidates), probe) == {'a.test': '1.0.0.2'}
+
+
+def test_weights_config_and_latency():
+    """权重可从JSON配置加载；同为可达时按延迟区分，同分保持初始排名"""
+    path = os.path.join(tempfile.mkdtemp(), 'scoring_weights.json')
+    assert ScoringWeights.load(path) == ScoringWeights()
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'hit': 0, 'latency_per_ms': -1.0, 'preferred_countries': ['JP'], 'unknown_key': 1}, f)
+    weights = ScoringWeights.load(path)
+    assert weights.hit == 0 and weights.preferred_countries == ('JP',)
+
+    answers = {'a.test': {'s1': ['10.0.0.1', '10.0.0.2'], 's2': ['10.0.0.1']}}
+    geo = {'10.0.0.1': JP, '10.0.0.2': JP}
+    latency = {'10.0.0.1': 0.120, '10.0.0.2': 0.030}
+
+    def probe(ranked):
+        return {ip: (True, latency[ip]) for ip in ranked}
+
+    engine = ScoringEngine(weights)
+    table = engine.build(answers, geo)
+    assert engine.select(table, probe) == {'a.test': '10.0.0.2'}
+    assert table.candidates('a.test')[0]['latency_ms'] == 30.0
+
+    # 无探测、同分时取初始排名靠前（IP排序在前）者
+    engine = ScoringEngine(ScoringWeights(hit=0))
+    assert engine.select(engine.build(answers, geo)) == {'a.test': '10.0.0.1'}
+
+
+def main():
+    for test in (test_hit_counts_per_server, test_batch_selection_matches_legacy_rules,
+                 test_weights_config_and_latency):
+        test()
+        print(f"✓ {test.__doc__}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+双栈集成增量分析测试（桩解析器与桩测试器，不访问网络）
+"""
+
+import json
+import os
+import tempfile
+import time
+
+from dual_stack_integration import DualStackIntegration
+from smart_dual_stack import DualStackDecision, IPVersion
+
+
+class _StubRouter:
+    """记录被测试的域名，返回固定决策"""
+
+    def __init__(self):
+        self.tested = []
+
+    def batch_test_hosts(self, hosts, ports=None):
+        self.tested.append(list(hosts))
+        return {host: DualStackDecision(recommended_version=IPVersion.IPV4, ipv4_quality=80.0) for host in hosts}
+
+
+def _setup(answers, count):
+    directory = tempfile.mkdtemp()
+    domain_file = os.path.join(directory, 'domains.txt')
+    with open(domain_file, 'w', encoding='utf-8') as f:
+        f.write("# 注释\n")
+        f.write("".join(f"d{i}.example.com 1.1.1.1\n" for i in range(count)))
+        f.write("d0.example.com\n")
+    cache_file = os.path.join(directory, 'routing_cache.json')
+    calls = []
+
+    def resolver(domain):
+        calls.append(domain)
+        return answers.get(domain, [])
+
+    def create():
+        integration = DualStackIntegration(cache_file=cache_file, resolver=resolver)
+        integration.router = _StubRouter()
+        return integration
+
+    return domain_file, cache_file, calls, create
+
+
+def test_full_list_then_incremental():
+    """首次测试全部域名（无50个上限）；之后只重测过期或DNS应答变化的域名"""
+    answers = {f"d{i}.example.com": [f"10.0.{i // 256}.{i % 256}", "2001:db8::1"] for i in range(120)}
+    answers["d5.example.com"] = []  # 解析失败
+    domain_file, cache_file, calls, create = _setup(answers, 120)
+
+    integration = create()
+    configs = integration.analyze_domain_list(domain_file)
+    assert len(configs) == 120 and len(integration.router.tested[0]) == 120
+    assert sorted(calls) == sorted(answers) and len(calls) == 120  # 每个域名解析一次
+    assert configs["d1.example.com"].ipv4_addresses == ["10.0.0.1"]
+    assert configs["d1.example.com"].ipv6_addresses == ["2001:db8::1"]
+    with open(cache_file, encoding='utf-8') as f:
+        assert json.load(f)["d1.example.com"]["tested_at"] > 0
+
+    # 重新加载缓存：DNS 变化的域名与过期域名才重测；解析失败沿用缓存
+    answers["d7.example.com"] = ["10.9.9.9"]
+    integration = create()
+    integration.routing_cache["d9.example.com"].tested_at = time.time() - 25 * 3600
+    configs = integration.analyze_domain_list(domain_file)
+    assert integration.router.tested == [["d7.example.com", "d9.example.com"]]
+    assert integration.analysis_stats == {"total": 120, "cached": 118, "expired": 1, "dns_changed": 1, "new": 0}
+    assert len(configs) == 120 and configs["d7.example.com"].ipv4_addresses == ["10.9.9.9"]
+
+    # 全部新鲜时不测试也不重写缓存
+    mtime = os.stat(cache_file).st_mtime_ns
+    integration = create()
+    assert len(integration.analyze_domain_list(domain_file)) == 120
+    assert integration.router.tested == [] and os.stat(cache_file).st_mtime_ns == mtime
+
+
+def test_legacy_cache_entries_expire():
+    """旧版缓存条目没有测试时间戳，加载后视为过期"""
+    answers = {"d0.example.com": ["10.0.0.0"]}
+    domain_file, cache_file, _, create = _setup(answers, 1)
+    with open(cache_file, 'w', encoding='utf-8') as f:
+        json.dump({"d0.example.com": {
+            "domain": "d0.example.com", "recommended_ip_version": "IPv4", "ipv4_addresses": ["10.0.0.0"],
+            "ipv6_addresses": [], "quality_score": 50.0, "last_updated": "2024-01-01 00:00:00",
+            "routing_priority": 5}}, f)
+    integration = create()
+    assert integration.routing_cache["d0.example.com"].tested_at == 0.0
+    integration.analyze_domain_list(domain_file)
+    assert integration.router.tested == [["d0.example.com"]]
+    assert integration.analysis_stats["expired"] == 1
+
+
+def main():
+    for test in (test_full_list_then_incremental, test_legacy_cache_entries_expire):
+        test()
+        print(f"✓ {test.__doc__}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+hosts文件引擎测试（临时目录中的hosts副本）
+"""
+
+import hashlib
+import os
+import tempfile
+
+from hosts_file import HostsFile, AUTOVPN_MARKER, is_valid_hostname, update_autovpn_entries
+
+ROUTES_IP_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'routes', '常用境外IP.txt')
+
+SAMPLE = (
+    "# Copyright (c) Microsoft Corp.\r\n"
+    "127.0.0.1       localhost\r\n"
+    "::1             localhost\r\n"
+    "\r\n"
+    "# [DOMESTIC_IPS] - 国内纯净IP区域\r\n"
+    "223.5.5.5       dns.alidns.com\r\n"
+    "bad-ip          broken.example\r\n"
+    "# [FOREIGN_CDN_IPS] - 国外CDN IP区域\r\n"
+    "104.16.1.1      cdn.example.com    cdn2.example.com\r\n"
+    "\r\n"
+    f"{AUTOVPN_MARKER}\r\n"
+    "1.2.3.4\told.example.com\r\n"
+    "1.2.3.4\twww.old.example.com\r\n"
+    "\r\n"
+    "10.0.0.1        intranet.local\r\n"
+)
+
+
+def _write(text):
+    path = os.path.join(tempfile.mkdtemp(), 'hosts')
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        f.write(text)
+    return path
+
+
+def _section_of(line):
+    if '[DOMESTIC_IPS]' in line:
+        return 'domestic'
+    if '[FOREIGN_CDN_IPS]' in line:
+        return 'foreign_cdn'
+    return None
+
+
+def test_tokenize_and_index():
+    """单次分词建立区域索引与域名索引；区域标记判断每行只调用一次"""
+    calls = []
+
+    def section_of(line):
+        calls.append(line)
+        return _section_of(line)
+
+    hosts = HostsFile.load(_write(SAMPLE), section_of=section_of)
+    assert len(calls) == 3  # 三个注释行（AUTOVPN 标记不经过回调）
+    assert hosts.newline == '\r\n'
+    assert hosts.section_ips('domestic') == ['223.5.5.5']
+    # 区域延续到下一个区域标记（与 HybridHostsRouter 原有规则一致）
+    assert hosts.section_ips('foreign_cdn') == ['104.16.1.1', '1.2.3.4', '1.2.3.4', '10.0.0.1']
+    assert hosts.lookup('CDN2.example.com') == '104.16.1.1' and hosts.lookup('localhost') == '127.0.0.1'
+    assert 'broken.example' not in hosts and hosts.lookup('missing.example') is None
+    assert hosts.autovpn_entries() == [('1.2.3.4', 'old.example.com'), ('1.2.3.4', 'www.old.example.com')]
+    # 未修改时原样输出
+    assert hosts.render() == SAMPLE.encode('utf-8')
+
+
+def test_upsert_atomic_save():
+    """合并写入AUTOVPN区块、替换区块内同名旧记录；报告被区块外条目覆盖的域名；原子写入后校验和一致；区块外内容不变"""
+    path = _write(SAMPLE)
+    hosts = HostsFile.load(path)
+    entries = [('5.6.7.8', 'cdn2.example.com'), ('5.6.7.8', 'new.example.com'),
+               ('5.6.7.8', 'www.old.example.com')]
+    hosts.upsert(entries)
+    # 区块之前的用户条目先生效：cdn2 的新记录不会生效；同IP的区块外条目不算
+    assert hosts.shadowed(entries) == ['cdn2.example.com']
+    assert hosts.shadowed([('104.16.1.1', 'cdn2.example.com'), ('9.9.9.9', 'missing.example')]) == []
+    digest = hosts.save()
+    with open(path, 'rb') as f:
+        data = f.read()
+    assert hashlib.sha256(data).hexdigest() == digest == hosts.checksum()
+    assert not [name for name in os.listdir(os.path.dirname(path)) if name.endswith('.tmp')]
+
+    text = data.decode('utf-8')
+    # 用户维护的条目不受影响（系统取第一条记录，仍解析到用户的IP）
+    assert "104.16.1.1      cdn.example.com    cdn2.example.com\r\n" in text and 'intranet.local' in text
+    reloaded = HostsFile.load(path)
+    assert reloaded.lookup('cdn2.example.com') == '104.16.1.1'
+    assert reloaded.lookup('www.old.example.com') == '5.6.7.8'
+    assert reloaded.autovpn_entries() == [('1.2.3.4', 'old.example.com'), ('5.6.7.8', 'cdn2.example.com'),
+                                          ('5.6.7.8', 'new.example.com'), ('5.6.7.8', 'www.old.example.com')]
+    assert text.count(AUTOVPN_MARKER) == 1
+
+    # 整体替换区块；没有区块的文件追加到末尾
+    assert update_autovpn_entries([('9.9.9.9', 'only.example.com')], path, replace=True) == 1
+    assert HostsFile.load(path).autovpn_entries() == [('9.9.9.9', 'only.example.com')]
+
+    plain = _write("127.0.0.1 localhost\n\n\n")
+    update_autovpn_entries([('9.9.9.9', 'a.example.com'), ('9.9.9.9', 'www.a.example.com')], plain)
+    with open(plain, encoding='utf-8', newline='') as f:
+        assert f.read() == f"127.0.0.1 localhost\n\n{AUTOVPN_MARKER}\n9.9.9.9\ta.example.com\n9.9.9.9\twww.a.example.com\n\n"
+
+    missing = os.path.join(tempfile.mkdtemp(), 'hosts')
+    update_autovpn_entries([('9.9.9.9', 'a.example.com')], missing)
+    assert HostsFile.load(missing).lookup('a.example.com') == '9.9.9.9'
+
+
+def test_import_routes_file_idempotent():
+    """导入 routes/常用境外IP.txt：行内注释与无效主机名不写入，重复导入结果不变，被截断的旧区块可修复"""
+    from update_hosts import update_hosts_file
+
+    assert is_valid_hostname('www.example.com') and is_valid_hostname('_dmarc.example.com')
+    assert not any(map(is_valid_hostname, ['#', 'www.#', 'www.', '*.example.com', '-a.com', '1.2.3.4']))
+
+    # 旧版本写入的区块：注释被当作域名，区块被无效行截断，之后的条目成为孤儿
+    path = _write(
+        "127.0.0.1       localhost\n"
+        "203.0.113.9     user.example.com\n"
+        "\n"
+        f"{AUTOVPN_MARKER}\n"
+        "198.18.3.69\t#\n"
+        "198.18.3.69\twww.#\n"
+        "216.239.32.21\tantigravity.google\n"
+        "\n"
+    )
+    count = update_hosts_file(ROUTES_IP_FILE, path, backup=False)
+    with open(path, 'rb') as f:
+        first = f.read()
+    hosts = HostsFile.load(path)
+    entries = hosts.autovpn_entries()
+    assert count == len(entries) > 300
+    assert all(is_valid_hostname(name) for _ip, name in entries)
+    assert b'\t#' not in first and b'www.#' not in first
+    assert first.count(AUTOVPN_MARKER.encode('utf-8')) == 1
+    assert hosts.lookup('antigravity.google') == '216.239.32.21' and hosts.lookup('user.example.com') == '203.0.113.9'
+
+    assert update_hosts_file(ROUTES_IP_FILE, path, backup=False) == count
+    with open(path, 'rb') as f:
+        assert f.read() == first
+
+
+def main():
+    for test in (test_tokenize_and_index, test_upsert_atomic_save, test_import_routes_file_idempotent):
+        test()
+        print(f"✓ {test.__doc__}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+hosts变更日志测试（临时目录中的hosts副本与日志库）
+"""
+
+import os
+import tempfile
+
+from hosts_file import update_autovpn_entries
+from hosts_journal import HostsJournal, main as journal_main
+
+BASE = b"127.0.0.1 localhost\r\n\r\n# AUTOVPN\xe8\x87\xaa\xe5\x8a\xa8\xe5\x86\x99\xe5\x85\xa5\r\n1.1.1.1\ta.example.com\r\n"
+
+
+def _setup(interval=3):
+    directory = tempfile.mkdtemp()
+    hosts_path = os.path.join(directory, 'hosts')
+    with open(hosts_path, 'wb') as f:
+        f.write(BASE)
+    journal = HostsJournal(os.path.join(directory, 'journal.sqlite3'), checkpoint_interval=interval)
+    return hosts_path, journal
+
+
+def _read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def test_deltas_and_rollback():
+    """每次更新只记录差量与条目摘要；周期检查点；可回滚到任意记录点"""
+    hosts_path, journal = _setup()
+    states = {}
+    for i in range(7):
+        with journal.track(hosts_path, f"添加 d{i}"):
+            update_autovpn_entries([(f"2.2.2.{i}", f"d{i}.example.com")], hosts_path)
+        states[journal.history(hosts_path, 1)[0]['id']] = _read(hosts_path)
+    with journal.track(hosts_path, "变更 a"):
+        update_autovpn_entries([('3.3.3.3', 'a.example.com')], hosts_path)
+    states[journal.history(hosts_path, 1)[0]['id']] = _read(hosts_path)
+
+    history = journal.history(hosts_path, limit=100)
+    assert len(history) == 9 and history[-1]['description'] == '基线' and history[-1]['checkpoint']
+    # 基线之后每 3 次变更一个检查点
+    assert [h['checkpoint'] for h in reversed(history)] == [True, False, False, True, False, False, True, False, False]
+    assert history[0]['summary'] == {'added': {}, 'removed': {}, 'changed': {'a.example.com': ['1.1.1.1', '3.3.3.3']}}
+    assert history[1]['summary']['added'] == {'d6.example.com': '2.2.2.6'}
+
+    # 未变化的更新不产生记录
+    with journal.track(hosts_path, "无变化"):
+        update_autovpn_entries([('3.3.3.3', 'a.example.com')], hosts_path)
+    assert len(journal.history(hosts_path, 100)) == 9
+
+    for change_id, content in states.items():
+        assert journal.content_at(change_id) == content
+    assert journal.content_at(history[-1]['id']) == BASE
+
+    target = history[4]['id']
+    rollback_id = journal.restore(target)
+    assert _read(hosts_path) == states[target]
+    assert journal.get(rollback_id)['description'] == f"回滚到 #{target}"
+    assert journal.content_at(rollback_id) == states[target]
+
+
+def test_external_edit_and_cli():
+    """外部修改先记为完整基线；命令行 list / show / restore"""
+    hosts_path, journal = _setup()
+    with journal.track(hosts_path, "第一次"):
+        update_autovpn_entries([('2.2.2.2', 'b.example.com')], hosts_path)
+    with open(hosts_path, 'ab') as f:
+        f.write(b"9.9.9.9 manual.example.com\r\n")
+    with journal.track(hosts_path, "第二次"):
+        update_autovpn_entries([('2.2.2.3', 'c.example.com')], hosts_path)
+    history = journal.history(hosts_path)
+    assert [h['description'] for h in history] == ['第二次', '外部修改', '第一次', '基线']
+    assert b'manual.example.com' in journal.content_at(history[1]['id'])
+    assert journal.checkpoint(hosts_path) == history[0]['id']
+
+    journal.close()
+    assert journal_main(['--journal', journal.path, 'list', '--hosts', hosts_path]) == 0
+    assert journal_main(['--journal', journal.path, 'show', str(history[0]['id'])]) == 0
+    assert journal_main(['--journal', journal.path, 'restore', str(history[3]['id']), '--dry-run']) == 0
+    assert journal_main(['--journal', journal.path, 'restore', str(history[3]['id'])]) == 0
+    assert _read(hosts_path) == BASE
+    assert journal_main(['--journal', journal.path, 'show', '9999']) == 1
+
+
+def main():
+    for test in (test_deltas_and_rollback, test_external_edit_and_cli):
+        test()
+        print(f"✓ {test.__doc__}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+混合IP分类器并发模式测试（探测函数使用桩函数，无需网络）
+"""
+
+import os
+import tempfile
+import threading
+import time
+
+from hybrid_ip_classifier import HybridIPClassifier
+
+
+def _classifier(delay=0.05, scores=None, calls=None, active=None, **config):
+    """构造使用桩探测函数的分类器：每次延迟探测 sleep delay 秒
+
+    active 为 {'now': 0, 'peak': 0} 时记录同时进行的探测数峰值
+    """
+    scores = scores or {}
+    calls = calls if calls is not None else []
+    active = active if active is not None else {'now': 0, 'peak': 0}
+    lock = threading.Lock()
+
+    def latency(ip):
+        with lock:
+            calls.append(ip)
+            active['now'] += 1
+            active['peak'] = max(active['peak'], active['now'])
+        time.sleep(delay)
+        with lock:
+            active['now'] -= 1
+        return scores.get(ip, 100.0)
+
+    classifier = HybridIPClassifier(
+        config_file=os.path.join(tempfile.mkdtemp(), 'hybrid_ip_config.json'),
+        probes={'latency': latency, 'packet_loss': lambda ip: 100.0, 'bandwidth': lambda ip: 100.0}
+    )
+    classifier.config['probing'].update(config)
+    return classifier
+
+
+def test_concurrent_batch_and_cache():
+    """质量探测在有界线程池中并发；结果保持输入顺序；同一IP只探测一次"""
+    calls, active, static_calls = [], {'now': 0, 'peak': 0}, []
+    foreign = [f"198.51.100.{i}" for i in range(1, 9)]
+    classifier = _classifier(scores={'198.51.100.1': 0.0}, calls=calls, active=active, max_workers=4)
+    classify_static = classifier._classify_static
+    classifier._classify_static = lambda ip: static_calls.append(ip) or classify_static(ip)
+    ips = ['223.5.5.5', *foreign, '104.16.1.1', '198.51.100.2', 'bad-ip']
+
+    results = classifier.batch_classify(ips)
+    # 探测并发进行且不超过线程数；每个IP只做一次地址段检查
+    assert 1 < active['peak'] <= 4, active
+    assert static_calls == ips
+    assert [r.ip_address for r in results] == ips
+    assert results[0].category == 'domestic' and results[9].category == 'foreign_cdn'
+    assert results[1].category == 'foreign_cdn' and results[1].confidence == 60.0  # 0*0.4 + 100*0.4 + 100*0.2
+    assert results[2].category == 'foreign_direct' and results[10].category == 'foreign_direct'
+    assert results[11].category == 'unknown'
+    assert sorted(calls) == sorted(foreign)
+    assert classifier.probe_stats['probed'] == 8
+    assert classifier.probe_stats['cache_hits'] + classifier.probe_stats['shared'] == 1
+
+    # 再次分类命中缓存；缓存过期后重新探测
+    classifier.batch_classify(foreign[:2])
+    assert len(calls) == 8 and classifier.probe_stats['cache_hits'] >= 2
+    classifier.config['probing']['cache_ttl'] = 0
+    time.sleep(0.01)
+    classifier.classify_ip(foreign[0])
+    assert len(calls) == 9
+
+
+def test_streaming_into_routing_config():
+    """iter_classify 按完成顺序产出，generate_routing_config 边分类边汇总"""
+    calls = []
+    classifier = _classifier(calls=calls, max_workers=2)
+    received = []
+
+    def stream():
+        for classification in classifier.iter_classify(['198.51.100.1', '223.5.5.5', '198.51.100.2']):
+            received.append(classification.ip_address)
+            yield classification
+
+    config = classifier.generate_routing_config(stream())
+    # 地址段可判定的国内IP不等待探测，最先到达；国内IP不探测
+    assert received[0] == '223.5.5.5'
+    assert sorted(calls) == ['198.51.100.1', '198.51.100.2']
+    assert 'route add 223.5.5.5 mask 255.255.255.255 192.168.1.1' in config
+    assert 'route add 198.51.100.2 mask 255.255.255.255 10.9.0.1' in config
+    assert '# 总计: 3 个IP地址' in config
+
+    try:
+        HybridIPClassifier(config_file=os.path.join(tempfile.mkdtemp(), 'hybrid_ip_config.json'),
+                           probes={'jitter': lambda ip: 0.0})
+    except ValueError:
+        pass
+    else:
+        raise AssertionError('未知探测类型应报错')
+
+
+def main():
+    for test in (test_concurrent_batch_and_cache, test_streaming_into_routing_config):
+        test()
+        print(f"✓ {test.__doc__}")
+
+
+if __name__ == "__main__":
+    main()
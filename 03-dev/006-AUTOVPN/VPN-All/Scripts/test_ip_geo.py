@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+离线IP地理位置查询测试
+使用临时CSV范围库与本地HTTP桩（模拟 ip-api 批量接口），无需外网
+"""
+
+import http.server
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+
+import ip_geo
+from ip_geo import GeoRangeDatabase, IPGeolocator
+
+CSV_CONTENT = """start_ip,end_ip,country,asn,org
+# 注释行
+8.8.8.0,8.8.8.255,US,AS15169,Google LLC
+1.0.0.0/24,AU,AS13335,Cloudflare
+16777472,16777727,CN,,
+2001:4860::,2001:4860:ffff:ffff:ffff:ffff:ffff:ffff,US,AS15169,Google LLC
+"""
+
+
+def _write_csv(content=CSV_CONTENT):
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'ip_country.csv')
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    return path
+
+
+class _BatchHandler(http.server.BaseHTTPRequestHandler):
+    requests_seen = []
+
+    def do_POST(self):
+        ips = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        _BatchHandler.requests_seen.append(ips)
+        body = json.dumps([
+            {'status': 'success', 'countryCode': 'JP', 'isp': 'Stub ISP', 'org': 'Stub Org', 'query': ip}
+            for ip in ips
+        ]).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def test_range_lookup_formats():
+    """起止IP / CIDR / 整数 / IPv6 范围均可查询"""
+    db = GeoRangeDatabase.load([_write_csv()])
+    assert len(db) == 4
+    assert db.lookup('8.8.8.8') == ('US', 'AS15169', 'Google LLC')
+    assert db.lookup('1.0.0.1')[0] == 'AU'
+    assert db.lookup('1.0.1.1')[0] == 'CN'
+    assert db.lookup('2001:4860:4860::8888')[0] == 'US'
+    assert db.lookup('8.8.9.1') is None
+    assert db.lookup('not-an-ip') is None
+
+
+def test_compiled_cache_reused():
+    """编译缓存与CSV一致时直接加载，CSV变化后重新导入"""
+    path = _write_csv()
+    GeoRangeDatabase.load([path])
+    compiled = f"{path}.compiled.pickle"
+    assert os.path.exists(compiled)
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write("9.9.9.0,9.9.9.255,CH,AS19281,Quad9\n")
+    assert GeoRangeDatabase.load([path]).lookup('9.9.9.9')[0] == 'CH'
+
+
+def test_online_fallback_and_persistent_cache():
+    """离线库未命中走批量接口，结果持久化，私有地址不查询"""
+    server = http.server.HTTPServer(('127.0.0.1', 0), _BatchHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    original_url = ip_geo.IP_API_BATCH_URL
+    ip_geo.IP_API_BATCH_URL = f"http://127.0.0.1:{server.server_address[1]}/batch"
+    _BatchHandler.requests_seen = []
+    try:
+        cache_path = os.path.join(tempfile.mkdtemp(), 'geo.sqlite3')
+        geolocator = IPGeolocator([_write_csv()], cache_path=cache_path)
+        results = geolocator.lookup_many(['8.8.8.8', '203.0.113.5', '5.5.5.5', '192.168.1.1', '6.6.6.6'])
+        assert results['8.8.8.8']['source'] == 'local'
+        assert results['5.5.5.5']['countryCode'] == 'JP' and results['5.5.5.5']['source'] == 'ip-api'
+        assert results['192.168.1.1']['error'] == 'reserved range'
+        # 一次批量请求覆盖全部未命中的公网IP
+        assert _BatchHandler.requests_seen == [['5.5.5.5', '6.6.6.6']]
+        geolocator.close()
+
+        again = IPGeolocator([_write_csv()], cache_path=cache_path)
+        assert again.lookup('5.5.5.5')['source'] == 'cache'
+        assert len(_BatchHandler.requests_seen) == 1
+    finally:
+        ip_geo.IP_API_BATCH_URL = original_url
+        server.shutdown()
+        server.server_close()
+
+
+def test_lookup_speed():
+    """10万条范围、10万次查询在微秒级完成"""
+    rows = ["start_ip,end_ip,country"]
+    for i in range(100000):
+        base = 0x0B000000 + i * 256
+        rows.append(f"{base},{base + 255},{'US' if i % 2 else 'DE'}")
+    db = GeoRangeDatabase.load([_write_csv("\n".join(rows) + "\n")])
+    probes = [f"11.{random.randint(0, 255)}.{random.randint(0, 255)}.{random.randint(0, 255)}"
+              for _ in range(100000)]
+    started = time.perf_counter()
+    hits = sum(1 for ip in probes if db.lookup(ip))
+    per_lookup = (time.perf_counter() - started) / len(probes)
+    print(f"  {len(probes)} lookups, {per_lookup * 1e6:.2f} µs/lookup")
+    assert hits > 0
+    assert per_lookup < 50e-6
+
+
+def main():
+    for test in (test_range_lookup_formats, test_compiled_cache_reused,
+                 test_online_fallback_and_persistent_cache, test_lookup_speed):
+        test()
+        print(f"✓ {test.__doc__}")
+
+
+if __name__ == "__main__":
+    main()
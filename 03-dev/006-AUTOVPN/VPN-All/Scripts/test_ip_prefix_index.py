@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+IP前缀索引测试
+"""
+
+import ipaddress
+import os
+import tempfile
+
+from ip_prefix_index import PrefixIndex, random_ips
+
+
+def test_merge_and_lookup():
+    """同标签相邻/重叠网段合并；IPv4 与 IPv6 二分查找"""
+    index = PrefixIndex.from_labeled({
+        'CN': ['1.0.1.0/24', '1.0.2.0/23', '1.0.0.0/24', '10.0.0.0/8', '10.1.0.0/16', '240e::/18'],
+        'cloudflare': ['104.16.0.0/12', '2606:4700::/32'],
+    })
+    # 1.0.0.0/24 + 1.0.1.0/24 + 1.0.2.0/23 合并为 1.0.0.0-1.0.3.255，10.1.0.0/16 被 10.0.0.0/8 吸收
+    assert list(index.v4_starts) == [int(ipaddress.ip_address('1.0.0.0')), int(ipaddress.ip_address('10.0.0.0')),
+                                     int(ipaddress.ip_address('104.16.0.0'))]
+    assert index.lookup('1.0.3.255') == 'CN' and index.lookup('1.0.4.0') is None
+    assert index.lookup('104.31.255.255') == 'cloudflare' and index.lookup('104.32.0.0') is None
+    assert index.lookup('240e:3b7::1') == 'CN' and index.lookup('2606:4700::6810:84e5') == 'cloudflare'
+    assert index.lookup('2001:db8::1') is None and index.lookup('not-an-ip') is None
+    assert '10.200.0.1' in index and '0.0.0.0' not in index
+
+    # 批量查找与逐个查找一致（含与原 ipaddress 线性判断对比）
+    ips = random_ips(5000, seed=7) + ['240e::1', 'bad', '1.0.2.1', '104.20.0.1']
+    networks = [(ipaddress.ip_network(r), label) for r, label in [
+        ('1.0.0.0/22', 'CN'), ('10.0.0.0/8', 'CN'), ('240e::/18', 'CN'),
+        ('104.16.0.0/12', 'cloudflare'), ('2606:4700::/32', 'cloudflare')]]
+    expected = []
+    for ip in ips:
+        try:
+            address = ipaddress.ip_address(ip)
+        except ValueError:
+            expected.append(None)
+            continue
+        expected.append(next((label for n, label in networks
+                              if address.version == n.version and address in n), None))
+    assert index.lookup_many(ips) == expected == [index.lookup(ip) for ip in ips]
+
+
+def test_range_file_compiled_cache():
+    """范围文件编译后缓存为 pickle，文件变化后重新构建"""
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'china_ip_ranges.txt')
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("# 注释\n1.0.1.0/24\n36.0.0.0-36.0.0.255  备注\n\ninvalid\n")
+    index = PrefixIndex.load_files([(path, 'CN')])
+    assert len(index) == 2 and index.lookup('36.0.0.9') == 'CN'
+    assert os.path.exists(f"{path}.compiled.pickle")
+
+    cached = PrefixIndex.load_files([(path, 'CN')])
+    assert list(cached.v4_starts) == list(index.v4_starts) and cached.sources == [path]
+
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write("240e::/18\n")
+    assert PrefixIndex.load_files([(path, 'CN')]).lookup('240e::1') == 'CN'
+    assert len(PrefixIndex.load_files([(os.path.join(directory, 'missing.txt'), 'CN')])) == 0
+
+
+def test_classifier_uses_index():
+    """HybridIPClassifier 的中国IP/CDN判断走前缀索引，支持IPv6"""
+    from hybrid_ip_classifier import HybridIPClassifier
+
+    directory = tempfile.mkdtemp()
+    range_file = os.path.join(directory, 'china.txt')
+    with open(range_file, 'w', encoding='utf-8') as f:
+        f.write("223.5.5.0/24\n240e::/18\n")
+    config_file = os.path.join(directory, 'hybrid_ip_config.json')
+    classifier = HybridIPClassifier(config_file=config_file)
+    assert classifier._is_china_ip('223.5.5.5') and not classifier._is_china_ip('8.8.8.8')
+    assert classifier._is_cdn_ip('104.16.1.1') == 'cloudflare' and classifier._is_cdn_ip('8.8.8.8') is None
+
+    classifier.config['china_ip_range_bin'] = os.path.join(directory, 'missing.bin')
+    classifier.config['china_ip_range_files'] = [range_file]
+    classifier.china_index = classifier._build_china_index()
+    assert classifier._is_china_ip('240e::1') and not classifier._is_china_ip('180.76.76.76')
+    assert classifier.classify_ip('240e::1').category == 'domestic'
+
+
+def main():
+    for test in (test_merge_and_lookup, test_range_file_compiled_cache, test_classifier_uses_index):
+        test()
+        print(f"✓ {test.__doc__}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+IPv6并发验证流水线测试（本机回环监听端口，解析使用桩函数，无需网络）
+"""
+
+import os
+import socket
+import tempfile
+import time
+
+from ipv6_validator import IPv6Validator
+
+
+def _listener(family, host):
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.bind((host, 0))
+    sock.listen(16)
+    return sock
+
+
+def _closed_port():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+def _validator(table, ports, cache_path, resolved):
+    def resolve(domains):
+        resolved.extend(domains)
+        return {d: table[d] for d in domains if d in table}
+    return IPv6Validator(ports=ports, timeout=2, cache_path=cache_path, resolve_func=resolve)
+
+
+def test_concurrent_validation():
+    """按地址族与端口汇总连通性，无AAAA记录的域名不做连接测试"""
+    v6 = _listener(socket.AF_INET6, '::1')
+    port = v6.getsockname()[1]
+    table = {
+        'v6.test': (['127.0.0.1'], ['::1'], []),
+        'v4only.test': (['127.0.0.1'], [], ['Google AAAA查询失败: NoAnswer']),
+    }
+    validator = _validator(table, (port, _closed_port()), None, [])
+    results = validator.validate(['v6.test', 'v4only.test', 'missing.test'])
+    v6.close()
+
+    assert list(results) == ['v6.test', 'v4only.test', 'missing.test']
+    test = results['v6.test']['connectivity_test']
+    assert results['v6.test']['supports_ipv6']
+    assert test['ipv6_http_reachable'] and not test['ipv6_https_reachable']
+    assert not test['ipv4_http_reachable']  # 只在 ::1 上监听
+    assert not results['v4only.test']['supports_ipv6']
+    assert results['v4only.test']['errors'] == ['Google AAAA查询失败: NoAnswer']
+    assert results['missing.test']['errors'] == ['DNS解析失败']
+    assert validator.stats['validated'] == 1 and validator.stats['probes'] == 4
+
+
+def test_incremental_revalidation():
+    """记录未变且未过期的域名复用结果；记录变化或过期时重新验证"""
+    cache_path = os.path.join(tempfile.mkdtemp(), 'ipv6.sqlite3')
+    ports = (_closed_port(), _closed_port())
+    table = {'a.test': ([], ['::1'], []), 'b.test': ([], ['::1'], [])}
+    resolved = []
+
+    validator = _validator(table, ports, cache_path, resolved)
+    validator.validate(['a.test', 'b.test'])
+    assert validator.stats['validated'] == 2
+    validator.close()
+
+    # 新实例：记录未变，全部复用；解析仍会执行（经DNS缓存）
+    validator = _validator(table, ports, cache_path, resolved)
+    results = validator.validate(['a.test', 'b.test'])
+    assert all(r['cached'] for r in results.values())
+    assert validator.stats['validated'] == 0 and validator.stats['reused'] == 2
+
+    # b.test 记录变化（应答顺序变化不算）
+    table['a.test'] = ([], ['::1'], [])
+    table['b.test'] = ([], ['::1', '::2'], [])
+    results = validator.validate(['a.test', 'b.test'])
+    assert results['a.test']['cached'] and not results['b.test']['cached']
+
+    # 过期后重新验证；force 忽略缓存
+    validator.max_age = 0
+    time.sleep(0.01)
+    assert not validator.validate(['a.test'])['a.test']['cached']
+    validator.max_age = 3600
+    assert not validator.validate(['a.test'], force=True)['a.test']['cached']
+    assert len(resolved) == 8
+
+
+def main():
+    for test in (test_concurrent_validation, test_incremental_revalidation):
+        test()
+        print(f"✓ {test.__doc__}")
+
+
+if __name__ == "__main__":
+    main()
@@ -61,66 +61,22 @@ def update_hosts_directly(domain, ip):
     """直接更新hosts文件，不依赖现有脚本"""
     try:
         HOSTS_FILE = r'C:\Windows\System32\drivers\etc\hosts'
+        from hosts_file import HostsFile
+        from hosts_journal import get_hosts_journal
         
-        # 读取现有hosts内容
-        original_hosts = []
-        if os.path.exists(HOSTS_FILE):
-            with open(HOSTS_FILE, 'r', encoding='utf-8') as f:
-                original_hosts = f.readlines()
-        
-        # 分离普通hosts条目和AUTOVPN部分
-        normal_lines = []
-        auto_vpn_lines = []
-        in_auto_vpn_section = False
-        
-        for line in original_hosts:
-            if line.strip() == '# AUTOVPN自动写入':
-                in_auto_vpn_section = True
-                auto_vpn_lines.append(line)  # 保留标题行
-                continue
-            
-            if in_auto_vpn_section:
-                # 检查是否是AUTOVPN部分的条目
-                if line.startswith('#') or (line.strip() == ''):
-                    # 新的注释部分或空行，说明AUTOVPN部分结束
-                    in_auto_vpn_section = False
-                    normal_lines.append(line)
-                elif '\t' in line or ' ' in line:
-                    # 检查是否是当前要更新的域名
-                    parts = line.split()
-                    if len(parts) >= 2:
-                        existing_domain = parts[1]
-                        # 如果不是我们要更新的域名，则保留
-                        if existing_domain != domain and existing_domain != f"www.{domain}":
-                            auto_vpn_lines.append(line)
-                else:
-                    # 不是AUTOVPN部分的条目
-                    in_auto_vpn_section = False
-                    normal_lines.append(line)
-            else:
-                normal_lines.append(line)
-        
-        # 添加新的域名映射到AUTOVPN部分
-        if '# AUTOVPN自动写入\n' not in auto_vpn_lines:
-            auto_vpn_lines.insert(0, '# AUTOVPN自动写入\n')
-        
-        auto_vpn_lines.append(f"{ip}\t{domain}\n")
-        # 自动添加www版本
+        # 写入AUTOVPN区块（区块内同名旧记录被替换，区块外条目不变），自动添加www版本
+        entries = [(ip, domain)]
         if not domain.startswith('www.'):
-            auto_vpn_lines.append(f"{ip}\twww.{domain}\n")
-        
-        # 确保AUTOVPN部分以空行结束
-        if auto_vpn_lines and not auto_vpn_lines[-1].endswith('\n'):
-            auto_vpn_lines[-1] += '\n'
-        if not auto_vpn_lines[-1].strip():
-            auto_vpn_lines.append('\n')
+            entries.append((ip, f"www.{domain}"))
+        hosts = HostsFile.load(HOSTS_FILE)
+        hosts.upsert(entries)
+        with get_hosts_journal().track(HOSTS_FILE, f"添加域名: {domain}"):
+            hosts.save()
         
-        # 合并内容
-        final_hosts_lines = normal_lines + auto_vpn_lines
-        
-        # 写入新的hosts文件
-        with open(HOSTS_FILE, 'w', encoding='utf-8') as f:
-            f.writelines(final_hosts_lines)
+        # 区块之前已有指向其他IP的同名条目时，新记录不会生效
+        shadowed = hosts.shadowed(entries)
+        if shadowed:
+            print(f"[警告] 以下域名在AUTOVPN区块之前已有其他IP的记录，新记录不会生效: {', '.join(shadowed)}")
             
         # 刷新DNS缓存
         try:
@@ -129,6 +85,8 @@ def update_hosts_directly(domain, ip):
         except:
             pass
             
+        if domain in shadowed:
+            return False
         print(f"已更新hosts文件: {domain} -> {ip}")
         return True
     except Exception as e:
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+PAC编译器测试（Python 端判断逻辑与生成的 JS 内容）
+"""
+
+import ipaddress
+import json
+import os
+import re
+import tempfile
+
+from pac_compiler import CompiledPac, benchmark, load_domain_file
+
+PROXY = "SOCKS5 127.0.0.1:1081; DIRECT"
+
+
+def _range(cidr):
+    network = ipaddress.ip_network(cidr)
+    return int(network.network_address), int(network.broadcast_address)
+
+
+def _pac(**kwargs):
+    return CompiledPac(PROXY, proxy_suffixes=['google.com', 'maps.baidu.com', '*.openai.com', 'youtube.com'],
+                       china_ranges=[_range('223.5.0.0/16'), _range('1.0.1.0/24')], **kwargs)
+
+
+def test_suffix_and_range_rules():
+    """后缀表最长后缀优先、直连优先；IP 字面量按私有/中国区间判断；未命中时按解析结果判断"""
+    pac = _pac()
+    resolved = {'shop.example.com': '223.5.5.5', 'blog.example.org': '8.8.8.8'}
+    resolve = resolved.get
+    cases = {
+        'intranet': 'DIRECT',
+        'www.google.com': PROXY, 'GOOGLE.COM': PROXY, 'notgoogle.com': PROXY,
+        'www.baidu.com': 'DIRECT', 'maps.baidu.com': PROXY, 'a.maps.baidu.com': PROXY,
+        'chat.openai.com': PROXY, 'news.sina.com.cn': 'DIRECT',
+        '192.168.1.10': 'DIRECT', '10.1.2.3': 'DIRECT', '172.31.0.1': 'DIRECT', '172.32.0.1': PROXY,
+        '223.5.5.5': 'DIRECT', '1.0.1.255': 'DIRECT', '1.0.2.0': PROXY,
+        'shop.example.com': 'DIRECT', 'blog.example.org': PROXY, 'unresolvable.example.net': PROXY,
+    }
+    for host, expected in cases.items():
+        assert pac.find_proxy(host, resolve) == expected, host
+    # 不解析未知主机名
+    assert _pac(resolve_unknown=False).find_proxy('shop.example.com', resolve) == PROXY
+
+
+def test_render_and_benchmark():
+    """生成的 PAC 内嵌后缀对象与有序区间数组，不含 Python 代码；基准测试可运行"""
+    pac = _pac()
+    js = pac.render()
+    assert 're.search' not in js and 'isInNet' not in js and 'shExpMatch' not in js
+    assert '__' not in js.replace('__proto__', '')
+    suffixes = json.loads(re.search(r'var SUFFIXES = (\{.*\});', js).group(1))
+    assert suffixes['cn'] == 0 and suffixes['openai.com'] == 1 and suffixes['maps.baidu.com'] == 1
+    assert re.search(r'var CHINA_STARTS = (\[.*\]);', js).group(1) == json.dumps(
+        [_range('1.0.1.0/24')[0], _range('223.5.0.0/16')[0]], separators=(',', ':'))
+    assert f'var PROXY = "{PROXY}";' in js
+
+    directory = tempfile.mkdtemp()
+    domain_file = os.path.join(directory, 'domains.txt')
+    with open(domain_file, 'w', encoding='utf-8') as f:
+        f.write("# 注释\ngoogle.com\n*.github.io\n\n bad domain\n")
+    assert load_domain_file(domain_file) == ['google.com', 'github.io']
+    path = pac.write(os.path.join(directory, 'proxy.pac'))
+    with open(path, encoding='utf-8') as f:
+        assert f.read() == js
+
+    result = benchmark(5000, pac, linear_sample=200)
+    assert result['count'] == 5000 and result['direct'] > 0 and result['compiled_sec'] > 0
+
+
+def main():
+    for test in (test_suffix_and_range_rules, test_render_and_benchmark):
+        test()
+        print(f"✓ {test.__doc__}")
+
+
+if __name__ == "__main__":
+    main()
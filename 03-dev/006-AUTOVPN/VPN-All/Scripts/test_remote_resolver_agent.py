@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+常驻远程解析代理测试（本机子进程传输，无需SSH）
+"""
+
+import json
+import queue
+import threading
+
+from remote_resolver_agent import (RemoteResolverAgent, LocalProcessTransport, AgentError,
+                                   agent_command, _LineTransport)
+
+
+class ScriptedTransport(_LineTransport):
+    """进程内桩传输：按预设表应答，可在第 N 个请求后模拟连接断开"""
+
+    def __init__(self, table, drop_after=None):
+        self.table = table
+        self.drop_after = drop_after
+        self.received = 0
+        self._requests = queue.Queue()
+        self._replies = queue.Queue()
+        self._replies.put(json.dumps({'agent': 'autovpn-resolver', 'version': 1, 'backend': 'stub'}))
+        super().__init__(iter(self._replies.get, None), None)
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def send(self, line):
+        self._requests.put(line)
+
+    def _serve(self):
+        pending = []
+        while True:
+            request = json.loads(self._requests.get())
+            if request.get('op') == 'quit':
+                self._replies.put(None)
+                return
+            self.received += 1
+            if self.drop_after is not None and self.received > self.drop_after:
+                self._replies.put(None)
+                return
+            pending.append(request)
+            # 乱序应答：攒够两个再倒序返回
+            if len(pending) >= 2 or self._requests.empty():
+                for item in reversed(pending):
+                    addresses = self.table.get(item['domain'], [])
+                    self._replies.put(json.dumps({'id': item['id'], 'domain': item['domain'],
+                                                  'addresses': addresses, 'ttl': 300,
+                                                  'error': None if addresses else 'NXDOMAIN'}))
+                pending = []
+
+    def close(self):
+        self._requests.put(json.dumps({'op': 'quit'}))
+
+
+def test_local_process_agent():
+    """本机子进程运行真实代理源码，一个会话解析多个域名"""
+    agent = RemoteResolverAgent(LocalProcessTransport.factory('socket'), timeout=20)
+    try:
+        results = agent.resolve_many(['localhost', 'nonexistent.invalid', 'localhost'])
+        assert results['localhost'][0] == ['127.0.0.1'] and results['localhost'][2] is None
+        assert results['nonexistent.invalid'] == ([], None, 'NXDOMAIN')
+        assert agent.resolve('localhost')[0] == ['127.0.0.1']
+        assert agent.backend == 'socket'
+        assert agent.stats['sessions'] == 1 and agent.stats['requests'] == 3
+    finally:
+        agent.close()
+
+
+def test_pipelining_and_out_of_order_replies():
+    """请求流水线发送，按 id 匹配乱序应答"""
+    table = {f"d{i}.test": [f"10.0.0.{i}"] for i in range(50)}
+    transports = []
+
+    def factory():
+        transports.append(ScriptedTransport(table))
+        return transports[-1]
+
+    agent = RemoteResolverAgent(factory, max_in_flight=8, timeout=5)
+    results = agent.resolve_many(list(table) + ['missing.test'])
+    agent.close()
+    assert all(results[domain][0] == table[domain] for domain in table)
+    assert results['missing.test'][2] == 'NXDOMAIN'
+    assert len(transports) == 1 and transports[0].received == 51
+
+
+def test_session_restart():
+    """会话中断后重建一次并重发未完成的请求"""
+    table = {f"d{i}.test": [f"10.0.1.{i}"] for i in range(20)}
+    transports = []
+
+    def factory():
+        transports.append(ScriptedTransport(table, drop_after=5 if not transports else None))
+        return transports[-1]
+
+    agent = RemoteResolverAgent(factory, max_in_flight=4, timeout=5)
+    results = agent.resolve_many(list(table))
+    assert all(results[domain][0] == table[domain] for domain in table)
+    assert len(transports) == 2 and agent.stats['restarts'] == 1
+
+    # 超过重建次数后剩余域名返回失败
+    def broken():
+        raise AgentError('SSH连接不可用')
+
+    agent = RemoteResolverAgent(broken, max_restarts=1)
+    assert agent.resolve('x.test')[2].startswith('RemoteFailed')
+
+
+def test_agent_command():
+    """远程启动命令内联源码，无需上传文件"""
+    command = agent_command(backend='dig')
+    assert command.startswith('python3 -u -c ') and command.endswith(' dig')
+    assert "'" not in command.split("b64decode('")[1].split("')")[0]
+
+
+def main():
+    for test in (test_local_process_agent, test_pipelining_and_out_of_order_replies,
+                 test_session_restart, test_agent_command):
+        test()
+        print(f"✓ {test.__doc__}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+域名解析结果库测试
+"""
+
+import os
+import tempfile
+
+from result_store import ResultStore, export_ip_list, export_failed_list, export_domain_csv
+
+
+def _new_store():
+    directory = tempfile.mkdtemp()
+    return ResultStore(os.path.join(directory, 'store.sqlite3')), directory
+
+
+def test_upsert_and_failures():
+    """按域名 upsert，未传入字段保持原值，成功后失败计数清零"""
+    store, _ = _new_store()
+    store.upsert('Example.COM', ipv4=['1.1.1.1', '2.2.2.2'], best_ip='2.2.2.2', score=80,
+                 geo={'country': 'US'})
+    store.upsert('example.com', ipv6=['2001:db8::1'])
+    record = store.get('example.com')
+    assert record.ipv4 == ['1.1.1.1', '2.2.2.2'] and record.ipv6 == ['2001:db8::1']
+    assert record.best_ip == '2.2.2.2' and record.score == 80 and record.geo == {'country': 'US'}
+
+    # 最佳IP不在新结果中时清除
+    store.upsert('example.com', ipv4=['3.3.3.3'])
+    assert store.get('example.com').ip == '3.3.3.3'
+
+    store.record_failure('example.com', 'Timeout')
+    store.record_failure('example.com', 'SERVFAIL')
+    record = store.get('example.com')
+    assert record.failures == 2 and record.last_error == 'SERVFAIL' and record.ipv4 == ['3.3.3.3']
+    store.upsert('example.com', ipv4=['3.3.3.3'])
+    assert store.get('example.com').failures == 0
+    assert store.stats() == {'domains': 1, 'resolved': 1, 'failed': 0, 'with_ipv6': 1}
+
+    store.close()
+    assert ResultStore(store.path).get('example.com').ipv4 == ['3.3.3.3']
+
+
+def test_batch_rollback():
+    """批量写入异常时整体回滚"""
+    store, _ = _new_store()
+    try:
+        with store.batch():
+            store.upsert('a.test', ipv4=['10.0.0.1'])
+            raise RuntimeError('中断')
+    except RuntimeError:
+        pass
+    assert 'a.test' not in store and len(store) == 0
+
+
+def test_exports_and_import():
+    """导出文本文件，内容未变化时不重写；导出结果可重新导入"""
+    store, directory = _new_store()
+    with store.batch():
+        store.upsert('b.test', ipv4=['10.0.0.2'])
+        store.upsert('a.test', ipv4=['10.0.0.1', '10.0.0.9'], best_ip='10.0.0.9')
+        store.record_failure('nx.test', 'NXDOMAIN')
+        store.set_metadata('a.test', category='AI & 大模型平台', note='测试备注')
+
+    ip_path = os.path.join(directory, '常用境外IP.txt')
+    assert export_ip_list(store, ip_path)
+    with open(ip_path, encoding='utf-8') as f:
+        assert f.read() == "10.0.0.9\ta.test\n10.0.0.2\tb.test\n"
+    mtime = os.path.getmtime(ip_path)
+    assert not export_ip_list(store, ip_path) and os.path.getmtime(ip_path) == mtime
+
+    failed_path = os.path.join(directory, '解析失败域名列表.txt')
+    export_failed_list(store, failed_path)
+    with open(failed_path, encoding='utf-8') as f:
+        lines = [line for line in f if line.strip() and not line.startswith('#')]
+    assert len(lines) == 1 and lines[0].startswith('nx.test\t1\tNXDOMAIN\t')
+
+    csv_path = os.path.join(directory, '境外域名大全.csv')
+    export_domain_csv(store, csv_path)
+    with open(csv_path, encoding='gbk') as f:
+        assert f.read() == "分类\t域名\t备注\nAI & 大模型平台\ta.test\t测试备注\n"
+
+    other, _ = _new_store()
+    assert other.import_ip_list(ip_path) == 2 and other.import_domain_csv(csv_path) == 1
+    assert other.best_ips() == store.best_ips()
+    assert other.get('a.test').note == '测试备注'
+
+
+def main():
+    for test in (test_upsert_and_failures, test_batch_rollback, test_exports_and_import):
+        test()
+        print(f"✓ {test.__doc__}")
+
+
+if __name__ == "__main__":
+    main()
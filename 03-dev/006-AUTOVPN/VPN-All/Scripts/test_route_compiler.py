@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+路由编译器测试（前缀合并、路由表差量、批处理执行；不修改本机路由表）
+"""
+
+import ipaddress
+import os
+import subprocess
+import tempfile
+
+from route_compiler import (Route, compile_routes, parse_route_print, diff_routes, plan_routes,
+                            apply_batch, load_route_state, save_route_state, FAILED_MARKER)
+
+PHYSICAL = ("192.168.1.1", 11)
+VIRTUAL = ("10.9.0.1", 6)
+
+ROUTE_PRINT = """\
+===========================================================================
+IPv4 Route Table
+===========================================================================
+Active Routes:
+Network Destination        Netmask          Gateway       Interface  Metric
+          0.0.0.0          0.0.0.0      192.168.1.1    192.168.1.100     25
+        127.0.0.0        255.0.0.0         On-link         127.0.0.1    331
+        223.5.5.4  255.255.255.254      192.168.1.1    192.168.1.100     36
+     142.250.0.10  255.255.255.255         10.9.0.1         10.9.0.2     11
+       8.8.4.4  255.255.255.255         10.9.0.1         10.9.0.2     11
+    198.51.100.20  255.255.255.255      192.168.1.1    192.168.1.100     26
+      203.0.113.7  255.255.255.255      172.16.0.1      172.16.0.100     20
+===========================================================================
+Persistent Routes:
+  Network Address          Netmask  Gateway Address  Metric
+      203.0.113.0    255.255.255.0      172.16.0.1       1
+===========================================================================
+"""
+
+
+def _routes(routes):
+    """Route 或 (网段, 网关) 键 → 可比较的排序列表"""
+    return sorted((str(network), gateway) for network, gateway, *_ in routes)
+
+
+def test_compile_routes():
+    """按网关合并为最小覆盖前缀；聚合强度放宽网段，冲突网段退回无损合并"""
+    groups = {
+        PHYSICAL: ['223.5.5.4', '223.5.5.5', '223.5.5.6', '223.5.5.7', '180.76.76.76', 'bad', '::1'],
+        VIRTUAL: [f'142.250.0.{i}' for i in range(16)] + ['142.250.1.9', '180.76.76.77', '223.5.5.5'],
+    }
+    routes = compile_routes(groups)
+    # 223.5.5.5 同时出现在两个组时归第一个组
+    assert _routes(routes) == sorted([
+        ('223.5.5.4/30', '192.168.1.1'), ('180.76.76.76/32', '192.168.1.1'),
+        ('142.250.0.0/28', '10.9.0.1'), ('142.250.1.9/32', '10.9.0.1'), ('180.76.76.77/32', '10.9.0.1')])
+    assert all(r.metric == 11 for r in routes if r.gateway == '192.168.1.1')
+
+    # 放宽到 /24：180.76.76.0/24 两个网关都使用，保持主机路由
+    routes = compile_routes(groups, aggressiveness=8)
+    assert _routes(routes) == sorted([
+        ('223.5.5.0/24', '192.168.1.1'), ('180.76.76.76/32', '192.168.1.1'),
+        ('142.250.0.0/23', '10.9.0.1'), ('180.76.76.77/32', '10.9.0.1')])
+
+    # 无损合并结果覆盖且仅覆盖输入地址
+    hosts = {str(ipaddress.IPv4Address(0x0A000000 + i * 3 // 2)) for i in range(2000)}
+    routes = compile_routes({VIRTUAL: hosts})
+    assert sum(r.network.num_addresses for r in routes) == len(hosts) and len(routes) < len(hosts)
+    assert all(any(ipaddress.IPv4Address(h) in r.network for r in routes) for h in list(hosts)[:50])
+
+
+def test_diff_and_batch_apply():
+    """与 route print 结果比较只输出差量；只删除本工具添加的路由；跃点数变化重新添加；批处理一次执行"""
+    installed = parse_route_print(ROUTE_PRINT)
+    assert len(installed) == 6 and ('203.0.113.0/24', '172.16.0.1') not in _routes(installed)
+
+    # 状态文件记录本工具添加过的路由；9.9.9.9 已不在路由表中（如重启后）
+    state_file = os.path.join(tempfile.mkdtemp(), 'installed_routes.json')
+    assert load_route_state(state_file) == {}
+    save_route_state(state_file, {(ipaddress.IPv4Network('8.8.4.4/32'), '10.9.0.1'): 6,
+                                  (ipaddress.IPv4Network('9.9.9.9/32'), '10.9.0.1'): 6})
+
+    groups = {PHYSICAL: ['223.5.5.4', '223.5.5.5'], VIRTUAL: ['142.250.0.10', '1.1.1.1']}
+    plan = plan_routes(groups, installed=installed, owned=load_route_state(state_file))
+    assert _routes(plan.to_add) == [('1.1.1.1/32', '10.9.0.1')]
+    # 经物理网关的 WireGuard 端点旁路路由等非本工具路由不删除
+    assert _routes(plan.to_delete) == [('8.8.4.4/32', '10.9.0.1')]
+    assert plan.host_count == 4 and len(plan.desired) == 3
+    assert plan.commands() == ['route delete 8.8.4.4 mask 255.255.255.255 10.9.0.1',
+                               'route add 1.1.1.1 mask 255.255.255.255 10.9.0.1 metric 6']
+    assert _routes(plan.owned_after()) == [('1.1.1.1/32', '10.9.0.1')]
+    assert _routes(plan.owned_after([plan.commands()[0]])) == [('1.1.1.1/32', '10.9.0.1'),
+                                                               ('8.8.4.4/32', '10.9.0.1')]
+
+    to_add, to_delete = diff_routes(plan.desired, [*installed, *plan.to_add])
+    assert to_add == [] and to_delete == []
+    # 目标路由已由其他程序添加时不重复添加，也不接管
+    adopted = plan_routes({VIRTUAL: ['8.8.4.4']}, installed=installed)
+    assert adopted.commands() == [] and adopted.owned_after() == {}
+
+    # 本工具添加的路由配置跃点数变化：删除后按新跃点数重新添加；旧版状态文件未记录跃点数同样重新添加
+    key = (ipaddress.IPv4Network('8.8.4.4/32'), '10.9.0.1')
+    changed = plan_routes({("10.9.0.1", 8): ['8.8.4.4']}, installed=installed, owned={key: 6})
+    assert changed.commands() == ['route delete 8.8.4.4 mask 255.255.255.255 10.9.0.1',
+                                  'route add 8.8.4.4 mask 255.255.255.255 10.9.0.1 metric 8']
+    assert changed.owned_after() == {key: 8}
+    assert changed.owned_after([changed.commands()[1]]) == {}
+    assert plan_routes({VIRTUAL: ['8.8.4.4']}, installed=installed, owned={key: 6}).commands() == []
+    with open(state_file, 'w', encoding='utf-8') as f:
+        f.write('{"routes": [["8.8.4.4/32", "10.9.0.1"]]}')
+    assert load_route_state(state_file) == {key: None}
+    legacy = plan_routes({VIRTUAL: ['8.8.4.4']}, installed=installed, owned=load_route_state(state_file))
+    assert len(legacy.commands()) == 2 and legacy.owned_after() == {key: 6}
+
+    with open(state_file, 'w', encoding='utf-8') as f:
+        f.write('{broken')
+    assert load_route_state(state_file) == {}
+
+    calls = []
+
+    def runner(args, **kwargs):
+        calls.append(args)
+        return subprocess.CompletedProcess(args, 0, stdout=f"{FAILED_MARKER} {plan.commands()[1]}\r\n", stderr="")
+
+    batch_file = os.path.join(tempfile.mkdtemp(), 'apply_hybrid_routing.bat')
+    success, failed = apply_batch(batch_file, plan.commands(), runner=runner)
+    assert calls == [['cmd', '/c', batch_file]]
+    assert success == 1 and failed == [plan.commands()[1]]
+    with open(batch_file, encoding='utf-8') as f:
+        content = f.read()
+    assert content.count('route ') == 4 and content.startswith('@echo off')
+    assert apply_batch(batch_file, [], runner=runner) == (0, []) and len(calls) == 1
+    assert Route(ipaddress.IPv4Network('10.0.0.0/8'), '10.9.0.1').key[1] == '10.9.0.1'
+
+
+def main():
+    for test in (test_compile_routes, test_diff_and_batch_apply):
+        test()
+        print(f"✓ {test.__doc__}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+智能双栈批量测试（本地监听端口阵列，不访问外网）
+"""
+
+import socket
+import threading
+import time
+
+from smart_dual_stack import IPVersion, ListenerFarm, SmartDualStackRouter, benchmark
+
+
+class _CountingRouter(SmartDualStackRouter):
+    """记录同时进行的连接测试数"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.active = 0
+        self.peak = 0
+        self.count_lock = threading.Lock()
+
+    def _test_single_connection(self, *args, **kwargs):
+        with self.count_lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        try:
+            time.sleep(0.01)
+            return super()._test_single_connection(*args, **kwargs)
+        finally:
+            with self.count_lock:
+                self.active -= 1
+
+
+def test_batch_fan_out_with_cached_resolution():
+    """全部 (主机, 端口) 任务在共享线程池中并发，受全局并发上限约束；每个主机只解析一次"""
+    hosts = [f"h{i}.farm.test" for i in range(30)]
+    with ListenerFarm(port_count=2) as farm:
+        with _CountingRouter(max_workers=4, resolver=farm.resolve) as router:
+            results = router.batch_test_hosts(hosts + hosts[:3], farm.ports)
+            assert list(results) == hosts
+            assert all(len(d.test_results) == 2 and all(r.success for r in d.test_results) for d in results.values())
+            assert all(d.recommended_version == IPVersion.IPV4 and d.ipv4_quality == 100 for d in results.values())
+            assert 1 < router.peak <= 4
+            assert farm.resolve_calls == 30
+            executor = router._get_executor()
+
+            # 第二轮沿用解析缓存与同一个线程池
+            decision = router.test_host_dual_stack(hosts[0], farm.ports)
+            assert farm.resolve_calls == 30 and len(decision.test_results) == 2
+            assert router._get_executor() is executor
+            assert router.resolve_stats["resolved"] == 30 and router.resolve_stats["cache_hits"] >= 2
+        assert router._executor is None
+
+
+def test_addrinfo_cache_entries():
+    """解析结果按主机缓存并替换端口；解析失败同样缓存；TTL 为 0 时每次重新解析"""
+    calls = []
+
+    def resolver(host, port, family=0, type=0, proto=0, flags=0):
+        calls.append((host, port, family))
+        if host == 'missing.test':
+            raise socket.gaierror(socket.EAI_NONAME, 'not known')
+        if family == socket.AF_INET6:
+            return [(socket.AF_INET6, socket.SOCK_STREAM, 6, '', ('2001:db8::1', 0, 0, 0))]
+        return [(socket.AF_INET, socket.SOCK_STREAM, 6, '', ('192.0.2.1', 0))]
+
+    router = SmartDualStackRouter(resolver=resolver)
+    assert router._getaddrinfo('a.test', 80, socket.AF_INET)[0][4] == ('192.0.2.1', 80)
+    assert router._getaddrinfo('a.test', 443, socket.AF_INET)[0][4] == ('192.0.2.1', 443)
+    assert router._getaddrinfo('a.test', 443, socket.AF_INET6)[0][4] == ('2001:db8::1', 443, 0, 0)
+    for _ in range(2):
+        result = router._test_single_connection('missing.test', 80, IPVersion.IPV4)
+        assert not result.success and result.error_message.startswith('地址解析失败')
+    assert calls == [('a.test', None, socket.AF_INET), ('a.test', None, socket.AF_INET6),
+                     ('missing.test', None, socket.AF_INET)]
+
+    router = SmartDualStackRouter(resolver=resolver, addrinfo_ttl=0)
+    router._getaddrinfo('a.test', 80, socket.AF_INET)
+    router._getaddrinfo('a.test', 80, socket.AF_INET)
+    assert router.resolve_stats['resolved'] == 2
+
+    result = benchmark(host_count=20, port_count=2, dns_delay=0.005, max_workers=8)
+    assert result['parallel_successes'] == result['sequential_successes'] == 40
+
+
+def main():
+    for test in (test_batch_fan_out_with_cached_resolution, test_addrinfo_cache_entries):
+        test()
+        print(f"✓ {test.__doc__}")
+
+
+if __name__ == "__main__":
+    main()
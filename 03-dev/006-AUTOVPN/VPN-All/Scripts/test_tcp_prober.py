@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+并发TCP连通性探测测试
+使用本地监听端口、已关闭端口与 TEST-NET 不可达地址，无需外网
+"""
+
+import socket
+import time
+
+from tcp_prober import ConnectivityProber, best_first_stop
+
+# TEST-NET-1 地址不可路由：连接超时或立即失败
+BLACKHOLE_IPS = [f"192.0.2.{i}" for i in range(1, 8)]
+
+
+def _listener():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(('127.0.0.1', 0))
+    sock.listen(16)
+    return sock, sock.getsockname()[1]
+
+
+def _closed_port():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+def test_any_port_reachable():
+    """任一端口连通即可达；全部端口拒绝即不可达"""
+    listener, open_port = _listener()
+    try:
+        prober = ConnectivityProber(timeout=1.0)
+        closed = _closed_port()
+        assert prober.probe_many(['127.0.0.1'], [closed, open_port]) == {'127.0.0.1': True}
+        assert prober.details('127.0.0.1')['port'] == open_port
+
+        prober.invalidate()
+        assert prober.probe_many(['127.0.0.1'], [closed]) == {'127.0.0.1': False}
+    finally:
+        listener.close()
+
+
+def test_parallel_costs_one_timeout():
+    """8个候选（7个不可达）并发探测，总耗时约为一次超时"""
+    listener, port = _listener()
+    try:
+        prober = ConnectivityProber(timeout=0.5)
+        started = time.monotonic()
+        results = prober.probe_many(BLACKHOLE_IPS + ['127.0.0.1'], [port, port + 1])
+        elapsed = time.monotonic() - started
+        assert results['127.0.0.1'] is True
+        assert all(results[ip] is False for ip in BLACKHOLE_IPS)
+        assert elapsed < 1.0
+    finally:
+        listener.close()
+
+
+def test_early_termination_and_cache():
+    """得分最高的IP连通后提前结束，结果按IP缓存"""
+    listener, port = _listener()
+    try:
+        prober = ConnectivityProber(timeout=2.0)
+        ranked = ['127.0.0.1'] + BLACKHOLE_IPS
+        started = time.monotonic()
+        results = prober.probe_many(ranked, [port], stop_when=best_first_stop(ranked))
+        assert time.monotonic() - started < 1.0
+        assert results['127.0.0.1'] is True
+        assert all(results[ip] is None for ip in BLACKHOLE_IPS)
+        assert prober.stats['early_stops'] == 1
+
+        again = prober.probe_many(['127.0.0.1'], [port])
+        assert again == {'127.0.0.1': True}
+        assert prober.stats['cache_hits'] == 1
+
+        expired = ConnectivityProber(timeout=2.0, cache_ttl=0)
+        expired.probe_many(['127.0.0.1'], [port])
+        time.sleep(0.01)
+        assert expired.cached('127.0.0.1') is None
+    finally:
+        listener.close()
+
+
+def main():
+    for test in (test_any_port_reachable, test_parallel_costs_one_timeout, test_early_termination_and_cache):
+        test()
+        print(f"✓ {test.__doc__}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,10 @@
 import os
-import shutil
-import datetime
 import logging
 from typing import Optional, List, Tuple
 
+from hosts_file import HOSTS_FILE, is_valid_entry, update_autovpn_entries
+from hosts_journal import get_hosts_journal
+
 # 配置日志记录
 logger = logging.getLogger(__name__)
 logging.basicConfig(
@@ -13,7 +14,6 @@ logging.basicConfig(
 
 # 定义全局变量
 IP_FILE = r'S:\YDS-Lab\03-dev\006-AUTOVPN\VPN-All\routes\常用境外IP.txt'
-HOSTS_FILE = r'C:\Windows\System32\drivers\etc\hosts'
 
 
 def update_hosts_file(
@@ -26,7 +26,7 @@ def update_hosts_file(
     Args:
         ip_list_file_path (str): IP列表文件路径
         hosts_file_path (Optional[str]): hosts文件路径，默认使用全局HOSTS_FILE
-        backup (bool): 是否创建备份文件，默认True
+        backup (bool): 是否记入hosts变更日志（可回滚），默认True
 
     Returns:
         int: 更新的条目数量，失败返回0
@@ -44,15 +44,20 @@ def update_hosts_file(
     with open(ip_list_file_path, 'r', encoding='utf-8') as f:
         lines = f.readlines()
 
-    # 去重、过滤无效行
+    # 去掉行内注释后去重、过滤无效行（IP与主机名都须有效）
     ip_set = set()
     valid_lines = []
     for line in lines:
-        line = line.strip()
-        if line and not line.startswith('#') and (' ' in line or '\t' in line):
-            if line not in ip_set:
-                ip_set.add(line)
-                valid_lines.append(line)
+        parts = line.split('#', 1)[0].split()
+        if len(parts) < 2:
+            continue
+        if not is_valid_entry(parts[0], parts[1]):
+            logger.warning(f"跳过无效记录: {line.strip()}")
+            continue
+        line = f"{parts[0]}\t{parts[1]}"
+        if line not in ip_set:
+            ip_set.add(line)
+            valid_lines.append(line)
 
     if not valid_lines:
         logger.error("没有有效的IP记录！")
@@ -62,22 +67,14 @@ def update_hosts_file(
     processed_lines = process_domain_pairs(valid_lines)
     valid_entries_count = len(processed_lines)
 
-    # 备份原hosts
-    bak = hosts_file_path + '.' + \
-        datetime.datetime.now().strftime('%Y%m%d_%H%M%S') + '.bak'
+    # 替换AUTOVPN区块（区块外的内容保持不变），原子写入并校验；变更差量记入日志
     try:
-        shutil.copy(hosts_file_path, bak)
-        logger.info(f"已备份原hosts到 {bak}")
-    except Exception as e:
-        logger.error(f"备份hosts文件失败: {e}")
-        return 0
-
-    # 写入新hosts
-    try:
-        with open(hosts_file_path, 'w', encoding='utf-8') as f:
-            f.write('# AUTOVPN自动写入\n')
-            for entry_line in processed_lines:
-                f.write(entry_line + '\n')
+        entries = [tuple(entry_line.split()[:2]) for entry_line in processed_lines]
+        if backup:
+            with get_hosts_journal().track(hosts_file_path, "update_hosts: 替换AUTOVPN区块"):
+                update_autovpn_entries(entries, hosts_file_path, replace=True)
+        else:
+            update_autovpn_entries(entries, hosts_file_path, replace=True)
         success = True
         logger.info(f"已写入Hosts文件，共{valid_entries_count}条记录（已自动补充www/非www域名对）")
     except Exception as e:
@@ -133,45 +130,12 @@ def main():
     if not os.path.exists(IP_FILE):
         print("常用境外IP.txt 不存在！")
         return
-    with open(IP_FILE, 'r', encoding='utf-8') as f:
-        lines = f.readlines()
-
-    # 去重、过滤无效行
-    ip_set = set()
-    valid_lines = []
-    for line in lines:
-        line = line.strip()
-        if line and not line.startswith('#') and (' ' in line or '\t' in line):
-            if line not in ip_set:
-                ip_set.add(line)
-                valid_lines.append(line)
-
-    if not valid_lines:
-        print("没有有效的IP记录！")
-        return
-
-    # 处理域名对，自动补充www和非www版本
-    processed_lines = process_domain_pairs(valid_lines)
-
-    # 备份原hosts
-    bak = HOSTS_FILE + '.' + datetime.datetime.now().strftime('%Y%m%d_%H%M%S') + '.bak'
-    try:
-        shutil.copy(HOSTS_FILE, bak)
-        print(f"已备份原hosts到 {bak}")
-    except Exception as e:
-        print(f"备份hosts文件失败: {e}")
-        return
-
-    # 写入新hosts
-    try:
-        with open(HOSTS_FILE, 'w', encoding='utf-8') as f:
-            f.write('# AUTOVPN自动写入\n')
-            for entry_line in processed_lines:
-                f.write(entry_line + '\n')
-        print(f"已写入Hosts文件，共{len(processed_lines)}条记录（已自动补充www/非www域名对）")
-    except Exception as e:
-        print(f"写入hosts文件失败: {e}")
+    count = update_hosts_file(IP_FILE)
+    if count:
+        print(f"已写入Hosts文件，共{count}条记录（已自动补充www/非www域名对）")
+    else:
+        print("写入hosts文件失败")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -2,139 +2,29 @@
 """
 IPv6域名验证脚本
 用于验证域名是否真实支持IPv6，并收集可靠的IPv6域名列表
+批量验证使用 ipv6_validator 并发流水线，记录未变化的域名复用上次验证结果
 """
 
-import dns.resolver
-import socket
-import time
-import sys
 from typing import List, Dict, Tuple
 
-def test_domain_ipv6_support(domain: str, timeout: int = 5) -> Dict:
-    """测试域名是否支持IPv6"""
-    result = {
-        "domain": domain,
-        "supports_ipv6": False,
-        "ipv6_addresses": [],
-        "ipv4_addresses": [],
-        "connectivity_test": {
-            "ipv6_http_reachable": False,
-            "ipv6_https_reachable": False,
-            "ipv4_http_reachable": False,
-            "ipv4_https_reachable": False
-        },
-        "dns_servers_tested": [],
-        "errors": []
-    }
-    
-    # 测试多个DNS服务器
-    dns_servers = [
-        ("Google", "8.8.8.8"),
-        ("Cloudflare", "1.1.1.1"),
-        ("Quad9", "9.9.9.9"),
-        ("OpenDNS", "208.67.222.222")
-    ]
-    
-    for dns_name, dns_server in dns_servers:
-        try:
-            resolver = dns.resolver.Resolver()
-            resolver.nameservers = [dns_server]
-            resolver.timeout = timeout
-            resolver.lifetime = timeout * 2
-            
-            # 测试AAAA记录 (IPv6)
-            try:
-                ipv6_answers = resolver.resolve(domain, "AAAA")
-                for rdata in ipv6_answers:
-                    ipv6_addr = rdata.address
-                    if ipv6_addr and ipv6_addr not in result["ipv6_addresses"]:
-                        result["ipv6_addresses"].append(ipv6_addr)
-                        result["supports_ipv6"] = True
-            except Exception as e:
-                result["errors"].append(f"{dns_name} AAAA查询失败: {str(e)}")
-            
-            # 测试A记录 (IPv4)
-            try:
-                ipv4_answers = resolver.resolve(domain, "A")
-                for rdata in ipv4_answers:
-                    ipv4_addr = rdata.address
-                    if ipv4_addr and ipv4_addr not in result["ipv4_addresses"]:
-                        result["ipv4_addresses"].append(ipv4_addr)
-            except Exception as e:
-                result["errors"].append(f"{dns_name} A查询失败: {str(e)}")
-            
-            result["dns_servers_tested"].append(dns_name)
-            
-        except Exception as e:
-            result["errors"].append(f"DNS服务器{dns_name}测试失败: {str(e)}")
-    
-    # 如果找到IPv6地址，进行连接性测试
-    if result["ipv6_addresses"]:
-        for ipv6_addr in result["ipv6_addresses"]:
-            # 测试HTTP连接 (端口80)
-            try:
-                sock = socket.socket(socket.AF_INET6, socket.SOCK_STREAM)
-                sock.settimeout(3)
-                result_code = sock.connect_ex((ipv6_addr, 80))
-                sock.close()
-                if result_code == 0:
-                    result["connectivity_test"]["ipv6_http_reachable"] = True
-                    break
-            except Exception as e:
-                result["errors"].append(f"IPv6 HTTP连接测试失败: {str(e)}")
-            
-            # 测试HTTPS连接 (端口443)
-            try:
-                sock = socket.socket(socket.AF_INET6, socket.SOCK_STREAM)
-                sock.settimeout(3)
-                result_code = sock.connect_ex((ipv6_addr, 443))
-                sock.close()
-                if result_code == 0:
-                    result["connectivity_test"]["ipv6_https_reachable"] = True
-                    break
-            except Exception as e:
-                result["errors"].append(f"IPv6 HTTPS连接测试失败: {str(e)}")
-    
-    # 如果找到IPv4地址，也进行连接性测试作为对比
-    if result["ipv4_addresses"]:
-        for ipv4_addr in result["ipv4_addresses"]:
-            # 测试HTTP连接 (端口80)
-            try:
-                sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                sock.settimeout(3)
-                result_code = sock.connect_ex((ipv4_addr, 80))
-                sock.close()
-                if result_code == 0:
-                    result["connectivity_test"]["ipv4_http_reachable"] = True
-                    break
-            except Exception as e:
-                result["errors"].append(f"IPv4 HTTP连接测试失败: {str(e)}")
-            
-            # 测试HTTPS连接 (端口443)
-            try:
-                sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                sock.settimeout(3)
-                result_code = sock.connect_ex((ipv4_addr, 443))
-                sock.close()
-                if result_code == 0:
-                    result["connectivity_test"]["ipv4_https_reachable"] = True
-                    break
-            except Exception as e:
-                result["errors"].append(f"IPv4 HTTPS连接测试失败: {str(e)}")
-    
-    return result
+from ipv6_validator import IPv6Validator
 
-def validate_ipv6_domains(domains: List[str]) -> Tuple[List[Dict], List[Dict]]:
-    """验证一批域名的IPv6支持情况"""
+def validate_ipv6_domains(domains: List[str], force: bool = False) -> Tuple[List[Dict], List[Dict]]:
+    """验证一批域名的IPv6支持情况（并发解析与连通性测试，只重新验证记录变化或过期的域名）"""
     ipv6_supported = []
     ipv6_not_supported = []
     
     print(f"开始验证 {len(domains)} 个域名的IPv6支持情况...")
     
-    for i, domain in enumerate(domains, 1):
-        print(f"正在测试 {i}/{len(domains)}: {domain}")
-        
-        result = test_domain_ipv6_support(domain)
+    validator = IPv6Validator(logger=print)
+    try:
+        results = validator.validate(domains, force=force)
+    finally:
+        validator.close()
+    
+    for i, domain in enumerate(results, 1):
+        result = results[domain]
+        print(f"已测试 {i}/{len(results)}: {domain}{' (缓存)' if result.get('cached') else ''}")
         
         if result["supports_ipv6"] and result["ipv6_addresses"]:
             ipv6_supported.append(result)
@@ -149,10 +39,9 @@ def validate_ipv6_domains(domains: List[str]) -> Tuple[List[Dict], List[Dict]]:
         else:
             ipv6_not_supported.append(result)
             print(f"  ❌ {domain} 不支持IPv6")
-        
-        # 短暂延迟避免过快
-        time.sleep(0.5)
     
+    stats = validator.stats
+    print(f"验证统计: 重新验证 {stats['validated']} 个，复用缓存 {stats['reused']} 个")
     return ipv6_supported, ipv6_not_supported
 
 def generate_ipv6_domain_report(supported_domains: List[Dict], output_file: str):
@@ -28,6 +28,7 @@ LOGS_DIR = os.path.join(PROJECT_ROOT, "logs")
 
 # 导入公共函数
 from Scripts.common.utils import load_config, is_process_running, kill_process_by_name, is_port_in_use
+from pac_compiler import CompiledPac
 
 # 设置日志
 logging.basicConfig(
@@ -42,35 +43,6 @@ logging.basicConfig(
             encoding='utf-8')])
 logger = logging.getLogger('wstunnel_proxy')
 
-# PAC文件模板
-PAC_TEMPLATE = """
-function FindProxyForURL(url, host) {
-    // 本地地址直连
-    if (isPlainHostName(host) ||
-        isInNet(host, "10.0.0.0", "255.0.0.0") ||
-        isInNet(host, "172.16.0.0", "255.240.0.0") ||
-        isInNet(host, "192.168.0.0", "255.255.0.0") ||
-        isInNet(host, "127.0.0.0", "255.0.0.0"))
-        return "DIRECT";
-
-    // 国内常见域名直连
-    if (re.search(r'\\.cn$', host) ||
-        /^.*\\.baidu\\.com$/.test(host) ||
-        /^.*\\.qq\\.com$/.test(host) ||
-        /^.*\\.163\\.com$/.test(host) ||
-        /^.*\\.sina\\.com\\.cn$/.test(host) ||
-        /^.*\\.weibo\\.com$/.test(host) ||
-        /^.*\\.taobao\\.com$/.test(host) ||
-        /^.*\\.tmall\\.com$/.test(host) ||
-        /^.*\\.jd\\.com$/.test(host) ||
-        /^.*\\.alipay\\.com$/.test(host))
-        return "DIRECT";
-
-    // 默认代理
-    return "__PROXY__";
-}
-"""
-
 # 确保日志目录存在
 os.makedirs(LOGS_DIR, exist_ok=True)
 
@@ -136,13 +108,11 @@ def generate_pac_file(config):
     # 生成智能分流PAC（国内直连，境外走代理）
     smart_pac_path = os.path.join(pac_dir, "PAC_智能分流_自动生成.pac")
     try:
-        # 使用模板并替换代理设置
-        pac_content = PAC_TEMPLATE.replace(
-            "__PROXY__",
+        # 编译PAC：境外域名与国内常见域名编译为后缀哈希表，中国IP段来自 APNIC 二进制范围文件（有序数组 + 二分查找）
+        pac = CompiledPac.from_sources(
             f"SOCKS5 {socks5_addr}:{socks5_port}; PROXY {http_addr}:{http_port}; DIRECT")
-
-        with open(smart_pac_path, 'w', encoding='utf-8') as f:
-            f.write(pac_content)
+        pac.write(smart_pac_path)
+        logger.info(f"PAC规则: 域名后缀 {len(pac.suffixes)} 条, 中国IPv4区间 {len(pac.china_starts)} 个")
         logger.info(f"已生成智能分流PAC文件: {smart_pac_path}")
     except Exception as e:
         logger.error(f"生成智能分流PAC文件失败: {e}")
@@ -157,6 +157,7 @@ class TraeMateApp:
                 self.system_tray.stop()
             
             self.log_manager.info("TraeMate 关闭")
+            self.log_manager.close()
         
         except Exception as e:
             print(f"清理资源时出错: {e}")
@@ -3,11 +3,25 @@
 负责结构化日志记录和管理
 """
 import os
+import gzip
+import time
+import atexit
+import shutil
 import datetime
 import threading
+import weakref
 from enum import Enum
 from typing import Optional
 
+# 所有存活的日志管理器，进程退出时统一刷新并关闭句柄
+_live_managers = weakref.WeakSet()
+
+
+@atexit.register
+def _close_live_managers():
+    for manager in list(_live_managers):
+        manager.close()
+
 
 class LogLevel(Enum):
     """日志级别枚举"""
@@ -24,6 +38,13 @@ class LogManager:
     _instance = None
     _lock = threading.Lock()
     
+    # 单个日志文件上限，超过后轮转为 .1.gz ... .N.gz
+    MAX_BYTES = 5 * 1024 * 1024
+    BACKUP_COUNT = 5
+    # 缓冲写入：定时刷新；ERROR 及以上级别立即落盘
+    FLUSH_INTERVAL = 2.0
+    FLUSH_LEVELS = (LogLevel.ERROR, LogLevel.CRITICAL)
+    
     def __new__(cls, log_file_path: Optional[str] = None, force_new: bool = False):
         """
         创建日志管理器实例
@@ -53,6 +74,10 @@ class LogManager:
         self.log_file_path = log_file_path or self._get_default_log_path()
         self._ensure_log_dir()
         self._lock = threading.Lock()
+        self._handle = None
+        self._size = 0
+        self._last_flush = time.monotonic()
+        _live_managers.add(self)
     
     def _get_default_log_path(self) -> str:
         """获取默认日志文件路径"""
@@ -64,6 +89,48 @@ class LogManager:
         if not os.path.exists(log_dir):
             os.makedirs(log_dir)
     
+    def _open(self) -> None:
+        """打开常驻文件句柄（调用方需持有锁）"""
+        self._handle = open(self.log_file_path, 'a', encoding='utf-8', buffering=64 * 1024)
+        try:
+            self._size = os.path.getsize(self.log_file_path)
+        except OSError:
+            self._size = 0
+    
+    def _close_handle(self) -> None:
+        """关闭文件句柄（调用方需持有锁）"""
+        if self._handle is not None:
+            self._handle.flush()
+            self._handle.close()
+            self._handle = None
+    
+    def _rotate(self) -> None:
+        """按大小轮转：log.N.gz 依次后移，当前文件压缩为 log.1.gz（调用方需持有锁）"""
+        self._close_handle()
+        oldest = f"{self.log_file_path}.{self.BACKUP_COUNT}.gz"
+        if os.path.exists(oldest):
+            os.remove(oldest)
+        for index in range(self.BACKUP_COUNT - 1, 0, -1):
+            src = f"{self.log_file_path}.{index}.gz"
+            if os.path.exists(src):
+                os.replace(src, f"{self.log_file_path}.{index + 1}.gz")
+        with open(self.log_file_path, 'rb') as src, gzip.open(f"{self.log_file_path}.1.gz", 'wb') as dst:
+            shutil.copyfileobj(src, dst)
+        os.remove(self.log_file_path)
+        self._open()
+    
+    def flush(self) -> None:
+        """将缓冲区写入磁盘"""
+        with self._lock:
+            if self._handle is not None:
+                self._handle.flush()
+                self._last_flush = time.monotonic()
+    
+    def close(self) -> None:
+        """刷新并关闭日志文件句柄"""
+        with self._lock:
+            self._close_handle()
+    
     def write_log(self, level: LogLevel, message: str) -> None:
         """
         写入日志
@@ -77,8 +144,18 @@ class LogManager:
             log_entry = f"[{timestamp}] [{level.value}] {message}\n"
             
             try:
-                with open(self.log_file_path, 'a', encoding='utf-8') as f:
-                    f.write(log_entry)
+                if self._handle is None:
+                    self._open()
+                self._handle.write(log_entry)
+                self._size += len(log_entry.encode('utf-8'))
+                
+                now = time.monotonic()
+                if level in self.FLUSH_LEVELS or now - self._last_flush >= self.FLUSH_INTERVAL:
+                    self._handle.flush()
+                    self._last_flush = now
+                
+                if self._size >= self.MAX_BYTES:
+                    self._rotate()
             except Exception as e:
                 # 如果写入日志失败，输出到控制台
                 print(f"日志写入失败: {e}")
@@ -86,6 +163,7 @@ class LogManager:
     
     def read_logs(self) -> str:
         """读取所有日志内容"""
+        self.flush()
         if not os.path.exists(self.log_file_path):
             return ""
         
@@ -125,6 +203,7 @@ class LogManager:
         Returns:
             日志行列表
         """
+        self.flush()
         try:
             with open(self.log_file_path, 'r', encoding='utf-8') as f:
                 all_lines = f.readlines()
@@ -140,8 +219,10 @@ class LogManager:
             是否成功清空
         """
         try:
-            with open(self.log_file_path, 'w', encoding='utf-8') as f:
-                f.write("")
+            with self._lock:
+                self._close_handle()
+                with open(self.log_file_path, 'w', encoding='utf-8') as f:
+                    f.write("")
             return True
         except Exception as e:
             self.error(f"清空日志失败: {e}")
@@ -154,6 +235,7 @@ class LogManager:
         Returns:
             日志文件大小
         """
+        self.flush()
         try:
             return os.path.getsize(self.log_file_path)
         except Exception:
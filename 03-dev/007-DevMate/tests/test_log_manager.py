@@ -26,9 +26,10 @@ class TestLogManager(unittest.TestCase):
     
     def tearDown(self):
         """测试后清理"""
-        # 删除临时文件
-        if os.path.exists(self.log_file):
-            os.remove(self.log_file)
+        # 关闭常驻句柄后删除临时文件（含轮转文件）
+        self.log_manager.close()
+        for name in os.listdir(self.temp_dir):
+            os.remove(os.path.join(self.temp_dir, name))
         os.rmdir(self.temp_dir)
     
     def test_write_log(self):
@@ -98,6 +99,22 @@ class TestLogManager(unittest.TestCase):
         size_after = self.log_manager.get_log_size()
         self.assertGreater(size_after, size_before)
     
+    def test_rotation(self):
+        """测试按大小轮转"""
+        self.log_manager.MAX_BYTES = 200
+        self.log_manager.BACKUP_COUNT = 2
+        
+        for i in range(30):
+            self.log_manager.info(f"轮转测试日志 {i}")
+        self.log_manager.flush()
+        
+        # 当前文件不超过上限，轮转文件数量受 BACKUP_COUNT 限制
+        self.assertLess(self.log_manager.get_log_size(), 200)
+        self.assertTrue(os.path.exists(self.log_file + ".1.gz"))
+        self.assertTrue(os.path.exists(self.log_file + ".2.gz"))
+        self.assertFalse(os.path.exists(self.log_file + ".3.gz"))
+        self.assertIn("轮转测试日志 29", self.log_manager.read_logs())
+    
     def test_singleton_pattern(self):
         """测试单例模式"""
         # 创建第二个日志管理器实例
@@ -22,14 +22,19 @@ import time
 import logging
 import subprocess
 import shutil
+import fnmatch
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from pathlib import Path
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
 import yaml
 import argparse
 
 # 添加 tools 目录到 Python 路径
 sys.path.insert(0, str(Path(__file__).parent))
+from tools.disk_usage import get_disk_usage_service
+from tools.log_backend import RetentionIndex
 """
 GitHelper 兼容导入与回退实现
 
@@ -258,6 +263,300 @@ except Exception:
             else:
                 return {'success': False, 'error': err or 'git log 执行失败', 'commits': []}
 
+class GitDataCollector:
+    """批量采集工作报告所需的 Git 数据
+
+    一次并发拉起最少数量的 git 进程（log+shortstat、status v2、工作区 diffstat），
+    结果在本次会话内缓存，避免 get_daily_git_commits / analyze_file_changes
+    / perform_git_push 重复执行 git 命令。
+    """
+
+    RECORD_SEP = '\x1e'
+    FIELD_SEP = '\x1f'
+
+    def __init__(self, repo_path: str, timeout: int = 30):
+        self.repo_path = Path(repo_path)
+        self.timeout = timeout
+        self._cache: Optional[Dict[str, any]] = None
+        self._cache_key: Optional[Tuple[str, str]] = None
+
+    def invalidate(self):
+        """提交/推送后工作区状态变化，清空缓存"""
+        self._cache = None
+        self._cache_key = None
+
+    def read_fast_status_config(self) -> Dict[str, bool]:
+        """直接读取 .git/config 判断 untrackedCache / fsmonitor 是否已配置（不启动进程）"""
+        settings = {'untracked_cache': False, 'fsmonitor': False}
+        config_path = self.repo_path / '.git' / 'config'
+        try:
+            section = ''
+            for raw in config_path.read_text(encoding='utf-8', errors='ignore').splitlines():
+                line = raw.strip()
+                if not line or line[0] in '#;':
+                    continue
+                if line.startswith('['):
+                    section = line.strip('[]').strip().lower()
+                    continue
+                if section != 'core' or '=' not in line:
+                    continue
+                key, value = [part.strip() for part in line.split('=', 1)]
+                key = key.lower()
+                value = value.lower()
+                if key == 'untrackedcache':
+                    settings['untracked_cache'] = value in ('true', 'yes', 'on', '1', 'keep')
+                elif key == 'fsmonitor':
+                    settings['fsmonitor'] = value not in ('false', 'no', 'off', '0', '')
+        except OSError:
+            pass
+        return settings
+
+    def _build_commands(self, since: str, until: str, fast_status: Dict[str, bool]) -> Dict[str, List[str]]:
+        # 未配置 untrackedCache/fsmonitor 时，未跟踪文件只扫描到目录级别，避免全量递归
+        untracked_mode = 'all' if (fast_status['untracked_cache'] or fast_status['fsmonitor']) else 'normal'
+        return {
+            'log': [
+                'git', '--no-optional-locks', 'log',
+                f'--after={since}', f'--before={until}',
+                f'--pretty=format:{self.RECORD_SEP}%h{self.FIELD_SEP}%s{self.FIELD_SEP}%an{self.FIELD_SEP}%ad',
+                '--date=format:%H:%M', '--no-merges', '--shortstat'
+            ],
+            'status': [
+                'git', '--no-optional-locks', 'status',
+                '--porcelain=v2', '-z', '--branch', f'--untracked-files={untracked_mode}'
+            ],
+            'diffstat': ['git', '--no-optional-locks', 'diff', 'HEAD', '--shortstat']
+        }
+
+    def _run_concurrently(self, commands: Dict[str, List[str]]) -> Dict[str, Tuple[int, str, str]]:
+        processes = {}
+        for name, cmd in commands.items():
+            try:
+                processes[name] = subprocess.Popen(
+                    cmd, cwd=str(self.repo_path),
+                    stdout=subprocess.PIPE, stderr=subprocess.PIPE
+                )
+            except Exception as e:
+                processes[name] = e
+
+        outputs = {}
+        for name, proc in processes.items():
+            if isinstance(proc, Exception):
+                outputs[name] = (-1, '', str(proc))
+                continue
+            try:
+                out, err = proc.communicate(timeout=self.timeout)
+                outputs[name] = (
+                    proc.returncode,
+                    out.decode('utf-8', errors='replace'),
+                    err.decode('utf-8', errors='replace')
+                )
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.communicate()
+                outputs[name] = (-1, '', f'git 命令超时 ({self.timeout}秒)')
+        return outputs
+
+    @staticmethod
+    def parse_shortstat(text: str) -> Dict[str, int]:
+        """解析 ' 3 files changed, 10 insertions(+), 2 deletions(-)'"""
+        stat = {'files_changed': 0, 'insertions': 0, 'deletions': 0}
+        for part in text.strip().split(','):
+            words = part.strip().split()
+            if len(words) < 2 or not words[0].isdigit():
+                continue
+            count = int(words[0])
+            if words[1].startswith('file'):
+                stat['files_changed'] = count
+            elif words[1].startswith('insertion'):
+                stat['insertions'] = count
+            elif words[1].startswith('deletion'):
+                stat['deletions'] = count
+        return stat
+
+    def parse_log(self, output: str) -> List[Dict[str, any]]:
+        commits = []
+        for record in output.split(self.RECORD_SEP):
+            if not record.strip():
+                continue
+            header, _, rest = record.partition('\n')
+            parts = header.split(self.FIELD_SEP)
+            if len(parts) < 4:
+                continue
+            commit = {
+                'hash': parts[0],
+                'message': parts[1],
+                'author': parts[2],
+                'time': parts[3]
+            }
+            commit.update(self.parse_shortstat(rest))
+            commits.append(commit)
+        return commits
+
+    @staticmethod
+    def parse_status_v2(output: str) -> Dict[str, any]:
+        """解析 git status --porcelain=v2 -z --branch 输出"""
+        status = {
+            'modified': [], 'added': [], 'deleted': [], 'untracked': [],
+            'conflicted': [], 'branch': None, 'upstream': None,
+            'ahead': 0, 'behind': 0, 'clean': True
+        }
+        entries = output.split('\0')
+        i = 0
+        while i < len(entries):
+            entry = entries[i]
+            i += 1
+            if not entry:
+                continue
+            kind = entry[0]
+            if kind == '#':
+                fields = entry.split(' ')
+                if fields[1] == 'branch.head':
+                    status['branch'] = fields[2]
+                elif fields[1] == 'branch.upstream':
+                    status['upstream'] = fields[2]
+                elif fields[1] == 'branch.ab' and len(fields) >= 4:
+                    status['ahead'] = int(fields[2].lstrip('+'))
+                    status['behind'] = int(fields[3].lstrip('-'))
+                continue
+
+            status['clean'] = False
+            if kind == '?':
+                status['untracked'].append(entry[2:])
+            elif kind == '1':
+                fields = entry.split(' ', 8)
+                xy, path = fields[1], fields[8]
+                if 'A' in xy:
+                    status['added'].append(path)
+                elif 'D' in xy:
+                    status['deleted'].append(path)
+                else:
+                    status['modified'].append(path)
+            elif kind == '2':
+                # 重命名/复制条目后紧跟原路径
+                path = entry.split(' ', 9)[9]
+                orig_path = entries[i] if i < len(entries) else ''
+                i += 1
+                status['modified'].append(f"{orig_path} -> {path}" if orig_path else path)
+            elif kind == 'u':
+                status['conflicted'].append(entry.split(' ', 10)[10])
+        return status
+
+    def collect(self, since: str, until: str) -> Dict[str, any]:
+        """采集并缓存 Git 数据"""
+        cache_key = (since, until)
+        if self._cache is not None and self._cache_key == cache_key:
+            return self._cache
+
+        started = time.perf_counter()
+        fast_status = self.read_fast_status_config()
+        outputs = self._run_concurrently(self._build_commands(since, until, fast_status))
+
+        log_code, log_out, log_err = outputs['log']
+        status_code, status_out, status_err = outputs['status']
+        diff_code, diff_out, _ = outputs['diffstat']
+
+        data = {
+            'log_success': log_code == 0,
+            'log_error': log_err.strip(),
+            'commits': self.parse_log(log_out) if log_code == 0 else [],
+            'status_success': status_code == 0,
+            'status_error': status_err.strip(),
+            'status': self.parse_status_v2(status_out) if status_code == 0 else None,
+            'diffstat': self.parse_shortstat(diff_out) if diff_code == 0 else None,
+            'fast_status': fast_status,
+            'processes': len(outputs),
+            'elapsed': time.perf_counter() - started
+        }
+        self._cache = data
+        self._cache_key = cache_key
+        return data
+
+class FinishTaskGraph:
+    """工作完成流程的任务图执行器
+
+    每个阶段声明其依赖，依赖全部完成后即提交到线程池，
+    彼此独立的阶段（磁盘密集的备份、网络密集的推送、清理）并发执行。
+    """
+
+    def __init__(self, max_workers: int = 4, logger: Optional[logging.Logger] = None):
+        self.max_workers = max(1, max_workers)
+        self.logger = logger or logging.getLogger(__name__)
+        self._stages: Dict[str, Tuple[Callable, List[str]]] = {}
+        self.results: Dict[str, any] = {}
+        self.timings: List[Dict[str, any]] = []
+        self.wall_time = 0.0
+
+    def add_stage(self, name: str, func, depends_on: Optional[List[str]] = None):
+        """注册阶段；func 接收已完成阶段的结果字典"""
+        deps = list(depends_on or [])
+        for dep in deps:
+            if dep not in self._stages:
+                raise ValueError(f"阶段 {name} 依赖未注册的阶段: {dep}")
+        self._stages[name] = (func, deps)
+
+    def _timed(self, name: str, func, origin: float):
+        started = time.perf_counter()
+        status = 'success'
+        try:
+            result = func(self.results)
+            # 阶段正常返回但报告未成功（如推送失败、备份禁用）
+            if isinstance(result, dict) and result.get('success') is False:
+                status = 'incomplete'
+            return result
+        except Exception:
+            status = 'failed'
+            raise
+        finally:
+            finished = time.perf_counter()
+            self.timings.append({
+                'stage': name,
+                'status': status,
+                'start_offset': started - origin,
+                'duration': finished - started,
+                'thread': threading.current_thread().name
+            })
+
+    def run(self) -> Dict[str, any]:
+        """按依赖顺序并发执行所有阶段；失败阶段的下游阶段被跳过"""
+        origin = time.perf_counter()
+        pending = dict(self._stages)
+        running = {}
+        failed = set()
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='finish') as executor:
+            while pending or running:
+                for name in list(pending):
+                    func, deps = pending[name]
+                    if any(dep in failed for dep in deps):
+                        del pending[name]
+                        failed.add(name)
+                        self.timings.append({
+                            'stage': name, 'status': 'skipped',
+                            'start_offset': time.perf_counter() - origin,
+                            'duration': 0.0, 'thread': None
+                        })
+                        self.logger.warning(f"阶段 {name} 因依赖失败被跳过")
+                    elif all(dep in self.results for dep in deps):
+                        del pending[name]
+                        running[executor.submit(self._timed, name, func, origin)] = name
+
+                if not running:
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        self.results[name] = future.result()
+                    except Exception as e:
+                        failed.add(name)
+                        self.logger.error(f"阶段 {name} 执行失败: {e}")
+
+        self.timings.sort(key=lambda t: t['start_offset'])
+        self.wall_time = time.perf_counter() - origin
+        return self.results
+
 class YDSLabFinishProcessor:
     """YDS-Lab工作完成处理器"""
     
@@ -278,6 +577,9 @@ class YDSLabFinishProcessor:
             print(f"❌ GitHelper 初始化失败: {e}")
             self.git_helper = None
         
+        # 批量 Git 数据采集器（会话内缓存）
+        self.git_collector = GitDataCollector(str(self.project_root))
+        
         # 设置日志
         self.setup_logging()
         
@@ -317,6 +619,10 @@ class YDSLabFinishProcessor:
                 'auto_cleanup_temp': True,
                 'cleanup_old_logs': True,
                 'max_log_files': 50
+            },
+            'pipeline': {
+                'parallel': True,
+                'max_workers': 4
             }
         }
         
@@ -345,9 +651,14 @@ class YDSLabFinishProcessor:
             self.logger = logging.getLogger(__name__)
             self.logger.info("YDS-Lab工作完成处理器初始化")
             
+            # 会话日志登记到保留索引；其他程序写入的日志在清理时补登记
+            self.log_index = RetentionIndex(self.logs_dir / ".log_index.json")
+            self.log_index.add(log_file)
+            
         except Exception as e:
             print(f"日志系统初始化失败: {e}")
             self.logger = logging.getLogger(__name__)
+            self.log_index = RetentionIndex(self.logs_dir / ".log_index.json")
             
     def load_config(self):
         """加载配置文件"""
@@ -393,11 +704,34 @@ class YDSLabFinishProcessor:
             'timestamp': now.timestamp()
         }
         
+    def collect_git_data(self) -> Optional[Dict[str, any]]:
+        """批量采集当日 Git 数据（log/status/diffstat），会话内只执行一次"""
+        today = datetime.now().strftime("%Y-%m-%d")
+        try:
+            data = self.git_collector.collect(f"{today} 00:00:00", f"{today} 23:59:59")
+            self.logger.info(f"Git 数据采集完成: {data['processes']} 个进程，耗时 {data['elapsed']:.2f}秒")
+            return data
+        except Exception as e:
+            self.logger.warning(f"批量采集 Git 数据失败: {e}")
+            return None
+
     def get_daily_git_commits(self) -> Dict[str, any]:
         """获取当日Git提交记录"""
         self.logger.info("获取当日Git提交记录...")
         
         try:
+            # 优先使用批量采集结果
+            git_data = self.collect_git_data()
+            if git_data and git_data['log_success']:
+                commits = git_data['commits']
+                return {
+                    'success': True,
+                    'commits': commits,
+                    'total_commits': len(commits),
+                    'insertions': sum(c.get('insertions', 0) for c in commits),
+                    'deletions': sum(c.get('deletions', 0) for c in commits)
+                }
+            
             # 检查 GitHelper 是否可用
             if not self.git_helper:
                 self.logger.warning("GitHelper 不可用，跳过Git提交记录获取")
@@ -405,67 +739,27 @@ class YDSLabFinishProcessor:
                     'success': False,
                     'commits': [],
                     'total_commits': 0,
-                    'error': 'GitHelper 不可用'
+                    'error': (git_data or {}).get('log_error') or 'GitHelper 不可用'
                 }
             
             today = datetime.now().strftime("%Y-%m-%d")
+            commits_result = self.git_helper.get_commits(
+                since=f"{today} 00:00:00",
+                until=f"{today} 23:59:59"
+            )
             
-            # 使用 GitHelper 获取提交记录
-            try:
-                commits_result = self.git_helper.get_commits(
-                    since=f"{today} 00:00:00",
-                    until=f"{today} 23:59:59"
-                )
-                
-                if commits_result and commits_result.get('success', False):
-                    return {
-                        'success': True,
-                        'commits': commits_result.get('commits', []),
-                        'total_commits': len(commits_result.get('commits', []))
-                    }
-                else:
-                    # 如果 GitHelper 失败，回退到系统命令
-                    raise Exception("GitHelper 获取提交记录失败")
-                    
-            except Exception as git_error:
-                self.logger.warning(f"GitHelper 获取提交记录失败: {git_error}，回退到系统命令")
-                
-                # 回退到系统 Git 命令
-                cmd = [
-                    "git", "log", 
-                    f"--after={today} 00:00:00",
-                    f"--before={today} 23:59:59",
-                    "--pretty=format:%h|%s|%an|%ad",
-                    "--date=format:%H:%M",
-                    "--no-merges"
-                ]
-                
-                result = subprocess.run(
-                    cmd,
-                    capture_output=True,
-                    text=True,
-                    encoding='utf-8',
-                    cwd=str(self.project_root),
-                    timeout=30
-                )
-                
-                commits = []
-                if result.returncode == 0 and result.stdout.strip():
-                    for line in result.stdout.strip().split('\n'):
-                        parts = line.split('|')
-                        if len(parts) >= 4:
-                            commits.append({
-                                'hash': parts[0],
-                                'message': parts[1],
-                                'author': parts[2],
-                                'time': parts[3]
-                            })
-                            
+            if commits_result and commits_result.get('success', False):
                 return {
                     'success': True,
-                    'commits': commits,
-                    'total_commits': len(commits)
+                    'commits': commits_result.get('commits', []),
+                    'total_commits': len(commits_result.get('commits', []))
                 }
+            return {
+                'success': False,
+                'commits': [],
+                'total_commits': 0,
+                'error': commits_result.get('error', 'GitHelper 获取提交记录失败') if commits_result else 'GitHelper 获取提交记录失败'
+            }
             
         except Exception as e:
             self.logger.error(f"获取Git提交记录失败: {e}")
@@ -480,31 +774,28 @@ class YDSLabFinishProcessor:
         """分析文件变更情况"""
         self.logger.info("分析文件变更情况...")
         
+        changes = {
+            'modified': [],
+            'added': [],
+            'deleted': [],
+            'untracked': [],
+            'total_changes': 0
+        }
+        
         try:
-            # 检查 GitHelper 是否可用
-            if not self.git_helper:
+            # 优先使用批量采集的 status v2 结果
+            git_data = self.collect_git_data()
+            if git_data and git_data['status_success']:
+                status_result = git_data['status']
+                if git_data['diffstat']:
+                    changes['diffstat'] = git_data['diffstat']
+            elif self.git_helper:
+                status_result = self.git_helper.get_status()
+            else:
                 self.logger.warning("GitHelper 不可用，跳过文件变更分析")
-                return {
-                    'modified': [],
-                    'added': [],
-                    'deleted': [],
-                    'untracked': [],
-                    'total_changes': 0
-                }
-            
-            # 使用 GitHelper 获取工作目录状态
-            status_result = self.git_helper.get_status()
-            
-            changes = {
-                'modified': [],
-                'added': [],
-                'deleted': [],
-                'untracked': [],
-                'total_changes': 0
-            }
+                return changes
             
             if status_result:
-                # 直接使用 GitHelper 返回的数据结构
                 changes['modified'] = status_result.get('modified', [])
                 changes['added'] = status_result.get('added', [])
                 changes['deleted'] = status_result.get('deleted', [])
@@ -571,8 +862,8 @@ class YDSLabFinishProcessor:
             
         return status
         
-    def perform_project_backup(self) -> Dict[str, any]:
-        """执行项目备份"""
+    def perform_project_backup(self, cleanup_old: bool = True) -> Dict[str, any]:
+        """执行项目备份；cleanup_old=False 时由调用方单独调度旧备份清理"""
         if not self.default_config['backup']['enable_auto_backup']:
             self.logger.info("自动备份已禁用")
             return {'success': False, 'reason': 'disabled'}
@@ -630,8 +921,12 @@ class YDSLabFinishProcessor:
                 else:
                     skipped_files += 1
                     
+            # 登记到备份索引，供过期清理使用
+            self.get_backup_index().add(backup_path, category=backup_type)
+            
             # 清理旧备份
-            self.cleanup_old_backups()
+            if cleanup_old:
+                self.cleanup_old_backups()
             
             backup_info = {
                 'success': True,
@@ -652,58 +947,51 @@ class YDSLabFinishProcessor:
                 'error': str(e)
             }
             
+    def get_backup_index(self) -> RetentionIndex:
+        """备份保留索引（bak/backup_index.json）
+
+        索引之前创建的 bak/backup_YYYYmmdd_HHMMSS 目录按名称中的时间登记（只遍历 bak 一层）。
+        """
+        index = RetentionIndex(self.bak_dir / "backup_index.json")
+        if self.bak_dir.exists():
+            index.bootstrap([p for p in self.bak_dir.glob("backup_*") if p.is_dir()],
+                            category='legacy', created_of=self._legacy_backup_time)
+        return index
+    
+    @staticmethod
+    def _legacy_backup_time(path: Path) -> Optional[float]:
+        """从旧备份目录名解析创建时间，无法解析时返回 None（不纳入管理）"""
+        try:
+            return datetime.strptime(path.name.replace('backup_', ''), '%Y%m%d_%H%M%S').timestamp()
+        except ValueError:
+            return None
+        
     def cleanup_old_backups(self):
-        """清理旧备份"""
+        """清理旧备份（按索引中的创建时间，仅处理已登记的备份）"""
         try:
             if not self.bak_dir.exists():
                 return
                 
             retention_days = self.default_config['backup']['backup_retention_days']
-            cutoff_date = datetime.now() - timedelta(days=retention_days)
-            
-            removed_count = 0
-            for backup_dir in self.bak_dir.iterdir():
-                if backup_dir.is_dir() and backup_dir.name.startswith('backup_'):
-                    # 从目录名提取时间戳
-                    try:
-                        timestamp_str = backup_dir.name.replace('backup_', '')
-                        backup_date = datetime.strptime(timestamp_str, '%Y%m%d_%H%M%S')
-                        
-                        if backup_date < cutoff_date:
-                            shutil.rmtree(backup_dir)
-                            removed_count += 1
-                            self.logger.info(f"删除过期备份: {backup_dir.name}")
-                            
-                    except ValueError:
-                        # 无法解析时间戳，跳过
-                        continue
+            removed = self.get_backup_index().prune(max_age_days=retention_days)
+            for path in removed:
+                self.logger.info(f"删除过期备份: {Path(path).name}")
                         
-            if removed_count > 0:
-                self.logger.info(f"清理了 {removed_count} 个过期备份")
+            if removed:
+                self.logger.info(f"清理了 {len(removed)} 个过期备份")
                 
         except Exception as e:
             self.logger.error(f"清理旧备份失败: {e}")
             
-    def get_directory_size(self, path: Path) -> str:
-        """获取目录大小"""
+    def get_directory_size(self, path: Path, approximate: bool = False) -> str:
+        """获取目录大小（共享磁盘占用服务，硬链接去重、按目录 mtime 缓存）"""
         try:
-            total_size = 0
-            for file_path in path.rglob("*"):
-                if file_path.is_file():
-                    total_size += file_path.stat().st_size
-                    
-            # 转换为可读格式
-            for unit in ['B', 'KB', 'MB', 'GB']:
-                if total_size < 1024.0:
-                    return f"{total_size:.1f} {unit}"
-                total_size /= 1024.0
-            return f"{total_size:.1f} TB"
-            
+            return get_disk_usage_service().get_formatted_size(path, approximate=approximate)
         except Exception:
             return "未知"
             
     def cleanup_temp_files(self):
-        """清理临时文件"""
+        """清理临时文件（单次遍历匹配所有模式，跳过 .git/node_modules 等目录）"""
         if not self.default_config['cleanup']['auto_cleanup_temp']:
             return
             
@@ -711,13 +999,18 @@ class YDSLabFinishProcessor:
         
         try:
             temp_patterns = ['*.tmp', '*.temp', '*~', '.DS_Store', 'Thumbs.db']
+            skip_dirs = {'.git', 'node_modules', '.venv', 'venv', '__pycache__'}
             removed_count = 0
             
-            for pattern in temp_patterns:
-                for temp_file in self.project_root.rglob(pattern):
-                    if temp_file.is_file():
-                        temp_file.unlink()
-                        removed_count += 1
+            for root, dirs, files in os.walk(self.project_root):
+                dirs[:] = [d for d in dirs if d not in skip_dirs]
+                for name in files:
+                    if any(fnmatch.fnmatch(name, pattern) for pattern in temp_patterns):
+                        try:
+                            os.unlink(os.path.join(root, name))
+                            removed_count += 1
+                        except OSError:
+                            continue
                         
             if removed_count > 0:
                 self.logger.info(f"清理了 {removed_count} 个临时文件")
@@ -726,7 +1019,11 @@ class YDSLabFinishProcessor:
             self.logger.error(f"清理临时文件失败: {e}")
             
     def cleanup_old_logs(self):
-        """清理旧日志文件"""
+        """清理旧日志文件（由保留索引驱动）
+
+        清理前扫描 logs 目录，把不经 RotatingLogWriter 写入、尚未登记的 *.log 补登记到索引，
+        所有日志文件都受 max_log_files 上限约束。
+        """
         if not self.default_config['cleanup']['cleanup_old_logs']:
             return
             
@@ -735,21 +1032,14 @@ class YDSLabFinishProcessor:
         try:
             max_files = self.default_config['cleanup']['max_log_files']
             
-            # 获取所有日志文件并按修改时间排序
-            log_files = []
-            for log_file in self.logs_dir.rglob("*.log"):
-                if log_file.is_file():
-                    log_files.append((log_file.stat().st_mtime, log_file))
-                    
-            # 按时间排序，保留最新的文件
-            log_files.sort(reverse=True)
+            # 与目录对账：新出现的日志按 mtime 登记
+            self.log_index.bootstrap([p for p in self.logs_dir.rglob("*.log") if p.is_file()])
+            # 会话日志保留最新 max_files 个；轮转压缩日志同样受此上限约束
+            removed = self.log_index.prune(max_entries=max_files, category='log')
+            removed += self.log_index.prune(max_entries=max_files, category='rotated')
             
-            if len(log_files) > max_files:
-                files_to_remove = log_files[max_files:]
-                for _, log_file in files_to_remove:
-                    log_file.unlink()
-                    
-                self.logger.info(f"清理了 {len(files_to_remove)} 个旧日志文件")
+            if removed:
+                self.logger.info(f"清理了 {len(removed)} 个旧日志文件")
                 
         except Exception as e:
             self.logger.error(f"清理旧日志文件失败: {e}")
@@ -770,8 +1060,13 @@ class YDSLabFinishProcessor:
             else:
                 self.logger.info(f"使用项目根目录的.gitignore文件: {gitignore_path}")
             
-            # 检查是否有未提交的更改
-            status = self.git_helper.get_status()
+            # 检查是否有未提交的更改：git_data 阶段缓存的状态早于清理阶段，先失效再重新采集
+            self.git_collector.invalidate()
+            git_data = self.collect_git_data()
+            if git_data and git_data['status_success']:
+                status = git_data['status']
+            else:
+                status = self.git_helper.get_status()
             
             # 检查是否有任何类型的变更（包括未跟踪文件）
             has_changes = (
@@ -798,6 +1093,7 @@ class YDSLabFinishProcessor:
                 commit_message = f"chore: {self.default_config['git']['commit_prefix']} - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
                 
                 if self.git_helper.commit(commit_message, auto_add=True):
+                    self.git_collector.invalidate()
                     self.logger.info(f"自动提交完成: {commit_message}")
                 else:
                     self.logger.warning("自动提交失败")
@@ -823,7 +1119,8 @@ class YDSLabFinishProcessor:
 
     def generate_work_report(self, session_info: Dict, git_info: Dict, 
                             file_changes: Dict, ai_status: Dict, 
-                            backup_info: Dict, push_info: Dict = None) -> str:
+                            backup_info: Dict, push_info: Dict = None,
+                            stage_timings: List[Dict] = None, wall_time: float = None) -> str:
          """生成工作报告"""
          self.logger.info("生成工作报告...")
          
@@ -842,7 +1139,10 @@ class YDSLabFinishProcessor:
  """
          
          if git_info['success'] and git_info['total_commits'] > 0:
-             report += f"- **今日提交数**: {git_info['total_commits']} 次\n\n"
+             report += f"- **今日提交数**: {git_info['total_commits']} 次\n"
+             if 'insertions' in git_info:
+                 report += f"- **今日行变更**: +{git_info['insertions']} / -{git_info['deletions']}\n"
+             report += "\n"
              report += "#### 提交详情\n"
              for commit in git_info['commits']:
                  report += f"- `{commit['hash']}` {commit['message']} - {commit['author']} ({commit['time']})\n"
@@ -874,9 +1174,13 @@ class YDSLabFinishProcessor:
  - **新增文件**: {len(file_changes['added'])} 个
  - **删除文件**: {len(file_changes['deleted'])} 个
  - **未跟踪文件**: {len(file_changes['untracked'])} 个
- 
  """
          
+         if file_changes.get('diffstat'):
+             diffstat = file_changes['diffstat']
+             report += f"- **工作区行变更**: +{diffstat['insertions']} / -{diffstat['deletions']} ({diffstat['files_changed']} 个文件)\n"
+         report += "\n"
+         
          # 显示具体变更文件（限制数量）
          if file_changes['total_changes'] > 0:
              report += "#### 文件变更详情\n"
@@ -935,6 +1239,18 @@ class YDSLabFinishProcessor:
              push_status = '✅ 已执行' if push_info.get('success') else '❌ 失败'
              report += f"- **Git 推送**: {push_status}\n"
              
+         # 阶段耗时（并发流水线）
+         if stage_timings:
+             status_icons = {'success': '✅', 'incomplete': '⚠️', 'failed': '❌', 'skipped': '⏭️'}
+             report += "\n### 阶段耗时\n"
+             report += "| 阶段 | 状态 | 开始(秒) | 耗时(秒) |\n|------|------|----------|----------|\n"
+             for timing in stage_timings:
+                 icon = status_icons.get(timing['status'], '❓')
+                 report += f"| {timing['stage']} | {icon} | {timing['start_offset']:.2f} | {timing['duration']:.2f} |\n"
+             if wall_time is not None:
+                 serial_time = sum(t['duration'] for t in stage_timings)
+                 report += f"\n- **总耗时**: {wall_time:.2f}秒（串行累计 {serial_time:.2f}秒）\n"
+             
          report += f"""
  
  ## 📋 工作总结
@@ -1025,39 +1341,54 @@ class YDSLabFinishProcessor:
             self.logger.error(f"保存工作报告失败: {e}")
             return ""
             
+    def build_finish_graph(self) -> FinishTaskGraph:
+        """构建工作完成任务图
+
+        git_data → push：先记录变更再自动提交；
+        全部清理阶段 → backup → push：清理与 git add、备份复制不并发，清理掉的文件不进入备份和提交；
+        备份目录 01-struc/bak 位于仓库内，push 在备份复制完成后才执行 git add，不会暂存复制到一半的备份；
+        report 在所有输入阶段完成后生成。
+        """
+        pipeline_config = self.default_config.get('pipeline', {})
+        max_workers = pipeline_config.get('max_workers', 4) if pipeline_config.get('parallel', True) else 1
+        graph = FinishTaskGraph(max_workers=max_workers, logger=self.logger)
+
+        graph.add_stage('session_info', lambda r: self.get_current_session_info())
+        graph.add_stage('git_data', lambda r: (self.get_daily_git_commits(), self.analyze_file_changes()))
+        graph.add_stage('ai_status', lambda r: self.check_ai_agents_status())
+        graph.add_stage('cleanup_temp', lambda r: self.cleanup_temp_files())
+        graph.add_stage('cleanup_logs', lambda r: self.cleanup_old_logs())
+        graph.add_stage('cleanup_old_backups', lambda r: self.cleanup_old_backups())
+        cleanup_stages = ['cleanup_temp', 'cleanup_logs', 'cleanup_old_backups']
+        graph.add_stage('backup', lambda r: self.perform_project_backup(cleanup_old=False),
+                        depends_on=cleanup_stages)
+        graph.add_stage('push', lambda r: self.perform_git_push(),
+                        depends_on=['git_data', 'backup'] + cleanup_stages)
+        return graph
+
     def perform_finish_process(self) -> Tuple[bool, str]:
-        """执行完整的工作完成流程"""
+        """执行完整的工作完成流程（任务图并发执行）"""
         try:
             print("🏁 YDS-Lab 工作完成处理")
             print("=" * 50)
             
-            # 1. 获取会话信息
-            session_info = self.get_current_session_info()
+            # 1-8. 并发执行会话信息、Git数据、Agent状态、备份、推送与清理
+            graph = self.build_finish_graph()
+            results = graph.run()
             
-            # 2. 获取Git提交记录
-            git_info = self.get_daily_git_commits()
-            
-            # 3. 分析文件变更
-            file_changes = self.analyze_file_changes()
-            
-            # 4. 检查AI Agent状态
-            ai_status = self.check_ai_agents_status()
-            
-            # 5. 执行项目备份
-            backup_info = self.perform_project_backup()
-            
-            # 6. 执行 Git 推送
-            push_info = self.perform_git_push()
-            
-            # 7. 清理临时文件
-            self.cleanup_temp_files()
-            
-            # 8. 清理旧日志
-            self.cleanup_old_logs()
+            session_info = results.get('session_info') or self.get_current_session_info()
+            git_info, file_changes = results.get('git_data') or (
+                {'success': False, 'commits': [], 'total_commits': 0, 'error': '阶段执行失败'},
+                {'modified': [], 'added': [], 'deleted': [], 'untracked': [], 'total_changes': 0}
+            )
+            ai_status = results.get('ai_status') or self.check_ai_agents_status()
+            backup_info = results.get('backup') or {'success': False, 'error': '阶段执行失败'}
+            push_info = results.get('push') or {'success': False, 'error': '阶段执行失败'}
             
-            # 9. 生成工作报告（包含推送信息）
+            # 9. 生成工作报告（依赖以上所有阶段，包含阶段耗时）
             report_content = self.generate_work_report(
-                session_info, git_info, file_changes, ai_status, backup_info, push_info
+                session_info, git_info, file_changes, ai_status, backup_info, push_info,
+                stage_timings=graph.timings, wall_time=graph.wall_time
             )
             
             # 10. 保存报告
@@ -23,11 +23,152 @@ import logging
 import subprocess
 import socket
 import struct
+import select
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
 from pathlib import Path
 from datetime import datetime, timedelta
 from typing import Dict, List, Set, Optional, Tuple
 import yaml
 
+
+class MemoryReadinessProbe:
+    """长记忆系统就绪探测器
+
+    在后台线程中同时监听服务端口（非阻塞connect + select）与心跳文件变化，
+    任一信号出现即视为首次就绪并立即唤醒等待方，不再依赖固定sleep轮询。
+    """
+
+    def __init__(self, ports: List[int], heartbeat_files: List[Path],
+                 process: Optional[subprocess.Popen] = None,
+                 host: str = 'localhost', interval: float = 0.25):
+        self.ports = list(ports)
+        self.heartbeat_files = list(heartbeat_files)
+        self.process = process
+        self.host = host
+        self.interval = interval
+
+        self.ready_event = threading.Event()
+        self.done_event = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        self.started_at: Optional[float] = None
+        self.ready_latency: Optional[float] = None
+        self.ready_source: Optional[str] = None
+        self.open_ports: List[int] = []
+        self.process_exit_code: Optional[int] = None
+        # 记录启动前的心跳mtime，只有之后的更新才算作新心跳
+        self._baseline_mtimes = {path: self._mtime(path) for path in self.heartbeat_files}
+
+    @staticmethod
+    def _mtime(path: Path) -> Optional[float]:
+        try:
+            return path.stat().st_mtime
+        except OSError:
+            return None
+
+    def start(self) -> 'MemoryReadinessProbe':
+        """启动后台探测线程"""
+        self.started_at = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name='memory-readiness-probe', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """停止探测"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval * 2)
+
+    def wait_ready(self, deadline: float) -> bool:
+        """等待首次就绪或进程退出，最多等待deadline秒"""
+        end = time.monotonic() + deadline
+        while not self.ready_event.is_set() and not self.done_event.is_set():
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                break
+            self.ready_event.wait(min(remaining, self.interval))
+        return self.ready_event.is_set()
+
+    def _mark_ready(self, source: str):
+        if not self.ready_event.is_set():
+            self.ready_latency = time.monotonic() - self.started_at
+            self.ready_source = source
+            self.ready_event.set()
+
+    def probe_ports(self, timeout: float) -> List[int]:
+        """对所有端口并发发起非阻塞连接，在timeout内收集已接通的端口"""
+        pending = {}
+        for port in self.ports:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.setblocking(False)
+            try:
+                sock.connect_ex((self.host, port))
+            except OSError:
+                sock.close()
+                continue
+            pending[sock] = port
+
+        connected = []
+        end = time.monotonic() + timeout
+        try:
+            while pending:
+                remaining = end - time.monotonic()
+                if remaining <= 0:
+                    break
+                _, writable, _ = select.select([], list(pending), [], remaining)
+                if not writable:
+                    break
+                for sock in writable:
+                    port = pending.pop(sock)
+                    if sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR) == 0:
+                        connected.append(port)
+                    sock.close()
+        finally:
+            for sock in pending:
+                sock.close()
+        return sorted(connected)
+
+    def _changed_heartbeat(self) -> Optional[Path]:
+        for path in self.heartbeat_files:
+            mtime = self._mtime(path)
+            if mtime is not None and mtime != self._baseline_mtimes.get(path):
+                return path
+        return None
+
+    def _run(self):
+        try:
+            while not self._stop_event.is_set():
+                heartbeat = self._changed_heartbeat()
+                if heartbeat is not None:
+                    self._mark_ready(f"heartbeat:{heartbeat.name}")
+
+                self.open_ports = self.probe_ports(self.interval)
+                if self.open_ports:
+                    self._mark_ready(f"port:{self.open_ports[0]}")
+
+                if self.ready_event.is_set():
+                    break
+
+                if self.process is not None and self.process.poll() is not None:
+                    self.process_exit_code = self.process.returncode
+                    break
+
+                self._stop_event.wait(self.interval)
+        finally:
+            self.done_event.set()
+
+    def to_dict(self) -> Dict[str, any]:
+        return {
+            'ready': self.ready_event.is_set(),
+            'latency_seconds': self.ready_latency,
+            'source': self.ready_source,
+            'open_ports': list(self.open_ports),
+            'process_exit_code': self.process_exit_code
+        }
+
+
 class YDSLabStartupChecker:
     """YDS-Lab AI Agent启动检查器"""
     
@@ -184,7 +325,11 @@ class YDSLabStartupChecker:
                 'test_on_startup': True,
                 'startup_timeout': 30,
                 'startup_retry_count': 3,
-                'startup_retry_delay': 2.0
+                'startup_retry_delay': 2.0,
+                # 就绪探测：端口连接 + 心跳文件变化，任一出现即视为就绪
+                'readiness_deadline': 30,
+                'readiness_ports': [3000, 8080, 9000],
+                'readiness_poll_interval': 0.25
             },
             'mcp_servers': {
                 'required_servers': ['memory', 'github', 'context7', 'sequential-thinking'],
@@ -823,6 +968,14 @@ class YDSLabStartupChecker:
             
         return port_info
     
+    def get_memory_heartbeat_files(self) -> List[Path]:
+        """长记忆服务心跳文件候选路径"""
+        return [
+            self.logs_dir / "memory_heartbeat.json",
+            self.memory_system_dir / "heartbeat.json",
+            self.memory_system_dir / "logs" / "heartbeat.log"
+        ]
+
     def check_memory_heartbeat(self) -> Dict[str, any]:
         """检查长记忆服务心跳状态"""
         try:
@@ -835,11 +988,7 @@ class YDSLabStartupChecker:
             }
             
             # 检查心跳文件
-            heartbeat_files = [
-                self.logs_dir / "memory_heartbeat.json",
-                self.memory_system_dir / "heartbeat.json",
-                self.memory_system_dir / "logs" / "heartbeat.log"
-            ]
+            heartbeat_files = self.get_memory_heartbeat_files()
             
             latest_heartbeat = None
             latest_file = None
@@ -944,8 +1093,11 @@ class YDSLabStartupChecker:
             raise last_exception
         return wrapper
     
-    def validate_memory_startup(self, timeout: int = 10) -> Dict[str, any]:
-        """验证长记忆系统启动状态"""
+    def validate_memory_startup(self, timeout: int = 10, probe: Optional[MemoryReadinessProbe] = None) -> Dict[str, any]:
+        """验证长记忆系统启动状态
+
+        如果传入已完成的就绪探测器，直接复用其端口结果，避免重复探测。
+        """
         try:
             validation_result = {
                 'validation_success': False,
@@ -978,22 +1130,15 @@ class YDSLabStartupChecker:
             
             # 2. 检查端口监听
             try:
-                import socket
-                test_ports = [3000, 8080, 9000]
-                open_ports = []
-                
-                for port in test_ports:
-                    try:
-                        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                        sock.settimeout(1)
-                        result = sock.connect_ex(('localhost', port))
-                        sock.close()
-                        
-                        if result == 0:
-                            open_ports.append(port)
-                    except Exception:
-                        continue
+                if probe is not None:
+                    open_ports = list(probe.open_ports)
+                else:
+                    test_ports = self.default_config['memory_system'].get('readiness_ports', [3000, 8080, 9000])
+                    port_probe = MemoryReadinessProbe(test_ports, [])
+                    open_ports = port_probe.probe_ports(min(timeout, 1))
                 
+                if probe is not None and probe.ready_source:
+                    validation_result['checks_performed'].append(f"✅ 就绪信号: {probe.ready_source}")
                 if open_ports:
                     validation_result['checks_performed'].append(f"✅ 发现开放端口: {open_ports}")
                 else:
@@ -1052,10 +1197,41 @@ class YDSLabStartupChecker:
                 'error': str(e)
             }
     
-    def start_memory_system(self) -> Dict[str, any]:
-        """启动长记忆系统 - 增强版，包含重试机制和验证流程"""
+    def _launch_memory_process(self, simple: bool = False) -> subprocess.Popen:
+        """非阻塞地拉起长记忆系统进程"""
+        if simple:
+            return subprocess.Popen(
+                ['node', 'test-memory-system.js', '--simple'],
+                cwd=str(self.memory_system_dir),
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL
+            )
+        return subprocess.Popen(
+            ['node', 'test-memory-system.js'],
+            cwd=str(self.memory_system_dir),
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            creationflags=subprocess.CREATE_NEW_CONSOLE if os.name == 'nt' else 0
+        )
+
+    def create_readiness_probe(self, process: Optional[subprocess.Popen] = None) -> MemoryReadinessProbe:
+        """按配置创建就绪探测器"""
+        memory_config = self.default_config['memory_system']
+        return MemoryReadinessProbe(
+            ports=memory_config.get('readiness_ports', [3000, 8080, 9000]),
+            heartbeat_files=self.get_memory_heartbeat_files(),
+            process=process,
+            interval=memory_config.get('readiness_poll_interval', 0.25)
+        )
+
+    def start_memory_system(self, memory_status: Optional[Dict] = None) -> Dict[str, any]:
+        """启动长记忆系统 - 事件驱动的就绪探测，进程退出或首次就绪即返回"""
         self.logger.info("尝试启动长记忆系统...")
-        
+
+        memory_config = self.default_config['memory_system']
+        deadline = float(memory_config.get('readiness_deadline', memory_config.get('startup_timeout', 30)))
+        max_attempts = max(1, int(memory_config.get('startup_retry_count', 3)))
+
         start_result = {
             'attempted': False,
             'success': False,
@@ -1064,22 +1240,25 @@ class YDSLabStartupChecker:
             'message': '',
             'retry_count': 0,
             'validation_result': None,
-            'startup_method': None
+            'startup_method': None,
+            'readiness': None,
+            'readiness_deadline': deadline
         }
-        
+
         try:
-            # 第1步：检查系统状态
-            memory_status = self.check_memory_system_status()
-            
+            # 第1步：检查系统状态（已有检查结果时直接复用）
+            if memory_status is None:
+                memory_status = self.check_memory_system_status()
+
             if not memory_status['ready']:
                 start_result['error'] = "系统未就绪，无法启动"
                 start_result['message'] = "请先确保长记忆系统配置正确且依赖已安装"
                 return start_result
-            
+
             # 第2步：检查是否已经在运行（使用增强检测）
             try:
                 import psutil
-                
+
                 # 检查进程
                 for proc in psutil.process_iter(['pid', 'name', 'cmdline']):
                     try:
@@ -1095,96 +1274,79 @@ class YDSLabStartupChecker:
                                 return start_result
                             else:
                                 self.logger.warning(f"发现进程但验证失败 (PID: {proc.info['pid']})，将尝试重启")
-                                # 尝试终止异常进程
+                                # 尝试终止异常进程，等待其退出而非固定休眠
                                 try:
                                     proc.terminate()
-                                    time.sleep(2)
+                                    proc.wait(timeout=2)
                                 except Exception:
                                     pass
                                 break
                     except (psutil.NoSuchProcess, psutil.AccessDenied):
                         continue
-                        
+
             except ImportError:
                 self.logger.warning("psutil模块未安装，进程检测受限")
-            
-            # 第3步：使用重试机制启动系统
-            @self.retry_operation(max_retries=3, delay=2.0, backoff=1.5)
-            def _start_with_retry():
-                # 切换到memory-system目录并启动
-                cmd = ['node', 'test-memory-system.js']
-                process = subprocess.Popen(
-                    cmd,
-                    cwd=str(self.memory_system_dir),
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    creationflags=subprocess.CREATE_NEW_CONSOLE if os.name == 'nt' else 0
-                )
-                
-                # 等待进程启动
-                time.sleep(3)
-                
-                # 检查进程是否仍然存在
-                try:
-                    import psutil
-                    if psutil.pid_exists(process.pid):
-                        return process
-                    else:
-                        raise RuntimeError("进程启动后立即退出")
-                except ImportError:
-                    # 如果没有psutil，简单等待后返回
-                    time.sleep(2)
-                    return process
-            
+
+            # 第3步：启动进程并由探测器等待首次就绪；进程提前退出时立即重试
             start_result['attempted'] = True
-            
-            try:
-                # 执行带重试的启动
-                process = _start_with_retry()
-                start_result['process_id'] = process.pid
-                start_result['retry_count'] = 0  # 重试成功
-                
-                self.logger.info(f"长记忆系统进程启动成功 (PID: {process.pid})")
-                
-            except Exception as retry_error:
-                # 重试机制失败，尝试降级启动
-                self.logger.warning(f"标准启动失败，尝试降级启动: {retry_error}")
-                
+            launch_started = time.monotonic()
+            probe = None
+
+            for attempt in range(max_attempts + 1):
+                # 最后一次尝试使用降级命令
+                simple = attempt == max_attempts
+                remaining = deadline - (time.monotonic() - launch_started)
+                if remaining <= 0:
+                    break
                 try:
-                    # 降级启动：使用更简单的命令
-                    simple_cmd = ['node', 'test-memory-system.js', '--simple']
-                    simple_process = subprocess.Popen(
-                        simple_cmd,
-                        cwd=str(self.memory_system_dir),
-                        stdout=subprocess.DEVNULL,
-                        stderr=subprocess.DEVNULL
-                    )
-                    
-                    start_result['process_id'] = simple_process.pid
-                    start_result['startup_method'] = 'degraded'
-                    self.logger.info(f"降级启动成功 (PID: {simple_process.pid})")
-                    
-                except Exception as degraded_error:
-                    start_result['error'] = f"所有启动方法均失败: {degraded_error}"
-                    start_result['message'] = f"启动失败: {degraded_error}"
-                    return start_result
-            
-            # 第4步：验证启动状态
-            self.logger.info("正在验证长记忆系统启动状态...")
-            validation = self.validate_memory_startup(timeout=15)
+                    process = self._launch_memory_process(simple=simple)
+                except Exception as launch_error:
+                    self.logger.warning(f"启动失败 (尝试 {attempt + 1}/{max_attempts + 1}): {launch_error}")
+                    start_result['retry_count'] = attempt + 1
+                    continue
+
+                start_result['process_id'] = process.pid
+                start_result['startup_method'] = 'degraded' if simple else 'standard'
+
+                probe = self.create_readiness_probe(process).start()
+                probe.wait_ready(remaining)
+                probe.stop()
+
+                if probe.ready_event.is_set() or probe.process_exit_code is None:
+                    # 已就绪，或进程仍在运行但已到截止时间
+                    break
+
+                self.logger.warning(f"长记忆系统进程提前退出 (退出码: {probe.process_exit_code})，立即重试")
+                start_result['retry_count'] = attempt + 1
+
+            if probe is None:
+                start_result['error'] = "所有启动方法均失败"
+                start_result['message'] = "启动失败: 无法拉起长记忆系统进程"
+                return start_result
+
+            readiness = probe.to_dict()
+            # 就绪延迟从首次拉起进程开始计算，包含重试耗时
+            if probe.ready_latency is not None:
+                readiness['latency_seconds'] = (probe.started_at + probe.ready_latency) - launch_started
+            start_result['readiness'] = readiness
+
+            # 第4步：验证启动状态（复用探测结果）
+            validation = self.validate_memory_startup(timeout=1, probe=probe)
             start_result['validation_result'] = validation
-            
-            if validation['startup_confirmed']:
+
+            if readiness['ready'] or validation['startup_confirmed']:
                 start_result['success'] = True
                 start_result['message'] = f"长记忆系统启动并验证成功 (PID: {start_result['process_id']})"
+                if readiness['latency_seconds'] is not None:
+                    start_result['message'] += f"，就绪耗时 {readiness['latency_seconds']:.2f}秒"
                 if start_result['startup_method'] == 'degraded':
                     start_result['message'] += " [降级模式]"
                 self.logger.info(start_result['message'])
             else:
-                start_result['error'] = "启动验证失败"
+                start_result['error'] = f"{deadline:.0f}秒内未就绪"
                 start_result['message'] = f"进程已启动但验证失败: {validation['issues_found']}"
                 self.logger.warning(start_result['message'])
-                
+
                 # 验证失败时，可以选择终止进程
                 try:
                     import psutil
@@ -1193,17 +1355,21 @@ class YDSLabStartupChecker:
                         self.logger.info("已终止验证失败的进程")
                 except Exception:
                     pass
-                
-        except ImportError:
-            start_result['error'] = "缺少psutil依赖包"
-            start_result['message'] = "请安装psutil: pip install psutil"
+
         except Exception as e:
             start_result['error'] = str(e)
             start_result['message'] = f"启动过程异常: {e}"
             self.logger.error(f"启动长记忆系统失败: {e}")
-            
+
         return start_result
-        
+
+    def start_memory_system_async(self, memory_status: Optional[Dict] = None) -> Future:
+        """在后台线程中启动长记忆系统，调用方可继续执行其他检查"""
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='memory-startup')
+        future = executor.submit(self.start_memory_system, memory_status)
+        executor.shutdown(wait=False)
+        return future
+
     def check_mcp_servers_status(self) -> Dict[str, any]:
         """检查MCP服务器状态"""
         self.logger.info("检查MCP服务器状态...")
@@ -1589,6 +1755,12 @@ class YDSLabStartupChecker:
                 start_icon = "❌"
                 start_msg = f"失败: {auto_start.get('error', '未知错误')}"
             briefing += f"- **自动启动**: {start_icon} {start_msg}\n"
+            readiness = auto_start.get('readiness')
+            if readiness:
+                if readiness.get('latency_seconds') is not None:
+                    briefing += f"- **就绪延迟**: ✅ {readiness['latency_seconds']:.2f}秒 ({readiness.get('source')})\n"
+                else:
+                    briefing += f"- **就绪延迟**: ❌ {auto_start.get('readiness_deadline', 0):.0f}秒截止时间内未就绪\n"
                 
         briefing += f"""
 
@@ -1772,6 +1944,12 @@ python up.py
                     'error': str(e)
                 }
             
+            # 自动启动长记忆系统（如果配置启用）：后台启动，与后续检查并行
+            memory_start_future = None
+            if (self.default_config['memory_system']['auto_start'] and 
+                checks_result['memory_system'].get('ready', False)):
+                memory_start_future = self.start_memory_system_async(checks_result['memory_system'])
+            
             # MCP服务器检查
             try:
                 checks_result['mcp_status'] = self.check_mcp_servers_status()
@@ -1821,17 +1999,17 @@ python up.py
                     'error': str(e)
                 }
             
-            # 自动启动长记忆系统（如果配置启用）
-            if (self.default_config['memory_system']['auto_start'] and 
-                checks_result['memory_system'].get('ready', False)):
+            # 收集长记忆系统后台启动结果（start_memory_system自身受readiness_deadline约束）
+            if memory_start_future is not None:
+                deadline = float(self.default_config['memory_system'].get('readiness_deadline', 30))
                 try:
-                    start_result = self.start_memory_system()
+                    start_result = memory_start_future.result(timeout=deadline + 10)
                     checks_result['memory_system']['auto_start_result'] = start_result
                 except Exception as e:
                     self.logger.error(f"长记忆系统自动启动失败: {e}")
                     checks_result['memory_system']['auto_start_result'] = {
                         'success': False,
-                        'error': str(e)
+                        'error': str(e) or type(e).__name__
                     }
             
             # 运行合规性检查（如果启用）
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+工作完成任务图测试（阶段函数使用桩函数，不执行备份、推送与清理）
+"""
+
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from fi import FinishTaskGraph, YDSLabFinishProcessor
+
+
+def test_graph_dependencies_and_skip():
+    """依赖全部完成后才开始；依赖失败时下游被跳过，其他阶段照常执行"""
+    events = []
+    lock = threading.Lock()
+
+    def stage(name, fail=False):
+        def run(results):
+            with lock:
+                events.append(('start', name))
+            time.sleep(0.02)
+            with lock:
+                events.append(('end', name))
+            if fail:
+                raise RuntimeError(name)
+            return name
+        return run
+
+    graph = FinishTaskGraph(max_workers=4)
+    graph.add_stage('a', stage('a'))
+    graph.add_stage('b', stage('b', fail=True))
+    graph.add_stage('c', stage('c'), depends_on=['a'])
+    graph.add_stage('d', stage('d'), depends_on=['b'])
+    results = graph.run()
+
+    assert results == {'a': 'a', 'c': 'c'}
+    assert events.index(('end', 'a')) < events.index(('start', 'c'))
+    assert ('start', 'd') not in events
+    statuses = {t['stage']: t['status'] for t in graph.timings}
+    assert statuses == {'a': 'success', 'b': 'failed', 'c': 'success', 'd': 'skipped'}
+    try:
+        graph.add_stage('e', stage('e'), depends_on=['missing'])
+    except ValueError:
+        pass
+    else:
+        raise AssertionError('依赖未注册的阶段应报错')
+
+
+def test_finish_graph_runs_push_after_backup():
+    """push 在全部清理阶段与备份复制完成后才执行（备份目录位于仓库内）"""
+    processor = YDSLabFinishProcessor(project_root=tempfile.mkdtemp())
+    events = []
+    lock = threading.Lock()
+
+    def stub(name, result=None):
+        def run(*args, **kwargs):
+            with lock:
+                events.append(('start', name))
+            time.sleep(0.02)
+            with lock:
+                events.append(('end', name))
+            return result if result is not None else {'success': True}
+        return run
+
+    processor.get_current_session_info = stub('session_info')
+    processor.get_daily_git_commits = stub('git_commits')
+    processor.analyze_file_changes = stub('file_changes')
+    processor.check_ai_agents_status = stub('ai_status')
+    processor.cleanup_temp_files = stub('cleanup_temp')
+    processor.cleanup_old_logs = stub('cleanup_logs')
+    processor.cleanup_old_backups = stub('cleanup_old_backups')
+    processor.perform_project_backup = stub('backup')
+    processor.perform_git_push = stub('push')
+
+    results = processor.build_finish_graph().run()
+    assert set(results) == {'session_info', 'git_data', 'ai_status', 'cleanup_temp', 'cleanup_logs',
+                            'cleanup_old_backups', 'backup', 'push'}
+    push_start = events.index(('start', 'push'))
+    for name in ('backup', 'git_commits', 'file_changes', 'cleanup_temp', 'cleanup_logs', 'cleanup_old_backups'):
+        assert events.index(('end', name)) < push_start, name
+    for name in ('cleanup_temp', 'cleanup_logs', 'cleanup_old_backups'):
+        assert events.index(('end', name)) < events.index(('start', 'backup')), name
+
+
+def main():
+    for test in (test_graph_dependencies_and_skip, test_finish_graph_runs_push_after_backup):
+        test()
+        print(f"✓ {test.__doc__}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+长记忆系统就绪探测测试（本地监听端口 + 临时目录中的心跳文件，不启动 node 进程）
+"""
+
+import os
+import socket
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from st import MemoryReadinessProbe, YDSLabStartupChecker
+
+
+def _free_port():
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+class _FakeProcess:
+    """模拟 Popen：exit_code 不为 None 时立即退出；on_poll 在首次 poll 时调用（模拟服务写心跳）"""
+
+    _next_pid = 40000
+
+    def __init__(self, exit_code=None, on_poll=None):
+        _FakeProcess._next_pid += 1
+        self.pid = _FakeProcess._next_pid
+        self.returncode = exit_code
+        self.on_poll = on_poll
+
+    def poll(self):
+        if self.on_poll is not None:
+            self.on_poll()
+            self.on_poll = None
+        return self.returncode
+
+
+def test_probe_signals_and_deadline():
+    """端口接通或心跳文件更新即就绪；进程退出提前结束等待；无信号时等到截止时间"""
+    listener = socket.socket()
+    listener.bind(('127.0.0.1', 0))
+    listener.listen(1)
+    port = listener.getsockname()[1]
+    try:
+        probe = MemoryReadinessProbe([_free_port(), port], [], host='127.0.0.1', interval=0.02).start()
+        assert probe.wait_ready(2.0)
+        probe.stop()
+        assert probe.ready_source == f'port:{port}' and probe.open_ports == [port]
+        assert probe.ready_latency is not None and probe.to_dict()['ready']
+    finally:
+        listener.close()
+
+    # 启动前已存在的心跳不算数，之后的更新才算
+    heartbeat = Path(tempfile.mkdtemp()) / 'memory_heartbeat.json'
+    heartbeat.write_text('{}', encoding='utf-8')
+    os.utime(heartbeat, (1000, 1000))
+    probe = MemoryReadinessProbe([_free_port()], [heartbeat], host='127.0.0.1', interval=0.02)
+    probe.start()
+    assert not probe.wait_ready(0.1)
+    os.utime(heartbeat, (2000, 2000))
+    assert probe.wait_ready(2.0) and probe.ready_source == 'heartbeat:memory_heartbeat.json'
+    probe.stop()
+
+    # 进程退出：不等到截止时间即返回
+    probe = MemoryReadinessProbe([_free_port()], [], process=_FakeProcess(exit_code=3),
+                                 host='127.0.0.1', interval=0.02).start()
+    assert not probe.wait_ready(30.0)
+    assert probe.done_event.is_set() and probe.process_exit_code == 3
+
+    # 没有任何信号：到截止时间返回 False
+    probe = MemoryReadinessProbe([_free_port()], [], host='127.0.0.1', interval=0.02).start()
+    started = time.monotonic()
+    assert not probe.wait_ready(0.2)
+    assert time.monotonic() - started >= 0.2 and not probe.done_event.is_set()
+    probe.stop()
+    assert probe.done_event.is_set()
+
+
+def test_async_start_relaunches_degraded():
+    """后台启动：进程提前退出时立即重拉，最后一次使用降级命令，心跳出现即成功"""
+    checker = YDSLabStartupChecker(project_root=tempfile.mkdtemp())
+    checker.default_config['memory_system'].update({
+        'readiness_deadline': 10, 'readiness_ports': [_free_port()],
+        'readiness_poll_interval': 0.02, 'startup_retry_count': 2})
+    heartbeat = checker.get_memory_heartbeat_files()[0]
+    launches = []
+
+    def launch(simple=False):
+        launches.append(simple)
+        if not simple:
+            return _FakeProcess(exit_code=1)
+        return _FakeProcess(on_poll=lambda: heartbeat.write_text('{"alive": true}', encoding='utf-8'))
+
+    checker._launch_memory_process = launch
+    future = checker.start_memory_system_async({'ready': True})
+    result = future.result(timeout=10)
+
+    assert launches == [False, False, True]
+    assert result['success'] and result['startup_method'] == 'degraded' and result['retry_count'] == 2
+    assert result['readiness']['source'] == 'heartbeat:memory_heartbeat.json'
+    assert result['readiness']['latency_seconds'] < result['readiness_deadline']
+    assert '[降级模式]' in result['message']
+
+
+def main():
+    for test in (test_probe_signals_and_deadline, test_async_start_relaunches_degraded):
+        test()
+        print(f"✓ {test.__doc__}")
+
+
+if __name__ == "__main__":
+    main()
@@ -17,8 +17,13 @@ import logging
 import argparse
 from pathlib import Path
 from typing import Dict, List, Optional
+import sys
 from dataclasses import dataclass, asdict
 
+# 与 fi.py 使用同一个 tools.disk_usage 模块实例（共享统计缓存）
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from tools.disk_usage import get_disk_usage_service, format_size
+
 # 配置日志
 logging.basicConfig(
     level=logging.INFO,
@@ -86,7 +91,6 @@ class BackupManager:
         try:
             # 复制项目文件
             file_count = 0
-            total_size = 0
             
             # 排除文件和目录
             exclude_patterns = {
@@ -121,11 +125,13 @@ class BackupManager:
                     try:
                         shutil.copy2(src_file, dest_file)
                         file_count += 1
-                        total_size += src_file.stat().st_size
                     except Exception as e:
                         logger.warning(f"复制文件失败 {src_file}: {e}")
                         continue
             
+            # 备份完成后单次遍历统计大小（结果缓存，供摘要复用）
+            total_size = get_disk_usage_service().get_size(backup_path)
+            
             # 创建备份信息
             backup_info = BackupInfo(
                 backup_id=backup_id,
@@ -258,31 +264,49 @@ class BackupManager:
             logger.error(f"删除备份失败: {e}")
             return False
     
-    def cleanup_old_backups(self, keep_count: int = 7) -> int:
-        """清理旧备份（保留最新N个）"""
+    def cleanup_old_backups(self, keep_count: int = 7, max_age_days: Optional[int] = None,
+                            force: bool = False) -> int:
+        """清理旧备份（保留最新N个，可选按天数过期）
+
+        直接基于 backup_info.json 索引批量删除，只确认一次、只写一次索引。
+        """
         backups = self.list_backups()
-        deleted_count = 0
         
-        if len(backups) <= keep_count:
+        backups_to_delete = backups[keep_count:]
+        if max_age_days is not None:
+            cutoff = (datetime.datetime.now() - datetime.timedelta(days=max_age_days)).isoformat()
+            backups_to_delete += [b for b in backups[:keep_count] if b.timestamp < cutoff]
+        
+        if not backups_to_delete:
             logger.info(f"备份数量 ({len(backups)}) 未超过保留限制 ({keep_count})，无需清理")
             return 0
         
-        backups_to_delete = backups[keep_count:]
+        if not force:
+            print(f"准备删除 {len(backups_to_delete)} 个旧备份: {', '.join(b.backup_id for b in backups_to_delete)}")
+            response = input("确认删除? (y/N): ")
+            if response.lower() != 'y':
+                print("删除操作已取消")
+                return 0
         
+        all_backups = self.get_backup_info()
+        deleted_count = 0
         for backup in backups_to_delete:
-            if self.delete_backup(backup.backup_id):
+            try:
+                backup_path = Path(backup.backup_path)
+                if backup_path.exists():
+                    shutil.rmtree(backup_path)
+                del all_backups[backup.backup_id]
                 deleted_count += 1
+            except Exception as e:
+                logger.error(f"删除备份失败 {backup.backup_id}: {e}")
+        self.save_backup_info(all_backups)
         
         logger.info(f"清理完成，删除了 {deleted_count} 个旧备份")
         return deleted_count
     
     def format_size(self, size_bytes: int) -> str:
         """格式化文件大小"""
-        for unit in ['B', 'KB', 'MB', 'GB']:
-            if size_bytes < 1024.0:
-                return f"{size_bytes:.1f} {unit}"
-            size_bytes /= 1024.0
-        return f"{size_bytes:.1f} TB"
+        return format_size(size_bytes)
     
     def print_backup_summary(self):
         """打印备份摘要"""
@@ -297,6 +321,9 @@ class BackupManager:
         if backups:
             total_size = sum(backup.size_bytes for backup in backups)
             print(f"总备份大小: {self.format_size(total_size)}")
+            # 实际磁盘占用（硬链接只计一次，近似模式复用本会话已有统计）
+            disk_usage = get_disk_usage_service().get_usage(self.backup_root, approximate=True)
+            print(f"实际磁盘占用: {disk_usage.formatted_size}")
             
             print("\n备份列表:")
             for i, backup in enumerate(backups[:10], 1):  # 只显示前10个
@@ -345,7 +372,7 @@ def main():
             )
             print(f"备份创建成功: {backup_id}")
             if args.auto_cleanup:
-                deleted = manager.cleanup_old_backups(args.keep_count)
+                deleted = manager.cleanup_old_backups(args.keep_count, force=args.force)
                 print(f"自动清理完成，删除 {deleted} 个旧备份")
         
         elif args.action == 'list':
@@ -386,7 +413,7 @@ def main():
                 return 1
         
         elif args.action == 'cleanup':
-            deleted_count = manager.cleanup_old_backups(args.keep_count)
+            deleted_count = manager.cleanup_old_backups(args.keep_count, force=args.force)
             print(f"清理完成，删除了 {deleted_count} 个备份")
         
         elif args.action == 'summary':
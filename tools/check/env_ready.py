@@ -34,6 +34,10 @@ import pkg_resources
 import tempfile
 import shutil
 
+# 与 fi.py 使用同一个 tools.disk_usage 模块实例（共享统计缓存）
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from tools.disk_usage import get_disk_usage_service
+
 class YDSLabEnvChecker:
     """YDS-Lab环境就绪检查器"""
     
@@ -276,7 +280,7 @@ class YDSLabEnvChecker:
                         'name': dir_name,
                         'path': str(dir_path),
                         'size': self._get_dir_size(dir_path),
-                        'files_count': len(list(dir_path.rglob('*')))
+                        'files_count': get_disk_usage_service().get_usage(dir_path).entry_count
                     })
                 else:
                     missing_dirs.append(dir_name)
@@ -286,7 +290,7 @@ class YDSLabEnvChecker:
                         'name': dir_name,
                         'path': str(dir_path),
                         'size': self._get_dir_size(dir_path),
-                        'files_count': len(list(dir_path.rglob('*')))
+                        'files_count': get_disk_usage_service().get_usage(dir_path).entry_count
                     })
                 else:
                     missing_dirs.append(dir_name)
@@ -551,14 +555,10 @@ class YDSLabEnvChecker:
         return result
     
     def _get_dir_size(self, dir_path: Path) -> int:
-        """获取目录大小"""
+        """获取目录大小（共享磁盘占用服务，与 files_count 复用同一次遍历）"""
         try:
-            total_size = 0
-            for file_path in dir_path.rglob('*'):
-                if file_path.is_file():
-                    total_size += file_path.stat().st_size
-            return total_size
-        except:
+            return get_disk_usage_service().get_size(dir_path)
+        except Exception:
             return 0
     
     def run_all_checks(self) -> Dict:
@@ -12,6 +12,8 @@ from pathlib import Path
 from datetime import datetime
 from typing import Optional, Dict, Any
 
+from log_backend import get_log_writer, RetentionIndex
+
 
 class Logger:
     """统一日志记录器"""
@@ -20,6 +22,11 @@ class Logger:
         self.name = name
         self.log_dir = Path("S:/YDS-Lab/logs")
         self.log_dir.mkdir(parents=True, exist_ok=True)
+        # 常驻句柄 + 缓冲写入，按日期/大小轮转（轮转文件压缩并登记索引）
+        self.app_writer = get_log_writer(
+            self.log_dir / "app", "%Y%m%d.log",
+            index=RetentionIndex(self.log_dir / ".log_index.json")
+        )
     
     def log_meeting(self, meeting_id: str, content: str) -> str:
         """记录会议日志"""
@@ -38,11 +45,7 @@ class Logger:
         print(log_message)
         
         # 保存到文件
-        log_file = self.log_dir / "app" / f"{datetime.now().strftime('%Y%m%d')}.log"
-        log_file.parent.mkdir(parents=True, exist_ok=True)
-        
-        with open(log_file, 'a', encoding='utf-8') as f:
-            f.write(log_message + "\n")
+        self.app_writer.write(log_message)
     
     def log_error(self, message: str, module: str = ""):
         """记录错误日志"""
@@ -50,12 +53,8 @@ class Logger:
         log_message = f"[{timestamp}] ERROR {module}: {message}"
         print(log_message)
         
-        # 保存到文件
-        log_file = self.log_dir / "app" / f"{datetime.now().strftime('%Y%m%d')}.log"
-        log_file.parent.mkdir(parents=True, exist_ok=True)
-        
-        with open(log_file, 'a', encoding='utf-8') as f:
-            f.write(log_message + "\n")
+        # 保存到文件（错误日志立即落盘）
+        self.app_writer.write(log_message, flush=True)
 
 
 def get_project_root() -> Path:
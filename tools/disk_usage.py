@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+YDS-Lab 磁盘占用统计服务
+供 fi.py、tools/check/env_ready.py、tools/backup_manager.py 共用
+
+- 基于 os.scandir 单次遍历，避免 rglob + 逐文件 stat()
+- 硬链接按 (st_dev, st_ino) 去重，只计一次
+- 按目录 mtime 缓存每个目录自身条目的统计结果，同一会话内重复统计几乎无开销
+- 近似模式：已统计过的目录直接返回上次结果，不再逐级校验子目录 mtime
+
+注意：目录 mtime 只在增删/重命名条目时变化，原地改写文件内容不会使缓存失效；
+需要精确结果时调用 invalidate()。
+"""
+
+import os
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple, Union
+
+
+@dataclass
+class DirUsage:
+    """目录占用统计结果"""
+    path: str
+    total_bytes: int = 0
+    file_count: int = 0
+    dir_count: int = 0
+    hardlinks_skipped: int = 0
+
+    @property
+    def entry_count(self) -> int:
+        """文件与子目录总数（等价于 len(list(path.rglob('*')))）"""
+        return self.file_count + self.dir_count
+
+    @property
+    def formatted_size(self) -> str:
+        return format_size(self.total_bytes)
+
+
+@dataclass
+class _DirEntryCache:
+    """单个目录自身（不含子目录）的统计缓存"""
+    mtime_ns: int
+    own_bytes: int
+    own_files: int
+    linked_files: List[Tuple[int, int, int]]  # (st_dev, st_ino, size)，st_nlink > 1 的文件
+    subdirs: List[str]
+
+
+def format_size(size_bytes: Union[int, float]) -> str:
+    """格式化文件大小"""
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if size_bytes < 1024.0:
+            return f"{size_bytes:.1f} {unit}"
+        size_bytes /= 1024.0
+    return f"{size_bytes:.1f} TB"
+
+
+class DiskUsageService:
+    """磁盘占用统计服务"""
+
+    def __init__(self):
+        self._cache: Dict[str, _DirEntryCache] = {}
+        # 近似模式使用的整棵子树统计缓存
+        self._tree_cache: Dict[str, DirUsage] = {}
+        self._lock = threading.Lock()
+        self.scanned_dirs = 0
+        self.cached_dirs = 0
+
+    def invalidate(self, path: Optional[Union[str, Path]] = None):
+        """清空缓存；指定 path 时只清除该目录及其子目录"""
+        with self._lock:
+            if path is None:
+                self._cache.clear()
+                self._tree_cache.clear()
+                return
+            prefix = os.path.abspath(str(path))
+            for cache in (self._cache, self._tree_cache):
+                for key in [k for k in cache if k == prefix or k.startswith(prefix + os.sep)]:
+                    del cache[key]
+
+    def _scan_dir(self, dir_path: str, mtime_ns: int) -> _DirEntryCache:
+        own_bytes = 0
+        own_files = 0
+        linked_files = []
+        subdirs = []
+        with os.scandir(dir_path) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        st = entry.stat(follow_symlinks=False)
+                        own_files += 1
+                        if st.st_nlink > 1:
+                            linked_files.append((st.st_dev, st.st_ino, st.st_size))
+                        else:
+                            own_bytes += st.st_size
+                except OSError:
+                    continue
+        self.scanned_dirs += 1
+        return _DirEntryCache(mtime_ns, own_bytes, own_files, linked_files, subdirs)
+
+    def _dir_entries(self, dir_path: str) -> Optional[_DirEntryCache]:
+        try:
+            mtime_ns = os.stat(dir_path).st_mtime_ns
+        except OSError:
+            return None
+        cached = self._cache.get(dir_path)
+        if cached is not None and cached.mtime_ns == mtime_ns:
+            self.cached_dirs += 1
+            return cached
+        try:
+            cached = self._scan_dir(dir_path, mtime_ns)
+        except OSError:
+            return None
+        self._cache[dir_path] = cached
+        return cached
+
+    def get_usage(self, path: Union[str, Path], approximate: bool = False) -> DirUsage:
+        """统计目录占用
+
+        approximate=True 时，已统计过的目录直接返回上次结果（不校验子目录 mtime）。
+        """
+        root = os.path.abspath(str(path))
+        with self._lock:
+            if approximate and root in self._tree_cache:
+                return self._tree_cache[root]
+
+            usage = DirUsage(path=root)
+            if os.path.isfile(root):
+                usage.total_bytes = os.path.getsize(root)
+                usage.file_count = 1
+                return usage
+
+            seen_inodes: Set[Tuple[int, int]] = set()
+            stack = [root]
+            while stack:
+                current = stack.pop()
+                entries = self._dir_entries(current)
+                if entries is None:
+                    continue
+                usage.total_bytes += entries.own_bytes
+                usage.file_count += entries.own_files
+                usage.dir_count += len(entries.subdirs)
+                for dev, ino, size in entries.linked_files:
+                    if (dev, ino) in seen_inodes:
+                        usage.hardlinks_skipped += 1
+                        continue
+                    seen_inodes.add((dev, ino))
+                    usage.total_bytes += size
+                stack.extend(entries.subdirs)
+
+            self._tree_cache[root] = usage
+            return usage
+
+    def get_size(self, path: Union[str, Path], approximate: bool = False) -> int:
+        """目录总字节数"""
+        return self.get_usage(path, approximate=approximate).total_bytes
+
+    def get_formatted_size(self, path: Union[str, Path], approximate: bool = False) -> str:
+        """可读格式的目录大小"""
+        return format_size(self.get_size(path, approximate=approximate))
+
+
+# 进程内共享实例
+_default_service: Optional[DiskUsageService] = None
+_default_lock = threading.Lock()
+
+
+def get_disk_usage_service() -> DiskUsageService:
+    """获取进程内共享的磁盘占用统计服务"""
+    global _default_service
+    with _default_lock:
+        if _default_service is None:
+            _default_service = DiskUsageService()
+        return _default_service
@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+YDS-Lab 统一日志后端
+替代逐条 open/close 日志文件的写法
+
+- RotatingLogWriter: 常驻文件句柄 + 缓冲写入，按大小/时间轮转，轮转文件 gzip 压缩
+- RetentionIndex: 轮转文件、会话日志、备份目录的保留索引（JSON），
+  清理只遍历索引条目，不再全量扫描目录
+"""
+
+import atexit
+import gzip
+import json
+import os
+import shutil
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Union
+
+
+class RetentionIndex:
+    """保留索引
+
+    记录受管理的文件/目录及其创建时间，按数量或天数清理时只处理索引条目。
+    """
+
+    def __init__(self, index_path: Union[str, Path]):
+        self.index_path = Path(index_path)
+        self._lock = threading.Lock()
+        self.entries: List[Dict] = self._load()
+
+    def _load(self) -> List[Dict]:
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return data.get('entries', []) if isinstance(data, dict) else []
+        except (OSError, ValueError):
+            return []
+
+    def exists(self) -> bool:
+        return self.index_path.exists()
+
+    def save(self):
+        """原子写入索引文件"""
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.index_path.with_suffix(f"{self.index_path.suffix}.{os.getpid()}.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'entries': self.entries}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.index_path)
+
+    def _upsert(self, path: str, created: float, category: str):
+        self.entries = [e for e in self.entries if e['path'] != path]
+        self.entries.append({'path': path, 'created': created, 'category': category})
+
+    def add(self, path: Union[str, Path], created: Optional[float] = None, category: str = 'log'):
+        """登记一个受管理的文件或目录"""
+        with self._lock:
+            # 索引可能被其他进程（fi.py / tools 日志器）同时更新，修改前重新读取
+            self.entries = self._load()
+            self._upsert(str(path), created if created is not None else time.time(), category)
+            self.save()
+
+    def bootstrap(self, paths: List[Path], category: str = 'log',
+                  created_of: Optional[Callable[[Path], Optional[float]]] = None) -> int:
+        """登记索引中尚未记录的已有文件/目录，返回新登记数
+
+        创建时间默认取 mtime；created_of 可从名称等解析，返回 None 的路径不登记。
+        """
+        with self._lock:
+            self.entries = self._load()
+            known = {e['path'] for e in self.entries}
+            added = 0
+            for path in paths:
+                if str(path) in known:
+                    continue
+                try:
+                    created = created_of(path) if created_of is not None else path.stat().st_mtime
+                except OSError:
+                    continue
+                if created is None:
+                    continue
+                self._upsert(str(path), created, category)
+                added += 1
+            if added or not self.exists():
+                self.save()
+            return added
+
+    def prune(self, max_entries: Optional[int] = None, max_age_days: Optional[float] = None,
+              category: Optional[str] = None) -> List[str]:
+        """按数量/天数删除最旧的条目，返回已删除路径"""
+        with self._lock:
+            self.entries = self._load()
+            managed = [e for e in self.entries if category is None or e['category'] == category]
+            managed.sort(key=lambda e: e['created'], reverse=True)
+
+            expired = []
+            if max_entries is not None and len(managed) > max_entries:
+                expired.extend(managed[max_entries:])
+                managed = managed[:max_entries]
+            if max_age_days is not None:
+                cutoff = time.time() - max_age_days * 86400
+                expired.extend(e for e in managed if e['created'] < cutoff)
+
+            removed = []
+            for entry in expired:
+                path = Path(entry['path'])
+                try:
+                    if path.is_dir():
+                        shutil.rmtree(path)
+                    elif path.exists():
+                        path.unlink()
+                    removed.append(entry['path'])
+                except OSError:
+                    # 删除失败的条目保留在索引中，下次重试
+                    continue
+            # 已不存在的条目一并移出索引
+            removed_set = set(removed) | {e['path'] for e in expired if not Path(e['path']).exists()}
+            if removed_set:
+                self.entries = [e for e in self.entries if e['path'] not in removed_set]
+                self.save()
+            return removed
+
+
+class RotatingLogWriter:
+    """常驻句柄、缓冲写入的轮转日志写入器
+
+    filename 可包含 strftime 占位符（如 "%Y%m%d.log"），占位符结果变化即按时间轮转；
+    当前文件超过 max_bytes 时按大小轮转。轮转出的文件 gzip 压缩并登记到 RetentionIndex。
+
+    待写入的行缓存在内存中，刷新时才写入文件；刷新前检查路径上的文件是否仍是当前句柄
+    （其他进程可能已轮转并删除/改名该文件），不一致则重新打开，避免写入已脱离目录的 inode。
+    """
+
+    def __init__(self, directory: Union[str, Path], filename: str,
+                 max_bytes: int = 10 * 1024 * 1024, compress: bool = True,
+                 buffer_size: int = 64 * 1024, flush_interval: float = 2.0,
+                 index: Optional[RetentionIndex] = None, max_rotated: Optional[int] = None):
+        self.directory = Path(directory)
+        self.filename = filename
+        self.max_bytes = max_bytes
+        self.compress = compress
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self.index = index or RetentionIndex(self.directory / '.log_index.json')
+        self.max_rotated = max_rotated
+
+        self._lock = threading.Lock()
+        self._handle = None
+        self._current_path: Optional[Path] = None
+        self._current_size = 0
+        self._file_id = None
+        self._pending: List[str] = []
+        self._pending_bytes = 0
+        self._last_flush = time.monotonic()
+
+    @property
+    def current_path(self) -> Path:
+        return self.directory / datetime.now().strftime(self.filename)
+
+    def _open(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._handle = open(path, 'a', encoding='utf-8')
+        self._current_path = path
+        stat = os.fstat(self._handle.fileno())
+        self._file_id = (stat.st_dev, stat.st_ino)
+        self._current_size = stat.st_size + self._pending_bytes
+
+    def _is_stale(self) -> bool:
+        """路径上的文件已不是当前句柄打开的文件（被删除或替换）"""
+        try:
+            stat = os.stat(self._current_path)
+        except OSError:
+            return True
+        return (stat.st_dev, stat.st_ino) != self._file_id
+
+    def _flush_pending(self):
+        if self._handle is None:
+            return
+        if self._pending:
+            if self._is_stale():
+                self._handle.close()
+                self._open(self._current_path)
+            self._handle.write(''.join(self._pending))
+            self._handle.flush()
+            self._pending = []
+            self._pending_bytes = 0
+        self._last_flush = time.monotonic()
+
+    def _close_handle(self):
+        if self._handle is not None:
+            self._flush_pending()
+            self._handle.close()
+            self._handle = None
+            self._file_id = None
+
+    @staticmethod
+    def _unique_target(path: Path, keep_name: bool = False) -> Path:
+        """选择未被占用的归档名（含 .gz 形式），不覆盖其他进程已生成的归档
+
+        keep_name 为 True 时优先使用原名，否则从 name.1.suffix 开始编号。
+        """
+        def taken(candidate: Path) -> bool:
+            return candidate.exists() or candidate.with_name(candidate.name + '.gz').exists()
+
+        if keep_name and not taken(path.with_name(path.name + '.gz')):
+            return path
+        n = 1
+        while taken(path.with_name(f"{path.stem}.{n}{path.suffix}")):
+            n += 1
+        return path.with_name(f"{path.stem}.{n}{path.suffix}")
+
+    def _archive(self, path: Path, target: Path):
+        """将已关闭的日志文件压缩/改名并登记到索引"""
+        try:
+            if self.compress:
+                archive = target.with_name(target.name + '.gz')
+                with open(path, 'rb') as src, gzip.open(archive, 'wb') as dst:
+                    shutil.copyfileobj(src, dst)
+                path.unlink()
+            else:
+                archive = target
+                os.replace(path, archive)
+        except FileNotFoundError:
+            # 其他进程已轮转该文件
+            return
+        self.index.add(archive, category='rotated')
+        if self.max_rotated is not None:
+            self.index.prune(max_entries=self.max_rotated, category='rotated')
+
+    def _rotate_by_size(self):
+        path = self._current_path
+        self._close_handle()
+        target = self._unique_target(path)
+        self._archive(path, target)
+        self._open(path)
+
+    def _rotate_by_time(self, new_path: Path):
+        old_path = self._current_path
+        self._close_handle()
+        if old_path is not None:
+            # 按日期命名的旧文件保持原名，仅压缩；同名归档已存在时追加序号
+            self._archive(old_path, self._unique_target(old_path, keep_name=True))
+        self._open(new_path)
+
+    def write(self, line: str, flush: bool = False):
+        """写入一行日志"""
+        if not line.endswith('\n'):
+            line += '\n'
+        with self._lock:
+            path = self.current_path
+            if self._handle is None:
+                self._open(path)
+            elif path != self._current_path:
+                self._rotate_by_time(path)
+
+            size = len(line.encode('utf-8'))
+            self._pending.append(line)
+            self._pending_bytes += size
+            self._current_size += size
+
+            if (flush or self._pending_bytes >= self.buffer_size
+                    or time.monotonic() - self._last_flush >= self.flush_interval):
+                self._flush_pending()
+
+            if self.max_bytes and self._current_size >= self.max_bytes:
+                self._rotate_by_size()
+
+    def flush(self):
+        with self._lock:
+            self._flush_pending()
+
+    def close(self):
+        with self._lock:
+            self._close_handle()
+
+
+_writers: Dict[str, RotatingLogWriter] = {}
+_writers_lock = threading.Lock()
+
+
+def get_log_writer(directory: Union[str, Path], filename: str, **kwargs) -> RotatingLogWriter:
+    """获取（或创建）共享的日志写入器，同一目标文件在进程内只保留一个句柄"""
+    key = os.path.abspath(os.path.join(str(directory), filename))
+    with _writers_lock:
+        writer = _writers.get(key)
+        if writer is None:
+            writer = RotatingLogWriter(directory, filename, **kwargs)
+            _writers[key] = writer
+        return writer
+
+
+@atexit.register
+def close_all_writers():
+    """进程退出时刷新并关闭所有日志句柄"""
+    with _writers_lock:
+        for writer in _writers.values():
+            try:
+                writer.close()
+            except Exception:
+                pass
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+磁盘占用统计服务测试（临时目录）
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from tools.disk_usage import DiskUsageService, format_size, get_disk_usage_service
+
+
+def _tree():
+    root = Path(tempfile.mkdtemp())
+    (root / 'a' / 'b').mkdir(parents=True)
+    (root / 'top.txt').write_bytes(b'x' * 100)
+    (root / 'a' / 'mid.bin').write_bytes(b'x' * 1000)
+    (root / 'a' / 'b' / 'deep.bin').write_bytes(b'x' * 24)
+    return root
+
+
+def test_usage_counts_and_hardlinks():
+    """单次遍历统计字节数与条目数；硬链接只计一次"""
+    root = _tree()
+    os.link(root / 'a' / 'mid.bin', root / 'a' / 'b' / 'mid_link.bin')
+    service = DiskUsageService()
+    usage = service.get_usage(root)
+    assert usage.total_bytes == 1124 and usage.file_count == 4 and usage.dir_count == 2
+    assert usage.hardlinks_skipped == 1
+    assert usage.entry_count == len(list(root.rglob('*')))
+    assert service.get_size(root / 'top.txt') == 100
+    assert service.get_formatted_size(root) == format_size(1124) == '1.1 KB'
+    assert format_size(0) == '0.0 B' and format_size(1024 ** 4) == '1.0 TB'
+
+
+def test_mtime_cache_approximate_and_invalidate():
+    """未变化目录复用缓存；近似模式不重新校验；invalidate 清除子树；共享实例唯一"""
+    root = _tree()
+    service = DiskUsageService()
+    service.get_usage(root)
+    assert service.scanned_dirs == 3
+    service.get_usage(root)
+    assert service.scanned_dirs == 3 and service.cached_dirs == 3
+
+    # 新增条目改变目录 mtime，只重扫该目录
+    (root / 'a' / 'b' / 'new.bin').write_bytes(b'x' * 6)
+    assert service.get_size(root) == 1130 and service.scanned_dirs == 4
+    # 近似模式直接返回上次结果
+    (root / 'a' / 'later.bin').write_bytes(b'x' * 10)
+    assert service.get_size(root, approximate=True) == 1130
+    assert service.get_size(root) == 1140
+
+    # 原地改写内容不改变目录 mtime，需要显式失效
+    stat = os.stat(root / 'a')
+    (root / 'a' / 'mid.bin').write_bytes(b'x' * 2000)
+    os.utime(root / 'a', ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert service.get_size(root) == 1140
+    service.invalidate(root / 'a')
+    assert service.get_size(root) == 2140
+
+    assert get_disk_usage_service() is get_disk_usage_service()
+
+
+def main():
+    for test in (test_usage_counts_and_hardlinks, test_mtime_cache_approximate_and_invalidate):
+        test()
+        print(f"✓ {test.__doc__}")
+
+
+if __name__ == "__main__":
+    main()
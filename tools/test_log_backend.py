@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+统一日志后端测试（临时目录）
+"""
+
+import gzip
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from tools.log_backend import RetentionIndex, RotatingLogWriter, get_log_writer
+
+
+def test_retention_index_prune_and_bootstrap():
+    """按数量/天数清理索引条目；bootstrap 只登记新路径并可从名称解析时间"""
+    root = Path(tempfile.mkdtemp())
+    index = RetentionIndex(root / 'index.json')
+    now = time.time()
+    for i in range(5):
+        path = root / f"s{i}.log"
+        path.write_text('x', encoding='utf-8')
+        index.add(path, created=now - i * 86400)
+    backup = root / 'backup_20200101_000000'
+    backup.mkdir()
+    (backup / 'f.txt').write_text('x', encoding='utf-8')
+    (root / 'backup_notatime').mkdir()
+
+    def from_name(path):
+        try:
+            return datetime.strptime(path.name.replace('backup_', ''), '%Y%m%d_%H%M%S').timestamp()
+        except ValueError:
+            return None
+
+    legacy = sorted(root.glob('backup_*'))
+    assert index.bootstrap(legacy, category='legacy', created_of=from_name) == 1
+    assert index.bootstrap(legacy, category='legacy', created_of=from_name) == 0
+
+    # 另一个实例读取同一索引文件
+    reloaded = RetentionIndex(root / 'index.json')
+    assert reloaded.prune(max_age_days=30, category='legacy') == [str(backup)]
+    assert not backup.exists() and (root / 'backup_notatime').exists()
+    removed = reloaded.prune(max_entries=3, category='log')
+    assert removed == [str(root / 's3.log'), str(root / 's4.log')]
+    assert sorted(p.name for p in root.glob('s*.log')) == ['s0.log', 's1.log', 's2.log']
+    assert reloaded.prune(max_age_days=1.5) == [str(root / 's2.log')]
+    assert len(RetentionIndex(root / 'index.json').entries) == 2
+
+
+def test_rotating_writer_size_rotation():
+    """缓冲写入；超过大小轮转并 gzip 压缩、登记索引、只保留 max_rotated 个；共享写入器唯一"""
+    root = Path(tempfile.mkdtemp())
+    writer = RotatingLogWriter(root, 'app.log', max_bytes=100, max_rotated=2, flush_interval=3600)
+    for i in range(13):
+        writer.write(f"line {i:02d} " + 'x' * 20)
+    writer.flush()
+    archives = sorted(p.name for p in root.glob('app.*.log.gz'))
+    assert len(archives) == 2, archives
+    with gzip.open(root / archives[-1], 'rt', encoding='utf-8') as f:
+        assert f.read().startswith('line ')
+    rotated = [e for e in RetentionIndex(root / '.log_index.json').entries if e['category'] == 'rotated']
+    assert sorted(os.path.basename(e['path']) for e in rotated) == archives
+    assert (root / 'app.log').read_text(encoding='utf-8').startswith('line 12 ')
+    writer.close()
+
+    assert get_log_writer(root, 'shared.log') is get_log_writer(root, 'shared.log')
+
+
+def test_rotating_writer_reopens_after_external_rotation():
+    """其他进程轮转并删除当前文件后，后续刷新写入重新创建的文件；同名归档不被覆盖"""
+    root = Path(tempfile.mkdtemp())
+    writer = RotatingLogWriter(root, 'app.log', max_bytes=0, flush_interval=3600)
+    other = RotatingLogWriter(root, 'app.log', max_bytes=0, flush_interval=3600)
+    writer.write('a1', flush=True)
+    other.write('b1', flush=True)
+    writer.write('a2')
+    # 模拟另一个进程按大小轮转：压缩后删除 app.log
+    other._rotate_by_size()
+    assert not (root / 'app.log').exists() or (root / 'app.log').stat().st_size == 0
+    writer.write('a3')
+    writer.flush()
+    other.write('b2', flush=True)
+    assert (root / 'app.log').read_text(encoding='utf-8') == 'a2\na3\nb2\n'
+    with gzip.open(root / 'app.1.log.gz', 'rt', encoding='utf-8') as f:
+        assert f.read() == 'a1\nb1\n'
+
+    # 改名方式轮转（不压缩）同样能检测到
+    os.replace(root / 'app.log', root / 'moved.log')
+    writer.write('a4', flush=True)
+    assert (root / 'app.log').read_text(encoding='utf-8') == 'a4\n'
+
+    # 按时间轮转时同名 .gz 已存在：追加序号
+    (root / 'day.log').write_text('old\n', encoding='utf-8')
+    with gzip.open(root / 'day.log.gz', 'wt', encoding='utf-8') as f:
+        f.write('archived elsewhere\n')
+    assert RotatingLogWriter._unique_target(root / 'day.log', keep_name=True) == root / 'day.1.log'
+    assert RotatingLogWriter._unique_target(root / 'app.log') == root / 'app.2.log'
+    writer.close()
+    other.close()
+
+
+def main():
+    for test in (test_retention_index_prune_and_bootstrap, test_rotating_writer_size_rotation,
+                 test_rotating_writer_reopens_after_external_rotation):
+        test()
+        print(f"✓ {test.__doc__}")
+
+
+if __name__ == "__main__":
+    main()